@@ -8,7 +8,9 @@ from openai.types.chat.chat_completion_message import ChatCompletionMessage
 from redbot.core import commands
 from redbot.core.bot import Red
 
-from .common.models import DB, GuildSettings
+from .common.channelcache import ChannelHistory
+from .common.embedbatch import EmbeddingBatcher, EmbeddingCache
+from .common.models import DB, Conversation, GuildSettings
 
 
 class CompositeMetaClass(CogMeta, ABCMeta):
@@ -23,6 +25,9 @@ class MixinMeta(ABC):
         self.db: DB
         self.mp_pool: Pool
         self.registry: Dict[str, Dict[str, dict]]
+        self.embedding_cache: EmbeddingCache
+        self.embedding_batcher: EmbeddingBatcher
+        self.channel_history: ChannelHistory
 
     @abstractmethod
     async def openai_status(self) -> str:
@@ -38,6 +43,8 @@ class MixinMeta(ABC):
         response_token_override: int = None,
         model_override: Optional[str] = None,
         temperature_override: Optional[float] = None,
+        on_text: Optional[Callable[[str], None]] = None,
+        conversation: Optional[Conversation] = None,
     ) -> Union[ChatCompletionMessage, str]:
         raise NotImplementedError
 
@@ -45,6 +52,10 @@ class MixinMeta(ABC):
     async def request_embedding(self, text: str, conf: GuildSettings) -> List[float]:
         raise NotImplementedError
 
+    @abstractmethod
+    async def request_embeddings(self, texts: List[str], conf: GuildSettings) -> List[List[float]]:
+        raise NotImplementedError
+
     @abstractmethod
     async def can_call_llm(self, conf: GuildSettings, ctx: Optional[commands.Context] = None) -> bool:
         raise NotImplementedError
@@ -62,7 +73,12 @@ class MixinMeta(ABC):
         raise NotImplementedError
 
     @abstractmethod
-    async def count_payload_tokens(self, messages: List[dict], model: str = "gpt-4o-mini") -> int:
+    async def count_payload_tokens(
+        self,
+        messages: List[dict],
+        model: str = "gpt-4o-mini",
+        conversation: Optional[Conversation] = None,
+    ) -> int:
         raise NotImplementedError
 
     @abstractmethod
@@ -88,6 +104,7 @@ class MixinMeta(ABC):
         function_list: List[dict],
         conf: GuildSettings,
         user: Optional[discord.Member],
+        conversation: Optional[Conversation] = None,
     ) -> bool:
         raise NotImplementedError
 
@@ -3,18 +3,23 @@ import asyncio
 import logging
 import os
 from multiprocessing.pool import Pool
+from pathlib import Path
 from time import perf_counter
 from typing import Callable, Dict, List, Literal, Optional, Union
 
 import discord
+import orjson
 from discord.ext import tasks
 from pydantic import ValidationError
 from redbot.core import Config, commands
 from redbot.core.bot import Red
+from redbot.core.data_manager import cog_data_path
 
 from .abc import CompositeMetaClass
 from .commands import AssistantCommands
 from .common.api import API
+from .common.calls import CLIENTS
+from .common.channelcache import ChannelHistory
 from .common.chat import ChatHandler
 from .common.constants import (
     CREATE_MEMORY,
@@ -24,8 +29,10 @@ from .common.constants import (
     SEARCH_INTERNET,
     SEARCH_MEMORIES,
 )
+from .common.embedbatch import EmbeddingBatcher, EmbeddingCache
 from .common.functions import AssistantFunctions
 from .common.models import DB, Embedding, EmbeddingEntryExists, NoAPIKey
+from .common.storage import ShardStore, write_atomic
 from .common.utils import json_schema_invalid
 from .listener import AssistantListener
 
@@ -72,10 +79,14 @@ class Assistant(
         super().__init__(*args, **kwargs)
         self.bot: Red = bot
         self.config = Config.get_conf(self, 117117117, force_registration=True)
-        self.config.register_global(db={})
+        self.config.register_global(db={})  # Only read to migrate to sharded storage
         self.db: DB = DB()
+        self.store = ShardStore(cog_data_path(self))
         self.mp_pool = Pool()
         self.session: Optional[aiohttp.ClientSession] = None
+        self.embedding_cache = EmbeddingCache()
+        self.embedding_batcher = EmbeddingBatcher()
+        self.channel_history = ChannelHistory()
 
         # {cog_name: {function_name: {"permission_level": "user", "schema": function_json_schema}}}
         self.registry: Dict[str, Dict[str, dict]] = {}
@@ -92,22 +103,44 @@ class Assistant(
             asyncio.create_task(self.session.close())
         self.save_loop.cancel()
         self.mp_pool.close()
+        self.embedding_batcher.close()
+        asyncio.create_task(CLIENTS.close())
         self.bot.dispatch("assistant_cog_remove")
 
     async def init_cog(self):
         await self.bot.wait_until_red_ready()
         start = perf_counter()
-        data = await self.config.db()
-        try:
-            self.db = await asyncio.to_thread(DB.model_validate, data)
-        except ValidationError:
-            # Try clearing conversations
-            if "conversations" in data:
-                del data["conversations"]
-            self.db = await asyncio.to_thread(DB.model_validate, data)
+        migrate = False
+        db = await asyncio.to_thread(self.store.load)
+        if db is not None:
+            self.db = db
+        else:
+            data = await self.config.db()
+            try:
+                self.db = await asyncio.to_thread(DB.model_validate, data)
+            except ValidationError:
+                # Try clearing conversations
+                if "conversations" in data:
+                    del data["conversations"]
+                self.db = await asyncio.to_thread(DB.model_validate, data)
+            migrate = bool(data)
 
         log.info(f"Config loaded in {round((perf_counter() - start) * 1000, 2)}ms")
 
+        if migrate:
+            try:
+                await asyncio.to_thread(self.store.save, self.db)
+                # Keep a copy of the old config, and only clear it once the shards have been read back intact
+                backup = cog_data_path(self) / "config_backup.json"
+                await asyncio.to_thread(write_atomic, backup, orjson.dumps(data))
+                if await asyncio.to_thread(self.store.verify, self.db):
+                    await self.config.db.clear()
+                    log.info(f"Config migrated to sharded storage, a copy of the old config was saved to {backup}")
+                else:
+                    log.error("Sharded storage doesn't match the config after migrating, the config has been kept")
+            except Exception as e:
+                log.error("Failed to migrate config to sharded storage", exc_info=e)
+
         # Check for environment variable override for Google AI Studio API Key
         key = os.getenv("GOOGLE_AI_STUDIO_API_KEY")
         if key: # Checks for None or empty string implicitly
@@ -116,6 +149,10 @@ class Assistant(
             # This key will be persisted if/when self.save_conf() is called later
 
         await asyncio.to_thread(self._cleanup_db)
+        CLIENTS.configure(self.db.concurrency_limits)
+        await asyncio.to_thread(self._load_ann_indexes)
+        # Read the embedding vectors in the background, anything needing a guild's vectors sooner reads them in a thread
+        asyncio.create_task(asyncio.to_thread(self.db.load_vectors))
 
         # Register internal functions
         await self.register_function(self.qualified_name, GENERATE_IMAGE)
@@ -143,9 +180,9 @@ class Assistant(
             start = perf_counter()
             if not self.db.persistent_conversations:
                 self.db.conversations.clear()
-            dump = await asyncio.to_thread(self.db.model_dump)
-            await self.config.db.set(dump)
-            txt = f"Config saved in {round((perf_counter() - start) * 1000, 2)}ms"
+            written = await asyncio.to_thread(self.store.save, self.db)
+            await asyncio.to_thread(self._save_ann_indexes)
+            txt = f"Config saved in {round((perf_counter() - start) * 1000, 2)}ms ({written} files written)"
             if self.first_run:
                 log.info(txt)
                 self.first_run = False
@@ -156,6 +193,30 @@ class Assistant(
         if not self.db.persistent_conversations and self.save_loop.is_running():
             self.save_loop.cancel()
 
+    @property
+    def ann_dir(self) -> Path:
+        return cog_data_path(self) / "ann"
+
+    def _load_ann_indexes(self):
+        for guild_id, conf in self.db.configs.items():
+            path = self.ann_dir / f"{guild_id}.npz"
+            if not conf.ann_probes or not path.exists():
+                continue
+            try:
+                conf.ensure_vectors()
+                conf._embedding_index.load_ivf(path, conf.embeddings)
+            except Exception as e:
+                log.error(f"Failed to load approximate embedding index for guild {guild_id}", exc_info=e)
+
+    def _save_ann_indexes(self):
+        for guild_id, conf in self.db.configs.items():
+            if not conf.ann_probes or not conf._embedding_index.ivf_changed:
+                continue
+            try:
+                conf._embedding_index.save_ivf(self.ann_dir / f"{guild_id}.npz")
+            except Exception as e:
+                log.error(f"Failed to save approximate embedding index for guild {guild_id}", exc_info=e)
+
     def _cleanup_db(self):
         cleaned = False
         # Cleanup registry if any cogs no longer exist
@@ -180,7 +241,7 @@ class Assistant(
                 del self.db.configs[guild_id]
                 cleaned = True
                 continue
-            conf = self.db.get_conf(guild_id)
+            conf = self.db.configs[guild_id]
             for role_id in conf.max_token_role_override.copy():
                 if not guild.get_role(role_id):
                     log.debug("Cleaning deleted max token override role")
@@ -209,6 +270,9 @@ class Assistant(
                     cleaned = True
 
             # Ensure embedding entry names arent too long
+            if all(len(entry_name) <= 100 for entry_name in conf.embeddings):
+                continue
+            conf.ensure_vectors()
             new_embeddings = {}
             for entry_name, embedding in conf.embeddings.items():
                 if len(entry_name) > 100:
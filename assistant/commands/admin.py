@@ -1,6 +1,7 @@
 import asyncio
 import contextlib
 import logging
+import math
 import re
 import traceback
 import typing as t
@@ -29,7 +30,9 @@ from redbot.core.utils.chat_formatting import (
 )
 
 from ..abc import MixinMeta
+from ..common.calls import CLIENTS
 from ..common.constants import MODELS, PRICES
+from ..common.functioncache import CALL_STATS, COMPILED
 from ..common.models import DB, Embedding
 from ..common.utils import get_attachments
 from ..views import CodeMenu, EmbeddingMenu, SetAPI
@@ -197,6 +200,7 @@ class Admin(MixinMeta):
         send_key = [ctx.guild.owner_id == ctx.author.id, ctx.author.id in self.bot.owner_ids]
 
         conf = self.db.get_conf(ctx.guild)
+        await conf.load_vectors()
         model = conf.get_user_model(ctx.author)
         system_tokens = await self.count_tokens(conf.system_prompt, model) if conf.system_prompt else 0
         prompt_tokens = await self.count_tokens(conf.prompt, model) if conf.prompt else 0
@@ -221,6 +225,7 @@ class Admin(MixinMeta):
             + _("`Mention on Reply:    `{}\n").format(conf.mention)
             + _("`Respond to Mentions: `{}\n").format(conf.mention_respond)
             + _("`Collaborative Mode:  `{}\n").format(conf.collab_convos)
+            + _("`Stream Responses:    `{}\n").format(conf.stream_responses)
             + _("`Max Retention:       `{}\n").format(conf.max_retention)
             + _("`Retention Expire:    `{}s\n").format(conf.max_retention_time)
             + _("`Max Tokens:          `{}\n").format(conf.max_tokens)
@@ -252,6 +257,9 @@ class Admin(MixinMeta):
             _("`System Prompt:       `{} tokens\n").format(humanize_number(system_tokens))
             + _("`User Prompt:         `{} tokens\n").format(humanize_number(prompt_tokens))
             + _("`Endpoint Override:   `{}\n").format(self.db.endpoint_override)
+            + _("`Concurrency Limits:  `{}\n").format(
+                humanize_list([f"{k} ({v})" for k, v in self.db.concurrency_limits.items()]) or _("None")
+            )
         )
 
         embed = discord.Embed(
@@ -301,6 +309,7 @@ class Admin(MixinMeta):
             _("`Top N Embeddings:  `{}\n").format(conf.top_n)
             + _("`Min Relatedness:   `{}\n").format(conf.min_relatedness)
             + _("`Embedding Method:  `{}\n").format(conf.embed_method)
+            + _("`Approx. Probes:    `{}\n").format(conf.ann_probes or _("Disabled"))
             + _("`Encodings:         `{}").format(encoded_by)
         )
         embed_num = humanize_number(len(conf.embeddings))
@@ -322,6 +331,10 @@ class Admin(MixinMeta):
         custom_func_field = (
             _("`Function Calling:  `{}\n").format(conf.use_function_calls)
             + _("`Maximum Recursion: `{}\n").format(conf.max_function_calls)
+            + _("`Parallel Calls:    `{}\n").format(conf.max_parallel_functions)
+            + _("`Function Timeout:  `{}\n").format(
+                _("{}s").format(conf.function_timeout) if conf.function_timeout else _("None")
+            )
             + _("`Function Tokens:   `{}\n").format(humanize_number(func_tokens))
         )
         if self.registry:
@@ -1164,6 +1177,23 @@ class Admin(MixinMeta):
             await ctx.send(_("Collaborative conversations are now **Enabled**"))
         await self.save_conf()
 
+    @assistant.command(name="streaming", aliases=["stream"])
+    async def toggle_streaming(self, ctx: commands.Context):
+        """
+        Toggle streaming responses
+
+        Replies are posted as soon as the model starts writing and edited as the rest comes in.
+        Streaming is skipped while a regex blacklist is set, since the full reply is needed to apply it.
+        """
+        conf = self.db.get_conf(ctx.guild)
+        if conf.stream_responses:
+            conf.stream_responses = False
+            await ctx.send(_("Streaming responses are now **Disabled**"))
+        else:
+            conf.stream_responses = True
+            await ctx.send(_("Streaming responses are now **Enabled**"))
+        await self.save_conf()
+
     @assistant.command(name="maxretention")
     async def max_retention(self, ctx: commands.Context, max_retention: int):
         """
@@ -1322,6 +1352,27 @@ class Admin(MixinMeta):
         )
         conf.max_function_calls = recursion
 
+    @assistant.command(name="parallelcalls")
+    async def set_parallel_calls(self, ctx: commands.Context, max_parallel: int, timeout: int = 120):
+        """Set how many function calls from a single response can run at once
+
+        When the model asks for several functions at once they are run concurrently, up to this many at a time.
+        Set to 1 to run them one after another, which also skips any calls after one that ends the turn
+        (such as image generation). When run concurrently every call runs before the turn ends.
+
+        **Arguments**
+        - `max_parallel`: Max function calls running at once
+        - `timeout`: Seconds to wait for each function call before giving up on it, 0 for no limit
+        """
+        conf = self.db.get_conf(ctx.guild)
+        conf.max_parallel_functions = max(1, max_parallel)
+        conf.function_timeout = max(0, timeout)
+        txt = _("Up to **{}** function calls will run at once").format(conf.max_parallel_functions)
+        if conf.function_timeout:
+            txt += _(", each timing out after **{}** seconds").format(conf.function_timeout)
+        await ctx.send(txt)
+        await self.save_conf()
+
     @assistant.command(name="minlength")
     async def min_length(self, ctx: commands.Context, min_question_length: int):
         """
@@ -1404,7 +1455,7 @@ class Admin(MixinMeta):
 
         if not model.startswith("gemini-") and conf.api_key and "deepseek" not in model and not self.db.endpoint_override:
             try:
-                client = openai.AsyncOpenAI(api_key=conf.api_key)
+                client = CLIENTS.get(conf.api_key)
                 await client.models.retrieve(model)
             except openai.NotFoundError as e:
                 # Check if it's a non-Gemini model that failed validation
@@ -1513,6 +1564,36 @@ class Admin(MixinMeta):
         await ctx.send(_("Minimum relatedness has been set to **{}**").format(mimimum_relatedness))
         await self.save_conf()
 
+    @assistant.command(name="approxsearch", aliases=["ann"])
+    async def set_approximate_search(self, ctx: commands.Context, probes: int, min_entries: int = 10000):
+        """
+        Use an approximate index to search embeddings for very large knowledge bases
+
+        Embeddings are grouped into clusters, and only the clusters closest to the question are searched.
+        **Probes** is how many clusters are searched, higher values find better matches but are slower.
+        Exact search is still used until there are at least **min_entries** embeddings.
+
+        Set probes to 0 to always search exactly (default)
+
+        **Hint**: Start around 8 probes and use `[p]query` to check that the results still look right.
+        """
+        if probes < 0 or min_entries < 0:
+            return await ctx.send(_("Values cannot be negative!"))
+        conf = self.db.get_conf(ctx.guild)
+        conf.ann_probes = probes
+        conf.ann_min_entries = min_entries
+        if not probes:
+            conf._embedding_index.clear_ivf()
+            (self.ann_dir / f"{ctx.guild.id}.npz").unlink(missing_ok=True)
+            await ctx.send(_("Embeddings will always be searched exactly"))
+        else:
+            await ctx.send(
+                _("Approximate search will probe **{}** clusters once there are at least **{}** embeddings").format(
+                    probes, humanize_number(min_entries)
+                )
+            )
+        await self.save_conf()
+
     @assistant.command(name="regexblacklist")
     async def regex_blacklist(self, ctx: commands.Context, *, regex: str):
         """Remove certain words/phrases in the bot's responses"""
@@ -1603,6 +1684,7 @@ class Admin(MixinMeta):
         This will read excel files too
         """
         conf = self.db.get_conf(ctx.guild)
+        await conf.load_vectors()
         if not await self.can_call_llm(conf, ctx):
             return
         attachments = get_attachments(ctx.message)
@@ -1641,35 +1723,34 @@ class Admin(MixinMeta):
 
         df = await asyncio.to_thread(pd.concat, frames)
 
-        entries = len(df.index)
-        split_by = 10
-        if entries > 300:
-            split_by = round(entries / 25)
-        imported = 0
-        for index, row in enumerate(df.values):
+        pending = []
+        for row in df.values:
             if pd.isna(row[0]) or pd.isna(row[1]):
                 continue
             name = str(row[0])
-            proc = _("processing")
             if name in conf.embeddings:
-                proc = _("overwriting")
                 if row[1] == conf.embeddings[name].text or not overwrite:
                     continue
-            text = str(row[1])[:4000]
-            if index and (index + 1) % split_by == 0:
-                with contextlib.suppress(discord.DiscordServerError):
-                    await message.edit(
-                        content=_("{}\n`Currently {}: `**{}** ({}/{})").format(
-                            message_text, proc, name, index + 1, len(df)
-                        )
-                    )
-            query_embedding = await self.request_embedding(text, conf)
-            if len(query_embedding) == 0:
-                await ctx.send(_("Failed to process embedding: `{}`").format(name))
-                continue
+            pending.append((name, str(row[1])[:4000]))
 
-            conf.embeddings[name] = Embedding(text=text, embedding=query_embedding, model=conf.embed_model)
-            imported += 1
+        # Embed in chunks so texts are batched into as few API calls as possible, with around 25 progress updates
+        chunk_size = max(100, math.ceil(len(pending) / 25))
+        imported = 0
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start : start + chunk_size]
+            with contextlib.suppress(discord.DiscordServerError):
+                await message.edit(
+                    content=_("{}\n`Currently {}: `**{}** ({}/{})").format(
+                        message_text, _("processing"), chunk[0][0], start + 1, len(pending)
+                    )
+                )
+            embeddings = await self.request_embeddings([i[1] for i in chunk], conf)
+            for (name, text), query_embedding in zip(chunk, embeddings):
+                if len(query_embedding) == 0:
+                    await ctx.send(_("Failed to process embedding: `{}`").format(name))
+                    continue
+                conf.embeddings[name] = Embedding(text=text, embedding=query_embedding, model=conf.embed_model)
+                imported += 1
         await message.edit(content=_("{}\n**COMPLETE**").format(message_text))
         await ctx.send(_("Successfully imported {} embeddings!").format(humanize_number(imported)))
         await self.save_conf()
@@ -1682,6 +1763,7 @@ class Admin(MixinMeta):
             overwrite (bool): overwrite embeddings with existing entry names
         """
         conf = self.db.get_conf(ctx.guild)
+        await conf.load_vectors()
         attachments = get_attachments(ctx.message)
         if not attachments:
             return await ctx.send(
@@ -1727,6 +1809,7 @@ class Admin(MixinMeta):
             overwrite (bool): overwrite embeddings with existing entry names
         """
         conf = self.db.get_conf(ctx.guild)
+        await conf.load_vectors()
         tz = pytz.timezone(conf.timezone)
         attachments = get_attachments(ctx.message)
         if not attachments:
@@ -1765,42 +1848,40 @@ class Admin(MixinMeta):
             message_text = _("Processing the following files in the background\n{}").format(box(humanize_list(files)))
             message = await ctx.send(message_text)
             df = await asyncio.to_thread(pd.concat, frames)
-            entries = len(df.index)
-            split_by = 10
-            if entries > 300:
-                split_by = round(entries / 25)
-            imported = 0
-            for index, row in df.iterrows():
+            pending = []
+            for _index, row in df.iterrows():
                 name = row["name"]
                 text = row["text"]
-                proc = _("processing")
                 if name in conf.embeddings:
-                    proc = _("overwriting")
                     if not overwrite or conf.embeddings[name].text == text:
                         continue
                 created_tz = pd.to_datetime(row["created"]).tz_localize(tz)
+                pending.append((name, text, row["ai_created"], created_tz))
 
-                if index and (index + 1) % split_by == 0:
-                    with contextlib.suppress(discord.DiscordServerError):
-                        await message.edit(
-                            content=_("{}\n`Currently {}: `**{}** ({}/{})").format(
-                                message_text, proc, name, index + 1, len(df)
-                            )
+            # Embed in chunks so texts are batched into as few API calls as possible, with around 25 progress updates
+            chunk_size = max(100, math.ceil(len(pending) / 25))
+            for start in range(0, len(pending), chunk_size):
+                chunk = pending[start : start + chunk_size]
+                with contextlib.suppress(discord.DiscordServerError):
+                    await message.edit(
+                        content=_("{}\n`Currently {}: `**{}** ({}/{})").format(
+                            message_text, _("processing"), chunk[0][0], start + 1, len(pending)
                         )
+                    )
+                embeddings = await self.request_embeddings([i[1] for i in chunk], conf)
+                for (name, text, ai_created, created_tz), query_embedding in zip(chunk, embeddings):
+                    if len(query_embedding) == 0:
+                        await ctx.send(_("Failed to process embedding: `{}`").format(name))
+                        continue
 
-                query_embedding = await self.request_embedding(text, conf)
-                if len(query_embedding) == 0:
-                    await ctx.send(_("Failed to process embedding: `{}`").format(name))
-                    continue
-
-                conf.embeddings[name] = Embedding(
-                    text=text,
-                    embedding=query_embedding,
-                    ai_created=row["ai_created"],
-                    created=created_tz,
-                    model=conf.embed_model,
-                )
-                imported += 1
+                    conf.embeddings[name] = Embedding(
+                        text=text,
+                        embedding=query_embedding,
+                        ai_created=ai_created,
+                        created=created_tz,
+                        model=conf.embed_model,
+                    )
+                    imported += 1
 
             if imported:
                 await message.edit(content=_("{}\n**COMPLETE**").format(message_text))
@@ -1906,6 +1987,7 @@ class Admin(MixinMeta):
     async def export_embeddings_json(self, ctx: commands.Context):
         """Export embeddings to a json file"""
         conf = self.db.get_conf(ctx.guild)
+        await conf.load_vectors()
         if not conf.embeddings:
             return await ctx.send(_("There are no embeddings to export!"))
 
@@ -2138,7 +2220,7 @@ class Admin(MixinMeta):
 
         if not model.startswith("gemini-") and conf.api_key and "deepseek" not in model and not self.db.endpoint_override: # Added deepseek check from base model command
             try:
-                client = openai.AsyncOpenAI(api_key=conf.api_key)
+                client = CLIENTS.get(conf.api_key)
                 await client.models.retrieve(model)
             except openai.NotFoundError as e:
                 txt = _("Model '{model_name}' not found or not accessible with your current API key for role override. ").format(model_name=model)
@@ -2342,6 +2424,61 @@ class Admin(MixinMeta):
             self.db.endpoint_override = None
             await ctx.send(_("Endpoint override has been removed!"))
 
+    @assistant.command(name="concurrency")
+    @commands.is_owner()
+    async def set_concurrency_limit(self, ctx: commands.Context, limit: int, endpoint: str = None):
+        """
+        Limit how many API calls can run at once for an endpoint
+
+        Useful for local servers set with the endpoint override that can only handle a few requests at a time.
+        Calls over the limit wait for a free slot instead of failing.
+
+        **Arguments**
+        - `limit`: Max calls running at once, 0 to remove the limit
+        - `endpoint`: The endpoint URL, defaults to the current endpoint override or OpenAI if none is set
+        """
+        if limit < 0:
+            return await ctx.send(_("Limit cannot be negative!"))
+        endpoint = endpoint or self.db.endpoint_override or "openai"
+        if limit:
+            self.db.concurrency_limits[endpoint] = limit
+            await ctx.send(_("Up to **{}** calls will run at once for **{}**").format(limit, endpoint))
+        else:
+            self.db.concurrency_limits.pop(endpoint, None)
+            await ctx.send(_("Removed the concurrency limit for **{}**").format(endpoint))
+        CLIENTS.configure(self.db.concurrency_limits)
+        await self.save_conf()
+
+    @assistant.command(name="functionstats", aliases=["fstats"])
+    @commands.is_owner()
+    async def function_stats(self, ctx: commands.Context, reset: bool = False):
+        """
+        View call counts, errors and latency of the functions the assistant has called
+
+        Stats are kept in memory since the cog was loaded.
+
+        **Arguments**
+        - `reset`: Clear the stats after showing them
+        """
+        if not CALL_STATS.functions:
+            return await ctx.send(_("No functions have been called yet!"))
+        rows = sorted(CALL_STATS.functions.items(), key=lambda i: i[1].calls, reverse=True)
+        width = max(len(name) for name, _stats in rows)
+        lines = [f"{'Function':<{width}}  Calls  Errors  Avg (ms)  Max (ms)"]
+        for name, stats in rows:
+            lines.append(
+                f"{name:<{width}}  {stats.calls:>5}  {stats.errors:>6}  "
+                f"{stats.average * 1000:>8.1f}  {stats.slowest * 1000:>8.1f}"
+            )
+        txt = "\n".join(lines)
+        footer = _("{} custom functions compiled, {} total compiles").format(len(COMPILED.compiled), COMPILED.compiles)
+        for page in pagify(txt, delims=["\n"], page_length=1900):
+            await ctx.send(box(page, lang="py"))
+        await ctx.send(footer)
+        if reset:
+            CALL_STATS.reset()
+            await ctx.send(_("Function stats have been reset"))
+
     @assistant.command(name="wipecog")
     @commands.is_owner()
     async def wipe_cog(self, ctx: commands.Context, confirm: bool):
@@ -2366,6 +2503,8 @@ class Admin(MixinMeta):
         def _dump():
             # Delete and convo data
             self.db.conversations.clear()
+            # Guilds that haven't been accessed since startup may not have their vectors read yet
+            self.db.load_vectors()
             return self.db.json()
 
         dump = await asyncio.to_thread(_dump)
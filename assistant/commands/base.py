@@ -196,7 +196,7 @@ If a file has no extension it will still try to read it only if it can be decode
             # Return the new RGB color
             return (green, blue)
 
-        convo_tokens = await self.count_payload_tokens(conversation.messages, conf.get_user_model(user))
+        convo_tokens = await self.count_payload_tokens(conversation.messages, conf.get_user_model(user), conversation)
         g, b = generate_color(messages, conf.get_user_max_retention(ctx.author))
         gg, bb = generate_color(convo_tokens, max_tokens)
         # Whatever limit is more severe get that color
@@ -5,11 +5,11 @@ import inspect
 import json
 import logging
 import math
-from typing import List, Optional
+from collections import Counter
+from typing import Callable, List, Optional, Tuple
 
 import aiohttp
 import discord
-import tiktoken
 from openai.types.chat.chat_completion import ChatCompletion
 from openai.types.chat.chat_completion_message import ChatCompletionMessage
 # Used to help adapt Gemini response to be somewhat OpenAI-like for easier integration
@@ -24,9 +24,16 @@ from redbot.core.i18n import Translator, cog_i18n
 from redbot.core.utils.chat_formatting import box, humanize_number
 
 from ..abc import MixinMeta
-from .calls import request_chat_completion_raw, request_embedding_raw
+from .calls import (
+    request_chat_completion_raw,
+    request_chat_completion_stream_raw,
+    request_embedding_raw,
+)
 from .constants import MODELS
-from .models import GuildSettings
+from .embedbatch import split_tokens
+from .models import Conversation, GuildSettings
+from .streaming import GeminiStreamAccumulator, StreamAccumulator
+from .tokenizer import TOKENS, get_encoding, message_tokens, payload_tokens
 
 log = logging.getLogger("red.vrt.assistant.api")
 _ = Translator("Assistant", __file__)
@@ -56,7 +63,14 @@ class API(MixinMeta):
         response_token_override: int = None,
         model_override: Optional[str] = None,
         temperature_override: Optional[float] = None,
+        on_text: Optional[Callable[[str], None]] = None,
+        conversation: Optional[Conversation] = None,
     ) -> ChatCompletionMessage:
+        """Get the next assistant message for a conversation
+
+        If on_text is given the completion is streamed, and it is called with each piece of reply text as it arrives.
+        If the conversation the messages belong to is given, its cached message token counts are reused.
+        """
         model_name = model_override or conf.get_user_model(member)
         
         # Determine if we are using Gemini
@@ -128,7 +142,7 @@ class API(MixinMeta):
         max_convo_tokens = self.get_max_tokens(conf, member) # Max tokens for the *conversation*
         max_response_tokens_user_setting = conf.get_user_max_response_tokens(member) # User's desired max for the *response*
 
-        current_convo_tokens = await self.count_payload_tokens(messages, model_name)
+        current_convo_tokens = await self.count_payload_tokens(messages, model_name, conversation)
         if functions:
             current_convo_tokens += await self.count_function_tokens(functions, model_name)
 
@@ -181,6 +195,7 @@ class API(MixinMeta):
                 system_message=system_message_str,
                 using_aistudio_key=using_aistudio_key,
                 conf=conf,
+                on_text=on_text,
                 # seed=conf.seed, # TODO: Add seed if supported
             )
             
@@ -249,30 +264,63 @@ class API(MixinMeta):
                 log.error(f"OpenAI model {model_name} is not in internal MODELS list. Switching to gpt-4o-mini.")
                 model_name = "gpt-4o-mini"
 
-            response: OpenAIChatCompletion = await request_chat_completion_raw(
-                model=model_name,
-                messages=messages,
-                temperature=temperature_override if temperature_override is not None else conf.temperature,
-                api_key=api_key_to_use,
-                max_tokens=max_api_response_tokens,
-                functions=functions,
-                frequency_penalty=conf.frequency_penalty,
-                presence_penalty=conf.presence_penalty,
-                seed=conf.seed,
-                base_url=base_url_to_use,
-            )
-            message_to_return: ChatCompletionMessage = response.choices[0].message
-            conf.update_usage(
-                response.model,
-                response.usage.total_tokens,
-                response.usage.prompt_tokens,
-                response.usage.completion_tokens,
-            )
+            kwargs = {
+                "model": model_name,
+                "messages": messages,
+                "temperature": temperature_override if temperature_override is not None else conf.temperature,
+                "api_key": api_key_to_use,
+                "max_tokens": max_api_response_tokens,
+                "functions": functions,
+                "frequency_penalty": conf.frequency_penalty,
+                "presence_penalty": conf.presence_penalty,
+                "seed": conf.seed,
+                "base_url": base_url_to_use,
+            }
+            if on_text is None:
+                response: OpenAIChatCompletion = await request_chat_completion_raw(**kwargs)
+                message_to_return: ChatCompletionMessage = response.choices[0].message
+                conf.update_usage(
+                    response.model,
+                    response.usage.total_tokens,
+                    response.usage.prompt_tokens,
+                    response.usage.completion_tokens,
+                )
+            else:
+                stream = StreamAccumulator()
+                async for chunk in request_chat_completion_stream_raw(**kwargs):
+                    if text := stream.add(chunk):
+                        on_text(text)
+                message_to_return: ChatCompletionMessage = stream.message()
+                if stream.usage:
+                    conf.update_usage(
+                        stream.model or model_name,
+                        stream.usage.total_tokens,
+                        stream.usage.prompt_tokens,
+                        stream.usage.completion_tokens,
+                    )
+                else:
+                    # Custom endpoints may not report usage for streams, so estimate it
+                    completion_tokens = await self.count_tokens(message_to_return.content or "", model_name)
+                    conf.update_usage(
+                        stream.model or model_name,
+                        current_convo_tokens + completion_tokens,
+                        current_convo_tokens,
+                        completion_tokens,
+                    )
 
         log.debug(f"MESSAGE TYPE: {type(message_to_return)}")
         return message_to_return
 
     async def request_embedding(self, text: str, conf: GuildSettings) -> List[float]:
+        return (await self.request_embeddings([text], conf))[0]
+
+    async def request_embeddings(self, texts: List[str], conf: GuildSettings) -> List[List[float]]:
+        """
+        Embed multiple texts at once.
+
+        Recently embedded texts are served from the query cache, and the rest are batched together with any other
+        concurrent requests to the same endpoint.
+        """
         model_name = conf.embed_model
         is_gemini_provider = model_name.startswith("gemini-")
         
@@ -319,38 +367,35 @@ class API(MixinMeta):
                 base_url_to_use = self.db.endpoint_override or f"https://us-central1-aiplatform.googleapis.com/v1"
                 log.debug(f"Using Google Cloud ADC for Gemini embeddings. Project: {project_id_to_use}, Endpoint: {base_url_to_use}")
 
-            gemini_response = await self.request_gemini_embedding_raw(
-                text=text,
-                api_key=api_key_to_use, 
-                model=model_name,
-                project_id=project_id_to_use, # May be None if using AI Studio Key
-                base_url=base_url_to_use,
-                using_aistudio_key=using_aistudio_key
-            )
-            # Handle different response structures for AI Studio vs Vertex AI
-            if using_aistudio_key:
-                # AI Studio direct embedding response
-                if "embedding" not in gemini_response or "value" not in gemini_response["embedding"]:
-                    log.error(f"Invalid Gemini AI Studio Embedding API response format: {gemini_response}")
-                    raise commands.UserFeedbackCheckFailure(_("Invalid response format from Gemini AI Studio Embedding API."))
-                embedding_values = gemini_response["embedding"]["value"]
-                # AI Studio does not provide token counts in the embedding response directly
-                token_count = await self.count_tokens(text, model_name)
-            else:
-                # Vertex AI embedding response
-                if not gemini_response.get("predictions") or not gemini_response["predictions"][0].get("embeddings"):
-                    log.error(f"Invalid Vertex AI Embedding API response format: {gemini_response}")
-                    raise commands.UserFeedbackCheckFailure(_("Invalid response format from Vertex AI Embedding API."))
-                embedding_values = gemini_response["predictions"][0]["embeddings"]["values"]
-                token_count = gemini_response["predictions"][0]["embeddings"]["statistics"]["token_count"]
-            
-            conf.update_usage(
-                model_name, 
-                token_count,
-                token_count, 
-                0, 
-            )
-            return embedding_values
+            batch_key = ("gemini", api_key_to_use, model_name, base_url_to_use, project_id_to_use)
+
+            async def embed(batch: List[str]) -> Tuple[List[List[float]], List[int]]:
+                gemini_response = await self.request_gemini_embedding_raw(
+                    texts=batch,
+                    api_key=api_key_to_use,
+                    model=model_name,
+                    project_id=project_id_to_use, # May be None if using AI Studio Key
+                    base_url=base_url_to_use,
+                    using_aistudio_key=using_aistudio_key
+                )
+                # Handle different response structures for AI Studio vs Vertex AI
+                if using_aistudio_key:
+                    # AI Studio batch embedding response
+                    if not gemini_response.get("embeddings"):
+                        log.error(f"Invalid Gemini AI Studio Embedding API response format: {gemini_response}")
+                        raise commands.UserFeedbackCheckFailure(_("Invalid response format from Gemini AI Studio Embedding API."))
+                    vectors = [i.get("values", i.get("value")) for i in gemini_response["embeddings"]]
+                    # AI Studio does not provide token counts in the embedding response directly
+                    token_counts = [await self.count_tokens(text, model_name) for text in batch]
+                else:
+                    # Vertex AI embedding response
+                    if not gemini_response.get("predictions") or not gemini_response["predictions"][0].get("embeddings"):
+                        log.error(f"Invalid Vertex AI Embedding API response format: {gemini_response}")
+                        raise commands.UserFeedbackCheckFailure(_("Invalid response format from Vertex AI Embedding API."))
+                    vectors = [i["embeddings"]["values"] for i in gemini_response["predictions"]]
+                    token_counts = [i["embeddings"]["statistics"]["token_count"] for i in gemini_response["predictions"]]
+                return vectors, token_counts
+
         else: # OpenAI or compatible
             if not conf.api_key:
                 raise commands.UserFeedbackCheckFailure(
@@ -360,23 +405,42 @@ class API(MixinMeta):
                     ).format(model_name=model_name)
                 )
             api_key_to_use = conf.api_key # Standard OpenAI key
-            response: CreateEmbeddingResponse = await self.request_openai_embedding_raw(
-                text=text,
-                api_key=api_key_to_use,
-                model=model_name,
-                base_url=base_url_to_use,
-            )
-            conf.update_usage(
-                response.model,
-                response.usage.total_tokens,
-                response.usage.prompt_tokens,
-                0,
-            )
-            return response.data[0].embedding
+            batch_key = ("openai", api_key_to_use, model_name, base_url_to_use)
+
+            async def embed(batch: List[str]) -> Tuple[List[List[float]], List[int]]:
+                response: CreateEmbeddingResponse = await self.request_openai_embedding_raw(
+                    texts=batch,
+                    api_key=api_key_to_use,
+                    model=model_name,
+                    base_url=base_url_to_use,
+                )
+                vectors = [i.embedding for i in sorted(response.data, key=lambda x: x.index)]
+                # Usage is only reported for the whole batch
+                return vectors, split_tokens(response.usage.total_tokens, batch)
+
+        endpoint = base_url_to_use or ""
+        results = [self.embedding_cache.get(model_name, endpoint, text) for text in texts]
+        missing = [idx for idx, embedding in enumerate(results) if embedding is None]
+        if not missing:
+            return results
+
+        embedded = await asyncio.gather(*[self.embedding_batcher.submit(batch_key, texts[i], embed) for i in missing])
+        token_count = 0
+        for idx, (embedding, tokens) in zip(missing, embedded):
+            results[idx] = embedding
+            token_count += tokens
+            self.embedding_cache.put(model_name, endpoint, texts[idx], embedding)
+        conf.update_usage(
+            model_name,
+            token_count,
+            token_count,
+            0,
+        )
+        return results
 
     async def request_gemini_embedding_raw(
         self,
-        text: str,
+        texts: List[str],
         api_key: str,
         model: str,
         project_id: Optional[str], # Google Cloud Project ID, optional if using AI Studio key
@@ -385,7 +449,7 @@ class API(MixinMeta):
         using_aistudio_key: bool = False,
     ) -> dict: 
         """
-        Makes a raw request to a Google Gemini Embedding model (Vertex AI or AI Studio).
+        Makes a raw request to a Google Gemini Embedding model (Vertex AI or AI Studio) for one or more texts.
         """
         # Construct the full model path for the endpoint
         # Example: projects/PROJECT_ID/locations/us-central1/publishers/google/models/text-embedding-004
@@ -399,8 +463,10 @@ class API(MixinMeta):
             # Model is usually just "embedding-001" or similar.
             # Base URL: "https://generativelanguage.googleapis.com/v1beta"
             # Key is passed in the URL for REST embedContent.
-            predict_endpoint = f"{base_url}/models/{model}:embedContent?key={api_key}"
-            payload = {"content": {"parts": [{"text": text}]}} # Model is in the URL, not payload
+            predict_endpoint = f"{base_url}/models/{model}:batchEmbedContents?key={api_key}"
+            payload = {
+                "requests": [{"model": f"models/{model}", "content": {"parts": [{"text": text}]}} for text in texts]
+            }
             headers = {
                 "Content-Type": "application/json; charset=utf-8",
             }
@@ -416,7 +482,7 @@ class API(MixinMeta):
 
             predict_endpoint = f"{base_url}/{model_path_for_endpoint}:predict"
             payload = {
-                "instances": [{"content": text, "task_type": task_type}],
+                "instances": [{"content": text, "task_type": task_type} for text in texts],
             }
             headers = { # Vertex AI uses Bearer token
                 "Authorization": f"Bearer {api_key}",
@@ -439,9 +505,9 @@ class API(MixinMeta):
             
         return response_json
 
-    async def request_openai_embedding_raw(self, text: str, api_key: str, model: str, base_url: Optional[str] = None ) -> CreateEmbeddingResponse:
+    async def request_openai_embedding_raw(self, texts: List[str], api_key: str, model: str, base_url: Optional[str] = None ) -> CreateEmbeddingResponse:
         return await request_embedding_raw( 
-            text=text,
+            texts=texts,
             api_key=api_key,
             model=model,
             base_url=base_url,
@@ -460,20 +526,26 @@ class API(MixinMeta):
         system_message: Optional[str] = None,
         using_aistudio_key: bool = False,
         conf: Optional[GuildSettings] = None, # Added conf
+        on_text: Optional[Callable[[str], None]] = None,
     ) -> dict: 
         """
         Makes a raw request to a Google Gemini Chat Completion model (Vertex AI or AI Studio).
+
+        If on_text is given the response is streamed over server sent events, calling it with each piece of reply
+        text, and the streamed responses are merged so the result has the same shape either way.
         """
         # Construct the full model path for the endpoint
         # Example: projects/PROJECT_ID/locations/us-central1/publishers/google/models/gemini-1.5-pro-latest
         location = "us-central1" # Or extract from base_url
         
-        action = "generateContent" # Could be streamGenerateContent for streaming
+        action = "generateContent" if on_text is None else "streamGenerateContent"
 
         if using_aistudio_key:
             # AI Studio uses a different endpoint structure. Key is in the URL.
             model_id_for_url = model if model.startswith("models/") else f"models/{model}"
             generate_endpoint = f"{base_url}/{model_id_for_url}:{action}?key={api_key}"
+            if on_text is not None:
+                generate_endpoint += "&alt=sse"
             headers = {
                 "Content-Type": "application/json; charset=utf-8",
             }
@@ -487,6 +559,8 @@ class API(MixinMeta):
             else:
                 model_path_for_endpoint = f"projects/{project_id}/locations/{location}/publishers/google/models/{model}"
             generate_endpoint = f"{base_url}/{model_path_for_endpoint}:{action}"
+            if on_text is not None:
+                generate_endpoint += "?alt=sse"
             headers = {
                 "Authorization": f"Bearer {api_key}",
                 "Content-Type": "application/json; charset=utf-8",
@@ -602,7 +676,14 @@ class API(MixinMeta):
                      _("Gemini API request failed with status {status}: {error}").format(status=resp.status, error=err_text)
                 )
             try:
-                response_json = await resp.json()
+                if on_text is None:
+                    response_json = await resp.json()
+                else:
+                    stream = GeminiStreamAccumulator()
+                    async for line in resp.content:
+                        if text := stream.add_line(line):
+                            on_text(text)
+                    response_json = stream.result()
             except aiohttp.ContentTypeError:
                 err_text = await resp.text()
                 log.error(f"Gemini API Error: Non-JSON response from {generate_endpoint}. Response: {err_text}")
@@ -634,7 +715,12 @@ class API(MixinMeta):
     # -------------------------------------------------------
     # -------------------------------------------------------
 
-    async def count_payload_tokens(self, messages: List[dict], model_name: str = "gpt-4o-mini") -> int:
+    async def count_payload_tokens(
+        self,
+        messages: List[dict],
+        model_name: str = "gpt-4o-mini",
+        conversation: Optional[Conversation] = None,
+    ) -> int:
         if model_name.startswith("gemini-"):
             num_tokens = 0
             for message in messages:
@@ -651,36 +737,8 @@ class API(MixinMeta):
         if not messages:
             return 0
 
-        def _count_payload_openai():
-            try:
-                encoding = tiktoken.encoding_for_model(model_name)
-            except KeyError:
-                log.warning(f"Tiktoken encoding not found for model {model_name}. Using o200k_base.")
-                encoding = tiktoken.get_encoding("o200k_base")
-
-            tokens_per_message = 3
-            tokens_per_name = 1
-            num_tokens = 0
-            for message in messages:
-                num_tokens += tokens_per_message
-                for key, value in message.items():
-                    if key == "content" and value is None: 
-                        continue
-                    if isinstance(value, list) and key == "content": 
-                        for item in value:
-                            if item.get("type") == "text" and item.get("text"):
-                                num_tokens += len(encoding.encode(str(item["text"])))
-                    elif isinstance(value, str):
-                         num_tokens += len(encoding.encode(value))
-                    else: 
-                        num_tokens += len(encoding.encode(json.dumps(value)))
-
-                    if key == "name":
-                        num_tokens += tokens_per_name
-            num_tokens += 3  
-            return num_tokens
-
-        return await asyncio.to_thread(_count_payload_openai)
+        counts = conversation._token_counts if conversation is not None else None
+        return await asyncio.to_thread(payload_tokens, messages, model_name, counts)
 
     async def count_function_tokens(self, functions: List[dict], model_name: str = "gpt-4o-mini") -> int:
         if model_name.startswith("gemini-"):
@@ -747,43 +805,42 @@ class API(MixinMeta):
         else:
             log.warning(f"Incompatible model for function token counting: {model_name}")
 
-        def _count_tokens():
-            try:
-                encoding = tiktoken.encoding_for_model(model_name)
-            except KeyError:
-                encoding = tiktoken.get_encoding("o200k_base")
-
-            func_token_count = 0
-            if len(functions) > 0:
-                for f in functions:
-                    if "function" not in f.keys():
-                        f = {"function": f, "name": f["name"], "description": f["description"]}
-                    func_token_count += func_init  
-                    function = f["function"]
-                    f_name = function["name"]
-                    f_desc = function["description"]
-                    if f_desc.endswith("."):
-                        f_desc = f_desc[:-1]
-                    line = f_name + ":" + f_desc
-                    func_token_count += len(encoding.encode(line))  
-                    if len(function["parameters"]["properties"]) > 0:
-                        func_token_count += prop_init  
-                        for key in list(function["parameters"]["properties"].keys()):
-                            func_token_count += prop_key  
-                            p_name = key
-                            p_type = function["parameters"]["properties"][key].get("type", "")
-                            p_desc = function["parameters"]["properties"][key].get("description", "")
-                            if "enum" in function["parameters"]["properties"][key].keys():
-                                func_token_count += enum_init  
-                                for item in function["parameters"]["properties"][key]["enum"]:
-                                    func_token_count += enum_item
-                                    func_token_count += len(encoding.encode(item))
-                            if p_desc.endswith("."):
-                                p_desc = p_desc[:-1]
-                            line = f"{p_name}:{p_type}:{p_desc}"
-                            func_token_count += len(encoding.encode(line))
-                func_token_count += func_end
+        def _count_function(f: dict) -> int:
+            if "function" not in f.keys():
+                f = {"function": f, "name": f["name"], "description": f["description"]}
+            func_token_count = func_init
+            function = f["function"]
+            f_name = function["name"]
+            f_desc = function["description"]
+            if f_desc.endswith("."):
+                f_desc = f_desc[:-1]
+            line = f_name + ":" + f_desc
+            func_token_count += len(encoding.encode(line))
+            if len(function["parameters"]["properties"]) > 0:
+                func_token_count += prop_init
+                for key in list(function["parameters"]["properties"].keys()):
+                    func_token_count += prop_key
+                    p_name = key
+                    p_type = function["parameters"]["properties"][key].get("type", "")
+                    p_desc = function["parameters"]["properties"][key].get("description", "")
+                    if "enum" in function["parameters"]["properties"][key].keys():
+                        func_token_count += enum_init
+                        for item in function["parameters"]["properties"][key]["enum"]:
+                            func_token_count += enum_item
+                            func_token_count += len(encoding.encode(item))
+                    if p_desc.endswith("."):
+                        p_desc = p_desc[:-1]
+                    line = f"{p_name}:{p_type}:{p_desc}"
+                    func_token_count += len(encoding.encode(line))
             return func_token_count
+
+        def _count_tokens():
+            # Schemas are the same dicts every turn, so each is only encoded once per model
+            tag = (encoding.name, func_init, prop_init, prop_key, enum_init, enum_item)
+            func_token_count = sum(TOKENS.count(f, tag, _count_function) for f in functions)
+            return func_token_count + func_end
+
+        encoding = await asyncio.to_thread(get_encoding, model_name)
         return await asyncio.to_thread(_count_tokens)
 
     async def get_tokens(self, text: str, model_name: str = "gpt-4o-mini") -> list[int]:
@@ -797,15 +854,7 @@ class API(MixinMeta):
             log.warning(f"get_tokens called for Gemini model '{model_name}'. Returning character codes as placeholder.")
             return [ord(c) for c in text]
 
-        def _get_encoding_openai():
-            try:
-                enc = tiktoken.encoding_for_model(model_name)
-            except KeyError:
-                log.warning(f"Tiktoken encoding not found for model {model_name}. Using o200k_base.")
-                enc = tiktoken.get_encoding("o200k_base")
-            return enc
-
-        encoding = await asyncio.to_thread(_get_encoding_openai)
+        encoding = await asyncio.to_thread(get_encoding, model_name)
         return await asyncio.to_thread(encoding.encode, text)
 
     async def count_tokens(self, text: str, model_name: str) -> int:
@@ -890,6 +939,7 @@ class API(MixinMeta):
         """Update embeds to match current dimensions or model type."""
         if not conf.embeddings:
             return 0
+        await conf.load_vectors()
         
         sample_key = list(conf.embeddings.keys())[0] if conf.embeddings else None
         if not sample_key:
@@ -906,31 +956,30 @@ class API(MixinMeta):
         target_model_name = conf.embed_model 
 
         synced_count = 0
-        tasks = []
-
+        stale = []
         for name, em_data in conf.embeddings.items():
             if em_data.model != target_model_name or len(em_data.embedding) != target_dimension:
                 log.info(f"Resyncing embedding for '{name}': model mismatch ('{em_data.model}' vs '{target_model_name}') or dim mismatch ({len(em_data.embedding)} vs {target_dimension}).")
-                
-                async def update_task(n, text_to_embed, current_conf):
-                    try:
-                        new_embedding_vector = await self.request_embedding(text_to_embed, current_conf)
-                        current_conf.embeddings[n].embedding = new_embedding_vector
-                        current_conf.embeddings[n].model = current_conf.embed_model 
-                        current_conf.embeddings[n].update() 
-                        log.debug(f"Successfully updated embedding for '{n}' to model '{current_conf.embed_model}'.")
-                        return 1
-                    except Exception as e_update:
-                        log.error(f"Failed to update embedding for '{n}' during resync: {e_update}")
-                        return 0
-
-                tasks.append(update_task(name, em_data.text, conf))
-
-        if tasks:
-            results = await asyncio.gather(*tasks)
-            synced_count = sum(results)
-            if synced_count > 0:
-                log.info(f"Resynced {synced_count} embeddings successfully.")
+                stale.append((name, em_data.text))
+
+        # Chunks are batched into multi-input API calls, a failed chunk doesn't abort the rest of the resync
+        for start in range(0, len(stale), 500):
+            chunk = stale[start : start + 500]
+            try:
+                new_embedding_vectors = await self.request_embeddings([i[1] for i in chunk], conf)
+            except Exception as e_update:
+                log.error(f"Failed to update {len(chunk)} embeddings during resync: {e_update}")
+                continue
+            for (n, _text), new_embedding_vector in zip(chunk, new_embedding_vectors):
+                if n not in conf.embeddings:
+                    continue
+                conf.embeddings[n].embedding = new_embedding_vector
+                conf.embeddings[n].model = conf.embed_model
+                conf.embeddings[n].update()
+                synced_count += 1
+
+        if synced_count > 0:
+            log.info(f"Resynced {synced_count} embeddings successfully.")
         
         return synced_count
 
@@ -965,15 +1014,7 @@ class API(MixinMeta):
                 log.error(f"Cannot decode Gemini tokens for model {model_name} as char codes. Tokens: {tokens[:10]}")
                 return "" 
 
-        def _get_encoding_openai():
-            try:
-                enc = tiktoken.encoding_for_model(model_name)
-            except KeyError:
-                log.warning(f"Tiktoken encoding not found for model {model_name}. Using o200k_base.")
-                enc = tiktoken.get_encoding("o200k_base")
-            return enc
-
-        encoding = await asyncio.to_thread(_get_encoding_openai)
+        encoding = await asyncio.to_thread(get_encoding, model_name)
         return await asyncio.to_thread(encoding.decode, tokens, errors="ignore") 
 
     # -------------------------------------------------------
@@ -987,6 +1028,7 @@ class API(MixinMeta):
         function_list: List[dict],
         conf: GuildSettings,
         user: Optional[discord.Member],
+        conversation: Optional[Conversation] = None,
     ) -> bool:
         """
         Iteratively degrade a conversation payload in-place to fit within the max token limit, prioritizing more recent messages and critical context.
@@ -1004,6 +1046,7 @@ class API(MixinMeta):
             messages (List[dict]): message entries sent to the api
             function_list (List[dict]): list of json function schemas for the model
             conf: (GuildSettings): current settings
+            conversation (Optional[Conversation]): the conversation the messages belong to, for its cached token counts
 
         Returns:
             bool: whether the conversation was degraded
@@ -1013,7 +1056,7 @@ class API(MixinMeta):
         # Fetch the max token limit for the current user
         max_tokens = self.get_max_tokens(conf, user)
         # Token count of current conversation
-        convo_tokens = await self.count_payload_tokens(messages, model)
+        convo_tokens = await self.count_payload_tokens(messages, model, conversation)
         # Token count of function calls available to model
         function_tokens = await self.count_function_tokens(function_list, model)
 
@@ -1025,31 +1068,26 @@ class API(MixinMeta):
 
         log.debug(f"Degrading messages for {user} (total: {total_tokens}/max: {max_tokens})")
 
+        # Track role counts as messages are removed instead of recounting the conversation each pass
+        role_counts = Counter(msg["role"] for msg in messages)
+        is_gemini = model.startswith("gemini-")
+
         def count(role: str):
-            return sum(1 for msg in messages if msg["role"] == role)
+            return role_counts[role]
 
         async def pop(role: str) -> int:
+            if not role_counts[role]:
+                return 0
             for idx, msg in enumerate(messages):
                 if msg["role"] != role:
                     continue
                 removed = messages.pop(idx)
-                reduction = 4
-                if "name" in removed:
-                    reduction += 1
-                if content := removed.get("content"):
-                    if isinstance(content, list):
-                        for i in content:
-                            if i["type"] == "text":
-                                reduction += await self.count_tokens(i["text"], model)
-                            else:
-                                reduction += 2
-                    else:
-                        reduction += await self.count_tokens(str(content), model)
-                elif tool_calls := removed.get("tool_calls"):
-                    reduction += await self.count_tokens(str(tool_calls), model)
-                elif function_call := removed.get("function_call"):
-                    reduction += await self.count_tokens(str(function_call), model)
-                return reduction
+                role_counts[role] -= 1
+                if is_gemini:
+                    return await self.count_payload_tokens([removed], model)
+                # Counted when the payload was measured above, so this is a cache hit if the conversation was given
+                counts = conversation._token_counts if conversation is not None else None
+                return message_tokens(removed, model, counts)
             return 0
 
         # We will NOT remove the most recent user message or assistant message
@@ -1208,6 +1246,7 @@ class API(MixinMeta):
         return embeds
 
     async def get_embbedding_menu_embeds(self, conf: GuildSettings, place: int) -> List[discord.Embed]:
+        await conf.load_vectors()
         embeddings = sorted(conf.embeddings.items(), key=lambda x: x[0])
         embeds = []
         pages = math.ceil(len(embeddings) / 5)
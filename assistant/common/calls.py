@@ -1,12 +1,15 @@
+import asyncio
+import importlib.util
 import logging
 import typing as t
+from contextlib import asynccontextmanager
 from typing import List, Optional
 
 import httpx
 import openai
-from aiocache import cached
+from openai import AsyncStream
 from openai.types import CreateEmbeddingResponse, Image, ImagesResponse
-from openai.types.chat import ChatCompletion
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
 from pydantic import BaseModel
 from sentry_sdk import add_breadcrumb
 from tenacity import (
@@ -20,24 +23,65 @@ from .constants import NO_DEVELOPER_ROLE, PRICES, SUPPORTS_SEED, SUPPORTS_TOOLS
 
 log = logging.getLogger("red.vrt.assistant.calls")
 
+# HTTP/2 needs the optional h2 package
+HTTP2 = importlib.util.find_spec("h2") is not None
 
-@retry(
-    retry=retry_if_exception_type(
-        t.Union[
-            httpx.TimeoutException,
-            httpx.ReadTimeout,
-            openai.InternalServerError,
-        ]
-    ),
-    wait=wait_random_exponential(min=1, max=30),
-    stop=stop_after_attempt(5),
-    reraise=True,
-)
-async def request_chat_completion_raw(
+
+class ClientPool:
+    """Reusable OpenAI clients keyed on (api_key, base_url)
+
+    Each client keeps its own keep-alive connection pool, so repeated calls skip the TCP and TLS handshakes.
+    Calls to an endpoint can optionally be limited to a number running at once.
+    """
+
+    def __init__(self):
+        self.clients: t.Dict[t.Tuple[str, Optional[str]], openai.AsyncOpenAI] = {}
+        self.limits: t.Dict[str, int] = {}  # Endpoint: Max concurrent calls
+        self.semaphores: t.Dict[str, asyncio.Semaphore] = {}
+
+    def get(self, api_key: str, base_url: Optional[str] = None) -> openai.AsyncOpenAI:
+        key = (api_key, base_url)
+        client = self.clients.get(key)
+        if client is None or client.is_closed():
+            http_client = openai.DefaultAsyncHttpxClient(
+                http2=HTTP2,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=120),
+            )
+            client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+            self.clients[key] = client
+        return client
+
+    def configure(self, limits: t.Dict[str, int]) -> None:
+        """Set the max concurrent calls per endpoint, use "openai" for the default endpoint"""
+        self.limits = {endpoint: limit for endpoint, limit in limits.items() if limit > 0}
+        self.semaphores.clear()
+
+    @asynccontextmanager
+    async def slot(self, base_url: Optional[str] = None):
+        """Wait for a free slot if the endpoint has a concurrency limit"""
+        endpoint = base_url or "openai"
+        if endpoint not in self.limits:
+            yield
+            return
+        if endpoint not in self.semaphores:
+            self.semaphores[endpoint] = asyncio.Semaphore(self.limits[endpoint])
+        async with self.semaphores[endpoint]:
+            yield
+
+    async def close(self) -> None:
+        clients = list(self.clients.values())
+        self.clients.clear()
+        for client in clients:
+            await client.close()
+
+
+CLIENTS = ClientPool()
+
+
+def build_chat_kwargs(
     model: str,
     messages: List[dict],
     temperature: float,
-    api_key: str,
     max_tokens: int,
     functions: Optional[List[dict]] = None,
     frequency_penalty: float = 0.0,
@@ -45,9 +89,7 @@ async def request_chat_completion_raw(
     seed: int = None,
     base_url: Optional[str] = None,
     reasoning_effort: Optional[str] = None,
-) -> ChatCompletion:
-    client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url)
-
+) -> dict:
     kwargs = {"model": model, "messages": messages}
 
     if model in PRICES and base_url is None:
@@ -88,19 +130,127 @@ async def request_chat_completion_raw(
                     # Remove the message from the payload
                     del kwargs["messages"][idx]
 
+    return kwargs
+
+
+@retry(
+    retry=retry_if_exception_type(
+        t.Union[
+            httpx.TimeoutException,
+            httpx.ReadTimeout,
+            openai.InternalServerError,
+        ]
+    ),
+    wait=wait_random_exponential(min=1, max=30),
+    stop=stop_after_attempt(5),
+    reraise=True,
+)
+async def request_chat_completion_raw(
+    model: str,
+    messages: List[dict],
+    temperature: float,
+    api_key: str,
+    max_tokens: int,
+    functions: Optional[List[dict]] = None,
+    frequency_penalty: float = 0.0,
+    presence_penalty: float = 0.0,
+    seed: int = None,
+    base_url: Optional[str] = None,
+    reasoning_effort: Optional[str] = None,
+) -> ChatCompletion:
+    client = CLIENTS.get(api_key, base_url)
+    kwargs = build_chat_kwargs(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        functions=functions,
+        frequency_penalty=frequency_penalty,
+        presence_penalty=presence_penalty,
+        seed=seed,
+        base_url=base_url,
+        reasoning_effort=reasoning_effort,
+    )
+
     add_breadcrumb(
         category="api",
         message=f"Calling request_chat_completion_raw: {model}",
         level="info",
         data=kwargs,
     )
-    response: ChatCompletion = await client.chat.completions.create(**kwargs)
+    async with CLIENTS.slot(base_url):
+        response: ChatCompletion = await client.chat.completions.create(**kwargs)
 
     log.debug(f"request_chat_completion_raw: {model} -> {response.model}")
     return response
 
 
-@cached(ttl=60)
+@retry(
+    retry=retry_if_exception_type(
+        t.Union[
+            httpx.TimeoutException,
+            httpx.ReadTimeout,
+            openai.InternalServerError,
+        ]
+    ),
+    wait=wait_random_exponential(min=1, max=30),
+    stop=stop_after_attempt(5),
+    reraise=True,
+)
+async def open_chat_stream(client: openai.AsyncOpenAI, kwargs: dict) -> AsyncStream[ChatCompletionChunk]:
+    return await client.chat.completions.create(**kwargs, stream=True)
+
+
+async def request_chat_completion_stream_raw(
+    model: str,
+    messages: List[dict],
+    temperature: float,
+    api_key: str,
+    max_tokens: int,
+    functions: Optional[List[dict]] = None,
+    frequency_penalty: float = 0.0,
+    presence_penalty: float = 0.0,
+    seed: int = None,
+    base_url: Optional[str] = None,
+    reasoning_effort: Optional[str] = None,
+) -> t.AsyncIterator[ChatCompletionChunk]:
+    """Same as request_chat_completion_raw but yields the completion as it is generated
+
+    Only opening the stream is retried, once chunks have been yielded the caller has already used them.
+    """
+    client = CLIENTS.get(api_key, base_url)
+    kwargs = build_chat_kwargs(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        functions=functions,
+        frequency_penalty=frequency_penalty,
+        presence_penalty=presence_penalty,
+        seed=seed,
+        base_url=base_url,
+        reasoning_effort=reasoning_effort,
+    )
+    if base_url is None:
+        # OpenAI only reports usage for streams when asked, in an extra chunk with no choices
+        kwargs["stream_options"] = {"include_usage": True}
+
+    add_breadcrumb(
+        category="api",
+        message=f"Calling request_chat_completion_stream_raw: {model}",
+        level="info",
+        data=kwargs,
+    )
+    # Hold the endpoint slot for the whole stream since the connection stays busy until it ends
+    async with CLIENTS.slot(base_url):
+        stream = await open_chat_stream(client, kwargs)
+        async with stream:
+            async for chunk in stream:
+                yield chunk
+
+    log.debug(f"request_chat_completion_stream_raw: {model}")
+
+
 @retry(
     retry=retry_if_exception_type(
         t.Union[
@@ -114,19 +264,20 @@ async def request_chat_completion_raw(
     reraise=True,
 )
 async def request_embedding_raw(
-    text: str,
+    texts: List[str],
     api_key: str,
     model: str,
     base_url: Optional[str] = None,
 ) -> CreateEmbeddingResponse:
-    client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url)
+    client = CLIENTS.get(api_key, base_url)
     add_breadcrumb(
         category="api",
         message="Calling request_embedding_raw",
         level="info",
-        data={"text": text},
+        data={"texts": len(texts)},
     )
-    response: CreateEmbeddingResponse = await client.embeddings.create(input=text, model=model)
+    async with CLIENTS.slot(base_url):
+        response: CreateEmbeddingResponse = await client.embeddings.create(input=texts, model=model)
     log.debug(f"request_embedding_raw: {model} -> {response.model}")
     return response
 
@@ -151,16 +302,17 @@ async def request_image_raw(
     style: t.Literal["natural", "vivid"] = "vivid",
     base_url: Optional[str] = None,
 ) -> Image:
-    client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url)
-    response: ImagesResponse = await client.images.generate(
-        model="dall-e-3",
-        prompt=prompt,
-        size=size,
-        quality=quality,
-        style=style,
-        response_format="b64_json",
-        n=1,
-    )
+    client = CLIENTS.get(api_key, base_url)
+    async with CLIENTS.slot(base_url):
+        response: ImagesResponse = await client.images.generate(
+            model="dall-e-3",
+            prompt=prompt,
+            size=size,
+            quality=quality,
+            style=style,
+            response_format="b64_json",
+            n=1,
+        )
     return response.data[0]
 
 
@@ -174,10 +326,11 @@ async def create_memory_call(
     api_key: str,
     base_url: Optional[str] = None,
 ) -> t.Union[CreateMemoryResponse, None]:
-    client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url)
-    response = await client.beta.chat.completions.parse(
-        model="gpt-4o-2024-11-20",
-        messages=messages,
-        response_format=CreateMemoryResponse,
-    )
+    client = CLIENTS.get(api_key, base_url)
+    async with CLIENTS.slot(base_url):
+        response = await client.beta.chat.completions.parse(
+            model="gpt-4o-2024-11-20",
+            messages=messages,
+            response_format=CreateMemoryResponse,
+        )
     return response.choices[0].message.parsed
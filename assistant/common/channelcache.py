@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import typing as t
+from collections import OrderedDict, deque
+
+import discord
+
+log = logging.getLogger("red.vrt.assistant.channelcache")
+
+
+class CachedMessage:
+    __slots__ = ("id", "author_name", "bot", "content")
+
+    def __init__(self, message_id: int, author_name: str, bot: bool, content: str):
+        self.id = message_id
+        self.author_name = author_name
+        self.bot = bot
+        self.content = content
+
+    @classmethod
+    def from_message(cls, message: discord.Message) -> "CachedMessage":
+        return cls(message.id, message.author.display_name, message.author.bot, message.content)
+
+
+class ChannelHistory:
+    """Recent messages of the channels used for channel context, kept current by gateway events
+
+    A channel's buffer is filled from the API the first time its context is needed, after that new, edited and
+    deleted messages are applied from events so context is served from memory. Channels are evicted least recently
+    used first once the cached message content goes over the character budget.
+    """
+
+    def __init__(self, max_messages: int = 50, max_chars: int = 5_000_000):
+        self.max_messages = max_messages  # Matches the highest channel context setting
+        self.max_chars = max_chars
+        self.channels: OrderedDict[int, t.Deque[CachedMessage]] = OrderedDict()
+        self.chars: int = 0
+        self.locks: t.Dict[int, asyncio.Lock] = {}
+        # Messages received while a channel's history is being fetched
+        self.priming: t.Dict[int, t.List[discord.Message]] = {}
+        self.fetches: int = 0
+        self.hits: int = 0
+
+    def add(self, message: discord.Message) -> None:
+        if (pending := self.priming.get(message.channel.id)) is not None:
+            pending.append(message)
+            return
+        buffer = self.channels.get(message.channel.id)
+        if buffer is None:
+            # Only channels that have been primed are tracked
+            return
+        if buffer and buffer[-1].id >= message.id:
+            # Already added by the fetch that primed the channel
+            return
+        if len(buffer) == buffer.maxlen:
+            self.chars -= len(buffer[0].content)
+        buffer.append(CachedMessage.from_message(message))
+        self.chars += len(message.content)
+        self.trim()
+
+    def edit(self, channel_id: int, message_id: int, content: str) -> None:
+        for cached in self.channels.get(channel_id, ()):
+            if cached.id == message_id:
+                self.chars += len(content) - len(cached.content)
+                cached.content = content
+                return
+
+    def delete(self, channel_id: int, message_ids: t.Iterable[int]) -> None:
+        buffer = self.channels.get(channel_id)
+        if not buffer:
+            return
+        message_ids = set(message_ids)
+        kept = [cached for cached in buffer if cached.id not in message_ids]
+        if len(kept) == len(buffer):
+            return
+        self.chars -= sum(len(cached.content) for cached in buffer if cached.id in message_ids)
+        buffer.clear()
+        buffer.extend(kept)
+
+    def discard(self, channel_id: int) -> None:
+        buffer = self.channels.pop(channel_id, None)
+        if buffer:
+            self.chars -= sum(len(cached.content) for cached in buffer)
+
+    def trim(self) -> None:
+        while self.chars > self.max_chars and len(self.channels) > 1:
+            channel_id = next(iter(self.channels))
+            self.discard(channel_id)
+            log.debug(f"Evicted channel {channel_id} from the history cache")
+
+    async def get(self, channel: discord.abc.Messageable, limit: int) -> t.List[CachedMessage]:
+        """The last messages of a channel, oldest first, fetching them from the API if the channel isn't cached"""
+        if limit <= 0:
+            return []
+        if channel.id not in self.channels:
+            lock = self.locks.setdefault(channel.id, asyncio.Lock())
+            async with lock:
+                if channel.id not in self.channels:
+                    await self.prime(channel)
+            self.locks.pop(channel.id, None)
+        else:
+            self.hits += 1
+        self.channels.move_to_end(channel.id)
+        return list(self.channels[channel.id])[-limit:]
+
+    async def prime(self, channel: discord.abc.Messageable) -> None:
+        self.priming[channel.id] = []
+        try:
+            fetched = [message async for message in channel.history(limit=self.max_messages)]
+        finally:
+            pending = self.priming.pop(channel.id)
+        self.fetches += 1
+        buffer = deque((CachedMessage.from_message(message) for message in reversed(fetched)), maxlen=self.max_messages)
+        self.channels[channel.id] = buffer
+        self.chars += sum(len(cached.content) for cached in buffer)
+        for message in pending:
+            self.add(message)
+        self.trim()
@@ -9,7 +9,8 @@ import traceback
 from datetime import datetime
 from inspect import iscoroutinefunction
 from io import BytesIO
-from typing import Callable, Dict, List, Optional, Union
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import discord
 import httpx
@@ -29,8 +30,9 @@ from sentry_sdk import add_breadcrumb
 
 from ..abc import MixinMeta
 from .constants import READ_EXTENSIONS, SUPPORTS_VISION
+from .functioncache import CALL_STATS
 from .models import Conversation, GuildSettings
-from .reply import send_reply
+from .reply import LiveReply, send_reply
 from .utils import (
     clean_name,
     clean_response,
@@ -163,6 +165,11 @@ class ChatHandler(MixinMeta):
                         name = f"@{ref_author.name}({ref_author.display_name})"
                     question = f"{name}: {ref.content}\n\n# REPLY\n{question}"
 
+        live_reply = None
+        # Streamed text is shown before the regex blacklist can be applied to the full reply
+        if conf.stream_responses and not outputfile and not extract and not conf.regex_blacklist:
+            live_reply = LiveReply(message, conf)
+
         if get_last_message:
             reply = conversation.messages[-1]["content"] if conversation.messages else _("No message history!")
         else:
@@ -176,6 +183,7 @@ class ChatHandler(MixinMeta):
                     message_obj=message,
                     images=images,
                     model_override=model_override,
+                    live_reply=live_reply,
                 )
             except openai.InternalServerError as e:
                 if e.body and isinstance(e.body, dict):
@@ -209,6 +217,10 @@ class ChatHandler(MixinMeta):
                 )
                 reply += "\n\n" + _("API Status: {}").format(status)
 
+        if live_reply and not get_last_message:
+            if await live_reply.finish(reply):
+                return
+
         if reply is None:
             return
 
@@ -267,6 +279,7 @@ class ChatHandler(MixinMeta):
         message_obj: Optional[discord.Message] = None,
         images: list[str] = None,
         model_override: Optional[str] = None,
+        live_reply: Optional[LiveReply] = None,
     ) -> Union[str, None]:
         """Call the API asynchronously"""
         functions = function_calls.copy() if function_calls else []
@@ -310,6 +323,7 @@ class ChatHandler(MixinMeta):
                 message_obj=message_obj,
                 images=images,
                 model_override=model_override,
+                live_reply=live_reply,
             )
         finally:
             conversation.cleanup(conf, author)
@@ -328,6 +342,7 @@ class ChatHandler(MixinMeta):
         message_obj: Optional[discord.Message] = None,
         images: list[str] = None,
         model_override: Optional[str] = None,
+        live_reply: Optional[LiveReply] = None,
     ) -> Union[str, None]:
         if isinstance(author, int):
             author = guild.get_member(author)
@@ -428,7 +443,7 @@ class ChatHandler(MixinMeta):
                         i["role"] = "system"
 
             # Iteratively degrade the conversation to ensure it is always under the token limit
-            degraded = await self.degrade_conversation(messages, function_calls, conf, author)
+            degraded = await self.degrade_conversation(messages, function_calls, conf, author, conversation)
 
             before = len(messages)
             cleaned = await ensure_tool_consistency(messages)
@@ -450,6 +465,8 @@ class ChatHandler(MixinMeta):
                     functions=function_calls,
                     member=author,
                     model_override=model_override,
+                    on_text=live_reply.feed if live_reply else None,
+                    conversation=conversation,
                 )
             except httpx.ReadTimeout:
                 reply = _("Request timed out, please try again.")
@@ -514,6 +531,8 @@ class ChatHandler(MixinMeta):
             # Add function call count
             conf.functions_called += len(response_functions)
 
+            # Parse every call first, run the valid ones concurrently, then handle the results in the order called
+            parsed = []
             for function_call in response_functions:
                 if isinstance(function_call, ChatCompletionMessageToolCall):
                     function_name = function_call.function.name
@@ -529,55 +548,96 @@ class ChatHandler(MixinMeta):
                 calls += 1
 
                 if function_name not in function_map:
-                    log.error(f"GPT suggested a function not provided: {function_name}")
-                    e = {
-                        "role": role,
-                        "name": "invalid_function",
-                        "content": f"{function_name} is not a valid function name",
-                    }
-                    if tool_id:
-                        e["tool_call_id"] = tool_id
-                    messages.append(e)
-                    conversation.messages.append(e)
-                    # Remove the function call from the list
-                    function_calls = [i for i in function_calls if i["name"] != function_name]
+                    parsed.append((function_name, arguments, tool_id, role, None))
                     continue
 
                 if arguments != "{}":
                     try:
                         args = json.loads(arguments)
-                        parse_success = True
                     except json.JSONDecodeError:
-                        args = {}
-                        parse_success = False
+                        args = None
                 else:
                     args = {}
-                    parse_success = True
-
-                if parse_success:
-                    extras = {
-                        "user": guild.get_member(author) if isinstance(author, int) else author,
-                        "channel": guild.get_channel_or_thread(channel) if isinstance(channel, int) else channel,
-                        "guild": guild,
-                        "bot": self.bot,
-                        "conf": conf,
-                    }
-                    kwargs = {**args, **extras}
-                    func = function_map[function_name]
+                parsed.append((function_name, arguments, tool_id, role, args))
+
+            extras = {
+                "user": guild.get_member(author) if isinstance(author, int) else author,
+                "channel": guild.get_channel_or_thread(channel) if isinstance(channel, int) else channel,
+                "guild": guild,
+                "bot": self.bot,
+                "conf": conf,
+            }
+            semaphore = asyncio.Semaphore(max(conf.max_parallel_functions, 1))
+
+            async def run_function(function_name: str, arguments: str, args: dict) -> Tuple[Any, bool]:
+                """Returns the function's result and whether it raised an error"""
+                kwargs = {**args, **extras}
+                func = function_map[function_name]
+                async with semaphore:
+                    start = perf_counter()
                     try:
                         if iscoroutinefunction(func):
-                            func_result = await func(**kwargs)
+                            call = func(**kwargs)
                         else:
-                            func_result = await asyncio.to_thread(func, **kwargs)
+                            # Threads can't be cancelled, on timeout this only stops waiting for it
+                            call = asyncio.to_thread(func, **kwargs)
+                        func_result = await asyncio.wait_for(call, timeout=conf.function_timeout or None)
+                    except asyncio.TimeoutError:
+                        CALL_STATS.record(function_name, perf_counter() - start, error=True)
+                        log.warning(f"Function {function_name} timed out after {conf.function_timeout}s")
+                        return f"TimeoutError: {function_name} took longer than {conf.function_timeout} seconds", False
                     except Exception as e:
+                        CALL_STATS.record(function_name, perf_counter() - start, error=True)
                         log.error(
                             f"Custom function {function_name} failed to execute!\nArgs: {arguments}",
                             exc_info=e,
                         )
-                        func_result = traceback.format_exc()
+                        return traceback.format_exc(), True
+                    elapsed = perf_counter() - start
+                CALL_STATS.record(function_name, elapsed)
+                log.debug(f"Function {function_name} took {elapsed:.2f}s")
+                return func_result, False
+
+            runnable = [(name, arguments, args) for name, arguments, _, _, args in parsed if args is not None]
+            outcomes = None
+            if conf.max_parallel_functions > 1 and len(runnable) > 1:
+                # All of the calls run before any result is handled, so a call that ends the turn (return_null)
+                # doesn't stop the ones after it. Their results are still added to the conversation before returning.
+                start = perf_counter()
+                outcomes = iter(await asyncio.gather(*(run_function(*i) for i in runnable)))
+                log.debug(
+                    f"Ran {len(runnable)} functions in {perf_counter() - start:.2f}s "
+                    f"(max {conf.max_parallel_functions} at once)"
+                )
+            # Otherwise each call runs as its result is handled and nothing runs after one that ends the turn
+            ended = False
+
+            for function_name, arguments, tool_id, role, args in parsed:
+                if function_name not in function_map:
+                    log.error(f"GPT suggested a function not provided: {function_name}")
+                    e = {
+                        "role": role,
+                        "name": "invalid_function",
+                        "content": f"{function_name} is not a valid function name",
+                    }
+                    if tool_id:
+                        e["tool_call_id"] = tool_id
+                    messages.append(e)
+                    conversation.messages.append(e)
+                    # Remove the function call from the list
+                    function_calls = [i for i in function_calls if i["name"] != function_name]
+                    continue
+
+                if args is not None:
+                    if outcomes is None:
+                        func_result, failed = await run_function(function_name, arguments, args)
+                    else:
+                        func_result, failed = next(outcomes)
+                    if failed:
                         function_calls = [i for i in function_calls if i["name"] != function_name]
                 else:
                     # Help the model self-correct
+                    args = {}
                     func_result = f"JSONDecodeError: Failed to parse arguments for function {function_name}"
 
                 return_null = False
@@ -646,15 +706,20 @@ class ChatHandler(MixinMeta):
                 messages.append(e)
                 conversation.messages.append(e)
 
-                if return_null:
-                    return None
-
                 if message_obj and function_name in ["create_memory", "edit_memory"]:
                     try:
                         await message_obj.add_reaction("\N{BRAIN}")
                     except (discord.Forbidden, discord.NotFound):
                         pass
 
+                if return_null:
+                    if outcomes is None:
+                        return None
+                    ended = True
+
+            if ended:
+                return None
+
         # Handle the rest of the reply
         if calls > 1:
             log.debug(f"Made {calls} function calls in a row")
@@ -738,7 +803,7 @@ class ChatHandler(MixinMeta):
         initial_prompt = format_string(conf.prompt)
         model = conf.get_user_model(author)
         current_tokens = await self.count_tokens(message + system_prompt + initial_prompt, model)
-        current_tokens += await self.count_payload_tokens(conversation.messages, model)
+        current_tokens += await self.count_payload_tokens(conversation.messages, model, conversation)
         current_tokens += await self.count_function_tokens(function_calls, model)
 
         max_tokens = self.get_max_tokens(conf, author)
@@ -801,5 +866,6 @@ class ChatHandler(MixinMeta):
             name=clean_name(author.name) if (author and hasattr(author, "name")) else None,
             images=images,
             resolution=conf.vision_detail,
+            history=self.channel_history,
         )
         return messages
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import typing as t
+from collections import OrderedDict
+
+import numpy as np
+
+log = logging.getLogger("red.vrt.assistant.embedbatch")
+
+# Embeds a list of texts, returning a vector and the tokens used for each text
+EmbedFunc = t.Callable[[t.List[str]], t.Awaitable[t.Tuple[t.List[t.List[float]], t.List[int]]]]
+
+
+def normalize(text: str) -> str:
+    """Collapse whitespace so trivially different queries share a cache entry"""
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    """LRU cache of query embeddings keyed on (model, endpoint, normalized text)
+
+    Vectors are kept as float32 arrays and the cache is bounded by their total size as well as the entry count,
+    since a 3072 dimension embedding is ~12KB as an array but several times that as a list of floats.
+    """
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 16 * 1024 * 1024):
+        self.entries: OrderedDict[t.Tuple[str, str, str], np.ndarray] = OrderedDict()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, model: str, endpoint: str, text: str) -> t.Optional[t.List[float]]:
+        key = (model, endpoint, normalize(text))
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key].tolist()
+        self.misses += 1
+        return None
+
+    def put(self, model: str, endpoint: str, text: str, embedding: t.List[float]) -> None:
+        if not embedding or not self.max_entries:
+            return
+        vector = np.asarray(embedding, dtype=np.float32)
+        if vector.nbytes > self.max_bytes:
+            return
+        key = (model, endpoint, normalize(text))
+        if key in self.entries:
+            self.size -= self.entries[key].nbytes
+        self.entries[key] = vector
+        self.entries.move_to_end(key)
+        self.size += vector.nbytes
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.nbytes
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.size = 0
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent embedding requests for the same endpoint into multi-input API calls
+
+    Requests wait a few milliseconds for others to join their batch, and a batch is sent early once it is full,
+    either by count or by its estimated token total. If the API rejects a batch because of its input it is split in
+    half and retried so that one bad input only fails its own request, any other error fails the whole batch.
+    The number of batches in flight at once is bounded so bulk resyncs and imports don't flood the API.
+    """
+
+    def __init__(self, max_batch: int = 96, max_tokens: int = 100_000, delay: float = 0.02, max_concurrency: int = 4):
+        self.max_batch = max_batch
+        self.max_tokens = max_tokens
+        self.delay = delay
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.pending: t.Dict[t.Hashable, t.List[t.Tuple[str, asyncio.Future]]] = {}
+        self.pending_tokens: t.Dict[t.Hashable, int] = {}
+        self.tasks: t.Set[asyncio.Task] = set()
+        self.calls: int = 0
+        self.texts: int = 0
+
+    async def submit(self, key: t.Hashable, text: str, func: EmbedFunc) -> t.Tuple[t.List[float], int]:
+        """Embed a text along with any other texts submitted under the same key
+
+        Args:
+            key (t.Hashable): Identifies the endpoint, model and credentials, only requests with the same key are batched
+            text (str): The text to embed
+            func (EmbedFunc): Makes the API call for a batch of texts
+
+        Returns:
+            t.Tuple[t.List[float], int]: The embedding and the tokens used for this text
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        tokens = estimate_tokens(text)
+        batch = self.pending.get(key)
+        if batch is not None and self.pending_tokens[key] + tokens > self.max_tokens:
+            # Send what we have rather than push the request over the token cap
+            self.flush(key, batch, func)
+            batch = None
+        if batch is None:
+            batch = self.pending[key] = []
+            self.pending_tokens[key] = 0
+            loop.call_later(self.delay, self.flush, key, batch, func)
+        batch.append((text, future))
+        self.pending_tokens[key] += tokens
+        if len(batch) >= self.max_batch or self.pending_tokens[key] >= self.max_tokens:
+            self.flush(key, batch, func)
+        return await future
+
+    def flush(self, key: t.Hashable, batch: t.List[t.Tuple[str, asyncio.Future]], func: EmbedFunc) -> None:
+        # The batch may already have been sent for being full
+        if self.pending.get(key) is not batch:
+            return
+        del self.pending[key]
+        del self.pending_tokens[key]
+        task = asyncio.create_task(self.run(batch, func))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def run(self, batch: t.List[t.Tuple[str, asyncio.Future]], func: EmbedFunc) -> None:
+        error = None
+        async with self.semaphore:
+            try:
+                embeddings, tokens = await func([text for text, _ in batch])
+            except Exception as e:
+                error = e
+        if error is not None:
+            if len(batch) == 1 or not input_error(error):
+                # Auth, rate limit and connection errors would fail every half of the batch too
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                return
+            # Narrow down the failing input instead of failing every request that shared the batch
+            log.debug(f"Batch of {len(batch)} texts failed, retrying in halves: {error}")
+            half = len(batch) // 2
+            await asyncio.gather(self.run(batch[:half], func), self.run(batch[half:], func))
+            return
+        self.calls += 1
+        self.texts += len(batch)
+        log.debug(f"Embedded {len(batch)} texts in one call")
+        for (_, future), embedding, token_count in zip(batch, embeddings, tokens):
+            if not future.done():
+                future.set_result((embedding, token_count))
+        for _, future in batch[len(embeddings) :]:
+            if not future.done():
+                future.set_exception(ValueError("The API returned fewer embeddings than requested"))
+
+    def close(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        for batch in self.pending.values():
+            for _, future in batch:
+                future.cancel()
+        self.pending.clear()
+        self.pending_tokens.clear()
+
+
+def input_error(error: Exception) -> bool:
+    """Whether the API rejected a request because of what was sent, 400 for a bad input and 413 for a batch that is
+    too large, which are the only failures that splitting a batch can get around"""
+    status = getattr(error, "status_code", getattr(error, "status", None))
+    return status in (400, 413)
+
+
+def split_tokens(total: int, texts: t.List[str]) -> t.List[int]:
+    """Apportion the token usage of a batch across its texts by length, for APIs that only report a total"""
+    lengths = [max(len(text), 1) for text in texts]
+    size = sum(lengths)
+    return [round(total * length / size) for length in lengths]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count used to size batches, about 4 characters per token for English text"""
+    return len(text) // 4 + 1
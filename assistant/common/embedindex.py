@@ -0,0 +1,285 @@
+import logging
+import threading
+import typing as t
+from pathlib import Path
+
+import numpy as np
+
+if t.TYPE_CHECKING:
+    from .models import Embedding
+
+log = logging.getLogger("red.vrt.assistant.embedindex")
+
+
+class IVFIndex:
+    """Inverted file index over the rows of a VectorGroup for approximate search
+
+    Rows are clustered around centroids with spherical k-means, and a query only scores the rows in the clusters
+    whose centroids are closest to it. Probing more clusters finds more of the true top results at the cost of speed.
+    """
+
+    def __init__(self, centroids: np.ndarray, trained_size: int):
+        self.centroids = centroids
+        self.trained_size = trained_size  # Rows in the group when the centroids were trained
+        self.assign: np.ndarray = np.empty(0, dtype=np.int32)  # Cluster of each row
+        # Rows sorted by cluster and where each cluster starts, rebuilt after rows change
+        self.lists: t.Optional[t.Tuple[np.ndarray, np.ndarray]] = None
+
+    @classmethod
+    def train(cls, matrix: np.ndarray, iterations: int = 10) -> "IVFIndex":
+        size = len(matrix)
+        rng = np.random.default_rng(0)
+        sample = matrix[rng.choice(size, min(size, 64 * int(np.sqrt(size))), replace=False)]
+        sample = sample[~np.isnan(sample).any(axis=1)]
+        nlist = max(1, min(int(np.sqrt(size)), len(sample)))
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(labels, kind="stable")
+            clusters, starts = np.unique(labels[order], return_index=True)
+            sums = np.add.reduceat(sample[order], starts, axis=0)
+            # Clusters that lost all their points keep their old centroid
+            centroids = centroids.copy()
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids[clusters] = sums / np.where(norms == 0, 1, norms)
+        index = cls(centroids.astype(np.float32), size)
+        index.assign = index.nearest(matrix)
+        return index
+
+    def nearest(self, vectors: np.ndarray) -> np.ndarray:
+        """Get the closest centroid of each vector, scored in chunks to bound memory"""
+        assign = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), 4096):
+            chunk = vectors[start : start + 4096]
+            assign[start : start + 4096] = np.argmax(np.nan_to_num(chunk) @ self.centroids.T, axis=1)
+        return assign
+
+    def set(self, row: int, vector: np.ndarray) -> None:
+        if row >= len(self.assign):
+            grown = np.zeros(max(16, row * 2), dtype=np.int32)
+            grown[: len(self.assign)] = self.assign
+            self.assign = grown
+        self.assign[row] = self.nearest(vector[None, :])[0]
+        self.lists = None
+
+    def move(self, src: int, dst: int) -> None:
+        self.assign[dst] = self.assign[src]
+        self.lists = None
+
+    def candidates(self, query: np.ndarray, probes: int, size: int) -> np.ndarray:
+        """Get the rows in the clusters closest to the query"""
+        if self.lists is None:
+            assign = self.assign[:size]
+            rows = np.argsort(assign, kind="stable")
+            starts = np.searchsorted(assign[rows], np.arange(len(self.centroids) + 1))
+            self.lists = rows, starts
+        rows, starts = self.lists
+        scores = self.centroids @ query
+        probes = min(probes, len(scores))
+        closest = np.argpartition(-scores, probes - 1)[:probes]
+        return np.concatenate([rows[starts[i] : starts[i + 1]] for i in closest.tolist()])
+
+
+class VectorGroup:
+    """Contiguous float32 matrix of normalized vectors that all share the same dimensions"""
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+        self.matrix: np.ndarray = np.empty((0, dimensions), dtype=np.float32)
+        self.names: t.List[str] = []
+        self.rows: t.Dict[str, int] = {}
+        self.ivf: t.Optional[IVFIndex] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.names)
+
+    def set(self, name: str, vector: np.ndarray) -> None:
+        row = self.rows.get(name)
+        if row is None:
+            row = self.size
+            if row == len(self.matrix):
+                # Grow geometrically so bulk imports don't reallocate on every entry
+                grown = np.empty((max(16, row * 2), self.dimensions), dtype=np.float32)
+                grown[:row] = self.matrix[:row]
+                self.matrix = grown
+            self.names.append(name)
+            self.rows[name] = row
+        self.matrix[row] = vector
+        if self.ivf is not None:
+            self.ivf.set(row, vector)
+
+    def remove(self, name: str) -> None:
+        """Remove a row by moving the last row into its place"""
+        row = self.rows.pop(name)
+        last = self.size - 1
+        moved = self.names.pop()
+        if row != last:
+            self.matrix[row] = self.matrix[last]
+            self.names[row] = moved
+            self.rows[moved] = row
+            if self.ivf is not None:
+                self.ivf.move(last, row)
+        elif self.ivf is not None:
+            self.ivf.lists = None
+
+    def search(
+        self,
+        query: np.ndarray,
+        top_n: int,
+        min_score: float,
+        probes: int = 0,
+    ) -> t.List[t.Tuple[str, float]]:
+        """Get the names and scores of the closest rows to a normalized query, highest first
+
+        If probes is set and the group has an IVF index, only rows in that many of the closest clusters are scored.
+        """
+        if not self.size:
+            return []
+        if probes and self.ivf is not None:
+            rows = self.ivf.candidates(query, probes, self.size)
+            scores = self.matrix[rows] @ query
+        else:
+            rows = np.arange(self.size)
+            scores = self.matrix[: self.size] @ query
+        if top_n < len(scores):
+            idx = np.argpartition(-scores, top_n - 1)[:top_n]
+        else:
+            idx = np.arange(len(scores))
+        idx = idx[np.argsort(-scores[idx], kind="stable")]
+        return [(self.names[rows[i]], float(scores[i])) for i in idx.tolist() if scores[i] >= min_score]
+
+    def needs_training(self) -> bool:
+        """Whether the IVF index is missing or the group has grown or shrunk too much since it was trained"""
+        if self.ivf is None:
+            return True
+        return not self.ivf.trained_size / 2 <= self.size <= self.ivf.trained_size * 2
+
+
+class EmbeddingIndex:
+    """Per guild search index over the embeddings dict
+
+    Vectors are normalized once and kept in one matrix per dimension count, so scoring a query is a single
+    matrix-vector product. The index is synced against the embeddings dict before each search and only entries that
+    were added, removed or had their vector replaced are rewritten.
+    """
+
+    def __init__(self):
+        self.groups: t.Dict[int, VectorGroup] = {}
+        # Name: (Embedding, vector list) as of the last sync, used to detect changed entries by identity
+        self.entries: t.Dict[str, t.Tuple["Embedding", t.List[float]]] = {}
+        self.lock = threading.Lock()
+        # Whether the IVF indexes changed since they were last saved
+        self.ivf_changed: bool = False
+
+    def sync(self, embeddings: t.Dict[str, "Embedding"]) -> None:
+        with self.lock:
+            for name in self.entries.keys() - embeddings.keys():
+                self.discard(name)
+            for name, em in embeddings.items():
+                cached = self.entries.get(name)
+                if cached is not None and cached[0] is em and cached[1] is em.embedding:
+                    continue
+                self.discard(name)
+                self.insert(name, em)
+                self.ivf_changed = True
+
+    def insert(self, name: str, em: "Embedding") -> None:
+        self.entries[name] = (em, em.embedding)
+        if not em.embedding:
+            return
+        vector = np.asarray(em.embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+        else:
+            # Can't be compared, a NaN row never scores above the threshold
+            vector = np.full_like(vector, np.nan)
+        dimensions = len(vector)
+        if dimensions not in self.groups:
+            self.groups[dimensions] = VectorGroup(dimensions)
+        self.groups[dimensions].set(name, vector)
+
+    def discard(self, name: str) -> None:
+        cached = self.entries.pop(name, None)
+        if cached is None:
+            return
+        group = self.groups.get(len(cached[1]))
+        if group is not None and name in group.rows:
+            group.remove(name)
+
+    def search(
+        self,
+        query_embedding: t.List[float],
+        top_n: int,
+        min_relatedness: float,
+        probes: int = 0,
+        min_entries: int = 0,
+    ) -> t.List[t.Tuple[str, float]]:
+        """Get the names and cosine similarity of the most related entries with the same dimensions as the query
+
+        Args:
+            query_embedding (t.List[float]): The query vector
+            top_n (int): Max results to return
+            min_relatedness (float): Minimum cosine similarity of the results
+            probes (int, optional): Clusters to search with the approximate index, 0 for an exact search.
+            min_entries (int, optional): Entries needed before the approximate index is used instead of an exact search.
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if not norm:
+            return []
+        with self.lock:
+            group = self.groups.get(len(query))
+            if group is None:
+                return []
+            if not probes or group.size < max(min_entries, 1):
+                return group.search(query / norm, top_n, min_relatedness)
+            if group.needs_training():
+                log.info(f"Training approximate index for {group.size} embeddings with {group.dimensions} dimensions")
+                group.ivf = IVFIndex.train(group.matrix[: group.size])
+                self.ivf_changed = True
+            return group.search(query / norm, top_n, min_relatedness, probes)
+
+    def clear_ivf(self) -> None:
+        with self.lock:
+            for group in self.groups.values():
+                group.ivf = None
+            self.ivf_changed = False
+
+    def save_ivf(self, path: Path) -> None:
+        """Save the trained centroids and cluster assignments of each dimension group"""
+        with self.lock:
+            arrays = {}
+            for dims, group in self.groups.items():
+                if group.ivf is None:
+                    continue
+                arrays[f"{dims}_centroids"] = group.ivf.centroids
+                arrays[f"{dims}_assign"] = group.ivf.assign[: group.size]
+                arrays[f"{dims}_names"] = np.array(group.names, dtype=str)
+                arrays[f"{dims}_trained"] = np.array(group.ivf.trained_size)
+            self.ivf_changed = False
+        if not arrays:
+            path.unlink(missing_ok=True)
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp.npz")
+        np.savez(tmp, **arrays)
+        tmp.replace(path)
+
+    def load_ivf(self, path: Path, embeddings: t.Dict[str, "Embedding"]) -> None:
+        """Sync with the embeddings and restore saved IVF indexes, entries not in the save are assigned fresh"""
+        self.sync(embeddings)
+        with np.load(path) as data, self.lock:
+            for dims, group in self.groups.items():
+                if f"{dims}_centroids" not in data or not group.size:
+                    continue
+                ivf = IVFIndex(data[f"{dims}_centroids"], int(data[f"{dims}_trained"]))
+                saved = dict(zip(data[f"{dims}_names"].tolist(), data[f"{dims}_assign"].tolist()))
+                missing = [row for row, name in enumerate(group.names) if name not in saved]
+                ivf.assign = np.fromiter((saved.get(name, 0) for name in group.names), dtype=np.int32)
+                if missing:
+                    ivf.assign[missing] = ivf.nearest(group.matrix[missing])
+                group.ivf = ivf
+            self.ivf_changed = False
+
@@ -0,0 +1,75 @@
+import hashlib
+import logging
+import typing as t
+from collections import defaultdict
+
+log = logging.getLogger("red.vrt.assistant.functioncache")
+
+
+class FunctionCache:
+    """Custom functions compiled once per version of their code
+
+    Each function is executed in its own copy of the namespace it used to share, so functions can't overwrite each
+    other's globals. Editing a function changes its code hash, so the next lookup compiles the new version.
+    """
+
+    def __init__(self):
+        # Function name: (code hash, callable)
+        self.compiled: t.Dict[str, t.Tuple[str, t.Callable]] = {}
+        self.compiles: int = 0
+
+    def get(self, name: str, code: str, base: t.Dict[str, t.Any]) -> t.Callable:
+        """Get the compiled callable for a function, compiling it if the code has changed
+
+        Args:
+            name (str): The name the code defines the function as
+            code (str): The function's source code
+            base (t.Dict[str, t.Any]): Globals the code is executed with, copied for each function
+        """
+        digest = hashlib.sha256(code.encode()).hexdigest()
+        cached = self.compiled.get(name)
+        if cached is not None and cached[0] == digest:
+            return cached[1]
+        namespace = dict(base)
+        exec(compile(code, f"<custom function {name}>", "exec"), namespace)
+        func = namespace[name]
+        self.compiled[name] = (digest, func)
+        self.compiles += 1
+        log.debug(f"Compiled custom function {name}")
+        return func
+
+    def discard(self, name: str) -> None:
+        self.compiled.pop(name, None)
+
+
+class FunctionStats:
+    def __init__(self):
+        self.calls: int = 0
+        self.errors: int = 0
+        self.total: float = 0.0  # Seconds spent across all calls
+        self.slowest: float = 0.0
+
+    @property
+    def average(self) -> float:
+        return self.total / self.calls if self.calls else 0.0
+
+
+class CallStats:
+    """Call counts, errors and latency of each function the model calls"""
+
+    def __init__(self):
+        self.functions: t.DefaultDict[str, FunctionStats] = defaultdict(FunctionStats)
+
+    def record(self, name: str, elapsed: float, error: bool = False) -> None:
+        stats = self.functions[name]
+        stats.calls += 1
+        stats.errors += error
+        stats.total += elapsed
+        stats.slowest = max(stats.slowest, elapsed)
+
+    def reset(self) -> None:
+        self.functions.clear()
+
+
+COMPILED = FunctionCache()
+CALL_STATS = CallStats()
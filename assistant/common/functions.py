@@ -201,6 +201,7 @@ class AssistantFunctions(MixinMeta):
 
         if memory_name not in conf.embeddings:
             return "A memory with that name does not exist!"
+        await conf.load_vectors()
         embedding = await self.request_embedding(memory_text, conf)
         if not embedding:
             return "Could not update the memory!"
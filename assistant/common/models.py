@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import typing as t
 from datetime import datetime, timezone
@@ -5,11 +6,15 @@ from datetime import datetime, timezone
 from assistant.common.constants import DEFAULT_GEMINI_EMBED_MODEL
 
 import discord
-import numpy as np
 import orjson
-from pydantic import VERSION, BaseModel, Field
+from pydantic import VERSION, BaseModel, Field, PrivateAttr
 from redbot.core.bot import Red
 
+from .channelcache import CachedMessage, ChannelHistory
+from .embedindex import EmbeddingIndex
+from .functioncache import COMPILED
+from .tokenizer import TokenCounts
+
 log = logging.getLogger("red.vrt.assistant.models")
 
 
@@ -20,10 +25,10 @@ class AssistantBaseModel(BaseModel):
             return super().model_validate(obj, *args, **kwargs)
         return super().parse_obj(obj, *args, **kwargs)
 
-    def model_dump(self, exclude_defaults: bool = True):
+    def model_dump(self, exclude_defaults: bool = True, exclude: t.Optional[t.Set[str]] = None):
         if VERSION >= "2.0.1":
-            return super().model_dump(mode="json", exclude_defaults=exclude_defaults)
-        return orjson.loads(super().json(exclude_defaults=exclude_defaults))
+            return super().model_dump(mode="json", exclude_defaults=exclude_defaults, exclude=exclude)
+        return orjson.loads(super().json(exclude_defaults=exclude_defaults, exclude=exclude))
 
 
 class Embedding(AssistantBaseModel):
@@ -57,9 +62,9 @@ class CustomFunction(AssistantBaseModel):
     permission_level: str = "user"  # user, mod, admin, owner
 
     def prep(self) -> t.Callable:
-        """Prep function for execution"""
-        exec(self.code, globals())
-        return globals()[self.jsonschema["name"]]
+        """Prep function for execution, only compiled again if the code has changed"""
+        # Functions were originally exec'd into this module, so they still get its globals to work with
+        return COMPILED.get(self.jsonschema["name"], self.code, globals())
 
 
 class Usage(AssistantBaseModel):
@@ -79,6 +84,8 @@ class GuildSettings(AssistantBaseModel):
     tutors: t.List[int] = []  # Role or user IDs
     top_n: int = 3
     min_relatedness: float = 0.78
+    ann_probes: int = 0  # Clusters searched by the approximate embedding index, 0 to always search exactly
+    ann_min_entries: int = 10000  # Embeddings needed before the approximate index is used
     embed_method: str = "dynamic"  # hybrid, dynamic, static, user
     question_mode: bool = False  # If True, only the first message and messages that end with ? will have emebddings
     channel_id: t.Optional[int] = 0
@@ -95,6 +102,7 @@ class GuildSettings(AssistantBaseModel):
     model: str = "gpt-4o-mini"
     embed_model: str = "text-embedding-3-small"  # Or text-embedding-3-large, text-embedding-ada-002
     collab_convos: bool = False
+    stream_responses: bool = False  # Show replies as they are generated by editing the reply message
     gemini_safety_settings: t.Dict[str, str] = Field(default_factory=dict)
     gemini_generation_config: t.Dict[str, t.Any] = Field(default_factory=dict)
     gemini_enable_google_search: bool = False
@@ -132,18 +140,32 @@ class GuildSettings(AssistantBaseModel):
 
     use_function_calls: bool = False
     max_function_calls: int = 20  # Max calls in a row
+    max_parallel_functions: int = 4  # Function calls from a single response that can run at once
+    function_timeout: int = 120  # Seconds to wait for a function call, 0 for no limit
     disabled_functions: t.List[str] = []
     functions_called: int = 0
 
+    # Non-config vector index over the embeddings
+    _embedding_index: EmbeddingIndex = PrivateAttr(default_factory=EmbeddingIndex)
+    # Reads the embedding vectors from disk, set while they haven't been read yet
+    _vector_loader: t.Optional[t.Callable[[], None]] = PrivateAttr(default=None)
+
+    def ensure_vectors(self) -> None:
+        """Read the embedding vectors if they haven't been yet, blocks so only call from a thread"""
+        if self._vector_loader is not None:
+            self._vector_loader()
+
+    async def load_vectors(self) -> None:
+        """Read the embedding vectors in a thread if they haven't been yet, call before reading or editing vectors"""
+        if self._vector_loader is not None:
+            await asyncio.to_thread(self._vector_loader)
+
     def get_related_embeddings(
         self,
         query_embedding: t.List[float],
         top_n_override: t.Optional[int] = None,
         relatedness_override: t.Optional[float] = None,
     ) -> t.List[t.Tuple[str, str, float, int]]:
-        def cosine_similarity(a, b):
-            return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-
         if not query_embedding:
             return []
 
@@ -155,25 +177,22 @@ class GuildSettings(AssistantBaseModel):
         if not top_n or q_length == 0 or not self.embeddings:
             return []
 
-        strings_and_relatedness = []
-        for name, em in self.embeddings.items():
-            if q_length != len(em.embedding):
-                continue
-            try:
-                score = cosine_similarity(query_embedding, em.embedding)
-                if score >= min_relatedness:
-                    strings_and_relatedness.append((name, em.text, score, len(em.embedding)))
-            except ValueError as e:
-                log.error(
-                    f"Failed to compare '{name}' embedding {q_length} - {len(em.embedding)}",
-                    exc_info=e,
-                )
-
-        if not strings_and_relatedness:
-            return []
-
-        strings_and_relatedness.sort(key=lambda x: x[2], reverse=True)
-        return strings_and_relatedness[:top_n]
+        # Always run in a thread, so reading the vectors here doesn't hold up the event loop
+        self.ensure_vectors()
+        self._embedding_index.sync(self.embeddings)
+        related = self._embedding_index.search(
+            query_embedding,
+            top_n,
+            min_relatedness,
+            probes=self.ann_probes,
+            min_entries=self.ann_min_entries,
+        )
+        # Entries can be removed from the event loop while this runs in a thread
+        return [
+            (name, em.text, score, q_length)
+            for name, score in related
+            if (em := self.embeddings.get(name)) is not None
+        ]
 
     def update_usage(
         self,
@@ -243,6 +262,9 @@ class Conversation(AssistantBaseModel):
     system_prompt_override: t.Optional[str] = None
     included_channel_message_ids: t.Set[int] = Field(default_factory=set)
 
+    # Non-config token counts of the messages
+    _token_counts: TokenCounts = PrivateAttr(default_factory=TokenCounts)
+
     def function_count(self) -> int:
         if not self.messages:
             return 0
@@ -314,8 +336,12 @@ class Conversation(AssistantBaseModel):
         name: str = None,
         images: t.List[str] = None,
         resolution: str = "auto",
+        history: t.Optional[ChannelHistory] = None,
     ) -> t.List[dict]:
-        """Pre-appends the prmompts before the user's messages without motifying them"""
+        """Pre-appends the prmompts before the user's messages without motifying them
+
+        Channel context is served from the history cache if one is given, otherwise it is fetched from the API.
+        """
         prepared = []
         if system_prompt.strip():
             prepared.append({"role": "developer", "content": system_prompt})
@@ -324,16 +350,22 @@ class Conversation(AssistantBaseModel):
 
         if conf.channel_context_enabled:
             channel_context_formatted_messages = []
-            history_iterator = channel.history(limit=conf.channel_context_max_messages, oldest_first=True)
-            async for hist_msg in history_iterator:
+            if history is not None:
+                recent = await history.get(channel, conf.channel_context_max_messages)
+            else:
+                recent = [
+                    CachedMessage.from_message(hist_msg)
+                    async for hist_msg in channel.history(limit=conf.channel_context_max_messages)
+                ][::-1]
+            for hist_msg in recent:
                 if hist_msg.id == current_message_id:
                     continue
-                if not conf.include_bot_messages_in_context and hist_msg.author.bot:
+                if not conf.include_bot_messages_in_context and hist_msg.bot:
                     continue
                 if hist_msg.id in self.included_channel_message_ids:
                     continue
-                msg_role = "assistant" if hist_msg.author.bot else "user"
-                msg_content = f"{hist_msg.author.display_name}: {hist_msg.content}"
+                msg_role = "assistant" if hist_msg.bot else "user"
+                msg_content = f"{hist_msg.author_name}: {hist_msg.content}"
                 formatted_hist_msg = {"role": msg_role, "content": msg_content}
                 channel_context_formatted_messages.append(formatted_hist_msg)
                 self.included_channel_message_ids.add(hist_msg.id)
@@ -379,6 +411,7 @@ class DB(AssistantBaseModel):
     listen_to_bots: bool = False
     brave_api_key: t.Optional[str] = None
     endpoint_override: t.Optional[str] = None
+    concurrency_limits: t.Dict[str, int] = {}  # Endpoint: Max concurrent API calls, "openai" for the default endpoint
     google_project_id: t.Optional[str] = None
     gemini_api_key: t.Optional[str] = None
     google_ai_studio_api_key: t.Optional[str] = None
@@ -391,6 +424,11 @@ class DB(AssistantBaseModel):
                 guild_settings.embed_model = DEFAULT_GEMINI_EMBED_MODEL
         return guild_settings
 
+    def load_vectors(self) -> None:
+        """Read the embedding vectors of every guild that hasn't been accessed yet"""
+        for conf in list(self.configs.values()):
+            conf.ensure_vectors()
+
     def get_conversation(
         self,
         member_id: int,
@@ -1,5 +1,7 @@
+import asyncio
 import logging
 import re
+from time import monotonic
 from typing import List, Optional
 
 import discord
@@ -151,3 +153,88 @@ async def send_reply(
                         kwargs["files"] = files
                         kwargs["as_reply"] = reply
                     await send(**kwargs)
+
+
+class LiveReply:
+    """Shows a streamed reply as it is generated by editing a single reply message
+
+    The message is posted as soon as the first text arrives, then edited at most once per interval to stay
+    well under Discord's message edit rate limits. Thinking sections are hidden until the final reply.
+    """
+
+    def __init__(self, message: discord.Message, conf: GuildSettings, interval: float = 1.5):
+        self.message = message
+        self.mention = conf.mention
+        self.interval = interval
+        self.text = ""
+        self.shown = ""
+        self.sent: Optional[discord.Message] = None
+        self.last_edit: float = 0.0
+        self.task: Optional[asyncio.Task] = None
+        self.failed = False
+
+    def feed(self, text: str) -> None:
+        """Add streamed text, updating the message in the background"""
+        self.text += text
+        if self.failed or (self.task and not self.task.done()):
+            # The running update will pick up the new text
+            return
+        self.task = asyncio.create_task(self.update())
+
+    def preview(self) -> str:
+        text = THINK_BLOCK.sub("", self.text)
+        if "<think>" in text:
+            # Still thinking
+            text = text[: text.index("<think>")]
+        text = text.strip()
+        if len(text) > 2000:
+            text = text[:1999] + "…"
+        return text
+
+    async def update(self) -> None:
+        if self.sent is not None:
+            wait = self.last_edit + self.interval - monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        preview = self.preview()
+        if not preview or preview == self.shown:
+            return
+        try:
+            if self.sent is None:
+                self.sent = await self.message.reply(preview, mention_author=self.mention)
+            else:
+                await self.sent.edit(content=preview)
+        except discord.HTTPException as e:
+            log.warning("Failed to update streamed reply, waiting for the full response", exc_info=e)
+            self.failed = True
+            return
+        self.shown = preview
+        self.last_edit = monotonic()
+
+    async def finish(self, content: Optional[str]) -> bool:
+        """Replace the preview with the final reply
+
+        Returns:
+            bool: True if the reply was delivered, False if it still needs to be sent normally
+        """
+        if self.task:
+            try:
+                await self.task
+            except Exception as e:
+                log.error("Streamed reply update failed", exc_info=e)
+        if self.sent is None:
+            return False
+        if content and len(content) <= 2000 and "<think>" not in content:
+            try:
+                if content != self.shown:
+                    await self.sent.edit(content=content)
+                return True
+            except discord.HTTPException as e:
+                log.warning("Failed to finish streamed reply", exc_info=e)
+        # Too long for one message or has thinking to attach, let send_reply handle it
+        try:
+            await self.sent.delete()
+        except discord.HTTPException:
+            pass
+        self.sent = None
+        return False
@@ -0,0 +1,308 @@
+"""Sharded on-disk storage for the cog's data
+
+Everything used to be dumped to a single Config entry on each save, re-serializing every embedding vector as a list
+of JSON floats. Instead each part lives in its own file and is only rewritten when it has changed:
+
+    settings.json                    Global settings
+    conversations.json               Persistent conversations
+    guilds/<guild_id>/settings.json  Guild settings, minus the embeddings
+    guilds/<guild_id>/embeddings.json  Embedding entries without their vectors, and which matrix row holds each vector
+    guilds/<guild_id>/<dims>-<token>.npy  float32 vectors of the guild's embeddings, one matrix per dimension count
+
+Embedding vectors are read the first time a guild's config is accessed (or by a background preload after startup)
+rather than when the cog loads.
+"""
+
+import logging
+import os
+import shutil
+import threading
+import typing as t
+from pathlib import Path
+from uuid import uuid4
+
+import numpy as np
+import orjson
+from pydantic import ValidationError
+
+from .models import DB, Conversation, Embedding, GuildSettings
+
+log = logging.getLogger("red.vrt.assistant.storage")
+
+# Snapshot of each entry as (objects compared by identity, values compared by equality)
+Marks = t.Dict[t.Any, t.Tuple[tuple, tuple]]
+
+
+def write_atomic(path: Path, data: t.Union[bytes, np.ndarray]) -> None:
+    """Write to a temp file and swap it in so a crash mid-write never leaves a truncated file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.parent / f"{path.stem}-{uuid4().fields[0]}.tmp"
+    with tmp_path.open("wb") as fs:
+        if isinstance(data, np.ndarray):
+            np.save(fs, data, allow_pickle=False)
+        else:
+            fs.write(data)
+        fs.flush()
+        os.fsync(fs.fileno())
+    tmp_path.replace(path)
+
+
+def embedding_marks(embeddings: t.Dict[str, Embedding]) -> Marks:
+    """Snapshot of each embedding entry as (objects, values), any reassignment of an object shows up as a new one"""
+    return {
+        name: ((em, em.embedding), (em.text, em.modified, em.model, em.ai_created))
+        for name, em in list(embeddings.items())
+    }
+
+
+def conversation_marks(conversations: t.Dict[str, Conversation]) -> Marks:
+    """Snapshot of each conversation as (objects, values)
+
+    Messages are hashed by their serialized form, since they are plain dicts that get appended to and edited in place.
+    """
+    return {
+        key: (
+            (convo, convo.messages),
+            (
+                hash(orjson.dumps(convo.messages)),
+                frozenset(convo.included_channel_message_ids),
+                convo.last_updated,
+                convo.system_prompt_override,
+            ),
+        )
+        for key, convo in list(conversations.items())
+    }
+
+
+def unchanged(old: t.Optional[Marks], new: Marks) -> bool:
+    if old is None or old.keys() != new.keys():
+        return False
+    for key, (objects, values) in new.items():
+        old_objects, old_values = old[key]
+        if any(a is not b for a, b in zip(old_objects, objects)) or old_values != values:
+            return False
+    return True
+
+
+class ShardStore:
+    """Reads and writes the DB in shards, tracking what was last written so saves skip anything unchanged"""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.settings_file = root / "settings.json"
+        self.conversations_file = root / "conversations.json"
+        self.guilds_dir = root / "guilds"
+
+        # Serialized settings last written, keyed by "settings" for the global settings or the guild ID
+        self.written: t.Dict[t.Union[str, int], bytes] = {}
+        self.embeddings_written: t.Dict[int, Marks] = {}
+        self.conversations_written: t.Optional[Marks] = None
+        # Guild ID: {dimensions: {"file": matrix filename, "names": entry name of each row}}
+        self.vector_files: t.Dict[int, t.Dict[str, dict]] = {}
+        # Embeddings of guilds whose vectors haven't been read yet
+        self.placeholders: t.Dict[int, t.Dict[str, Embedding]] = {}
+        self.lock = threading.Lock()
+        # Nothing is written until the existing data has been read, so a failed load can't clobber it
+        self.ready = False
+
+    @property
+    def exists(self) -> bool:
+        return self.settings_file.exists()
+
+    def load(self) -> t.Optional[DB]:
+        """Load the DB with embedding vectors left unread, or None if nothing has been saved in this format yet"""
+        if not self.exists:
+            self.ready = True
+            return None
+        db = DB.model_validate(orjson.loads(self.settings_file.read_bytes()))
+        self.written["settings"] = self.dump_settings(db)
+
+        if self.conversations_file.exists():
+            try:
+                conversations = orjson.loads(self.conversations_file.read_bytes())
+                db.conversations = {key: Conversation.model_validate(convo) for key, convo in conversations.items()}
+            except (ValidationError, orjson.JSONDecodeError) as e:
+                log.error("Failed to load conversations, they will be cleared", exc_info=e)
+        self.conversations_written = conversation_marks(db.conversations)
+
+        if self.guilds_dir.is_dir():
+            for guild_dir in self.guilds_dir.iterdir():
+                if not guild_dir.name.isdigit() or not (guild_dir / "settings.json").exists():
+                    continue
+                try:
+                    db.configs[int(guild_dir.name)] = self.load_guild(int(guild_dir.name), guild_dir)
+                except Exception as e:
+                    # Leave the files alone, they're only rewritten if the guild is modified
+                    log.error(f"Failed to load config for guild {guild_dir.name}", exc_info=e)
+        self.ready = True
+        return db
+
+    def verify(self, db: DB) -> bool:
+        """Read the shards back with a fresh store and check they hold the same data as the DB"""
+        loaded = ShardStore(self.root).load()
+        if loaded is None or self.dump_settings(loaded) != self.dump_settings(db):
+            return False
+        if loaded.configs.keys() != db.configs.keys() or loaded.conversations.keys() != db.conversations.keys():
+            return False
+        for guild_id, conf in db.configs.items():
+            other = loaded.configs[guild_id]
+            if self.dump_guild(other) != self.dump_guild(conf) or other.embeddings.keys() != conf.embeddings.keys():
+                return False
+            other.ensure_vectors()
+            for name, em in conf.embeddings.items():
+                # Vectors are stored as float32 so only their size is compared
+                if other.embeddings[name].text != em.text or len(other.embeddings[name].embedding) != len(em.embedding):
+                    return False
+        return True
+
+    def load_guild(self, guild_id: int, guild_dir: Path) -> GuildSettings:
+        conf = GuildSettings.model_validate(orjson.loads((guild_dir / "settings.json").read_bytes()))
+        self.written[guild_id] = self.dump_guild(conf)
+        index_path = guild_dir / "embeddings.json"
+        if not index_path.exists():
+            self.embeddings_written[guild_id] = {}
+            return conf
+        index = orjson.loads(index_path.read_bytes())
+        placeholder = {
+            name: Embedding.model_validate({**entry, "embedding": []}) for name, entry in index["entries"].items()
+        }
+        conf.embeddings = placeholder
+        self.placeholders[guild_id] = placeholder
+        self.vector_files[guild_id] = index["vectors"]
+        # Entries edited before their vectors are read show up as changed against these
+        self.embeddings_written[guild_id] = embedding_marks(placeholder)
+        conf._vector_loader = self.make_loader(guild_id, conf, placeholder)
+        return conf
+
+    def make_loader(self, guild_id: int, conf: GuildSettings, placeholder: t.Dict[str, Embedding]) -> t.Callable:
+        lock = threading.Lock()
+
+        def load():
+            with lock:
+                if conf._vector_loader is None:
+                    return
+                # The embeddings may have been replaced wholesale before ever being read
+                if conf.embeddings is placeholder:
+                    filled = {}
+                    try:
+                        filled = self.read_vectors(guild_id, placeholder)
+                    except Exception as e:
+                        log.error(f"Failed to load embedding vectors for guild {guild_id}", exc_info=e)
+                    # The vectors read from disk match what was written, other edits since loading still show up
+                    marks = self.embeddings_written.get(guild_id)
+                    if marks is not None:
+                        read = {
+                            name: ((em, em.embedding), marks[name][1]) for name, em in filled.items() if name in marks
+                        }
+                        self.embeddings_written[guild_id] = {**marks, **read}
+                conf._vector_loader = None
+                self.placeholders.pop(guild_id, None)
+
+        return load
+
+    def read_vectors(self, guild_id: int, embeddings: t.Dict[str, Embedding]) -> t.Dict[str, Embedding]:
+        """Fill in the vectors of entries that haven't been given a new one since loading
+
+        Returns:
+            t.Dict[str, Embedding]: The entries that were filled in
+        """
+        filled = {}
+        guild_dir = self.guilds_dir / str(guild_id)
+        for group in self.vector_files.get(guild_id, {}).values():
+            # Memory mapped so rows are converted straight from the page cache without a full copy first
+            matrix = np.load(guild_dir / group["file"], mmap_mode="r", allow_pickle=False)
+            for row, name in enumerate(group["names"]):
+                if (em := embeddings.get(name)) is not None and not em.embedding:
+                    em.embedding = matrix[row].tolist()
+                    filled[name] = em
+        return filled
+
+    def dump_settings(self, db: DB) -> bytes:
+        return orjson.dumps(db.model_dump(exclude={"configs", "conversations"}))
+
+    def dump_guild(self, conf: GuildSettings) -> bytes:
+        return orjson.dumps(conf.model_dump(exclude={"embeddings"}))
+
+    def save(self, db: DB) -> int:
+        """Write any part of the DB that changed since it was last written
+
+        Returns:
+            int: The number of files written
+        """
+        if not self.ready:
+            log.warning("Skipping save, existing data has not been loaded")
+            return 0
+        with self.lock:
+            written = 0
+            settings = self.dump_settings(db)
+            if settings != self.written.get("settings"):
+                write_atomic(self.settings_file, settings)
+                self.written["settings"] = settings
+                written += 1
+
+            marks = conversation_marks(db.conversations)
+            if not unchanged(self.conversations_written, marks):
+                dump = {key: convo.model_dump() for key, ((convo, *_), _values) in marks.items()}
+                write_atomic(self.conversations_file, orjson.dumps(dump))
+                self.conversations_written = marks
+                written += 1
+
+            configs = dict(db.configs)
+            for guild_id, conf in configs.items():
+                written += self.save_guild(guild_id, conf)
+
+            # Remove guilds that no longer have a config
+            for guild_id in [i for i in self.written if isinstance(i, int) and i not in configs]:
+                shutil.rmtree(self.guilds_dir / str(guild_id), ignore_errors=True)
+                self.written.pop(guild_id, None)
+                self.embeddings_written.pop(guild_id, None)
+                self.vector_files.pop(guild_id, None)
+                self.placeholders.pop(guild_id, None)
+            return written
+
+    def save_guild(self, guild_id: int, conf: GuildSettings) -> int:
+        written = 0
+        guild_dir = self.guilds_dir / str(guild_id)
+        settings = self.dump_guild(conf)
+        if settings != self.written.get(guild_id):
+            write_atomic(guild_dir / "settings.json", settings)
+            self.written[guild_id] = settings
+            written += 1
+
+        if conf._vector_loader is not None:
+            placeholder = self.placeholders.get(guild_id)
+            if conf.embeddings is placeholder:
+                if unchanged(self.embeddings_written.get(guild_id), embedding_marks(placeholder)):
+                    # Neither read nor modified since loading, so there is nothing new to write
+                    return written
+            # Every vector is needed to write the matrices, or the loader just drops a replaced placeholder
+            conf._vector_loader()
+        marks = embedding_marks(conf.embeddings)
+        if not unchanged(self.embeddings_written.get(guild_id), marks):
+            self.write_embeddings(guild_id, guild_dir, marks)
+            self.embeddings_written[guild_id] = marks
+            written += 1
+        return written
+
+    def write_embeddings(self, guild_id: int, guild_dir: Path, marks: Marks) -> None:
+        entries = {}
+        groups: t.Dict[int, t.List[t.Tuple[str, t.List[float]]]] = {}
+        for name, ((em, *_), _values) in marks.items():
+            entries[name] = em.model_dump(exclude={"embedding"})
+            if em.embedding:
+                groups.setdefault(len(em.embedding), []).append((name, em.embedding))
+
+        # Matrices get a fresh name each write so the index never points at a half written file
+        vectors = {}
+        for dims, rows in groups.items():
+            filename = f"{dims}-{uuid4().hex[:8]}.npy"
+            write_atomic(guild_dir / filename, np.array([vector for _, vector in rows], dtype=np.float32))
+            vectors[str(dims)] = {"file": filename, "names": [name for name, _ in rows]}
+        guild_dir.mkdir(parents=True, exist_ok=True)
+        write_atomic(guild_dir / "embeddings.json", orjson.dumps({"entries": entries, "vectors": vectors}))
+        self.vector_files[guild_id] = vectors
+
+        keep = {group["file"] for group in vectors.values()}
+        for path in guild_dir.glob("*.npy"):
+            if path.name not in keep:
+                path.unlink(missing_ok=True)
@@ -0,0 +1,128 @@
+import json
+import logging
+import typing as t
+
+from openai.types.chat import ChatCompletionChunk
+from openai.types.chat.chat_completion_message import (
+    ChatCompletionMessage,
+    FunctionCall,
+)
+from openai.types.chat.chat_completion_message_tool_call import (
+    ChatCompletionMessageToolCall,
+)
+from openai.types.completion_usage import CompletionUsage
+
+log = logging.getLogger("red.vrt.assistant.streaming")
+
+
+class StreamAccumulator:
+    """Assembles streamed chat completion chunks back into a single message
+
+    Tool calls arrive as fragments keyed by their index in the final list, with the ID and name in the first
+    fragment and the arguments JSON split across the rest.
+    """
+
+    def __init__(self):
+        self.content: t.List[str] = []
+        self.tool_calls: t.Dict[int, dict] = {}
+        self.function_call: t.Optional[dict] = None
+        self.model: t.Optional[str] = None
+        self.usage: t.Optional[CompletionUsage] = None
+
+    def add(self, chunk: ChatCompletionChunk) -> str:
+        """Merge a chunk, returning any new reply text"""
+        if chunk.model:
+            self.model = chunk.model
+        if chunk.usage:
+            # Only sent in the final chunk when usage is requested
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return ""
+        delta = chunk.choices[0].delta
+        for fragment in delta.tool_calls or []:
+            call = self.tool_calls.setdefault(
+                fragment.index,
+                {"id": "", "type": "function", "function": {"name": "", "arguments": ""}},
+            )
+            if fragment.id:
+                call["id"] = fragment.id
+            if fragment.function:
+                call["function"]["name"] += fragment.function.name or ""
+                call["function"]["arguments"] += fragment.function.arguments or ""
+        if delta.function_call:
+            if self.function_call is None:
+                self.function_call = {"name": "", "arguments": ""}
+            self.function_call["name"] += delta.function_call.name or ""
+            self.function_call["arguments"] += delta.function_call.arguments or ""
+        if delta.content:
+            self.content.append(delta.content)
+            return delta.content
+        return ""
+
+    def message(self) -> ChatCompletionMessage:
+        tool_calls = [ChatCompletionMessageToolCall(**self.tool_calls[idx]) for idx in sorted(self.tool_calls)]
+        return ChatCompletionMessage(
+            role="assistant",
+            content="".join(self.content) or None,
+            tool_calls=tool_calls or None,
+            function_call=FunctionCall(**self.function_call) if self.function_call else None,
+        )
+
+
+class GeminiStreamAccumulator:
+    """Merges streamed Gemini responses into the shape of a single generateContent response
+
+    Each streamed response carries the next parts of the first candidate. Text parts are joined, function calls
+    always arrive whole, and the usage metadata of the last response covers the whole stream.
+    """
+
+    def __init__(self):
+        self.text: t.List[str] = []
+        self.parts: t.List[dict] = []
+        self.response: t.Dict[str, t.Any] = {}
+
+    def add(self, data: dict) -> str:
+        """Merge a streamed response, returning any new reply text"""
+        for key in ("usageMetadata", "promptFeedback", "modelVersion", "error"):
+            if key in data:
+                self.response[key] = data[key]
+        text = ""
+        for candidate in data.get("candidates", [])[:1]:
+            if finish_reason := candidate.get("finishReason"):
+                self.response["finishReason"] = finish_reason
+            for part in candidate.get("content", {}).get("parts", []):
+                if "text" in part:
+                    text += part["text"]
+                else:
+                    self.flush()
+                    self.parts.append(part)
+        if text:
+            self.text.append(text)
+        return text
+
+    def flush(self) -> None:
+        if self.text:
+            self.parts.append({"text": "".join(self.text)})
+            self.text = []
+
+    def add_line(self, line: bytes) -> str:
+        """Merge a line of the server sent event stream"""
+        line = line.strip()
+        if not line.startswith(b"data:"):
+            return ""
+        try:
+            data = json.loads(line[5:])
+        except json.JSONDecodeError:
+            log.warning(f"Skipping malformed Gemini stream event: {line[:200]}")
+            return ""
+        return self.add(data)
+
+    def result(self) -> dict:
+        self.flush()
+        response = {key: value for key, value in self.response.items() if key != "finishReason"}
+        if self.parts or "finishReason" in self.response:
+            candidate = {"content": {"role": "model", "parts": self.parts}}
+            if "finishReason" in self.response:
+                candidate["finishReason"] = self.response["finishReason"]
+            response["candidates"] = [candidate]
+        return response
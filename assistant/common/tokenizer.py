@@ -0,0 +1,150 @@
+import functools
+import json
+import logging
+import threading
+import typing as t
+from collections import OrderedDict
+
+import tiktoken
+
+log = logging.getLogger("red.vrt.assistant.tokenizer")
+
+
+@functools.lru_cache(maxsize=64)
+def get_encoding(model_name: str) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        log.warning(f"Tiktoken encoding not found for model {model_name}. Using o200k_base.")
+        return tiktoken.get_encoding("o200k_base")
+
+
+class TokenCache:
+    """Token counts of function schemas memoized by their JSON
+
+    The same schemas are sent every turn, so each one only has to be encoded once per model.
+    Keying on the serialized schema means edited schemas are recounted and no schema dicts are kept alive.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.entries: OrderedDict[t.Tuple[str, t.Hashable], int] = OrderedDict()
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+    def count(self, obj: dict, tag: t.Hashable, counter: t.Callable[[dict], int]) -> int:
+        """Get the cached count of a dict, or count it with the counter
+
+        Args:
+            obj (dict): The function schema
+            tag (t.Hashable): Anything else the count depends on, such as the encoding name
+            counter (t.Callable[[dict], int]): Counts the tokens of the dict on a miss
+        """
+        key = (json.dumps(obj, sort_keys=True), tag)
+        with self.lock:
+            cached = self.entries.get(key)
+            if cached is not None:
+                self.entries.move_to_end(key)
+                return cached
+        tokens = counter(obj)
+        with self.lock:
+            self.entries[key] = tokens
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return tokens
+
+
+TOKENS = TokenCache()
+
+
+class TokenCounts:
+    """Token counts of a conversation's messages, so only new or edited messages are encoded each turn
+
+    Lives on the conversation it counts for. Entries are looked up by message id and only reused if the message
+    still has the same fingerprint, so in-place edits (including to list content) are recounted and a reused id
+    can't return a stale count. Counting a full payload drops entries for messages that are no longer in it.
+    """
+
+    def __init__(self):
+        self.entries: t.Dict[int, t.Tuple[str, tuple, int]] = {}
+        self.lock = threading.Lock()
+
+    def count(self, message: dict, encoding: tiktoken.Encoding) -> int:
+        key = id(message)
+        current = fingerprint(message)
+        with self.lock:
+            cached = self.entries.get(key)
+        if cached is not None and cached[0] == encoding.name and cached[1] == current:
+            return cached[2]
+        tokens = count_message(message, encoding)
+        with self.lock:
+            self.entries[key] = (encoding.name, current, tokens)
+        return tokens
+
+    def prune(self, messages: t.List[dict]) -> None:
+        keep = {id(message) for message in messages}
+        with self.lock:
+            self.entries = {k: v for k, v in self.entries.items() if k in keep}
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+def fingerprint(message: dict) -> tuple:
+    """The parts of a message its token count depends on, compared to tell if a cached count is still valid"""
+    parts = []
+    for key, value in message.items():
+        if isinstance(value, list) and key == "content":
+            value = tuple(item.get("text") for item in value if item.get("type") == "text")
+        elif value is not None and not isinstance(value, str):
+            value = json.dumps(value)
+        parts.append((key, value))
+    return tuple(parts)
+
+
+def count_message(message: dict, encoding: tiktoken.Encoding) -> int:
+    """Tokens used by a single message in a chat payload"""
+    tokens_per_message = 3
+    tokens_per_name = 1
+    num_tokens = tokens_per_message
+    for key, value in message.items():
+        if key == "content" and value is None:
+            continue
+        if isinstance(value, list) and key == "content":
+            for item in value:
+                if item.get("type") == "text" and item.get("text"):
+                    num_tokens += len(encoding.encode(str(item["text"])))
+        elif isinstance(value, str):
+            num_tokens += len(encoding.encode(value))
+        else:
+            num_tokens += len(encoding.encode(json.dumps(value)))
+
+        if key == "name":
+            num_tokens += tokens_per_name
+    return num_tokens
+
+
+def message_tokens(message: dict, model_name: str, counts: t.Optional[TokenCounts] = None) -> int:
+    """Token count of a message, served from the conversation's counts if given"""
+    encoding = get_encoding(model_name)
+    if counts is None:
+        return count_message(message, encoding)
+    return counts.count(message, encoding)
+
+
+def payload_tokens(messages: t.List[dict], model_name: str, counts: t.Optional[TokenCounts] = None) -> int:
+    """Token count of a chat payload
+
+    If the conversation's counts are given, only messages that are new or edited since the last count are encoded.
+    """
+    if not messages:
+        return 0
+    encoding = get_encoding(model_name)
+    if counts is None:
+        total = sum(count_message(message, encoding) for message in messages)
+    else:
+        total = sum(counts.count(message, encoding) for message in messages)
+        counts.prune(messages)
+    # Every reply is primed with 3 tokens
+    return total + 3
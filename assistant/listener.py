@@ -140,6 +140,25 @@ class AssistantListener(MixinMeta):
         finally:
             self.responding_to.discard(message.author.id)
 
+    @commands.Cog.listener("on_message")
+    async def track_history(self, message: discord.Message):
+        # Channels only show up in the history cache once their context has been used
+        if message.guild:
+            self.channel_history.add(message)
+
+    @commands.Cog.listener("on_raw_message_edit")
+    async def track_history_edit(self, payload: discord.RawMessageUpdateEvent):
+        if "content" in payload.data:
+            self.channel_history.edit(payload.channel_id, payload.message_id, payload.data["content"])
+
+    @commands.Cog.listener("on_raw_message_delete")
+    async def track_history_delete(self, payload: discord.RawMessageDeleteEvent):
+        self.channel_history.delete(payload.channel_id, [payload.message_id])
+
+    @commands.Cog.listener("on_raw_bulk_message_delete")
+    async def track_history_bulk_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        self.channel_history.delete(payload.channel_id, payload.message_ids)
+
     @commands.Cog.listener("on_guild_remove")
     async def cleanup(self, guild: discord.Guild):
         if guild.id in self.db.configs:
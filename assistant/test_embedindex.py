@@ -0,0 +1,90 @@
+import random
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+try:
+    from .common.embedindex import EmbeddingIndex
+except ImportError:
+    from assistant.common.embedindex import EmbeddingIndex
+
+
+def loop_search(embeddings: dict, query: list, top_n: int, min_relatedness: float):
+    # The per-entry loop the index replaced
+    results = []
+    for name, em in embeddings.items():
+        if len(query) != len(em.embedding):
+            continue
+        score = np.dot(query, em.embedding) / (np.linalg.norm(query) * np.linalg.norm(em.embedding))
+        if score >= min_relatedness:
+            results.append((name, score))
+    results.sort(key=lambda x: x[1], reverse=True)
+    return results[:top_n]
+
+
+def assert_same(found: list, expected: list):
+    assert [name for name, _ in found] == [name for name, _ in expected]
+    assert [score for _, score in found] == pytest.approx([score for _, score in expected], abs=1e-5)
+
+
+def make_embedding(dims: int) -> SimpleNamespace:
+    return SimpleNamespace(embedding=np.random.rand(dims).tolist())
+
+
+@pytest.fixture
+def embeddings():
+    random.seed(7)
+    np.random.seed(7)
+    embeddings = {f"entry-{i}": make_embedding(64) for i in range(300)}
+    # Entries with other dimensions are never compared with the query
+    embeddings.update({f"other-{i}": make_embedding(32) for i in range(20)})
+    return embeddings
+
+
+def test_matches_loop(embeddings):
+    index = EmbeddingIndex()
+    index.sync(embeddings)
+    for _ in range(10):
+        query = np.random.rand(64).tolist()
+        assert_same(index.search(query, 5, 0.5), loop_search(embeddings, query, 5, 0.5))
+    assert index.search(np.random.rand(16).tolist(), 5, 0) == []
+
+
+def test_sync_after_changes(embeddings):
+    index = EmbeddingIndex()
+    index.sync(embeddings)
+    for name in random.sample(sorted(embeddings), 40):
+        del embeddings[name]
+    for name in random.sample(sorted(embeddings), 40):
+        embeddings[name].embedding = np.random.rand(64).tolist()
+    for i in range(40):
+        embeddings[f"new-{i}"] = make_embedding(64)
+    index.sync(embeddings)
+    for _ in range(10):
+        query = np.random.rand(64).tolist()
+        assert_same(index.search(query, 10, 0), loop_search(embeddings, query, 10, 0))
+
+
+def test_approximate_search_probing_every_cluster(embeddings):
+    index = EmbeddingIndex()
+    index.sync(embeddings)
+    query = np.random.rand(64).tolist()
+    # With every cluster probed the approximate search scores every entry
+    found = index.search(query, 10, 0, probes=1000)
+    assert index.groups[64].ivf is not None
+    assert_same(found, loop_search(embeddings, query, 10, 0))
+
+
+def test_ivf_save_and_load(embeddings, tmp_path):
+    index = EmbeddingIndex()
+    index.sync(embeddings)
+    query = np.random.rand(64).tolist()
+    expected = index.search(query, 10, 0, probes=4)
+    path = tmp_path / "ivf.npz"
+    index.save_ivf(path)
+
+    loaded = EmbeddingIndex()
+    loaded.load_ivf(path, embeddings)
+    assert not loaded.ivf_changed
+    assert_same(loaded.search(query, 10, 0, probes=4), expected)
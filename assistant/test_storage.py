@@ -0,0 +1,102 @@
+from pathlib import Path
+
+import pytest
+
+try:
+    from .common.models import DB, Embedding
+    from .common.storage import ShardStore
+except ImportError:
+    from assistant.common.models import DB, Embedding
+    from assistant.common.storage import ShardStore
+
+
+@pytest.fixture
+def db():
+    db = DB()
+    for guild_id in (1, 2):
+        conf = db.get_conf(guild_id)
+        conf.system_prompt = f"Guild {guild_id}"
+        for i in range(20):
+            # Whole numbers survive the float32 matrices exactly
+            conf.embeddings[f"entry-{i}"] = Embedding(text=f"text {i}", embedding=[float(i)] * 8)
+        conf.embeddings["small"] = Embedding(text="other dimensions", embedding=[1.0, 2.0])
+    convo = db.get_conversation(10, 20, 1)
+    convo.messages.append({"role": "user", "content": "hello"})
+    return db
+
+
+def save(db: DB, root: Path) -> ShardStore:
+    store = ShardStore(root)
+    # Nothing is written until the store has loaded
+    store.load()
+    store.save(db)
+    return store
+
+
+def reload(root: Path):
+    store = ShardStore(root)
+    return store, store.load()
+
+
+def test_round_trip(db, tmp_path: Path):
+    store = ShardStore(tmp_path)
+    assert store.load() is None
+    assert store.save(db)
+    assert store.verify(db)
+
+    _, loaded = reload(tmp_path)
+    assert loaded.configs.keys() == db.configs.keys()
+    assert loaded.get_conf(1).system_prompt == "Guild 1"
+    assert loaded.get_conversation(10, 20, 1).messages == [{"role": "user", "content": "hello"}]
+    conf = loaded.get_conf(2)
+    # Vectors are only read once asked for
+    assert conf._vector_loader is not None
+    assert conf.embeddings["entry-3"].embedding == []
+    conf.ensure_vectors()
+    for name, em in db.get_conf(2).embeddings.items():
+        assert conf.embeddings[name].text == em.text
+        assert conf.embeddings[name].embedding == em.embedding
+
+
+def test_unchanged_saves_write_nothing(db, tmp_path: Path):
+    save(db, tmp_path)
+    store, loaded = reload(tmp_path)
+    assert store.save(loaded) == 0
+    loaded.get_conf(1).ensure_vectors()
+    assert store.save(loaded) == 0
+
+
+def test_edits_before_vectors_are_read(db, tmp_path: Path):
+    save(db, tmp_path)
+    store, loaded = reload(tmp_path)
+    conf = loaded.get_conf(1)
+    conf.embeddings["entry-3"].text = "edited"
+    conf.embeddings["entry-3"].embedding = [9.0] * 8
+    del conf.embeddings["entry-4"]
+    assert store.save(loaded)
+    assert store.save(loaded) == 0
+
+    _, reloaded = reload(tmp_path)
+    conf = reloaded.get_conf(1)
+    conf.ensure_vectors()
+    assert conf.embeddings["entry-3"].text == "edited"
+    assert conf.embeddings["entry-3"].embedding == [9.0] * 8
+    assert "entry-4" not in conf.embeddings
+    assert conf.embeddings["entry-5"].embedding == [5.0] * 8
+
+
+def test_in_place_conversation_edits(db, tmp_path: Path):
+    store = save(db, tmp_path)
+    db.get_conversation(10, 20, 1).messages[0]["content"] = "edited"
+    assert store.save(db) == 1
+
+    _, loaded = reload(tmp_path)
+    assert loaded.get_conversation(10, 20, 1).messages[0]["content"] == "edited"
+
+
+def test_removed_guilds(db, tmp_path: Path):
+    store = save(db, tmp_path)
+    del db.configs[2]
+    store.save(db)
+    assert not (tmp_path / "guilds" / "2").exists()
+    assert store.verify(db)
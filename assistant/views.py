@@ -12,6 +12,7 @@ from redbot.core import commands
 from redbot.core.i18n import Translator
 from redbot.core.utils.chat_formatting import box, pagify, text_to_file
 
+from .common.functioncache import COMPILED
 from .common.models import DB, CustomFunction, Embedding, GuildSettings
 from .common.utils import (
     code_string_valid,
@@ -720,6 +721,7 @@ class CodeMenu(discord.ui.View):
         if function_name != new_name:
             self.db.functions[new_name] = CustomFunction(code=code, jsonschema=schema)
             del self.db.functions[function_name]
+            COMPILED.discard(function_name)
         else:
             self.db.functions[function_name].code = code
             self.db.functions[function_name].jsonschema = schema
@@ -745,6 +747,7 @@ class CodeMenu(discord.ui.View):
                 ephemeral=True,
             )
         del self.db.functions[function_name]
+        COMPILED.discard(function_name)
         await self.get_pages()
         self.page %= len(self.pages)
         self.update_button()
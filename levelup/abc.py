@@ -5,12 +5,15 @@ from abc import ABC, ABCMeta, abstractmethod
 from datetime import datetime
 from pathlib import Path
 
+import aiohttp
 import discord
 from discord.ext.commands.cog import CogMeta
 from redbot.core import commands
 from redbot.core.bot import Red
 
-from .common.models import DB, GuildSettings, Profile, VoiceTracking
+from .common.models import DB, GuildSettings, Profile, QueuedXP, VoiceTracking
+from .generator.rendercache import RenderCache
+from .generator.renderpool import RenderPool
 from .generator.tenor.converter import TenorAPI
 
 
@@ -28,8 +31,11 @@ class MixinMeta(ABC):
         self.db: DB
         self.lastmsg: t.Dict[int, t.Dict[int, float]]
         self.voice_tracking: t.Dict[int, t.Dict[int, VoiceTracking]]
-        self.profile_cache: t.Dict[int, t.Dict[int, t.Tuple[str, bytes]]]
+        self.profile_cache: t.Dict[int, t.Dict[int, t.Tuple[float, str]]]
+        self.render_cache: RenderCache
+        self.render_pool: RenderPool
         self.stars: t.Dict[int, t.Dict[int, datetime]]
+        self.xp_queue: t.List[QueuedXP]
 
         self.cog_path: Path
         self.bundled_path: Path
@@ -43,15 +49,27 @@ class MixinMeta(ABC):
 
         # Save state
         self.last_save: float
+        self.dirty_guilds: t.Set[int]
 
         # Tenor
         self.tenor: TenorAPI
 
         # Internal API
         self.api_proc: t.Union[asyncio.subprocess.Process, mp.Process]
+        self.api_socket: Path
+        self.api_session: aiohttp.ClientSession
+        self.api_socket_session: t.Optional[aiohttp.ClientSession]
 
     @abstractmethod
-    def save(self) -> None:
+    def save(self, guild: t.Union[discord.Guild, int, None] = None, full: bool = False) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def configure_render_cache(self) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_api_socket_session(self) -> aiohttp.ClientSession:
         raise NotImplementedError
 
     @abstractmethod
@@ -66,6 +84,15 @@ class MixinMeta(ABC):
     async def initialize_voice_states(self) -> int:
         raise NotImplementedError
 
+    @abstractmethod
+    async def apply_queued_xp(self, queue: t.List[QueuedXP]) -> int:
+        raise NotImplementedError
+
+    # -------------------------- tasks --------------------------
+    @abstractmethod
+    def set_xp_batch_interval(self, milliseconds: int) -> None:
+        raise NotImplementedError
+
     # -------------------------- levelups.py --------------------------
     @abstractmethod
     async def check_levelups(
@@ -124,6 +151,24 @@ class MixinMeta(ABC):
     ) -> t.Union[discord.Embed, discord.File]:
         raise NotImplementedError
 
+    @abstractmethod
+    async def render_user_profile(
+        self, member: discord.Member, reraise: bool = False
+    ) -> t.Union[discord.Embed, t.Tuple[str, bytes, bool]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def request_render(self, endpoint: str, payload: aiohttp.FormData) -> t.Optional[t.Tuple[bytes, bool]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def render_pool_busy(self) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def render_image(self, kind: str, **kwargs) -> t.Tuple[bytes, bool]:
+        raise NotImplementedError
+
     @abstractmethod
     async def get_user_profile_cached(self, member: discord.Member) -> t.Union[discord.File, discord.Embed]:
         raise NotImplementedError
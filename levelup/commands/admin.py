@@ -213,10 +213,10 @@ class Admin(MixinMeta):
             )
         if style == "none":
             conf.style_override = None
-            self.save()
+            self.save(ctx.guild)
             return await ctx.send(_("Style override has been **disabled**!"))
         conf.style_override = style
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Style override has been set to **{}**").format(style))
 
     @levelset.command(name="toggle")
@@ -225,7 +225,7 @@ class Admin(MixinMeta):
         conf = self.db.get_conf(ctx.guild)
         status = _("**Disabled**") if conf.enabled else _("**Enabled**")
         conf.enabled = not conf.enabled
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("LevelUp has been {}").format(status))
 
     @levelset.command(name="rolegroup")
@@ -248,7 +248,7 @@ class Admin(MixinMeta):
             txt = _("The role {} will now gain expecience points from all members that have it.").format(
                 f"<@&{role_id}>"
             )
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(txt)
 
     @levelset.command(name="addxp")
@@ -264,7 +264,7 @@ class Admin(MixinMeta):
             profile = conf.get_profile(user_or_role)
             profile.xp += xp
             txt = _("Added {} XP to {}").format(xp, user_or_role.name)
-            self.save()
+            self.save(ctx.guild)
             return await ctx.send(txt)
         for user in user_or_role.members:
             profile = conf.get_profile(user)
@@ -275,7 +275,7 @@ class Admin(MixinMeta):
             user_or_role.mention,
         )
         await ctx.send(txt)
-        self.save()
+        self.save(ctx.guild)
 
     @levelset.command(name="removexp")
     async def remove_xp_from_user(
@@ -290,7 +290,7 @@ class Admin(MixinMeta):
             profile = conf.get_profile(user_or_role)
             profile.xp -= min(profile.xp, xp)
             txt = _("Removed {} XP from {}").format(min(profile.xp, xp), user_or_role.name)
-            self.save()
+            self.save(ctx.guild)
             return await ctx.send(txt)
         for user in user_or_role.members:
             profile = conf.get_profile(user)
@@ -301,7 +301,7 @@ class Admin(MixinMeta):
             user_or_role.mention,
         )
         await ctx.send(txt)
-        self.save()
+        self.save(ctx.guild)
 
     @levelset.command(name="algorithm", aliases=["algo"])
     async def set_level_algorithm(
@@ -337,7 +337,7 @@ class Admin(MixinMeta):
                 return await ctx.send(_("Base must be greater than 0"))
         conf = self.db.get_conf(ctx.guild)
         setattr(conf.algorithm, part, value)
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Algorithm {} has been set to {}").format(part, value))
 
     @levelset.command(name="commandxp")
@@ -346,7 +346,7 @@ class Admin(MixinMeta):
         conf = self.db.get_conf(ctx.guild)
         status = _("**Disabled**") if conf.command_xp else _("**Enabled**")
         conf.command_xp = not conf.command_xp
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Command XP has been {}").format(status))
 
     @levelset.command(name="dm")
@@ -359,7 +359,7 @@ class Admin(MixinMeta):
         conf = self.db.get_conf(ctx.guild)
         status = _("**Disabled**") if conf.notifydm else _("**Enabled**")
         conf.notifydm = not conf.notifydm
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("DM notifications have been {}").format(status))
 
     @levelset.command(name="resetemojis")
@@ -367,7 +367,7 @@ class Admin(MixinMeta):
         """Reset the emojis to default"""
         conf = self.db.get_conf(ctx.guild)
         conf.emojis = Emojis()
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Emojis have been reset to default"))
 
     @levelset.command(name="emojis")
@@ -415,7 +415,7 @@ class Admin(MixinMeta):
         conf.emojis.mic = get_emoji_value(voicetime)
         conf.emojis.bulb = get_emoji_value(experience)
         conf.emojis.money = get_emoji_value(balance)
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Emojis have been set"))
 
     @levelset.command(name="embeds")
@@ -425,11 +425,11 @@ class Admin(MixinMeta):
         if self.db.force_embeds:
             txt = _("Profile rendering is locked to Embeds only by the bot owner!")
             conf.use_embeds = False
-            self.save()
+            self.save(ctx.guild)
             return await ctx.send(txt)
         status = _("**Images**") if conf.use_embeds else _("**Embeds**")
         conf.use_embeds = not conf.use_embeds
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Profile rendering has been set to {}").format(status))
 
     @levelset.command(name="levelchannel")
@@ -450,10 +450,10 @@ class Admin(MixinMeta):
             return await ctx.send_help()
         if not channel and conf.notifylog:
             conf.notifylog = 0
-            self.save()
+            self.save(ctx.guild)
             return await ctx.send(_("LevelUp messages will no longer be sent to a specific channel"))
         conf.notifylog = channel.id
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("LevelUp messages will now be sent to {}").format(channel.mention))
 
     @levelset.command(name="levelnotify")
@@ -466,7 +466,7 @@ class Admin(MixinMeta):
         conf = self.db.get_conf(ctx.guild)
         status = _("**Disabled**") if conf.notify else _("**Enabled**")
         conf.notify = not conf.notify
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("LevelUp notifications have been {}").format(status))
 
     @levelset.command(name="mention")
@@ -479,7 +479,7 @@ class Admin(MixinMeta):
         conf = self.db.get_conf(ctx.guild)
         status = _("**Disabled**") if conf.notifymention else _("**Enabled**")
         conf.notifymention = not conf.notifymention
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Mentioning user in LevelUp messages has been {}").format(status))
 
     @levelset.command(name="seelevels")
@@ -534,7 +534,7 @@ class Admin(MixinMeta):
             # Make sure xp is a valid number that python can actually handle
             if profile.xp > 1e308:
                 return await ctx.send(_("That level is too high!"))
-            self.save()
+            self.save(ctx.guild)
             reason = _("{} set {}'s level to {}").format(ctx.author.name, user.name, level)
             added, removed = await self.ensure_roles(user, conf, reason)
             if added or removed:
@@ -559,7 +559,7 @@ class Admin(MixinMeta):
             return await ctx.send(_("That prestige level does not exist!"))
         profile = conf.get_profile(user)
         profile.prestige = prestige
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("{} has been set to prestige level {}").format(user.name, prestige))
 
     @levelset.command(name="showbalance", aliases=["showbal"])
@@ -568,7 +568,7 @@ class Admin(MixinMeta):
         conf = self.db.get_conf(ctx.guild)
         status = _("**Disabled**") if conf.showbal else _("**Enabled**")
         conf.showbal = not conf.showbal
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Including economy balance in profiles has been {}").format(status))
 
     @levelset.command(name="starcooldown")
@@ -580,7 +580,7 @@ class Admin(MixinMeta):
         """
         conf = self.db.get_conf(ctx.guild)
         conf.starcooldown = seconds
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Star cooldown has been set to {} seconds").format(seconds))
 
     @levelset.command(name="starmention")
@@ -592,7 +592,7 @@ class Admin(MixinMeta):
         conf = self.db.get_conf(ctx.guild)
         status = _("**Disabled**") if conf.starmention else _("**Enabled**")
         conf.starmention = not conf.starmention
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Mentioning user when they receive a star has been {}").format(status))
 
     @levelset.command(name="starmentiondelete")
@@ -607,7 +607,7 @@ class Admin(MixinMeta):
             await ctx.send(_("Star mentions will be deleted after {} seconds").format(deleted_after))
         else:
             await ctx.send(_("Star mentions will not be auto-deleted"))
-        self.save()
+        self.save(ctx.guild)
 
     @levelset.group(name="allowed")
     async def allowed(self, ctx: commands.Context):
@@ -634,7 +634,7 @@ class Admin(MixinMeta):
         else:
             conf.allowedchannels.append(channel.id)
             txt = _("Channel {} has been added to the allowed list").format(channel.mention)
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(txt)
 
     @allowed.command(name="role")
@@ -657,7 +657,7 @@ class Admin(MixinMeta):
         else:
             conf.allowedroles.append(role.id)
             txt = _("Role {} has been added to the allowed list").format(role.mention)
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(txt)
 
     @levelset.group(name="ignore")
@@ -685,7 +685,7 @@ class Admin(MixinMeta):
         else:
             conf.ignoredchannels.append(channel.id)
             txt = _("Channel {} has been added to the ignore list").format(channel.mention)
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(txt)
 
     @ignore.command(name="role")
@@ -708,7 +708,7 @@ class Admin(MixinMeta):
         else:
             conf.ignoredroles.append(role.id)
             txt = _("Role {} has been added to the ignore list").format(role.mention)
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(txt)
 
     @ignore.command(name="user")
@@ -731,7 +731,7 @@ class Admin(MixinMeta):
         else:
             conf.ignoredusers.append(user.id)
             txt = _("User {} has been added to the ignore list").format(user.name)
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(txt)
 
     @levelset.group(name="levelupmessages", aliases=["lvlalerts", "levelalerts", "lvlmessages", "lvlmsg"])
@@ -785,7 +785,7 @@ class Admin(MixinMeta):
             return await ctx.send_help()
         if not message and conf.levelup_dm:
             conf.levelup_dm = None
-            self.save()
+            self.save(ctx.guild)
             return await ctx.send(_("LevelUp DM message has been removed"))
         kwargs = {
             "username": ctx.author.name,
@@ -799,7 +799,7 @@ class Admin(MixinMeta):
         except KeyError as e:
             return await ctx.send(_("Invalid placeholder used: {}").format(e))
         conf.levelup_dm = message
-        self.save()
+        self.save(ctx.guild)
         embed = discord.Embed(description=msg, color=await self.bot.get_embed_color(ctx))
         await ctx.send(_("LevelUp DM message has been set"), embed=embed)
 
@@ -822,7 +822,7 @@ class Admin(MixinMeta):
             return await ctx.send_help()
         if not message and conf.role_awarded_dm:
             conf.role_awarded_dm = None
-            self.save()
+            self.save(ctx.guild)
             return await ctx.send(_("LevelUp DM role message has been removed"))
         kwargs = {
             "username": ctx.author.name,
@@ -837,7 +837,7 @@ class Admin(MixinMeta):
         except KeyError as e:
             return await ctx.send(_("Invalid placeholder used: {}").format(e))
         conf.role_awarded_dm = message
-        self.save()
+        self.save(ctx.guild)
         embed = discord.Embed(description=msg, color=await self.bot.get_embed_color(ctx))
         await ctx.send(_("LevelUp DM role message has been set"), embed=embed)
 
@@ -859,7 +859,7 @@ class Admin(MixinMeta):
             return await ctx.send_help()
         if not message and conf.levelup_msg:
             conf.levelup_msg = ""
-            self.save()
+            self.save(ctx.guild)
             return await ctx.send(_("LevelUp message has been removed"))
         kwargs = {
             "username": ctx.author.name,
@@ -873,7 +873,7 @@ class Admin(MixinMeta):
         except KeyError as e:
             return await ctx.send(_("Invalid placeholder used: {}").format(e))
         conf.levelup_msg = message
-        self.save()
+        self.save(ctx.guild)
         embed = discord.Embed(description=msg, color=await self.bot.get_embed_color(ctx))
         await ctx.send(_("LevelUp message has been set"), embed=embed)
 
@@ -896,7 +896,7 @@ class Admin(MixinMeta):
             return await ctx.send_help()
         if not message and conf.role_awarded_msg:
             conf.role_awarded_msg = ""
-            self.save()
+            self.save(ctx.guild)
             return await ctx.send(_("LevelUp role message has been removed"))
         kwargs = {
             "username": ctx.author.name,
@@ -911,7 +911,7 @@ class Admin(MixinMeta):
         except KeyError as e:
             return await ctx.send(_("Invalid placeholder used: {}").format(e))
         conf.role_awarded_msg = message
-        self.save()
+        self.save(ctx.guild)
         embed = discord.Embed(description=msg, color=await self.bot.get_embed_color(ctx))
         await ctx.send(_("LevelUp role message has been set"), embed=embed)
 
@@ -940,16 +940,16 @@ class Admin(MixinMeta):
         if channel.id in conf.channelbonus.msg:
             if min_xp == 0 and max_xp == 0:
                 del conf.channelbonus.msg[channel.id]
-                self.save()
+                self.save(ctx.guild)
                 return await ctx.send(_("Channel bonus has been removed"))
             conf.channelbonus.msg[channel.id] = [min_xp, max_xp]
-            self.save()
+            self.save(ctx.guild)
             return await ctx.send(_("Channel bonus has been updated"))
 
         if min_xp == 0 and max_xp == 0:
             return await ctx.send(_("XP range cannot be 0"))
         conf.channelbonus.msg[channel.id] = [min_xp, max_xp]
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Channel bonus has been set"))
 
     @message_group.command(name="cooldown")
@@ -962,7 +962,7 @@ class Admin(MixinMeta):
         """
         conf = self.db.get_conf(ctx.guild)
         conf.cooldown = cooldown
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Cooldown has been set to {} seconds").format(cooldown))
 
     @message_group.command(name="length")
@@ -975,7 +975,7 @@ class Admin(MixinMeta):
         """
         conf = self.db.get_conf(ctx.guild)
         conf.min_length = length
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Minimum message length has been set to {}").format(length))
 
     @message_group.command(name="rolebonus")
@@ -999,13 +999,13 @@ class Admin(MixinMeta):
         if role.id in conf.rolebonus.msg:
             if min_xp == 0 and max_xp == 0:
                 del conf.rolebonus.msg[role.id]
-                self.save()
+                self.save(ctx.guild)
                 return await ctx.send(_("Role bonus has been removed"))
             conf.rolebonus.msg[role.id] = [min_xp, max_xp]
-            self.save()
+            self.save(ctx.guild)
             return await ctx.send(_("Role bonus has been updated"))
         conf.rolebonus.msg[role.id] = [min_xp, max_xp]
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Role bonus has been set"))
 
     @message_group.command(name="xp")
@@ -1022,7 +1022,7 @@ class Admin(MixinMeta):
         if min_xp == 0 and max_xp == 0:
             return await ctx.send(_("XP range cannot be 0"))
         conf.xp = [min_xp, max_xp]
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Message XP range has been set to {} - {}").format(min_xp, max_xp))
 
     @levelset.group(name="roles")
@@ -1035,7 +1035,7 @@ class Admin(MixinMeta):
         conf = self.db.get_conf(ctx.guild)
         status = _("**Disabled**") if conf.autoremove else _("**Enabled**")
         conf.autoremove = not conf.autoremove
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Automatic removal of previous level roles has been {}").format(status))
 
     @level_roles.command(name="add")
@@ -1051,7 +1051,7 @@ class Admin(MixinMeta):
         else:
             txt = _("The role associated with level {} has been added").format(level)
         conf.levelroles[level] = role.id
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(txt)
 
     @level_roles.command(name="remove", aliases=["rem", "del"])
@@ -1061,7 +1061,7 @@ class Admin(MixinMeta):
         if level not in conf.levelroles:
             return await ctx.send(_("There is no role associated with level {}").format(level))
         del conf.levelroles[level]
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("The role associated with level {} has been removed").format(level))
 
     @level_roles.command(name="initialize", aliases=["init"])
@@ -1141,15 +1141,15 @@ class Admin(MixinMeta):
         if channel.id in conf.channelbonus.voice:
             if min_xp == 0 and max_xp == 0:
                 del conf.channelbonus.voice[channel.id]
-                self.save()
+                self.save(ctx.guild)
                 return await ctx.send(_("Channel bonus has been removed"))
             conf.channelbonus.voice[channel.id] = [min_xp, max_xp]
-            self.save()
+            self.save(ctx.guild)
             return await ctx.send(_("Channel bonus has been updated"))
         if min_xp == 0 and max_xp == 0:
             return await ctx.send(_("XP range cannot be 0"))
         conf.channelbonus.voice[channel.id] = [min_xp, max_xp]
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Channel bonus has been set"))
 
     @voice_group.command(name="streambonus")
@@ -1168,10 +1168,10 @@ class Admin(MixinMeta):
             return await ctx.send(_("Min XP value cannot be greater than Max XP value"))
         if min_xp == 0 and max_xp == 0:
             conf.streambonus = None
-            self.save()
+            self.save(ctx.guild)
             return await ctx.send(_("Stream bonus has been removed"))
         conf.streambonus = [min_xp, max_xp]
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Stream bonus has been set"))
 
     @voice_group.command(name="rolebonus")
@@ -1195,15 +1195,15 @@ class Admin(MixinMeta):
         if role.id in conf.rolebonus.voice:
             if min_xp == 0 and max_xp == 0:
                 del conf.rolebonus.voice[role.id]
-                self.save()
+                self.save(ctx.guild)
                 return await ctx.send(_("Role bonus has been removed"))
             conf.rolebonus.voice[role.id] = [min_xp, max_xp]
-            self.save()
+            self.save(ctx.guild)
             return await ctx.send(_("Role bonus has been updated"))
         if min_xp == 0 and max_xp == 0:
             return await ctx.send(_("XP range cannot be 0"))
         conf.rolebonus.voice[role.id] = [min_xp, max_xp]
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Role bonus has been set"))
 
     @voice_group.command(name="deafened")
@@ -1219,7 +1219,7 @@ class Admin(MixinMeta):
         else:
             txt = _("Deafened users will no longer gain XP while in a voice channel")
             conf.ignore_deafened = True
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(txt)
 
     @voice_group.command(name="invisible")
@@ -1235,7 +1235,7 @@ class Admin(MixinMeta):
         else:
             txt = _("Invisible users will no longer gain XP while in a voice channel")
             conf.ignore_invisible = True
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(txt)
 
     @voice_group.command(name="muted")
@@ -1251,7 +1251,7 @@ class Admin(MixinMeta):
         else:
             txt = _("Muted users will no longer gain XP while in a voice channel")
             conf.ignore_muted = True
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(txt)
 
     @voice_group.command(name="solo")
@@ -1267,7 +1267,7 @@ class Admin(MixinMeta):
         else:
             txt = _("Solo users will no longer gain XP while in a voice channel")
             conf.ignore_solo = True
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(txt)
 
     @voice_group.command(name="xp")
@@ -1278,7 +1278,7 @@ class Admin(MixinMeta):
         """
         conf = self.db.get_conf(ctx.guild)
         conf.voicexp = voice_xp
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Voice XP has been set to {} per minute").format(voice_xp))
 
     @levelset.group(name="prestige")
@@ -1291,7 +1291,7 @@ class Admin(MixinMeta):
         conf = self.db.get_conf(ctx.guild)
         status = _("**Disabled**") if conf.keep_level_roles else _("**Enabled**")
         conf.keep_level_roles = not conf.keep_level_roles
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Keeping roles after prestiging has been {}").format(status))
 
     @prestige_group.command(name="level")
@@ -1301,7 +1301,7 @@ class Admin(MixinMeta):
         """
         conf = self.db.get_conf(ctx.guild)
         conf.prestigelevel = level
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Prestige level has been set to {}").format(level))
 
     @prestige_group.command(name="stack")
@@ -1314,7 +1314,7 @@ class Admin(MixinMeta):
         conf = self.db.get_conf(ctx.guild)
         status = _("**Disabled**") if conf.stackprestigeroles else _("**Enabled**")
         conf.stackprestigeroles = not conf.stackprestigeroles
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Stacking roles on prestige has been {}").format(status))
 
     @prestige_group.command(name="add")
@@ -1343,7 +1343,7 @@ class Admin(MixinMeta):
             emoji_url=url,
         )
         conf.prestigedata[prestige] = prestige_obj
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Role and emoji have been set for prestige level {}").format(prestige))
 
     @prestige_group.command(name="remove", aliases=["rem", "del"])
@@ -1355,5 +1355,5 @@ class Admin(MixinMeta):
         if prestige not in conf.prestigedata:
             return await ctx.send(_("That prestige level does not exist!"))
         del conf.prestigedata[prestige]
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Prestige level {} has been removed").format(prestige))
@@ -44,10 +44,12 @@ class DataAdmin(MixinMeta):
             member = ctx.guild.get_member(user_id)
             if not member:
                 del conf.users[user_id]
+                conf.touch_ranks(user_id)
                 pruned += 1
                 continue
             if member.bot and self.db.ignore_bots:
                 del conf.users[user_id]
+                conf.touch_ranks(user_id)
                 pruned += 1
         if pruned:
             txt += _("Pruned {} users from the database\n").format(pruned)
@@ -55,6 +57,7 @@ class DataAdmin(MixinMeta):
         for user_id in list(conf.users_weekly.keys()):
             if not ctx.guild.get_member(user_id):
                 del conf.users_weekly[user_id]
+                conf.touch_ranks(user_id)
                 pruned += 1
         if pruned:
             txt += _("Pruned {} users from the weekly database\n").format(pruned)
@@ -116,7 +119,7 @@ class DataAdmin(MixinMeta):
             txt += _("Pruned {} voice channel bonuses from the database\n").format(pruned)
         if not txt:
             await ctx.send(_("No data to prune!"))
-        self.save()
+        self.save(ctx.guild)
 
     @lvldata.command(name="resetglobal")
     @commands.is_owner()
@@ -129,7 +132,7 @@ class DataAdmin(MixinMeta):
         for guild_id in list(self.db.configs.keys()):
             self.db.configs[guild_id].users = {}
             self.db.configs[guild_id].users_weekly = {}
-        self.save()
+        self.save(full=True)
         await msg.edit(content=_("Global data reset!"))
 
     @lvldata.command(name="reset")
@@ -142,7 +145,7 @@ class DataAdmin(MixinMeta):
         conf = self.db.get_conf(ctx.guild)
         conf.users = {}
         conf.users_weekly = {}
-        self.save()
+        self.save(ctx.guild)
         await msg.edit(content=_("Server data reset!"))
 
     @lvldata.command(name="resetcog")
@@ -154,7 +157,7 @@ class DataAdmin(MixinMeta):
         if not yes:
             return await msg.edit(content=_("Reset cancelled!"))
         self.db = DB()
-        self.save()
+        self.save(full=True)
         await msg.edit(content=_("Cog data reset!"))
 
     @lvldata.command(name="backupcog")
@@ -198,7 +201,7 @@ class DataAdmin(MixinMeta):
             await DynamicMenu(ctx, pages).refresh()
             return
         self.db.configs[ctx.guild.id] = conf
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Server data restored!"))
 
     @lvldata.command(name="restorecog")
@@ -218,7 +221,7 @@ class DataAdmin(MixinMeta):
             await ctx.send(_("Failed to restore data!"))
             await DynamicMenu(ctx, pages).refresh()
             return
-        self.save()
+        self.save(full=True)
         await ctx.send(_("Cog data restored!"))
 
     @lvldata.command(name="importamari")
@@ -343,7 +346,7 @@ class DataAdmin(MixinMeta):
                 txt += _(" ({} skipped since they are no longer in the discord)").format(str(failed))
             await msg.edit(content=txt)
             await ctx.tick()
-            self.save()
+            self.save(ctx.guild)
 
     @lvldata.command(name="importfixator")
     @commands.is_owner()
@@ -442,7 +445,7 @@ class DataAdmin(MixinMeta):
             if not imported:
                 return await msg.edit(content=_("There was no data to import!"))
 
-            self.save()
+            self.save(full=True)
             await msg.edit(content=_("Imported data for {} users from Fixator's Leveler cog!").format(imported))
 
     @lvldata.command(name="importmalarne")
@@ -510,7 +513,7 @@ class DataAdmin(MixinMeta):
             return await ctx.send(_("There were no profiles to import"))
         txt = _("Imported {} profile(s)").format(imported)
         await ctx.send(txt)
-        self.save()
+        self.save(full=True)
 
     @lvldata.command(name="importmee6")
     @commands.guildowner()
@@ -635,7 +638,7 @@ class DataAdmin(MixinMeta):
                 txt += _(" ({} skipped since they are no longer in the discord)").format(str(failed))
             await msg.edit(content=txt)
             await ctx.tick()
-            self.save()
+            self.save(ctx.guild)
 
     @lvldata.command(name="importpolaris")
     @commands.guildowner()
@@ -756,4 +759,4 @@ class DataAdmin(MixinMeta):
                 txt += _(" ({} skipped since they are no longer in the discord)").format(str(failed))
             await msg.edit(content=txt)
             await ctx.tick()
-            self.save()
+            self.save(ctx.guild)
@@ -5,6 +5,7 @@ from io import BytesIO, StringIO
 import discord
 from redbot.core import commands
 from redbot.core.i18n import Translator, cog_i18n
+from redbot.core.utils.chat_formatting import box, humanize_number
 
 from ..abc import MixinMeta
 from ..common import utils
@@ -38,9 +39,10 @@ class Owner(MixinMeta):
         size = await asyncio.to_thread(_size)
         embed.add_field(
             name=_("Global Settings"),
-            value=_("`Profile Cache Time: `{}\n" "`Cache Size:         `{}\n").format(
+            value=_("`Profile Cache Time: `{}\n" "`Cache Size:         `{}\n" "`Compact Profiles:   `{}\n").format(
                 utils.humanize_delta(self.db.cache_seconds),
                 utils.humanize_size(size),
+                _("Enabled") if self.db.compact_profiles else _("Disabled"),
             ),
             inline=False,
         )
@@ -96,10 +98,12 @@ class Owner(MixinMeta):
         txt = _(
             "*If an internal API port is specified, the bot will spin up subprocesses to handle image generation.*\n"
             "- **Internal API Port:** {}\n"
+            "- **Internal API Socket:** {}\n"
             "*If an external API URL is specified, the bot will use that URL for image generation.*\n"
             "- **External API URL:** {}\n"
         ).format(
             self.db.internal_api_port or _("Not Using"),
+            _("Enabled") if self.db.internal_api_socket else _("Disabled"),
             self.db.external_api_url or _("Not Using"),
         )
         embed.add_field(
@@ -107,6 +111,49 @@ class Owner(MixinMeta):
             value=txt,
             inline=False,
         )
+        if self.db.xp_batch_interval:
+            txt = _("Message XP is queued and applied every {} milliseconds ({} queued)").format(
+                self.db.xp_batch_interval, len(self.xp_queue)
+            )
+        else:
+            txt = _("Message XP is applied instantly")
+        embed.add_field(
+            name=_("XP Batching"),
+            value=txt,
+            inline=False,
+        )
+        stats = self.render_cache.stats()
+        txt = _(
+            "- **Memory:** {}/{} MB ({} images)\n"
+            "- **Disk:** {}/{} MB\n"
+            "- **Hits:** {} ({} from disk)\n"
+            "- **Misses:** {}\n"
+        ).format(
+            round(stats["size"] / 1024 / 1024, 1),
+            self.db.render_cache_mb,
+            stats["entries"],
+            round(stats["spill_size"] / 1024 / 1024, 1),
+            self.db.render_cache_disk_mb,
+            stats["hits"] + stats["disk_hits"],
+            stats["disk_hits"],
+            stats["misses"],
+        )
+        embed.add_field(
+            name=_("Render Cache"),
+            value=txt,
+            inline=False,
+        )
+        if self.db.render_pool_workers:
+            txt = _("Rendering in {} worker processes, up to {} queued before falling back to embeds").format(
+                self.db.render_pool_workers, self.db.render_pool_queue
+            )
+        else:
+            txt = _("Rendering in threads")
+        embed.add_field(
+            name=_("Render Pool"),
+            value=txt,
+            inline=False,
+        )
         status = _("Enabled") if self.db.auto_cleanup else _("Disabled")
         embed.add_field(
             name=_("Auto-Cleanup ({})").format(status),
@@ -147,6 +194,7 @@ class Owner(MixinMeta):
             bad_keys = [i for i in self.db.configs if not self.bot.get_guild(i)]
             for key in bad_keys:
                 del self.db.configs[key]
+                self.save(key)
             if bad_keys:
                 await ctx.send(_("Purged {} guilds from the database.").format(len(bad_keys)))
         self.save()
@@ -188,6 +236,28 @@ class Owner(MixinMeta):
             await self.stop_api()
         self.save()
 
+    @lvlowner.command(name="apisocket")
+    async def toggle_api_socket(self, ctx: commands.Context):
+        """
+        Toggle serving the internal API over a unix socket
+
+        A unix socket skips the TCP stack when the bot talks to its internal API.
+        The internal API must still be enabled with a port, which is only used on Windows where sockets aren't supported.
+        """
+        self.db.internal_api_socket = not self.db.internal_api_socket
+        if self.db.internal_api_socket:
+            txt = _("The internal API will be served over a unix socket.")
+        else:
+            txt = _("The internal API will be served over its port.")
+        if self.api_proc:
+            txt += "\n" + _("Restarting workers")
+            await ctx.send(txt)
+            await self.stop_api()
+            await self.start_api()
+        else:
+            await ctx.send(txt)
+        self.save()
+
     @lvlowner.command(name="externalapi")
     async def set_external_api(self, ctx: commands.Context, url: str):
         """
@@ -258,6 +328,122 @@ class Owner(MixinMeta):
         await ctx.send(_("Cache time set to {} seconds.").format(seconds))
         self.save()
 
+    @lvlowner.command(name="batchxp")
+    async def set_xp_batching(self, ctx: commands.Context, milliseconds: int):
+        """
+        Apply message XP in bulk every X milliseconds
+
+        Instead of applying XP and checking for levelups on every message, messages are queued and applied in batches.
+        This reduces the work done per message for bots in very busy servers.
+
+        Set to 0 to apply message XP instantly (default)
+
+        **Notes**
+        - Level up messages will be sent when the batch is applied rather than when the message is sent.
+        - Level up messages will not reply to the message that triggered them.
+        """
+        if milliseconds < 0:
+            return await ctx.send(_("Interval cannot be negative!"))
+        self.db.xp_batch_interval = milliseconds
+        self.set_xp_batch_interval(milliseconds)
+        if milliseconds:
+            await ctx.send(_("Message XP will be applied every {} milliseconds.").format(milliseconds))
+        else:
+            if self.xp_queue:
+                queue, self.xp_queue = self.xp_queue, []
+                await self.apply_queued_xp(queue)
+            await ctx.send(_("Message XP will be applied instantly."))
+        self.save()
+
+    @lvlowner.command(name="compact")
+    async def toggle_compact_profiles(self, ctx: commands.Context):
+        """
+        Toggle compact profile storage
+
+        Profiles are kept in memory as lightweight slotted objects instead of full models, only storing customization that differs from the defaults.
+        This greatly reduces memory usage for bots with a lot of users, the saved config is unchanged.
+        """
+        compact = not self.db.compact_profiles
+        async with ctx.typing():
+            await asyncio.to_thread(self.db.set_compact, compact)
+        if compact:
+            await ctx.send(_("Profiles are now stored in compact form."))
+        else:
+            await ctx.send(_("Profiles are now stored as regular models."))
+        self.save()
+
+    @lvlowner.command(name="rendercache")
+    async def set_render_cache(self, ctx: commands.Context, memory_mb: int, disk_mb: int = 0):
+        """
+        Set the size of the rendered image cache
+
+        Profiles and level up images with identical inputs are only rendered once and reused from this cache.
+        Images evicted from memory can optionally spill over to disk instead of being discarded.
+
+        Set disk to 0 to keep the cache in memory only (default)
+        """
+        if memory_mb < 0 or disk_mb < 0:
+            return await ctx.send(_("Cache size cannot be negative!"))
+        self.db.render_cache_mb = memory_mb
+        self.db.render_cache_disk_mb = disk_mb
+        await asyncio.to_thread(self.configure_render_cache)
+        await ctx.send(_("Render cache set to {} MB in memory and {} MB on disk.").format(memory_mb, disk_mb))
+        self.save()
+
+    @lvlowner.command(name="renderpool")
+    async def set_render_pool(self, ctx: commands.Context, workers: int, max_queue: int = 8):
+        """
+        Render images in a pool of worker processes
+
+        Images are rendered in threads by default, which still compete with the bot for the GIL.
+        Rendering in separate processes keeps heavy renders from slowing the bot down.
+
+        If more than `max_queue` renders are waiting for a worker, profiles and level ups fall back to embeds.
+
+        Set workers to 0 to render in threads (default)
+
+        **Notes**
+        - This only applies to the bundled generator, not the internal or external API.
+        - Each worker uses its own memory, so keep the worker count modest.
+        """
+        if workers < 0 or max_queue < 0:
+            return await ctx.send(_("Workers and queue size cannot be negative!"))
+        self.db.render_pool_workers = workers
+        self.db.render_pool_queue = max_queue
+        self.render_pool.start(workers, max_queue)
+        if workers:
+            txt = _("Images will be rendered in {} worker processes with up to {} queued.").format(workers, max_queue)
+        else:
+            txt = _("Images will be rendered in threads.")
+        await ctx.send(txt)
+        self.save()
+
+    @lvlowner.command(name="renderstats")
+    async def view_render_stats(self, ctx: commands.Context):
+        """View the render pool's queue and render times"""
+        if not self.render_pool.running:
+            return await ctx.send(_("The render pool is not enabled."))
+        stats = self.render_pool.stats()
+        txt = _(
+            "Workers: {}\n"
+            "In progress: {}\n"
+            "Queued: {}/{}\n"
+            "Rendered: {}\n"
+            "Fell back to embeds: {}\n"
+            "Render time p50: {}ms\n"
+            "Render time p95: {}ms"
+        ).format(
+            stats["workers"],
+            stats["pending"] - stats["queued"],
+            stats["queued"],
+            stats["max_queue"],
+            humanize_number(stats["rendered"]),
+            humanize_number(stats["rejected"]),
+            round(stats["p50"] * 1000),
+            round(stats["p95"] * 1000),
+        )
+        await ctx.send(box(txt, lang="py"))
+
     @commands.command(name="mocklvl", hidden=True)
     @commands.is_owner()
     @commands.bot_has_permissions(attach_files=True)
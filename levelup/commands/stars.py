@@ -59,7 +59,7 @@ class Stars(MixinMeta):
         if conf.weeklysettings.on:
             weekly = conf.get_weekly_profile(user)
             weekly.stars += 1
-        self.save()
+        self.save(ctx.guild)
         name = user.mention if conf.starmention else f"**{user.display_name}**"
         kwargs = {"ephemeral": True}
         if conf.starmentionautodelete:
@@ -140,7 +140,7 @@ class Stars(MixinMeta):
         conf = self.db.get_conf(ctx.guild)
         conf.starcooldown = cooldown
         await ctx.send(_("Cooldown set to {}").format(utils.humanize_delta(cooldown)))
-        self.save()
+        self.save(ctx.guild)
 
     @starset.command(name="mention")
     async def starset_mention(self, ctx: commands.Context) -> None:
@@ -152,7 +152,7 @@ class Stars(MixinMeta):
         else:
             conf.starmention = True
             await ctx.send(_("Star mention enabled"))
-        self.save()
+        self.save(ctx.guild)
 
     @starset.command(name="mentiondelete")
     async def starset_mentionautodelete(self, ctx: commands.Context, delete_after: int) -> None:
@@ -166,4 +166,4 @@ class Stars(MixinMeta):
             await ctx.send(_("Star mention auto delete set to {}").format(delete_after))
         else:
             await ctx.send(_("Star mention auto delete disabled"))
-        self.save()
+        self.save(ctx.guild)
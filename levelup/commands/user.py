@@ -164,7 +164,7 @@ class User(MixinMeta):
                 "*You can use {} to view your profile settings at any time*"
             ).format(f"`{ctx.clean_prefix}setprofile`", f"`{ctx.clean_prefix}setprofile view`")
             profile.show_tutorial = False
-            self.save()
+            self.save(ctx.guild)
 
         try:
             if ctx.interaction is None:
@@ -234,7 +234,7 @@ class User(MixinMeta):
         profile.level = newlevel
         profile.xp = leftover_xp
         profile.prestige = next_prestige
-        self.save()
+        self.save(ctx.guild)
 
         txt = _("You have reached Prestige {}!\n").format(f"**{next_prestige}**")
         added, removed = await self.ensure_roles(ctx.author, conf, _("Reached prestige {}").format(next_prestige))
@@ -519,7 +519,7 @@ class User(MixinMeta):
 
         profile = conf.get_profile(ctx.author)
         profile.style = style
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(_("Your profile type has been set to {}").format(style.capitalize()))
 
     @set_profile.command(name="shownick")
@@ -528,7 +528,7 @@ class User(MixinMeta):
         conf = self.db.get_conf(ctx.guild)
         profile = conf.get_profile(ctx.author)
         profile.show_displayname = not profile.show_displayname
-        self.save()
+        self.save(ctx.guild)
         txt = (
             _("Your nickname will now be shown in your profile!")
             if profile.show_displayname
@@ -555,7 +555,7 @@ class User(MixinMeta):
             return await ctx.send(_("You cannot change your name color with the current profile style!"))
         if color == "default":
             profile.namecolor = None
-            self.save()
+            self.save(ctx.guild)
             return await ctx.send(_("Your name color has been set to random!"))
         try:
             rgb = utils.string_to_rgb(color)
@@ -569,7 +569,7 @@ class User(MixinMeta):
             color=discord.Color.from_rgb(*rgb),
         )
         profile.namecolor = color
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(embed=embed)
 
     @set_profile.command(name="statcolor", aliases=["stat"])
@@ -588,7 +588,7 @@ class User(MixinMeta):
         profile = conf.get_profile(ctx.author)
         if color == "default":
             profile.statcolor = None
-            self.save()
+            self.save(ctx.guild)
             return await ctx.send(_("Your stat color has been set to random!"))
         try:
             rgb = utils.string_to_rgb(color)
@@ -602,7 +602,7 @@ class User(MixinMeta):
             color=discord.Color.from_rgb(*rgb),
         )
         profile.statcolor = color
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(embed=embed)
 
     @set_profile.command(name="barcolor", aliases=["levelbar", "lvlbar", "bar"])
@@ -623,7 +623,7 @@ class User(MixinMeta):
             return await ctx.send(_("You cannot change your name color with the current profile style!"))
         if color == "default":
             profile.barcolor = None
-            self.save()
+            self.save(ctx.guild)
             return await ctx.send(_("Your level bar color has been set to random!"))
         try:
             rgb = utils.string_to_rgb(color)
@@ -637,7 +637,7 @@ class User(MixinMeta):
             color=discord.Color.from_rgb(*rgb),
         )
         profile.barcolor = color
-        self.save()
+        self.save(ctx.guild)
         await ctx.send(embed=embed)
 
     @set_levelbar_color.autocomplete("color")
@@ -701,14 +701,14 @@ class User(MixinMeta):
 
         if url and url == "random":
             profile.background = "random"
-            self.save()
+            self.save(ctx.guild)
             txt = _("Your profile background has been set to random!")
             if self.db.cache_seconds:
                 txt += cached_txt
             return await ctx.send(txt)
         if url and url == "default":
             profile.background = "default"
-            self.save()
+            self.save(ctx.guild)
             txt = _("Your profile background has been set to default!")
             if self.db.cache_seconds:
                 txt += cached_txt
@@ -722,7 +722,7 @@ class User(MixinMeta):
                 return await ctx.send(_("You must provide a url, filename, or attach a file"))
             else:
                 profile.background = "default"
-                self.save()
+                self.save(ctx.guild)
                 txt = _("Your background has been reset to default!")
                 if self.db.cache_seconds:
                     txt += cached_txt
@@ -740,7 +740,7 @@ class User(MixinMeta):
             except Exception as e:
                 profile.background = "default"
                 return await ctx.send(_("That image is not a valid profile background!\n{}").format(str(e)))
-            self.save()
+            self.save(ctx.guild)
             txt = _("Your profile background has been set!")
             if self.db.cache_seconds:
                 txt += cached_txt
@@ -765,7 +765,7 @@ class User(MixinMeta):
             except Exception as e:
                 profile.background = "default"
                 return await ctx.send(_("That image is not a valid profile background!\n{}").format(str(e)))
-            self.save()
+            self.save(ctx.guild)
             txt = _("Your profile background has been set!")
             if self.db.cache_seconds:
                 txt += cached_txt
@@ -780,7 +780,7 @@ class User(MixinMeta):
             return await ctx.send(_("No background found with that name!"))
         file = discord.File(path)
         profile.background = path.stem
-        self.save()
+        self.save(ctx.guild)
         txt = _("Your profile background has been set to {}").format(f"`{path.name}`")
         if self.db.cache_seconds:
             txt += cached_txt
@@ -804,7 +804,7 @@ class User(MixinMeta):
 
         if font_name == "default":
             profile.font = "default"
-            self.save()
+            self.save(ctx.guild)
             return await ctx.send(_("Your font has been reset to default!"))
         fonts = list(self.fonts.iterdir()) + list(self.custom_fonts.iterdir())
         for path in fonts:
@@ -813,7 +813,7 @@ class User(MixinMeta):
         else:
             return await ctx.send(_("No font found with that name!"))
         profile.font = path.name
-        self.save()
+        self.save(ctx.guild)
         txt = _("Your font has been set to {}").format(f"`{path.name}`")
         await ctx.send(txt)
 
@@ -841,6 +841,6 @@ class User(MixinMeta):
         if profile.style in const.STATIC_FONT_STYLES:
             return await ctx.send(_("You cannot change your name color with the current profile style!"))
         profile.blur = not profile.blur
-        self.save()
+        self.save(ctx.guild)
         txt = _("Your profile blur has been set to {}").format(_("Enabled") if profile.blur else _("Disabled"))
         await ctx.send(txt)
@@ -134,7 +134,7 @@ class Weekly(MixinMeta):
         else:
             conf.weeklysettings.ping_winners = True
             await ctx.send(_("Winners will now be pinged in announcements"))
-        self.save()
+        self.save(ctx.guild)
 
     @weeklyset.command(name="autoremove")
     async def weeklyset_autoremove(self, ctx: commands.Context):
@@ -146,7 +146,7 @@ class Weekly(MixinMeta):
         else:
             conf.weeklysettings.remove = True
             await ctx.send(_("Roles will now be removed from the previous winners"))
-        self.save()
+        self.save(ctx.guild)
 
     @weeklyset.command(name="autoreset")
     async def weeklyset_autoreset(self, ctx: commands.Context):
@@ -158,7 +158,7 @@ class Weekly(MixinMeta):
         else:
             conf.weeklysettings.autoreset = True
             await ctx.send(_("Weekly stats will now auto reset"))
-        self.save()
+        self.save(ctx.guild)
 
     @weeklyset.command(name="bonus")
     async def weeklyset_bonus(self, ctx: commands.Context, bonus: int):
@@ -166,7 +166,7 @@ class Weekly(MixinMeta):
         conf = self.db.get_conf(ctx.guild)
         conf.weeklysettings.bonus = bonus
         await ctx.send(_("Bonus exp for weekly winners set to {}").format(bonus))
-        self.save()
+        self.save(ctx.guild)
 
     @weeklyset.command(name="channel")
     async def weeklyset_channel(self, ctx: commands.Context, *, channel: discord.TextChannel):
@@ -174,7 +174,7 @@ class Weekly(MixinMeta):
         conf = self.db.get_conf(ctx.guild)
         conf.weeklysettings.channel = channel.id
         await ctx.send(_("Weekly winners will now be announced in {}").format(channel.mention))
-        self.save()
+        self.save(ctx.guild)
 
     @weeklyset.command(name="day")
     async def weeklyset_day(self, ctx: commands.Context, day: int):
@@ -192,7 +192,7 @@ class Weekly(MixinMeta):
             return await ctx.send(_("Day must be between 0 and 6"))
         conf.weeklysettings.reset_day = day
         await ctx.send(_("Weekly stats will now reset on {}").format(utils.get_day_name(day)))
-        self.save()
+        self.save(ctx.guild)
 
     @weeklyset.command(name="hour")
     async def weeklyset_hour(self, ctx: commands.Context, hour: int):
@@ -203,7 +203,7 @@ class Weekly(MixinMeta):
         conf.weeklysettings.reset_hour = hour
         txt = _("Hour set to {}, next reset will occur at {}").format(hour, f"<t:{conf.weeklysettings.next_reset}:F>")
         await ctx.send(txt)
-        self.save()
+        self.save(ctx.guild)
 
     @weeklyset.command(name="reset")
     @commands.bot_has_permissions(embed_links=True)
@@ -221,7 +221,7 @@ class Weekly(MixinMeta):
         conf = self.db.get_conf(ctx.guild)
         conf.weeklysettings.role = role.id
         await ctx.send(_("Role set to {}").format(role.mention))
-        self.save()
+        self.save(ctx.guild)
 
     @weeklyset.command(name="roleall")
     async def weeklyset_roleall(self, ctx: commands.Context):
@@ -233,7 +233,7 @@ class Weekly(MixinMeta):
         else:
             conf.weeklysettings.role_all = True
             await ctx.send(_("All winners will get the role"))
-        self.save()
+        self.save(ctx.guild)
 
     @weeklyset.command(name="winners")
     async def weeklyset_winners(self, ctx: commands.Context, count: int):
@@ -247,7 +247,7 @@ class Weekly(MixinMeta):
             return await ctx.send(_("Number of winners must be between 1 and 25"))
         conf.weeklysettings.count = count
         await ctx.send(_("Number of winners to display set to {}").format(count))
-        self.save()
+        self.save(ctx.guild)
 
     @weeklyset.command(name="toggle")
     async def weeklyset_toggle(self, ctx: commands.Context):
@@ -259,4 +259,4 @@ class Weekly(MixinMeta):
         else:
             conf.weeklysettings.on = True
             await ctx.send(_("Weekly stat tracking enabled"))
-        self.save()
+        self.save(ctx.guild)
@@ -4,12 +4,13 @@ from datetime import datetime
 from io import StringIO
 
 import discord
+import numpy as np
 from redbot.core.bot import Red
 from redbot.core.i18n import Translator
 from redbot.core.utils.chat_formatting import humanize_number
 
 from ..common import utils
-from ..common.models import DB, GuildSettings, Profile, ProfileWeekly, WeeklySettings
+from ..common.models import DB, GuildSettings, Profile, WeeklySettings
 
 _ = Translator("LevelUp", __file__)
 
@@ -24,41 +25,17 @@ def get_user_position(
     """Get the position of a user in the leaderboard
 
     Args:
-        lb (t.Dict[int, t.Union[Profile, ProfileWeekly]]): The leaderboard
+        guild (discord.Guild): The guild the leaderboard is for
+        conf (GuildSettings): The guild's settings
+        lbtype (t.Literal["lb", "weekly"]): The type of leaderboard
         target_user (int): The user's ID
         key (str): The key to sort by
 
     Returns:
-        int: The user's position
+        dict: The user's position, the stat total, and the user's percentage of the total
     """
-    if lbtype == "weekly":
-        lb: t.Dict[int, ProfileWeekly] = conf.users_weekly
-    elif not conf.prestigedata:
-        lb: t.Dict[int, Profile] = conf.users
-    else:
-        lb: t.Dict[int, Profile] = {}
-        for user_id in list(conf.users.keys()):
-            profile = (
-                conf.users[user_id].model_copy()
-                if hasattr(conf.users[user_id], "model_copy")
-                else conf.users[user_id].copy()
-            )
-            if profile.prestige and conf.prestigelevel:
-                profile.xp += profile.prestige * conf.algorithm.get_xp(conf.prestigelevel)
-                profile.level += profile.prestige * conf.prestigelevel
-            lb[user_id] = profile
-
-    valid_users = {k: v for k, v in lb.items() if guild.get_member(k)}
-    sorted_users = sorted(valid_users.items(), key=lambda x: getattr(x[1], key), reverse=True)
-    for idx, (uid, _) in enumerate(sorted_users):
-        if uid == target_user:
-            position = idx + 1
-            break
-    else:
-        position = -1
-    total = sum([getattr(x[1], key) for x in sorted_users])
-    percent = getattr(lb[target_user], key) / total * 100 if total else 0
-    return {"position": position, "total": total, "percent": percent}
+    ranks = conf.get_ranks(guild, weekly=lbtype == "weekly")
+    return ranks.stat_summary(key, target_user)
 
 
 def get_role_leaderboard(rolegroups: t.Dict[int, float], color: discord.Color) -> t.List[discord.Embed]:
@@ -130,43 +107,14 @@ def get_leaderboard(
     stat = stat.lower()
     color = member.color if member else color
     conf = db.get_conf(guild)
-    lb: t.Dict[int, t.Union[Profile, ProfileWeekly]]
     weekly: WeeklySettings = None
     if lbtype == "weekly":
         title = _("Weekly ")
-        lb = db.get_conf(guild).users_weekly
-        weekly = db.get_conf(guild).weeklysettings
+        weekly = conf.weeklysettings
     elif lbtype == "lb" and is_global:
         title = _("Global LevelUp ")
-        # Add up all the guilds
-        lb: t.Dict[int, Profile] = {}
-        for guild_id in db.configs.keys():
-            guild_conf: GuildSettings = db.configs[guild_id]
-            for user_id in guild_conf.users.keys():
-                profile: Profile = guild_conf.users[user_id]
-                if user_id not in lb:
-                    lb[user_id] = profile.model_copy() if hasattr(profile, "model_copy") else profile.copy()
-                else:
-                    lb[user_id].xp += profile.xp
-                    lb[user_id].messages += profile.messages
-                    lb[user_id].voice += profile.voice
-                    lb[user_id].stars += profile.stars
-
-                if "xp" in stat and profile.prestige and guild_conf.prestigelevel:
-                    lb[user_id].xp += profile.prestige * guild_conf.algorithm.get_xp(guild_conf.prestigelevel)
-                    lb[user_id].level += profile.prestige * guild_conf.prestigelevel
-    elif "xp" in stat and conf.prestigelevel and conf.prestigedata:
-        title = _("LevelUp ")
-        lb = {}
-        for user_id in conf.users.keys():
-            profile: Profile = conf.users[user_id]
-            lb[user_id] = profile.model_copy() if hasattr(profile, "model_copy") else profile.copy()
-            if profile.prestige:
-                lb[user_id].xp += profile.prestige * conf.algorithm.get_xp(conf.prestigelevel)
-                lb[user_id].level += profile.prestige * conf.prestigelevel
     else:
         title = _("LevelUp ")
-        lb = db.get_conf(guild).users.copy()
 
     if "v" in stat:
         title += _("Voice Leaderboard")
@@ -189,31 +137,66 @@ def get_leaderboard(
         emoji = conf.emojis.get("bulb", bot)
         statname = _("Experience")
 
-    if is_global:
-        valid_users: t.Dict[int, t.Union[Profile, ProfileWeekly]] = {k: v for k, v in lb.items() if bot.get_user(k)}
+    # List of (user_id, stat value) for users with a value above zero, highest first
+    sorted_users: t.List[t.Tuple[int, float]]
+    if lbtype == "lb" and is_global:
+        # Add up all the guilds as flat columns, then sum per user
+        uid_parts: t.List[np.ndarray] = []
+        value_parts: t.List[np.ndarray] = []
+        for guild_conf in list(db.configs.values()):
+            profiles: t.List[t.Tuple[int, Profile]] = list(guild_conf.users.items())
+            if not profiles:
+                continue
+            count = len(profiles)
+            uid_parts.append(np.fromiter((uid for uid, _ in profiles), dtype=np.int64, count=count))
+            values = np.fromiter((getattr(p, key) for _, p in profiles), dtype=np.float64, count=count)
+            if key == "xp" and guild_conf.prestigelevel:
+                prestige = np.fromiter((p.prestige for _, p in profiles), dtype=np.float64, count=count)
+                values += prestige * guild_conf.algorithm.get_xp(guild_conf.prestigelevel)
+            value_parts.append(values)
+
+        sorted_users = []
+        if uid_parts:
+            uids, inverse = np.unique(np.concatenate(uid_parts), return_inverse=True)
+            totals = np.bincount(inverse, weights=np.concatenate(value_parts))
+            order = np.argsort(-totals, kind="stable")
+            count = int(np.count_nonzero(totals > 0))
+            for uid, value in zip(uids[order[:count]].tolist(), totals[order[:count]].tolist()):
+                if bot.get_user(uid):
+                    sorted_users.append((uid, value))
     else:
-        valid_users: t.Dict[int, t.Union[Profile, ProfileWeekly]] = {k: v for k, v in lb.items() if guild.get_member(k)}
+        ranks = conf.get_ranks(guild, weekly=lbtype == "weekly")
+        sorted_users = ranks.ranked(key)
 
-    filtered_users: t.Dict[int, t.Union[Profile, ProfileWeekly]] = {
-        k: v for k, v in valid_users.items() if getattr(v, key) > 0
-    }
-    if not filtered_users and not dashboard:
+    if not sorted_users and not dashboard:
         txt = _("There is no data for the {} leaderboard yet").format(
             _("weekly {}").format(statname) if lbtype == "weekly" else statname
         )
         return txt
 
-    sorted_users = sorted(filtered_users.items(), key=lambda x: getattr(x[1], key), reverse=True)
+    def _get_level(user_id: int) -> int:
+        profile = conf.users.get(user_id)
+        if not profile:
+            return 0
+        if profile.prestige and conf.prestigelevel and conf.prestigedata:
+            return profile.level + profile.prestige * conf.prestigelevel
+        return profile.level
+
+    show_level = key == "xp" and lbtype != "weekly" and not is_global
     usercount = len(sorted_users)
     func = utils.humanize_delta if "v" in stat else humanize_number
-    total: str = func(round(sum([getattr(x, key) for x in filtered_users.values()])))
-
-    for idx, (user_id, stats) in enumerate(sorted_users):
-        if member and user_id == member.id:
-            you = _(" | You: {}").format(f"{idx + 1}/{len(sorted_users)}")
-            break
-    else:
-        you = ""
+    total: str = func(round(sum([x[1] for x in sorted_users])))
+
+    you = ""
+    if member and not is_global:
+        position = ranks.position(key, member.id)
+        if 0 < position <= usercount:
+            you = _(" | You: {}").format(f"{position}/{usercount}")
+    elif member:
+        for idx, (user_id, value) in enumerate(sorted_users):
+            if user_id == member.id:
+                you = _(" | You: {}").format(f"{idx + 1}/{usercount}")
+                break
 
     if lbtype == "weekly":
         if dashboard:
@@ -254,7 +237,7 @@ def get_leaderboard(
             "user_position": you,
             "stats": [],
         }
-        for idx, (user_id, stats) in enumerate(sorted_users):
+        for idx, (user_id, value) in enumerate(sorted_users):
             user_obj = bot.get_user(user_id) if is_global else guild.get_member(user_id)
             user = (user_obj.display_name if use_displayname else user_obj.name) if user_obj else user_id
             if query:
@@ -273,12 +256,12 @@ def get_leaderboard(
                         continue
             place = idx + 1
             if key == "voice":
-                stat = utils.humanize_delta(round(getattr(stats, key)))
+                stat = utils.humanize_delta(round(value))
             else:
-                stat = utils.abbreviate_number(round(getattr(stats, key)))
+                stat = utils.abbreviate_number(round(value))
 
-                if key == "xp" and lbtype != "weekly" and not is_global:
-                    stat += f" 🎖{stats.level}"
+                if show_level:
+                    stat += f" 🎖{_get_level(user_id)}"
 
             entry = {"position": place, "name": user, "id": user_id, "stat": stat}
             payload["stats"].append(entry)
@@ -292,16 +275,16 @@ def get_leaderboard(
         stop = min(usercount, stop)
         buffer = StringIO()
         for i in range(start, stop):
-            user_id, stats = sorted_users[i]
+            user_id, value = sorted_users[i]
             user_obj = bot.get_user(user_id) if is_global else guild.get_member(user_id)
             name = (user_obj.display_name if use_displayname else user_obj.name) if user_obj else user_id
             place = i + 1
             if key == "voice":
-                stat = utils.humanize_delta(round(getattr(stats, key)))
+                stat = utils.humanize_delta(round(value))
             else:
-                stat = utils.abbreviate_number(round(getattr(stats, key)))
-                if key == "xp" and lbtype != "weekly" and not is_global:
-                    stat += f" 🎖{stats.level}"
+                stat = utils.abbreviate_number(round(value))
+                if show_level:
+                    stat += f" 🎖{_get_level(user_id)}"
 
             buffer.write(f"**{place}**. {name} (`{stat}`)\n")
 
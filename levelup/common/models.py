@@ -11,9 +11,11 @@ from uuid import uuid4
 
 import discord
 import orjson
-from pydantic import VERSION, BaseModel, Field
+from pydantic import VERSION, BaseModel, Field, PrivateAttr
 from redbot.core.bot import Red
 
+from .policy import XPPolicy
+from .ranks import RankIndex
 from .utils import get_twemoji
 
 log = logging.getLogger("red.vrt.levelup.models")
@@ -34,15 +36,22 @@ class Base(BaseModel):
             return cls.model_validate_json(obj)
         return cls.parse_raw(obj)
 
-    def dump(self, exclued_defaults: bool = True) -> t.Dict[str, t.Any]:
+    def dump(self, exclued_defaults: bool = True, exclude: t.Optional[t.Set[str]] = None) -> t.Dict[str, t.Any]:
         if VERSION >= "2.0.1":
-            return super().model_dump(mode="json", exclude_defaults=exclued_defaults)
-        return orjson.loads(self.json(exclude_defaults=exclued_defaults))
-
-    def dumpjson(self, exclude_defaults: bool = True, pretty: bool = False) -> str:
+            return super().model_dump(mode="json", exclude_defaults=exclued_defaults, exclude=exclude)
+        return orjson.loads(self.json(exclude_defaults=exclued_defaults, exclude=exclude))
+
+    def dumpjson(
+        self,
+        exclude_defaults: bool = True,
+        pretty: bool = False,
+        exclude: t.Optional[t.Set[str]] = None,
+    ) -> str:
         kwargs = {"exclude_defaults": exclude_defaults}
         if pretty:
             kwargs["indent"] = 2
+        if exclude:
+            kwargs["exclude"] = exclude
         if VERSION >= "2.0.1":
             return self.model_dump_json(**kwargs)
         return self.json(**kwargs)
@@ -80,8 +89,8 @@ class Base(BaseModel):
                 log.error("Failed to load via json5")
                 raise e
 
-    def to_file(self, path: Path, pretty: bool = False) -> None:
-        dump = self.dumpjson(exclude_defaults=True, pretty=pretty)
+    def to_file(self, path: Path, pretty: bool = False, exclude: t.Optional[t.Set[str]] = None) -> None:
+        dump = self.dumpjson(exclude_defaults=True, pretty=pretty, exclude=exclude)
         # We want to write the file as safely as possible
         # https://github.com/Cog-Creators/Red-DiscordBot/blob/V3/develop/redbot/core/_drivers/json.py#L224
         tmp_file = f"{path.stem}-{uuid4().fields[0]}.tmp"
@@ -112,6 +121,16 @@ class VoiceTracking(Base):
     stopped_gaining_xp_at: t.Union[float, None]  # Time when user last stopped gaining xp
 
 
+class QueuedXP(t.NamedTuple):
+    """Non-config record of message XP waiting to be applied in bulk"""
+
+    guild_id: int
+    user_id: int
+    channel_id: int
+    xp: int
+    role_groups: t.Tuple[int, ...]  # Role group IDs the user had when the message was sent
+
+
 class Profile(Base):
     xp: float = 0  # Experience points
     voice: float = 0  # Voice time in seconds
@@ -155,6 +174,175 @@ class Profile(Base):
         return all(checks)
 
 
+# Defaults of the Profile customization fields, CompactProfile only stores fields that differ from these
+CUSTOM_DEFAULTS: t.Dict[str, t.Any] = {
+    "style": "default",
+    "background": "default",
+    "namecolor": None,
+    "statcolor": None,
+    "barcolor": None,
+    "font": None,
+    "blur": True,
+    "show_displayname": False,
+}
+
+
+class CustomField:
+    """A Profile customization field on a CompactProfile, stored sparsely"""
+
+    def __set_name__(self, owner: type, name: str):
+        self.name = name
+        self.default = CUSTOM_DEFAULTS[name]
+
+    def __get__(self, obj: t.Optional[CompactProfile], objtype: t.Optional[type] = None) -> t.Any:
+        if obj is None:
+            return self
+        if obj.custom is None:
+            return self.default
+        return obj.custom.get(self.name, self.default)
+
+    def __set__(self, obj: CompactProfile, value: t.Any) -> None:
+        if value == self.default:
+            if obj.custom:
+                obj.custom.pop(self.name, None)
+            if not obj.custom:
+                obj.custom = None
+            return
+        if obj.custom is None:
+            obj.custom = {}
+        obj.custom[self.name] = value
+
+
+class CompactProfile:
+    """Memory efficient stand-in for Profile, used when compact profile storage is enabled
+
+    Counters live in slots, last_active is kept as a timestamp and customization fields are only stored
+    when they differ from their defaults. Has the same attributes as Profile, use to_profile for a real model.
+    """
+
+    __slots__ = ("xp", "voice", "messages", "level", "prestige", "stars", "active", "show_tutorial", "custom")
+
+    style = CustomField()
+    background = CustomField()
+    namecolor = CustomField()
+    statcolor = CustomField()
+    barcolor = CustomField()
+    font = CustomField()
+    blur = CustomField()
+    show_displayname = CustomField()
+
+    def __init__(
+        self,
+        xp: float = 0,
+        voice: float = 0,
+        messages: int = 0,
+        level: int = 0,
+        prestige: int = 0,
+        stars: int = 0,
+        active: t.Optional[float] = None,
+        show_tutorial: bool = True,
+        custom: t.Optional[t.Dict[str, t.Any]] = None,
+    ):
+        self.xp = xp
+        self.voice = voice
+        self.messages = messages
+        self.level = level
+        self.prestige = prestige
+        self.stars = stars
+        self.active = datetime.now().timestamp() if active is None else active
+        self.show_tutorial = show_tutorial
+        self.custom = custom or None
+
+    @property
+    def last_active(self) -> datetime:
+        return datetime.fromtimestamp(self.active)
+
+    @last_active.setter
+    def last_active(self, value: datetime) -> None:
+        self.active = value.timestamp()
+
+    @classmethod
+    def from_profile(cls, profile: Profile) -> CompactProfile:
+        custom = {k: getattr(profile, k) for k, v in CUSTOM_DEFAULTS.items() if getattr(profile, k) != v}
+        return cls(
+            xp=profile.xp,
+            voice=profile.voice,
+            messages=profile.messages,
+            level=profile.level,
+            prestige=profile.prestige,
+            stars=profile.stars,
+            active=profile.last_active.timestamp(),
+            show_tutorial=profile.show_tutorial,
+            custom=custom,
+        )
+
+    def to_profile(self) -> Profile:
+        return Profile(
+            xp=self.xp,
+            voice=self.voice,
+            messages=self.messages,
+            level=self.level,
+            prestige=self.prestige,
+            stars=self.stars,
+            last_active=self.last_active,
+            show_tutorial=self.show_tutorial,
+            **(self.custom or {}),
+        )
+
+    @classmethod
+    def validate(cls, value: t.Any) -> CompactProfile:
+        # Raw data always validates as a Profile, only existing compact records are accepted here
+        if not isinstance(value, cls):
+            raise ValueError("CompactProfile fields only accept CompactProfile instances")
+        return value
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source: t.Any, handler: t.Any) -> t.Any:
+        # Pydantic 2
+        from pydantic_core import core_schema
+
+        return core_schema.no_info_plain_validator_function(
+            cls.validate,
+            serialization=core_schema.plain_serializer_function_ser_schema(
+                lambda profile, info: profile.dump(info.exclude_defaults),
+                info_arg=True,
+            ),
+        )
+
+    @classmethod
+    def __get_validators__(cls) -> t.Iterator[t.Callable[[t.Any], CompactProfile]]:
+        # Pydantic 1
+        yield cls.validate
+
+    def add_message(self) -> CompactProfile:
+        self.messages += 1
+        self.active = datetime.now().timestamp()
+        return self
+
+    def all_default(self) -> bool:
+        return self.custom is None
+
+    def dump(self, exclued_defaults: bool = True) -> t.Dict[str, t.Any]:
+        """Same output as Profile.dump"""
+        data = {
+            # Float fields on Profile, an int assigned here would otherwise be saved as one
+            "xp": float(self.xp),
+            "voice": float(self.voice),
+            "messages": self.messages,
+            "level": self.level,
+            "prestige": self.prestige,
+            "stars": self.stars,
+            "show_tutorial": self.show_tutorial,
+        }
+        if exclued_defaults:
+            data = {k: v for k, v in data.items() if v != (k == "show_tutorial")}
+            data.update(self.custom or {})
+        else:
+            data.update({k: getattr(self, k) for k in CUSTOM_DEFAULTS})
+        data["last_active"] = self.last_active.isoformat()
+        return data
+
+
 class ProfileWeekly(Base):
     xp: float = 0
     voice: float = 0
@@ -260,7 +448,7 @@ class Emojis(Base):
 
 
 class GuildSettings(Base):
-    users: t.Dict[int, Profile] = {}  # User_ID: Profile
+    users: t.Dict[int, t.Union[Profile, CompactProfile]] = {}  # User_ID: Profile
     users_weekly: t.Dict[int, ProfileWeekly] = {}  # User_ID: ProfileWeekly
     weeklysettings: WeeklySettings = WeeklySettings()
     emojis: Emojis = Emojis()
@@ -323,29 +511,207 @@ class GuildSettings(Base):
     starmention: bool = False  # Mention when users add a star
     starmentionautodelete: int = 0  # Auto delete star mention reactions (0 to disable)
 
-    def get_profile(self, user: t.Union[discord.Member, int]) -> Profile:
+    # Non-config leaderboard indexes
+    _ranks: t.Optional[RankIndex] = PrivateAttr(default=None)
+    _weekly_ranks: t.Optional[RankIndex] = PrivateAttr(default=None)
+    # Non-config compiled XP eligibility settings
+    _policy: t.Optional[XPPolicy] = PrivateAttr(default=None)
+    # Whether new and loaded profiles are stored as CompactProfile
+    _compact: bool = PrivateAttr(default=False)
+
+    def dump(self, exclued_defaults: bool = True, exclude: t.Optional[t.Set[str]] = None) -> t.Dict[str, t.Any]:
+        if not self._compact or (exclude and "users" in exclude):
+            return super().dump(exclued_defaults, exclude)
+        data = super().dump(exclued_defaults, (exclude or set()) | {"users"})
+        data["users"] = {str(uid): profile.dump(exclued_defaults) for uid, profile in self.users.items()}
+        return data
+
+    def dumpjson(
+        self,
+        exclude_defaults: bool = True,
+        pretty: bool = False,
+        exclude: t.Optional[t.Set[str]] = None,
+    ) -> str:
+        if not self._compact or (exclude and "users" in exclude):
+            return super().dumpjson(exclude_defaults, pretty, exclude)
+        option = orjson.OPT_INDENT_2 if pretty else 0
+        return orjson.dumps(self.dump(exclude_defaults, exclude), option=option).decode()
+
+    def compact_users(self) -> None:
+        """Store all profiles as CompactProfile, new profiles will be compact as well"""
+        self._compact = True
+        for uid, profile in self.users.items():
+            if isinstance(profile, Profile):
+                self.users[uid] = CompactProfile.from_profile(profile)
+
+    def expand_users(self) -> None:
+        """Store all profiles as regular Profile models again"""
+        self._compact = False
+        for uid, profile in self.users.items():
+            if isinstance(profile, CompactProfile):
+                self.users[uid] = profile.to_profile()
+
+    def get_policy(self) -> XPPolicy:
+        if self._policy is None:
+            self._policy = XPPolicy(self)
+        return self._policy
+
+    def invalidate_policy(self) -> None:
+        """Rebuild the XP policy next time it is needed, call after modifying channel/role/user settings"""
+        self._policy = None
+
+    def get_profile(self, user: t.Union[discord.Member, int]) -> t.Union[Profile, CompactProfile]:
         uid = user if isinstance(user, int) else user.id
-        return self.users.setdefault(uid, Profile())
+        if self._ranks is not None:
+            self._ranks.touch(uid)
+        if uid not in self.users:
+            self.users[uid] = CompactProfile() if self._compact else Profile()
+        return self.users[uid]
 
     def get_weekly_profile(self, user: t.Union[discord.Member, int]) -> ProfileWeekly:
         uid = user if isinstance(user, int) else user.id
+        if self._weekly_ranks is not None:
+            self._weekly_ranks.touch(uid)
         return self.users_weekly.setdefault(uid, ProfileWeekly())
 
+    def touch_ranks(self, user: t.Union[discord.Member, int]) -> None:
+        """Mark a user to be re-ranked, for stat or membership changes without fetching their profile and deletions"""
+        uid = user if isinstance(user, int) else user.id
+        for index in (self._ranks, self._weekly_ranks):
+            if index is not None:
+                index.touch(uid)
+
+    def invalidate_ranks(self, weekly: bool = False) -> None:
+        """Rebuild a leaderboard index next time it is needed, call after clearing its users in place"""
+        if weekly:
+            self._weekly_ranks = None
+        else:
+            self._ranks = None
+
+    def get_ranks(self, guild: discord.Guild, weekly: bool = False) -> RankIndex:
+        """Get the synced leaderboard index for this guild
+
+        XP on the main leaderboard includes the XP of any prestige levels when prestige is configured.
+        """
+        if weekly:
+            if self._weekly_ranks is None:
+                self._weekly_ranks = RankIndex()
+            self._weekly_ranks.sync(self.users_weekly, guild)
+            return self._weekly_ranks
+
+        prestige_xp = 0
+        if self.prestigelevel and self.prestigedata:
+            prestige_xp = self.algorithm.get_xp(self.prestigelevel)
+        if self._ranks is None:
+            self._ranks = RankIndex()
+        self._ranks.sync(self.users, guild, prestige_xp)
+        return self._ranks
+
 
 class DB(Base):
     configs: t.Dict[int, GuildSettings] = {}
     ignored_guilds: t.List[int] = []
     cache_seconds: int = 0  # How long generated profile images should be cached, 0 to disable
+    render_cache_mb: int = 64  # Memory budget for rendered images, keyed on their render inputs
+    render_cache_disk_mb: int = 0  # Disk budget for renders evicted from memory, 0 to disable
+    render_pool_workers: int = 0  # Worker processes for rendering images locally, 0 to render in threads
+    render_pool_queue: int = 8  # Renders that can wait for a worker before falling back to embeds
     render_gifs: bool = False  # Whether to render profiles as gifs
     force_embeds: bool = False  # Globally force embeds for leveling
     internal_api_port: int = 0  # If specified, starts internal api subprocess
+    internal_api_socket: bool = False  # Serve the internal api over a unix socket instead of the port (not on Windows)
     external_api_url: str = ""  # If specified, overrides internal api
     auto_cleanup: bool = False  # If True, will clean up configs of old guilds
     ignore_bots: bool = True  # Ignore bots completely
+    xp_batch_interval: int = 0  # Milliseconds between applying queued message XP in bulk, 0 to apply instantly
+    compact_profiles: bool = False  # Store profiles in memory as slotted objects instead of pydantic models
 
     def get_conf(self, guild: t.Union[discord.Guild, int]) -> GuildSettings:
         gid = guild if isinstance(guild, int) else guild.id
-        return self.configs.setdefault(gid, GuildSettings())
+        conf = self.configs.get(gid)
+        if conf is None:
+            conf = self.configs[gid] = GuildSettings()
+        # Restored or newly created configs pick up the compact mode on first access
+        if self.compact_profiles and not conf._compact:
+            conf.compact_users()
+        return conf
+
+    def set_compact(self, compact: bool) -> None:
+        """Convert the profiles of every guild to or from compact storage"""
+        self.compact_profiles = compact
+        for conf in self.configs.values():
+            if compact:
+                conf.compact_users()
+            else:
+                conf.expand_users()
+
+    def dump(self, exclued_defaults: bool = True, exclude: t.Optional[t.Set[str]] = None) -> t.Dict[str, t.Any]:
+        if not self.compact_profiles or (exclude and "configs" in exclude):
+            return super().dump(exclued_defaults, exclude)
+        data = super().dump(exclued_defaults, (exclude or set()) | {"configs"})
+        data["configs"] = {str(gid): conf.dump(exclued_defaults) for gid, conf in self.configs.items()}
+        return data
+
+    def dumpjson(
+        self,
+        exclude_defaults: bool = True,
+        pretty: bool = False,
+        exclude: t.Optional[t.Set[str]] = None,
+    ) -> str:
+        if not self.compact_profiles or (exclude and "configs" in exclude):
+            return super().dumpjson(exclude_defaults, pretty, exclude)
+        option = orjson.OPT_INDENT_2 if pretty else 0
+        return orjson.dumps(self.dump(exclude_defaults, exclude), option=option).decode()
+
+    def load_shards(self, shard_dir: Path) -> int:
+        """Merge per-guild config files into the DB, shards take priority over configs in the root file
+
+        Returns:
+            int: The number of guild configs loaded
+        """
+        if not shard_dir.is_dir():
+            return 0
+        loaded = 0
+        for path in shard_dir.glob("*.json"):
+            if not path.stem.isdigit():
+                continue
+            self.configs[int(path.stem)] = GuildSettings.from_file(path)
+            loaded += 1
+        return loaded
+
+    def save_shards(
+        self,
+        root_file: Path,
+        shard_dir: Path,
+        guild_ids: t.Iterable[int],
+        full: bool = False,
+        settings: bool = False,
+    ) -> int:
+        """Write the given guild configs to their own files, and the global settings if modified or doing a full save
+
+        Guilds that no longer have a config will have their file removed.
+        A full save also removes any leftover files for guilds that have been purged.
+
+        Returns:
+            int: The number of guild configs written
+        """
+        shard_dir.mkdir(exist_ok=True, parents=True)
+        if settings or full or not root_file.exists():
+            self.to_file(root_file, exclude={"configs"})
+        if full:
+            for path in shard_dir.glob("*.json"):
+                if path.stem.isdigit() and int(path.stem) not in self.configs:
+                    path.unlink(missing_ok=True)
+        written = 0
+        for gid in guild_ids:
+            path = shard_dir / f"{gid}.json"
+            conf = self.configs.get(gid)
+            if conf is None:
+                path.unlink(missing_ok=True)
+                continue
+            conf.to_file(path)
+            written += 1
+        return written
 
 
 def run_migrations(settings: t.Dict[str, t.Any]) -> DB:
@@ -423,3 +789,4 @@ def run_migrations(settings: t.Dict[str, t.Any]) -> DB:
     log.warning(f"Migrated {migrated} guilds to new schema")
     db: DB = DB.load(data)
     return db
+
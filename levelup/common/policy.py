@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import random
+import typing as t
+
+import discord
+
+if t.TYPE_CHECKING:
+    from .models import GuildSettings
+
+# (channel_id, parent_id, category_id), parent is only set for threads
+ChannelScope = t.Tuple[int, t.Optional[int], t.Optional[int]]
+
+
+def get_channel_scope(channel: t.Union[discord.abc.GuildChannel, discord.Thread]) -> ChannelScope:
+    """Get the IDs a channel's allow/ignore and bonus settings can match on"""
+    if isinstance(channel, discord.Thread):
+        parent = channel.parent
+        return channel.id, channel.parent_id, parent.category_id if parent else None
+    return channel.id, None, channel.category_id
+
+
+class XPPolicy:
+    """Precompiled, set based view of a guild's XP eligibility and bonus settings
+
+    Built from the GuildSettings lists once and reused for every message and voice event until the settings change.
+    Whether the cog is disabled in the guild and the guild's prefixes come from the bot and have to be awaited,
+    so the message listener fetches them once per policy. The policy is invalidated whenever a command completes
+    in the guild, which covers the core prefix and disable cog commands as well as this cog's settings.
+    """
+
+    __slots__ = (
+        "allowed_channels",
+        "ignored_channels",
+        "allowed_roles",
+        "ignored_roles",
+        "ignored_users",
+        "msg_role_bonus",
+        "voice_role_bonus",
+        "msg_channel_bonus",
+        "voice_channel_bonus",
+        "cog_disabled",
+        "prefixes",
+        "fetched",
+    )
+
+    def __init__(self, conf: GuildSettings):
+        self.allowed_channels: t.FrozenSet[int] = frozenset(conf.allowedchannels)
+        self.ignored_channels: t.FrozenSet[int] = frozenset(conf.ignoredchannels)
+        self.allowed_roles: t.FrozenSet[int] = frozenset(conf.allowedroles)
+        self.ignored_roles: t.FrozenSet[int] = frozenset(conf.ignoredroles)
+        self.ignored_users: t.FrozenSet[int] = frozenset(conf.ignoredusers)
+        self.msg_role_bonus: t.Dict[int, t.Tuple[int, int]] = {k: tuple(v) for k, v in conf.rolebonus.msg.items()}
+        self.voice_role_bonus: t.Dict[int, t.Tuple[int, int]] = {k: tuple(v) for k, v in conf.rolebonus.voice.items()}
+        self.msg_channel_bonus: t.Dict[int, t.Tuple[int, int]] = {
+            k: tuple(v) for k, v in conf.channelbonus.msg.items()
+        }
+        self.voice_channel_bonus: t.Dict[int, t.Tuple[int, int]] = {
+            k: tuple(v) for k, v in conf.channelbonus.voice.items()
+        }
+        self.cog_disabled: bool = False
+        self.prefixes: t.Tuple[str, ...] = ()
+        self.fetched: bool = False  # Whether cog_disabled and prefixes have been fetched from the bot
+
+    def eligible(
+        self,
+        scope: ChannelScope,
+        role_ids: t.AbstractSet[int],
+        user_id: t.Optional[int] = None,
+    ) -> bool:
+        """Whether a user with the given roles can gain XP in a channel
+
+        Args:
+            scope (ChannelScope): The channel, parent and category IDs from get_channel_scope
+            role_ids (t.AbstractSet[int]): The user's role IDs
+            user_id (t.Optional[int], optional): The user's ID, to check against ignored users. Defaults to None.
+        """
+        if user_id is not None and user_id in self.ignored_users:
+            return False
+        if self.allowed_channels and self.allowed_channels.isdisjoint(scope):
+            return False
+        if not self.ignored_channels.isdisjoint(scope):
+            return False
+        if self.allowed_roles and self.allowed_roles.isdisjoint(role_ids):
+            return False
+        if not self.ignored_roles.isdisjoint(role_ids):
+            return False
+        return True
+
+    def bonus(self, scope: ChannelScope, role_ids: t.AbstractSet[int], voice: bool = False) -> int:
+        """Roll the bonus XP for a channel and set of roles
+
+        The most specific channel bonus applies (channel, then parent, then category) and all role bonuses stack.
+        For voice the result is the bonus per minute.
+        """
+        channel_bonus = self.voice_channel_bonus if voice else self.msg_channel_bonus
+        role_bonus = self.voice_role_bonus if voice else self.msg_role_bonus
+        xp = 0
+        for channel_id in scope:
+            if channel_id in channel_bonus:
+                xp += random.randint(*channel_bonus[channel_id])
+                break
+        if role_bonus:
+            for role_id in role_ids & role_bonus.keys():
+                xp += random.randint(*role_bonus[role_id])
+        return xp
@@ -0,0 +1,209 @@
+import threading
+import typing as t
+
+import discord
+import numpy as np
+
+STATS = ("xp", "voice", "messages", "stars")
+
+
+class RankIndex:
+    """Per guild columnar snapshot of member stats, used for leaderboards and rank lookups
+
+    The snapshot has one row per ranked user sorted by user ID, with a float column per stat.
+    Each stat also keeps the ranked users in leaderboard order (highest first, ties broken by user ID),
+    so a position is found with a binary search instead of sorting.
+    Users are marked as touched whenever their profile is fetched, and the next time the index is synced
+    only those users are removed and re-inserted in the snapshot and in each leaderboard order.
+    Users deleted from the users dict or leaving the guild must be touched as well, the index is only rebuilt
+    when the users dict is replaced or the prestige XP changes.
+    Only users that are currently members of the guild are ranked.
+    """
+
+    def __init__(self):
+        self.uids: np.ndarray = np.empty(0, dtype=np.int64)
+        self.columns: t.Dict[str, np.ndarray] = {stat: np.empty(0, dtype=np.float64) for stat in STATS}
+        # Leaderboard order of each stat as the negated values and the user IDs, both sorted ascending together
+        self.keys: t.Dict[str, np.ndarray] = {stat: np.empty(0, dtype=np.float64) for stat in STATS}
+        self.ordered: t.Dict[str, np.ndarray] = {stat: np.empty(0, dtype=np.int64) for stat in STATS}
+
+        self.users: t.Optional[t.Dict[int, t.Any]] = None  # The users dict this index was built from
+        self.prestige_xp: int = 0  # XP each prestige level is worth, 0 if prestige isn't counted
+
+        self.pending: t.Set[int] = set()
+        self.pending_lock = threading.Lock()
+        # Syncing can happen from a worker thread while the event loop is touching users
+        self.lock = threading.Lock()
+
+    def touch(self, user_id: int) -> None:
+        with self.pending_lock:
+            self.pending.add(user_id)
+
+    def get_columns(self, profiles: t.List[t.Any]) -> t.Dict[str, np.ndarray]:
+        count = len(profiles)
+        columns = {
+            stat: np.fromiter((getattr(profile, stat) for profile in profiles), dtype=np.float64, count=count)
+            for stat in STATS
+        }
+        if self.prestige_xp:
+            prestige = np.fromiter((getattr(p, "prestige", 0) for p in profiles), dtype=np.float64, count=count)
+            columns["xp"] += prestige * self.prestige_xp
+        return columns
+
+    def sync(self, users: t.Dict[int, t.Any], guild: discord.Guild, prestige_xp: int = 0) -> None:
+        with self.pending_lock:
+            pending, self.pending = self.pending, set()
+        with self.lock:
+            # Users being replaced wholesale (resets, restores, imports) aren't touched individually
+            if users is not self.users or prestige_xp != self.prestige_xp:
+                self.rebuild(users, guild, prestige_xp)
+                return
+            if pending:
+                self.update(pending, users, guild)
+
+    def rebuild(self, users: t.Dict[int, t.Any], guild: discord.Guild, prestige_xp: int) -> None:
+        self.users = users
+        self.prestige_xp = prestige_xp
+        items = list(users.items())
+        uids = np.fromiter((user_id for user_id, _ in items), dtype=np.int64, count=len(items))
+        columns = self.get_columns([profile for _, profile in items])
+        member_ids = np.fromiter((member.id for member in guild.members), dtype=np.int64)
+        keep = np.isin(uids, member_ids)
+        order = np.argsort(uids[keep])
+        self.uids = uids[keep][order]
+        self.columns = {stat: column[keep][order] for stat, column in columns.items()}
+        self.sort()
+
+    def sort(self) -> None:
+        """Build the leaderboard order of every stat from scratch"""
+        for stat, column in self.columns.items():
+            # Rows are sorted by user ID, so a stable sort breaks ties by user ID
+            order = np.argsort(-column, kind="stable")
+            self.keys[stat] = -column[order]
+            self.ordered[stat] = self.uids[order]
+
+    def update(self, pending: t.Set[int], users: t.Dict[int, t.Any], guild: discord.Guild) -> None:
+        """Re-rank touched users, moving them in each leaderboard order rather than re-sorting it"""
+        touched = np.array(sorted(pending), dtype=np.int64)
+        idx = np.searchsorted(self.uids, touched)
+        found = idx < len(self.uids)
+        found[found] = self.uids[idx[found]] == touched[found]
+        uids = touched.tolist()
+        profiles = [users.get(uid) for uid in uids]
+        ranked = np.fromiter(
+            (profile is not None and guild.get_member(uid) is not None for uid, profile in zip(uids, profiles)),
+            dtype=bool,
+            count=len(uids),
+        )
+        # Re-sorting everything is cheaper than moving most of the users one by one
+        resort = len(touched) * 16 > len(self.uids)
+
+        # Users that are still ranked keep their row and are moved within each order
+        moved = found & ranked
+        if moved.any():
+            rows = idx[moved]
+            new_columns = self.get_columns([profile for profile, keep in zip(profiles, moved) if keep])
+            for stat in STATS:
+                column = self.columns[stat]
+                if not resort:
+                    for row, uid, value in zip(rows.tolist(), touched[moved].tolist(), new_columns[stat].tolist()):
+                        if column[row] != value:
+                            self.move(stat, uid, -column[row], -value)
+                column[rows] = new_columns[stat]
+
+        # Users that left or were removed lose their row
+        removed = found & ~ranked
+        if removed.any():
+            rows = idx[removed]
+            if not resort:
+                for stat in STATS:
+                    spots = [
+                        self.locate(stat, -value, uid)
+                        for uid, value in zip(touched[removed].tolist(), self.columns[stat][rows].tolist())
+                    ]
+                    self.keys[stat] = np.delete(self.keys[stat], spots)
+                    self.ordered[stat] = np.delete(self.ordered[stat], spots)
+            keep = np.ones(len(self.uids), dtype=bool)
+            keep[rows] = False
+            self.uids = self.uids[keep]
+            self.columns = {stat: column[keep] for stat, column in self.columns.items()}
+
+        # Users that joined or are new get a row
+        added = ~found & ranked
+        if added.any():
+            new_uids = touched[added]
+            new_columns = self.get_columns([profile for profile, keep in zip(profiles, added) if keep])
+            # Both sides are sorted by user ID so the insert positions keep the snapshot sorted
+            idx = np.searchsorted(self.uids, new_uids)
+            self.uids = np.insert(self.uids, idx, new_uids)
+            self.columns = {stat: np.insert(column, idx, new_columns[stat]) for stat, column in self.columns.items()}
+            if not resort:
+                for stat in STATS:
+                    keys = -new_columns[stat]
+                    # Inserting in leaderboard order keeps each spot valid for the ones after it
+                    order = np.lexsort((new_uids, keys))
+                    spots = [self.locate(stat, keys[i], new_uids[i]) for i in order.tolist()]
+                    self.keys[stat] = np.insert(self.keys[stat], spots, keys[order])
+                    self.ordered[stat] = np.insert(self.ordered[stat], spots, new_uids[order])
+
+        if resort:
+            self.sort()
+
+    def move(self, stat: str, user_id: int, old_key: float, new_key: float) -> None:
+        """Move a user to their new spot in the leaderboard order of a stat, shifting only the users in between"""
+        keys, ordered = self.keys[stat], self.ordered[stat]
+        old = self.locate(stat, old_key, user_id)
+        new = self.locate(stat, new_key, user_id)
+        if new > old:
+            # The spot was found with the user still in place ahead of it
+            new -= 1
+            keys[old:new] = keys[old + 1 : new + 1]
+            ordered[old:new] = ordered[old + 1 : new + 1]
+        elif new < old:
+            keys[new + 1 : old + 1] = keys[new:old]
+            ordered[new + 1 : old + 1] = ordered[new:old]
+        keys[new] = new_key
+        ordered[new] = user_id
+
+    def locate(self, stat: str, key: float, user_id: int) -> int:
+        """Index of a (negated value, user ID) pair in the leaderboard order of a stat"""
+        keys = self.keys[stat]
+        start = int(np.searchsorted(keys, key, side="left"))
+        end = int(np.searchsorted(keys, key, side="right"))
+        return start + int(np.searchsorted(self.ordered[stat][start:end], user_id))
+
+    def get_row(self, user_id: int) -> int:
+        idx = int(np.searchsorted(self.uids, user_id))
+        if idx < len(self.uids) and self.uids[idx] == user_id:
+            return idx
+        return -1
+
+    def position(self, stat: str, user_id: int) -> int:
+        """1 based position of the user, or -1 if they aren't ranked"""
+        with self.lock:
+            row = self.get_row(user_id)
+            if row == -1:
+                return -1
+            return self.locate(stat, -self.columns[stat][row], user_id) + 1
+
+    def ranked(self, stat: str) -> t.List[t.Tuple[int, float]]:
+        """All users with a value above zero as (user_id, value), highest first"""
+        with self.lock:
+            keys = self.keys[stat]
+            count = int(np.searchsorted(keys, 0, side="left"))
+            return list(zip(self.ordered[stat][:count].tolist(), (-keys[:count]).tolist()))
+
+    def stat_summary(self, stat: str, user_id: int) -> t.Dict[str, t.Union[int, float]]:
+        """Position, stat total and the percentage of the total the user holds"""
+        with self.lock:
+            column = self.columns[stat]
+            total = float(column.sum())
+            row = self.get_row(user_id)
+            if row == -1:
+                return {"position": -1, "total": total, "percent": 0}
+            return {
+                "position": self.locate(stat, -column[row], user_id) + 1,
+                "total": total,
+                "percent": float(column[row]) / total * 100 if total else 0,
+            }
+
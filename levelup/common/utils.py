@@ -156,6 +156,9 @@ def deep_getsizeof(obj: t.Any, seen: t.Optional[set] = None) -> int:
     elif hasattr(obj, "__dict__"):
         # If the object has a __dict__, it's likely an object. Find size of its dictionary
         size += deep_getsizeof(obj.__dict__, seen)
+    elif hasattr(obj, "__slots__"):
+        # Slotted objects have no __dict__, add the size of each slot's value
+        size += sum([deep_getsizeof(getattr(obj, i), seen) for i in obj.__slots__ if hasattr(obj, i)])
     elif hasattr(obj, "__iter__") and not isinstance(obj, (str, bytes, bytearray)):
         # If the object is an iterable (not a string or bytes), iterate through its items
         size += sum([deep_getsizeof(i, seen) for i in obj])
@@ -192,7 +192,8 @@ class DashboardIntegration(MixinMeta):
             conf.enabled = form.enabled.data
             conf.algorithm.base = form.algo_base.data or 100
             conf.algorithm.exp = form.algo_multiplier.data or 2.0
-            self.save()
+            conf.invalidate_policy()
+            self.save(guild)
             return {
                 "status": 0,
                 "notifications": [{"message": _("Settings saved"), "category": "success"}],
@@ -15,13 +15,14 @@ import uvicorn
 import uvicorn.config
 from decouple import config
 from dotenv import load_dotenv
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
 from uvicorn.config import LOGGING_CONFIG
 from uvicorn.logging import AccessFormatter, ColourizedFormatter
 
 try:
     # Running from the cog
     from .levelalert import generate_level_img
+    from .rendercache import RenderCache, make_key
     from .styles.default import generate_default_profile
     from .styles.runescape import generate_runescape_profile
 
@@ -29,6 +30,7 @@ try:
 except ImportError:
     # Running as separate service
     from levelalert import generate_level_img
+    from rendercache import RenderCache, make_key
     from styles.default import generate_default_profile
     from styles.runescape import generate_runescape_profile
 
@@ -52,6 +54,8 @@ DEFAULT_WORKERS: int = os.cpu_count() or 1
 ROOT = Path(__file__).parent
 LOG_DIR = Path.home() / "levelup-api-logs"
 PROC: t.Union[mp.Process, asyncio.subprocess.Process] = None
+# Each worker process keeps its own cache of rendered images
+CACHE = RenderCache(max_bytes=config("LEVELUP_RENDER_CACHE_MB", default=64, cast=int) * 1024 * 1024)
 
 
 if SERVICE:
@@ -121,14 +125,39 @@ def get_kwargs(form_data: t.Dict[str, t.Any]) -> t.Dict[str, t.Any]:
     return kwargs
 
 
+async def render(
+    request: Request,
+    kind: str,
+    func: t.Callable[..., t.Tuple[bytes, bool]],
+    kwargs: t.Dict[str, t.Any],
+) -> t.Union[dict, Response]:
+    """Render an image, reusing cached renders with identical inputs
+
+    Clients that accept images get the raw image back with an X-Animated header,
+    otherwise the image is returned base64 encoded in json
+    """
+    key = make_key(kind, **{k: v for k, v in kwargs.items() if k != "reraise"})
+    if cached := await asyncio.to_thread(CACHE.get, key):
+        img_bytes, animated = cached
+    else:
+        img_bytes, animated = await asyncio.to_thread(func, **kwargs)
+        await asyncio.to_thread(CACHE.put, key, img_bytes, animated)
+    if "image/" in request.headers.get("accept", ""):
+        return Response(
+            content=img_bytes,
+            media_type="image/gif" if animated else "image/webp",
+            headers={"X-Animated": "1" if animated else "0"},
+        )
+    encoded = base64.b64encode(img_bytes).decode("utf-8")
+    return {"b64": encoded, "animated": animated}
+
+
 @app.post("/fullprofile")
 async def fullprofile(request: Request):
     form_data = await request.form()
     kwargs = get_kwargs(form_data)
     log.info(f"Generating full profile for {kwargs['username']}")
-    img_bytes, animated = await asyncio.to_thread(generate_default_profile, **kwargs)
-    encoded = base64.b64encode(img_bytes).decode("utf-8")
-    return {"b64": encoded, "animated": animated}
+    return await render(request, "default", generate_default_profile, kwargs)
 
 
 @app.post("/runescape")
@@ -136,9 +165,7 @@ async def runescape(request: Request):
     form_data = await request.form()
     kwargs = get_kwargs(form_data)
     log.info(f"Generating runescape profile for {kwargs['username']}")
-    img_bytes, animated = await asyncio.to_thread(generate_runescape_profile, **kwargs)
-    encoded = base64.b64encode(img_bytes).decode("utf-8")
-    return {"b64": encoded, "animated": animated}
+    return await render(request, "runescape", generate_runescape_profile, kwargs)
 
 
 @app.post("/levelup")
@@ -146,14 +173,12 @@ async def levelup(request: Request):
     form_data = await request.form()
     kwargs = get_kwargs(form_data)
     log.info("Generating levelup image")
-    img_bytes, animated = await asyncio.to_thread(generate_level_img, **kwargs)
-    encoded = base64.b64encode(img_bytes).decode("utf-8")
-    return {"b64": encoded, "animated": animated}
+    return await render(request, "levelup", generate_level_img, kwargs)
 
 
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
+    return {"status": "ok", "cache": CACHE.stats()}
 
 
 def port_in_use(port: int) -> bool:
@@ -192,21 +217,30 @@ async def run(
     port: t.Optional[int] = 8888,
     log_dir: t.Optional[t.Union[Path, str]] = None,
     host: t.Optional[str] = None,
+    uds: t.Optional[t.Union[Path, str]] = None,
 ) -> t.Union[mp.Process, asyncio.subprocess.Process]:
+    """Spin up the API workers
+
+    If a unix socket path is given (not supported on Windows) the API listens on it instead of a TCP port
+    """
     if not port:
         port = 8888
     if log_dir:
         global LOG_DIR
         LOG_DIR = log_dir if isinstance(log_dir, Path) else Path(log_dir)
+    if IS_WINDOWS:
+        uds = None
 
-    # Check if port is being used
-    if port_in_use(port):
+    if uds:
+        # Clear out a socket left behind by a previous run
+        Path(uds).unlink(missing_ok=True)
+    elif port_in_use(port):
         raise Exception("Port already in use")
 
     APP_DIR = str(ROOT)
     log.info(f"Running API from {APP_DIR}")
     log.info(f"Log directory: {LOG_DIR} (As Service: {SERVICE})")
-    log.info(f"Spinning up {DEFAULT_WORKERS} workers on port {port} in 5s...")
+    log.info(f"Spinning up {DEFAULT_WORKERS} workers on {f'socket {uds}' if uds else f'port {port}'} in 5s...")
     await asyncio.sleep(5)
 
     if IS_WINDOWS:
@@ -235,12 +269,12 @@ async def run(
     cmd = [
         f"{exe_path} -m uvicorn api:app",
         f"--workers {DEFAULT_WORKERS}",
-        f"--port {port}",
+        f"--uds {uds}" if uds else f"--port {port}",
         f"--app-dir {APP_DIR}",
     ]
-    if SERVICE and not host:
+    if SERVICE and not host and not uds:
         cmd.append("--host 0.0.0.0")
-    elif host:
+    elif host and not uds:
         cmd.append(f"--host {host}")
 
     cmd = " ".join(cmd)
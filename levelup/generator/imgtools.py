@@ -1,7 +1,11 @@
+import functools
+import hashlib
 import logging
 import math
 import random
+import threading
 import typing as t
+from collections import OrderedDict
 from io import BytesIO
 from pathlib import Path
 from typing import Union
@@ -34,14 +38,87 @@ log = logging.getLogger("red.vrt.levelup.imagetools")
 _ = Translator("LevelUp", __file__)
 
 
+class AssetCache:
+    """Small thread safe LRU for decoded assets, shared by every render in the process
+
+    Bounded by both entry count and the total size of the entries in bytes, as given when they're added.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        # {key: (value, size)}
+        self.entries: OrderedDict[t.Hashable, t.Tuple[t.Any, int]] = OrderedDict()
+        self.size = 0
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+    def get(self, key: t.Hashable) -> t.Any:
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+    def put(self, key: t.Hashable, value: t.Any, size: int) -> None:
+        if size > self.max_bytes:
+            # Would evict everything else and still not fit
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.size += size
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _key, (_value, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+def image_size(image: Image.Image) -> int:
+    """Approximate memory held by a decoded image"""
+    return image.width * image.height * len(image.getbands())
+
+
+# Fitted backgrounds are ~2MB each at profile size
+BACKGROUNDS = AssetCache(max_entries=32, max_bytes=64 * 1024 * 1024)
+AVATARS = AssetCache(max_entries=256, max_bytes=16 * 1024 * 1024)
+# URL -> (etag, last_modified, content), banners and GIFs can be several MB each
+DOWNLOADS = AssetCache(max_entries=128, max_bytes=32 * 1024 * 1024)
+SESSION = requests.Session()
+SESSION.headers["User-Agent"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:126.0) Gecko/20100101 Firefox/126.0"
+
+
+def digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
 def download_image(url: str) -> t.Union[bytes, None]:
-    """Get an image from a URL"""
-    headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:126.0) Gecko/20100101 Firefox/126.0"}
+    """Get an image from a URL
+
+    Responses are kept by URL and revalidated with ETag/Last-Modified, so unchanged images aren't downloaded twice
+    """
+    headers = {}
+    cached: t.Optional[t.Tuple[t.Optional[str], t.Optional[str], bytes]] = DOWNLOADS.get(url)
+    if cached:
+        etag, last_modified, _content = cached
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
     try:
-        response = requests.get(url, headers=headers)
+        response = SESSION.get(url, headers=headers, timeout=30)
+        if response.status_code == 304 and cached:
+            return cached[2]
         if response.status_code == 404:
             return None
         response.raise_for_status()
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if etag or last_modified:
+            DOWNLOADS.put(url, (etag, last_modified, response.content), len(response.content))
         return response.content
     except requests.HTTPError as e:
         log.warning(f"Failed to download image URL: {url}\n{e}")
@@ -100,33 +177,59 @@ def make_circle_outline(thickness: int, color: tuple) -> Image.Image:
     return img
 
 
+@functools.lru_cache(maxsize=32)
+def get_circle_outline(thickness: int, color: tuple, size: t.Tuple[int, int]) -> Image.Image:
+    """Cached circle outline resized to fit around an avatar, must not be modified"""
+    return make_circle_outline(thickness, color).resize(size, Image.Resampling.LANCZOS)
+
+
+@functools.lru_cache(maxsize=32)
+def get_status_icon(status: str, size: t.Tuple[int, int]) -> Image.Image:
+    """Cached status icon at the given size, must not be modified"""
+    return STATUS[status].resize(size, Image.Resampling.LANCZOS)
+
+
+@functools.lru_cache(maxsize=256)
+def get_font(path: t.Union[str, Path], size: int) -> ImageFont.FreeTypeFont:
+    """Load a font once per path and size"""
+    return ImageFont.truetype(str(path), size)
+
+
+@functools.lru_cache(maxsize=64)
+def get_circle_mask(size: t.Tuple[int, int], method: Image.Resampling = Image.Resampling.LANCZOS) -> Image.Image:
+    """Cached anti-aliased circle mask, must not be modified"""
+    # Create a mask at 4x size (So we can scale down to smooth the edges later)
+    mask = Image.new("L", (size[0] * 4, size[1] * 4), 0)
+    draw = ImageDraw.Draw(mask)
+    draw.ellipse((0, 0, mask.width, mask.height), fill=255)
+    # Resize the mask to the image size
+    return mask.resize(size, method)
+
+
 def make_profile_circle(
     pfp: Image.Image,
     method: Image.Resampling = Image.Resampling.LANCZOS,
 ) -> Image.Image:
     """Crop an image into a circle"""
-    # Create a mask at 4x size (So we can scale down to smooth the edges later)
-    mask = Image.new("L", (pfp.width * 4, pfp.height * 4), 0)
-    draw = ImageDraw.Draw(mask)
-    draw.ellipse((0, 0, mask.width, mask.height), fill=255)
-    # Resize the mask to the image size
-    mask = mask.resize(pfp.size, method)
-    # Apply the mask
-    pfp.putalpha(mask)
+    pfp.putalpha(get_circle_mask(pfp.size, method))
     return pfp
 
 
-def get_rounded_corner_mask(image: Image.Image, radius: int) -> Image.Image:
-    """Get a mask for rounded corners"""
-    mask = Image.new("L", (image.width * 4, image.height * 4), 0)
+@functools.lru_cache(maxsize=64)
+def _rounded_corner_mask(size: t.Tuple[int, int], radius: int) -> Image.Image:
+    mask = Image.new("L", (size[0] * 4, size[1] * 4), 0)
     draw = ImageDraw.Draw(mask)
     draw.rounded_rectangle(
         (0, 0, mask.width, mask.height),
         fill=255,
         radius=radius * 4,
     )
-    mask = mask.resize(image.size, Image.Resampling.LANCZOS)
-    return mask
+    return mask.resize(size, Image.Resampling.LANCZOS)
+
+
+def get_rounded_corner_mask(image: Image.Image, radius: int) -> Image.Image:
+    """Get a mask for rounded corners, cached per size and radius so it must not be modified"""
+    return _rounded_corner_mask(image.size, radius)
 
 
 def round_image_corners(image: Image.Image, radius: int) -> Image.Image:
@@ -199,7 +302,7 @@ def format_fonts(filepaths: t.List[str]) -> Image.Image:
     color = (255, 255, 255)
     draw = ImageDraw.Draw(img)
     for idx, path in enumerate(filepaths):
-        font = ImageFont.truetype(path, fontsize)
+        font = get_font(path, fontsize)
         draw.text((5, idx * (fontsize + 15)), Path(path).stem, color, font=font, stroke_width=1, stroke_fill=(0, 0, 0))
     return img
 
@@ -224,7 +327,7 @@ def format_backgrounds(filepaths: t.List[str]) -> Image.Image:
             draw.text(
                 (10, 10),
                 name,
-                font=ImageFont.truetype(str(DEFAULT_FONT), 100),
+                font=get_font(DEFAULT_FONT, 100),
                 fill=(255, 255, 255),
                 stroke_width=5,
                 stroke_fill="#000000",
@@ -362,14 +465,91 @@ def fit_aspect_ratio(
         return image.resize(desired_size, method)
 
 
+@functools.lru_cache(maxsize=1)
+def get_stock_backgrounds() -> t.Tuple[Path, ...]:
+    return tuple(DEFAULT_BACKGROUNDS.glob("*.webp"))
+
+
 def get_random_background() -> Image.Image:
     """Get a random background image"""
-    files = list(DEFAULT_BACKGROUNDS.glob("*.webp"))
+    files = get_stock_backgrounds()
     if not files:
         raise FileNotFoundError("No background images found")
     return Image.open(random.choice(files))
 
 
+def get_background(
+    data: t.Optional[bytes],
+    size: t.Tuple[int, int],
+    allow_animated: bool = False,
+) -> Image.Image:
+    """
+    Decode a background and fit it to the card size
+
+    Static backgrounds are cached by their content so repeat renders skip decoding and resizing.
+    Animated backgrounds are returned as-is if allowed, otherwise their first frame is used.
+
+    Args:
+        data (t.Optional[bytes]): The background image, or None for a random stock background
+        size (t.Tuple[int, int]): The card size to fit the background to
+        allow_animated (bool, optional): Return animated backgrounds untouched. Defaults to False.
+
+    Returns:
+        Image: An RGBA image of the given size that is safe to modify, or the raw animated image
+    """
+    if data:
+        key = (digest(data), size)
+        source = BytesIO(data)
+    else:
+        files = get_stock_backgrounds()
+        if not files:
+            raise FileNotFoundError("No background images found")
+        source = random.choice(files)
+        key = (str(source), size)
+
+    if cached := BACKGROUNDS.get(key):
+        image, animated = cached
+        if not (animated and allow_animated):
+            return image.copy()
+
+    image = Image.open(source)
+    animated = getattr(image, "is_animated", False)
+    if animated and allow_animated:
+        return image
+    fitted = fit_aspect_ratio(image.convert("RGBA"), size)
+    BACKGROUNDS.put(key, (fitted, animated), image_size(fitted))
+    return fitted.copy()
+
+
+def get_profile_circle(data: t.Optional[bytes], size: t.Tuple[int, int]) -> Image.Image:
+    """
+    Decode an avatar, resize it and crop it into a circle, using the first frame if animated
+
+    Results are cached by content so the returned image must not be modified.
+
+    Args:
+        data (t.Optional[bytes]): The avatar image, or None for the default avatar
+        size (t.Tuple[int, int]): The size of the profile circle
+    """
+    key = (digest(data) if data else None, size)
+    if (cached := AVATARS.get(key)) is not None:
+        return cached
+    pfp = Image.open(BytesIO(data)) if data else DEFAULT_PFP
+    pfp = pfp.convert("RGBA").resize(size, Image.Resampling.LANCZOS)
+    pfp = make_profile_circle(pfp)
+    AVATARS.put(key, pfp, image_size(pfp))
+    return pfp
+
+
+def preload_assets() -> None:
+    """Load the stock assets and default fonts ahead of the first render"""
+    for image in (STAR, DEFAULT_PFP, RS_TEMPLATE, RS_TEMPLATE_BALANCE, *STATUS.values()):
+        image.load()
+    get_stock_backgrounds()
+    for size in range(20, 61):
+        get_font(DEFAULT_FONT, size)
+
+
 def get_avg_duration(image: Image.Image) -> int:
     """Get the average duration of a GIF"""
     if not getattr(image, "is_animated", False):
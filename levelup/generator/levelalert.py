@@ -19,7 +19,7 @@ import typing as t
 from io import BytesIO
 from pathlib import Path
 
-from PIL import Image, ImageDraw, ImageFont, ImageSequence, UnidentifiedImageError
+from PIL import Image, ImageDraw, ImageSequence, UnidentifiedImageError
 from redbot.core.i18n import Translator
 
 try:
@@ -49,14 +49,13 @@ def generate_level_img(
         log.debug("Avatar image is a URL, attempting to download")
         avatar_bytes = imgtools.download_image(avatar_bytes)
 
-    if background_bytes:
-        try:
-            card = Image.open(BytesIO(background_bytes))
-        except UnidentifiedImageError as e:
-            log.error("Error opening background image", exc_info=e)
-            card = imgtools.get_random_background()
-    else:
-        card = imgtools.get_random_background()
+    desired_card_size = (200, 70)
+    # Static backgrounds come back already fitted to the card size
+    try:
+        card = imgtools.get_background(background_bytes, desired_card_size, allow_animated=render_gif)
+    except UnidentifiedImageError as e:
+        log.error("Error opening background image", exc_info=e)
+        card = imgtools.get_background(None, desired_card_size)
     if avatar_bytes:
         pfp = Image.open(BytesIO(avatar_bytes))
     else:
@@ -66,7 +65,6 @@ def generate_level_img(
     bg_animated = getattr(card, "is_animated", False)
     log.debug(f"PFP animated: {pfp_animated}, BG animated: {bg_animated}")
 
-    desired_card_size = (200, 70)
     # 3 layers: card, profile, text
 
     # PREPARE THE TEXT LAYER
@@ -82,12 +80,12 @@ def generate_level_img(
         else:
             font_path = imgtools.DEFAULT_FONT
     font_path = str(font_path)
-    font = ImageFont.truetype(font_path, fontsize)
+    font = imgtools.get_font(font_path, fontsize)
     text = _("Level {}").format(level)
     placement_area_center_x = th + ((tw - th) / 2)
     while font.getlength(text) > (tw - th) - 10:
         fontsize -= 1
-        font = ImageFont.truetype(font_path, fontsize)
+        font = imgtools.get_font(font_path, fontsize)
     draw = ImageDraw.Draw(text_layer)
     draw.text(
         xy=(placement_area_center_x, int(th / 2)),
@@ -103,11 +101,8 @@ def generate_level_img(
         # Render a static pfp on a static background
         if not card.mode == "RGBA":
             card = card.convert("RGBA")
-        if not pfp.mode == "RGBA":
-            pfp = pfp.convert("RGBA")
         card = imgtools.fit_aspect_ratio(card, desired_card_size)
-        pfp = pfp.resize((card.height, card.height), Image.Resampling.LANCZOS)
-        pfp = imgtools.make_profile_circle(pfp)
+        pfp = imgtools.get_profile_circle(avatar_bytes, (card.height, card.height))
         card.paste(text_layer, (0, 0), text_layer)
         card.paste(pfp, (0, 0), pfp)
         card = imgtools.round_image_corners(card, card.height)
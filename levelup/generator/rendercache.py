@@ -0,0 +1,169 @@
+"""Bounded cache for rendered profile and level-up images
+
+Images are keyed on a hash of everything that went into rendering them, so two renders with identical inputs
+(same style, stats, avatar, background, colors, font...) share a single entry regardless of who requested them.
+Entries are evicted least recently used first once the memory budget is exceeded, and can optionally spill over
+to disk instead of being dropped.
+"""
+
+import hashlib
+import logging
+import threading
+import typing as t
+from collections import OrderedDict
+from pathlib import Path
+
+log = logging.getLogger("red.vrt.levelup.generator.rendercache")
+
+
+def make_key(kind: str, **inputs: t.Any) -> str:
+    """Hash the render inputs into a cache key
+
+    Args:
+        kind (str): What is being rendered, such as the profile style or "levelup"
+        **inputs: The kwargs passed to the image generator
+
+    Returns:
+        str: A hex digest of the inputs
+    """
+    hasher = hashlib.blake2b(kind.encode(), digest_size=20)
+    for name in sorted(inputs):
+        value = inputs[name]
+        hasher.update(b"\x00" + name.encode() + b"\x00")
+        if isinstance(value, (bytes, bytearray)):
+            hasher.update(b"b")
+            hasher.update(value)
+        else:
+            hasher.update(b"r")
+            hasher.update(repr(value).encode())
+    return hasher.hexdigest()
+
+
+class RenderCache:
+    """Thread safe LRU cache of rendered images with a memory budget and optional disk spillover"""
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        spill_dir: t.Optional[Path] = None,
+        max_spill_bytes: int = 0,
+    ):
+        self.entries: OrderedDict[str, t.Tuple[bytes, bool]] = OrderedDict()
+        self.size: int = 0
+        self.max_bytes: int = max_bytes
+        self.spill_dir: t.Optional[Path] = None
+        self.spill_size: int = 0
+        self.max_spill_bytes: int = 0
+        self.lock = threading.Lock()
+
+        self.hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+
+        self.configure(max_bytes, spill_dir, max_spill_bytes)
+
+    def configure(self, max_bytes: int, spill_dir: t.Optional[Path] = None, max_spill_bytes: int = 0) -> None:
+        """Update the memory and disk budgets, trimming the cache if it's now too large"""
+        with self.lock:
+            self.max_bytes = max_bytes
+            self.max_spill_bytes = max_spill_bytes if spill_dir else 0
+            self.spill_dir = spill_dir if self.max_spill_bytes else None
+            if self.spill_dir:
+                self.spill_dir.mkdir(exist_ok=True, parents=True)
+                self.spill_size = sum(i.stat().st_size for i in self.spill_dir.iterdir() if i.is_file())
+                self._trim_disk()
+            self._trim()
+
+    def get(self, key: str) -> t.Optional[t.Tuple[bytes, bool]]:
+        """Get (image_bytes, animated) for a key, or None if it isn't cached"""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            if self.spill_dir:
+                for animated, ext in ((False, "webp"), (True, "gif")):
+                    path = self.spill_dir / f"{key}.{ext}"
+                    if not path.exists():
+                        continue
+                    try:
+                        data = path.read_bytes()
+                    except OSError:
+                        break
+                    self.disk_hits += 1
+                    # Promote back into memory
+                    path.unlink(missing_ok=True)
+                    self.spill_size -= len(data)
+                    self._store(key, data, animated)
+                    return data, animated
+            self.misses += 1
+            return None
+
+    def put(self, key: str, data: bytes, animated: bool) -> None:
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return
+            self._store(key, data, animated)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            if self.spill_dir:
+                for path in self.spill_dir.iterdir():
+                    path.unlink(missing_ok=True)
+                self.spill_size = 0
+
+    def stats(self) -> t.Dict[str, int]:
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "size": self.size,
+                "max_bytes": self.max_bytes,
+                "spill_size": self.spill_size,
+                "max_spill_bytes": self.max_spill_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
+
+    def _store(self, key: str, data: bytes, animated: bool) -> None:
+        if len(data) > self.max_bytes:
+            self._spill(key, data, animated)
+            return
+        self.entries[key] = (data, animated)
+        self.size += len(data)
+        self._trim()
+
+    def _trim(self) -> None:
+        while self.entries and self.size > self.max_bytes:
+            key, (data, animated) = self.entries.popitem(last=False)
+            self.size -= len(data)
+            self._spill(key, data, animated)
+
+    def _spill(self, key: str, data: bytes, animated: bool) -> None:
+        if not self.spill_dir or len(data) > self.max_spill_bytes:
+            return
+        path = self.spill_dir / f"{key}.{'gif' if animated else 'webp'}"
+        try:
+            path.write_bytes(data)
+        except OSError as e:
+            log.warning(f"Failed to spill render to disk: {e}")
+            return
+        self.spill_size += len(data)
+        self._trim_disk()
+
+    def _trim_disk(self) -> None:
+        if self.spill_size <= self.max_spill_bytes:
+            return
+        files = sorted(
+            (i for i in self.spill_dir.iterdir() if i.is_file()),
+            key=lambda x: x.stat().st_mtime,
+        )
+        for path in files:
+            if self.spill_size <= self.max_spill_bytes:
+                break
+            size = path.stat().st_size
+            path.unlink(missing_ok=True)
+            self.spill_size -= size
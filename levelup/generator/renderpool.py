@@ -0,0 +1,146 @@
+"""Process pool for rendering images off the bot's process
+
+Rendering with threads still holds the GIL for most of the work, so concurrent renders serialize and slow down the
+event loop. This pool runs the generators in worker processes instead.
+"""
+
+import asyncio
+import logging
+import multiprocessing as mp
+import site
+import typing as t
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from time import perf_counter
+
+log = logging.getLogger("red.vrt.levelup.generator.renderpool")
+
+# Directory the cog package lives in, so workers can import it to unpickle render calls
+COG_PARENT = str(Path(__file__).parent.parent.parent)
+
+
+def _warm() -> None:
+    from . import imgtools
+
+    imgtools.preload_assets()
+
+
+def _render(kind: str, kwargs: t.Dict[str, t.Any]) -> t.Tuple[bytes, bool, float]:
+    from .levelalert import generate_level_img
+    from .styles.default import generate_default_profile
+    from .styles.runescape import generate_runescape_profile
+
+    funcs = {
+        "default": generate_default_profile,
+        "runescape": generate_runescape_profile,
+        "levelup": generate_level_img,
+    }
+    start = perf_counter()
+    img_bytes, animated = funcs[kind](**kwargs)
+    return img_bytes, animated, perf_counter() - start
+
+
+class RenderPool:
+    """Renders images in a pool of worker processes, tracking queue depth and render times"""
+
+    def __init__(self):
+        self.executor: t.Optional[ProcessPoolExecutor] = None
+        self.workers: int = 0
+        self.max_queue: int = 0
+        self.pending: int = 0  # Renders submitted and not yet finished
+        self.rendered: int = 0
+        self.rejected: int = 0
+        self.durations: t.Deque[float] = deque(maxlen=1000)
+
+    @property
+    def running(self) -> bool:
+        return self.executor is not None
+
+    @property
+    def queued(self) -> int:
+        """Renders waiting for a free worker"""
+        return max(self.pending - self.workers, 0)
+
+    @property
+    def busy(self) -> bool:
+        """Whether the queue is full and new renders should fall back to embeds"""
+        return self.running and self.queued >= self.max_queue
+
+    def start(self, workers: int, max_queue: int) -> None:
+        self.stop()
+        self.workers = workers
+        self.max_queue = max_queue
+        if not workers:
+            return
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=site.addsitedir,
+            initargs=(COG_PARENT,),
+        )
+        # Workers are spawned on demand, get them all up and loaded before the first render
+        for _ in range(workers):
+            self.executor.submit(_warm)
+        log.info(f"Render pool started with {workers} workers")
+
+    def stop(self) -> None:
+        if self.executor is None:
+            return
+        # Renders already submitted are left to finish in the old workers rather than cancelled, their callers are
+        # still waiting on them. The old workers exit once the queue is drained, new renders go to the next pool.
+        self.executor.shutdown(wait=False, cancel_futures=False)
+        self.executor = None
+        log.info("Render pool stopped")
+
+    def reject(self) -> None:
+        self.rejected += 1
+
+    async def render(self, kind: str, kwargs: t.Dict[str, t.Any]) -> t.Tuple[bytes, bool]:
+        """Render an image in the pool
+
+        Args:
+            kind (str): "default", "runescape" or "levelup"
+            kwargs (t.Dict[str, t.Any]): The kwargs for the generator
+
+        Returns:
+            t.Tuple[bytes, bool]: The image bytes and whether it is animated
+        """
+        if self.executor is None:
+            raise RuntimeError("Render pool is not running")
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        self.pending += 1
+        try:
+            img_bytes, animated, elapsed = await loop.run_in_executor(executor, _render, kind, kwargs)
+        except BrokenProcessPool:
+            # A worker died, spin up a fresh pool for the next render if nothing else has yet
+            if self.executor is executor:
+                log.error("Render pool broke, restarting it")
+                self.start(self.workers, self.max_queue)
+            raise
+        finally:
+            self.pending -= 1
+        self.rendered += 1
+        self.durations.append(elapsed)
+        return img_bytes, animated
+
+    def stats(self) -> t.Dict[str, t.Union[int, float]]:
+        durations = sorted(self.durations)
+
+        def percentile(pct: float) -> float:
+            if not durations:
+                return 0
+            return durations[round(pct * (len(durations) - 1))]
+
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "pending": self.pending,
+            "queued": self.queued,
+            "rendered": self.rendered,
+            "rejected": self.rejected,
+            "p50": percentile(0.5),
+            "p95": percentile(0.95),
+        }
@@ -6,7 +6,7 @@ import typing as t
 from io import BytesIO
 from pathlib import Path
 
-from PIL import Image, ImageDraw, ImageFont, ImageSequence, UnidentifiedImageError
+from PIL import Image, ImageDraw, ImageSequence, UnidentifiedImageError
 from redbot.core.i18n import Translator
 from redbot.core.utils.chat_formatting import humanize_number
 
@@ -168,27 +168,6 @@ def generate_default_profile(
     else:
         role_icon_bytes = role_icon
 
-    if background_bytes:
-        try:
-            card = Image.open(BytesIO(background_bytes))
-        except UnidentifiedImageError as e:
-            if reraise:
-                raise e
-            log.error(
-                f"Failed to open background image ({type(background_bytes)} - {len(background_bytes)})", exc_info=e
-            )
-            card = imgtools.get_random_background()
-    else:
-        card = imgtools.get_random_background()
-    if avatar_bytes:
-        pfp = Image.open(BytesIO(avatar_bytes))
-    else:
-        pfp = imgtools.DEFAULT_PFP
-
-    pfp_animated = getattr(pfp, "is_animated", False)
-    bg_animated = getattr(card, "is_animated", False)
-    log.debug(f"PFP animated: {pfp_animated}, BG animated: {bg_animated}")
-
     # Setup
     default_fill = (0, 0, 0)  # Default fill color for text
     stroke_width = 2  # Width of the stroke around text
@@ -237,6 +216,23 @@ def generate_default_profile(
         star_icon_x = 850  # Left bound of star icon
         star_icon_y = 35  # Top bound of star icon
 
+    # Static backgrounds come back already fitted to the card size
+    try:
+        card = imgtools.get_background(background_bytes, desired_card_size, allow_animated=render_gif)
+    except UnidentifiedImageError as e:
+        if reraise:
+            raise e
+        log.error(f"Failed to open background image ({type(background_bytes)} - {len(background_bytes)})", exc_info=e)
+        card = imgtools.get_background(None, desired_card_size)
+    if avatar_bytes:
+        pfp = Image.open(BytesIO(avatar_bytes))
+    else:
+        pfp = imgtools.DEFAULT_PFP
+
+    pfp_animated = getattr(pfp, "is_animated", False)
+    bg_animated = getattr(card, "is_animated", False)
+    log.debug(f"PFP animated: {pfp_animated}, BG animated: {bg_animated}")
+
     # Establish layer for all text and accents
     stats = Image.new("RGBA", desired_card_size, (0, 0, 0, 0))
 
@@ -266,12 +262,12 @@ def generate_default_profile(
     draw = ImageDraw.Draw(stats)
     # ---------------- Username text ----------------
     fontsize = 60
-    font = ImageFont.truetype(font_path, fontsize)
+    font = imgtools.get_font(font_path, fontsize)
     with Pilmoji(stats) as pilmoji:
         # Ensure text doesnt pass star_icon_x
         while pilmoji.getsize(username, font)[0] + stat_start > star_icon_x - 10:
             fontsize -= 1
-            font = ImageFont.truetype(font_path, fontsize)
+            font = imgtools.get_font(font_path, fontsize)
         pilmoji.text(
             xy=(stat_start, name_y),
             text=username,
@@ -284,11 +280,11 @@ def generate_default_profile(
     if prestige:
         text = _("(Prestige {})").format(f"{humanize_number(prestige)}")
         fontsize = 40
-        font = ImageFont.truetype(font_path, fontsize)
+        font = imgtools.get_font(font_path, fontsize)
         # Ensure text doesnt pass stat_end
         while font.getlength(text) + stat_start > stat_end:
             fontsize -= 1
-            font = ImageFont.truetype(font_path, fontsize)
+            font = imgtools.get_font(font_path, fontsize)
         draw.text(
             xy=(stat_start, name_y + 70),
             text=text,
@@ -306,11 +302,11 @@ def generate_default_profile(
     # ---------------- Stars text ----------------
     text = humanize_number(stars)
     fontsize = 60
-    font = ImageFont.truetype(font_path, fontsize)
+    font = imgtools.get_font(font_path, fontsize)
     # Ensure text doesnt pass stat_end
     while font.getlength(text) + star_text_x > stat_end:
         fontsize -= 1
-        font = ImageFont.truetype(font_path, fontsize)
+        font = imgtools.get_font(font_path, fontsize)
     draw.text(
         xy=(star_text_x, star_text_y),
         text=text,
@@ -323,11 +319,11 @@ def generate_default_profile(
     # ---------------- Rank text ----------------
     text = _("Rank: {}").format(f"#{humanize_number(position)}")
     fontsize = 40
-    font = ImageFont.truetype(font_path, fontsize)
+    font = imgtools.get_font(font_path, fontsize)
     # Ensure text doesnt pass stat_split point
     while font.getlength(text) + stat_start > stat_split - 5:
         fontsize -= 1
-        font = ImageFont.truetype(font_path, fontsize)
+        font = imgtools.get_font(font_path, fontsize)
     draw.text(
         xy=(stat_start, stats_y),
         text=text,
@@ -339,11 +335,11 @@ def generate_default_profile(
     # ---------------- Level text ----------------
     text = _("Level: {}").format(humanize_number(level))
     fontsize = 40
-    font = ImageFont.truetype(font_path, fontsize)
+    font = imgtools.get_font(font_path, fontsize)
     # Ensure text doesnt pass the stat_split point
     while font.getlength(text) + stat_start > stat_split - 5:
         fontsize -= 1
-        font = ImageFont.truetype(font_path, fontsize)
+        font = imgtools.get_font(font_path, fontsize)
     draw.text(
         xy=(stat_start, stats_y + stat_offset),
         text=text,
@@ -355,11 +351,11 @@ def generate_default_profile(
     # ---------------- Messages text ----------------
     text = _("Messages: {}").format(humanize_number(messages))
     fontsize = 40
-    font = ImageFont.truetype(font_path, fontsize)
+    font = imgtools.get_font(font_path, fontsize)
     # Ensure text doesnt pass the stat_end
     while font.getlength(text) + stat_split > stat_end:
         fontsize -= 1
-        font = ImageFont.truetype(font_path, fontsize)
+        font = imgtools.get_font(font_path, fontsize)
     draw.text(
         xy=(stat_split, stats_y),
         text=text,
@@ -371,11 +367,11 @@ def generate_default_profile(
     # ---------------- Voice text ----------------
     text = _("Voice: {}").format(imgtools.abbreviate_time(voicetime))
     fontsize = 40
-    font = ImageFont.truetype(font_path, fontsize)
+    font = imgtools.get_font(font_path, fontsize)
     # Ensure text doesnt pass the stat_end
     while font.getlength(text) + stat_split > stat_end:
         fontsize -= 1
-        font = ImageFont.truetype(font_path, fontsize)
+        font = imgtools.get_font(font_path, fontsize)
     draw.text(
         xy=(stat_split, stats_y + stat_offset),
         text=text,
@@ -387,12 +383,12 @@ def generate_default_profile(
     # ---------------- Balance text ----------------
     if balance:
         text = _("Balance: {}").format(f"{humanize_number(balance)} {currency_name}")
-        font = ImageFont.truetype(font_path, 40)
+        font = imgtools.get_font(font_path, 40)
         with Pilmoji(stats) as pilmoji:
             # Ensure text doesnt pass the stat_end
             while pilmoji.getsize(text, font)[0] + stat_start > stat_end:
                 fontsize -= 1
-                font = ImageFont.truetype(font_path, fontsize)
+                font = imgtools.get_font(font_path, fontsize)
             placement = (stat_start, stat_bottom - stat_offset * 2)
             pilmoji.text(
                 xy=placement,
@@ -409,11 +405,11 @@ def generate_default_profile(
         f"{humanize_number(current)}/{humanize_number(goal)}", humanize_number(current_xp)
     )
     fontsize = 40
-    font = ImageFont.truetype(font_path, fontsize)
+    font = imgtools.get_font(font_path, fontsize)
     # Ensure text doesnt pass the stat_end
     while font.getlength(text) + stat_start > stat_end:
         fontsize -= 1
-        font = ImageFont.truetype(font_path, fontsize)
+        font = imgtools.get_font(font_path, fontsize)
     draw.text(
         xy=(stat_start, stat_bottom - stat_offset),
         text=text,
@@ -425,13 +421,11 @@ def generate_default_profile(
     # ---------------- Profile Accents ----------------
     # Draw a circle outline around where the avatar is
     # Calculate the circle outline's placement around the avatar
-    circle = imgtools.make_circle_outline(thickness=5, color=user_color)
-    outline_size = (380, 380)
-    circle = circle.resize(outline_size, Image.Resampling.LANCZOS)
+    circle = imgtools.get_circle_outline(thickness=5, color=tuple(user_color), size=(380, 380))
     placement = (circle_x - 25, circle_y - 25)
     stats.paste(circle, placement, circle)
     # Place status icon
-    status_icon = imgtools.STATUS[status].resize((75, 75), Image.Resampling.LANCZOS)
+    status_icon = imgtools.get_status_icon(status, (75, 75))
     stats.paste(status_icon, (circle_x + 260, circle_y + 260), status_icon)
     # Paste role icon on top left of profile circle
     if role_icon_bytes:
@@ -455,18 +449,14 @@ def generate_default_profile(
         if card.mode != "RGBA":
             log.debug(f"Converting card mode '{card.mode}' to RGBA")
             card = card.convert("RGBA")
-        if pfp.mode != "RGBA":
-            log.debug(f"Converting pfp mode '{pfp.mode}' to RGBA")
-            pfp = pfp.convert("RGBA")
         card = imgtools.fit_aspect_ratio(card, desired_card_size)
         if blur:
             blur_section = imgtools.blur_section(card, (blur_edge, 0, card.width, card.height))
             # Paste onto the stats
             card.paste(blur_section, (blur_edge, 0), blur_section)
         card = imgtools.round_image_corners(card, 45)
-        pfp = pfp.resize(desired_pfp_size, Image.Resampling.LANCZOS)
-        # Crop the profile image into a circle
-        pfp = imgtools.make_profile_circle(pfp)
+        # Resized and cropped into a circle
+        pfp = imgtools.get_profile_circle(avatar_bytes, desired_pfp_size)
         # Paste the items onto the card
         card.paste(stats, (0, 0), stats)
         card.paste(pfp, (circle_x, circle_y), pfp)
@@ -527,12 +517,8 @@ def generate_default_profile(
         log.debug(f"Rendering card as gif with avg duration of {avg_duration}ms")
         frames: t.List[Image.Image] = []
 
-        if pfp.mode != "RGBA":
-            log.debug(f"Converting pfp mode '{pfp.mode}' to RGBA")
-            pfp = pfp.convert("RGBA")
-        pfp = pfp.resize(desired_pfp_size, Image.Resampling.LANCZOS)
-        # Crop the profile image into a circle
-        pfp = imgtools.make_profile_circle(pfp)
+        # Resized and cropped into a circle
+        pfp = imgtools.get_profile_circle(avatar_bytes, desired_pfp_size)
         for frame in range(card.n_frames):
             card.seek(frame)
             # Prepare copies of the card and stats
@@ -17,4 +17,4 @@ class GuildListener(MixinMeta):
             return
         del self.db.configs[old_guild.id]
         log.info(f"Purged config for {old_guild.name} ({old_guild.id})")
-        self.save()
+        self.save(old_guild)
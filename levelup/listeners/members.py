@@ -14,6 +14,7 @@ class MemberListener(MixinMeta):
         if member.guild.id not in self.db.configs:
             return
         conf = self.db.get_conf(member.guild)
+        conf.touch_ranks(member)
         if not conf.enabled:
             return
         added, removed = await self.ensure_roles(member, conf, "Member rejoined")
@@ -21,3 +22,10 @@ class MemberListener(MixinMeta):
             log.info(f"Added {len(added)} roles to {member} in {member.guild}")
         if removed:
             log.info(f"Removed {len(removed)} roles from {member} in {member.guild}")
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        if member.guild.id not in self.db.configs:
+            return
+        # Members that leave are dropped from the leaderboard
+        self.db.get_conf(member.guild).touch_ranks(member)
@@ -1,11 +1,15 @@
 import logging
 import random
+import typing as t
+from collections import defaultdict
 from time import perf_counter
 
 import discord
 from redbot.core import commands
 
 from ..abc import MixinMeta
+from ..common.models import QueuedXP
+from ..common.policy import get_channel_scope
 
 log = logging.getLogger("red.vrt.levelup.listeners.messages")
 
@@ -28,12 +32,8 @@ class MessageListener(MixinMeta):
         # Ignore webhooks
         if not isinstance(message.author, discord.Member):
             return
-        # Check if cog is disabled
-        if await self.bot.cog_disabled_in_guild(self, message.guild):
-            return
         try:
-            roles = list(message.author.roles)
-            role_ids = [role.id for role in roles]
+            role_ids = {role.id for role in message.author.roles}
         except AttributeError:
             # User sent messange and left immediately?
             return
@@ -41,8 +41,16 @@ class MessageListener(MixinMeta):
         if not conf.enabled:
             return
 
+        policy = conf.get_policy()
+        if not policy.fetched:
+            policy.cog_disabled = await self.bot.cog_disabled_in_guild(self, message.guild)
+            policy.prefixes = tuple(await self.bot.get_valid_prefixes(guild=message.guild))
+            policy.fetched = True
+        # Check if cog is disabled
+        if policy.cog_disabled:
+            return
         user_id = message.author.id
-        if user_id in conf.ignoredusers:
+        if user_id in policy.ignored_users:
             # If we're specifically ignoring a user we don't want to see them anywhere
             return
 
@@ -50,55 +58,19 @@ class MessageListener(MixinMeta):
         weekly = None
         if conf.weeklysettings.on:
             weekly = conf.get_weekly_profile(message.author).add_message()
+        self.dirty_guilds.add(message.guild.id)
 
         if perf_counter() - self.last_save > 300:
             # Save at least every 5 minutes
-            self.save()
-
-        prefixes = await self.bot.get_valid_prefixes(guild=message.guild)
-        if not conf.command_xp and message.content.startswith(tuple(prefixes)):
-            # Don't give XP for commands
-            return
+            self.save(message.guild)
 
-        if conf.allowedchannels:
-            # Make sure the channel is allowed
-            if message.channel.id not in conf.allowedchannels:
-                # See if its category or parent channel is allowed then
-                if isinstance(message.channel, (discord.Thread, discord.ForumChannel)):
-                    channel_id = message.channel.parent_id
-                    if channel_id not in conf.allowedchannels:
-                        # Mabe the parent channel's category is allowed?
-                        category_id = message.channel.parent.category_id
-                        if category_id not in conf.allowedchannels:
-                            # Nope, not allowed
-                            return
-                else:
-                    channel_id = message.channel.category_id
-                    if channel_id and channel_id not in conf.allowedchannels:
-                        return
-
-        if message.channel.id in conf.ignoredchannels:
-            return
-        if (
-            isinstance(
-                message.channel,
-                (
-                    discord.Thread,
-                    discord.ForumChannel,
-                ),
-            )
-            and message.channel.parent_id in conf.ignoredchannels
-        ):
-            return
-        elif message.channel.category_id and message.channel.category_id in conf.ignoredchannels:
-            return
-
-        if conf.allowedroles:
-            # Make sure the user has at least one allowed role
-            if not any(role in conf.allowedroles for role in role_ids):
+        if not conf.command_xp:
+            if message.content.startswith(policy.prefixes):
+                # Don't give XP for commands
                 return
 
-        if any(role in conf.ignoredroles for role in role_ids):
+        scope = get_channel_scope(message.channel)
+        if not policy.eligible(scope, role_ids):
             return
         now = perf_counter()
         last_messages = self.lastmsg.setdefault(message.guild.id, {})
@@ -115,25 +87,13 @@ class MessageListener(MixinMeta):
         self.lastmsg[message.guild.id][user_id] = now
 
         xp_to_add = random.randint(conf.xp[0], conf.xp[1])
-        # Add channel bonus if it exists
-        channel_bonuses = conf.channelbonus.msg
-        category = None
-        if isinstance(message.channel, discord.Thread):
-            parent = message.channel.parent
-            if parent:
-                category = parent.category
-        else:
-            category = message.channel.category
-        cat_id = category.id if category else 0
-
-        if message.channel.id in channel_bonuses:
-            xp_to_add += random.randint(*channel_bonuses[message.channel.id])
-        elif cat_id in channel_bonuses:
-            xp_to_add += random.randint(*channel_bonuses[cat_id])
-        # Stack all role bonuses
-        for role_id, (bonus_min, bonus_max) in conf.rolebonus.msg.items():
-            if role_id in role_ids:
-                xp_to_add += random.randint(bonus_min, bonus_max)
+        # Add the channel bonus if it exists and stack all role bonuses
+        xp_to_add += policy.bonus(scope, role_ids)
+        if self.db.xp_batch_interval:
+            # XP, role groups and levelups are applied in bulk by the batch loop
+            groups = tuple(role_id for role_id in role_ids if role_id in conf.role_groups)
+            self.xp_queue.append(QueuedXP(message.guild.id, user_id, message.channel.id, xp_to_add, groups))
+            return
         # Add the xp to the role groups
         for role_id in role_ids:
             if role_id in conf.role_groups:
@@ -143,6 +103,7 @@ class MessageListener(MixinMeta):
         profile.xp += xp_to_add
         if weekly:
             weekly.xp += xp_to_add
+        conf.touch_ranks(user_id)
         # Check for levelups
         await self.check_levelups(
             guild=message.guild,
@@ -152,3 +113,55 @@ class MessageListener(MixinMeta):
             message=message,
             channel=message.channel,
         )
+
+    async def apply_queued_xp(self, queue: t.List[QueuedXP]) -> int:
+        """Apply queued message XP in bulk and check for levelups
+
+        Returns:
+            int: The number of users that gained XP
+        """
+        # {(guild_id, user_id): [xp, last channel_id]}
+        totals: t.Dict[t.Tuple[int, int], t.List[int]] = {}
+        for record in queue:
+            entry = totals.setdefault((record.guild_id, record.user_id), [0, record.channel_id])
+            entry[0] += record.xp
+            entry[1] = record.channel_id
+            if not record.role_groups:
+                continue
+            conf = self.db.configs.get(record.guild_id)
+            if conf is None:
+                continue
+            for role_id in record.role_groups:
+                if role_id in conf.role_groups:
+                    conf.role_groups[role_id] += record.xp
+
+        # Group users by guild so each guild is only looked up once
+        guilds: t.Dict[int, t.List[t.Tuple[int, int, int]]] = defaultdict(list)
+        for (guild_id, user_id), (xp, channel_id) in totals.items():
+            guilds[guild_id].append((user_id, xp, channel_id))
+
+        for guild_id, users in guilds.items():
+            conf = self.db.configs.get(guild_id)
+            guild = self.bot.get_guild(guild_id)
+            if conf is None or guild is None:
+                continue
+            self.dirty_guilds.add(guild_id)
+            for user_id, xp, channel_id in users:
+                profile = conf.get_profile(user_id)
+                profile.xp += xp
+                if conf.weeklysettings.on:
+                    conf.get_weekly_profile(user_id).xp += xp
+                member = guild.get_member(user_id)
+                if not member:
+                    continue
+                try:
+                    await self.check_levelups(
+                        guild=guild,
+                        member=member,
+                        profile=profile,
+                        conf=conf,
+                        channel=guild.get_channel_or_thread(channel_id),
+                    )
+                except Exception as e:
+                    log.error(f"Failed to check levelups for {member} in {guild}", exc_info=e)
+        return len(totals)
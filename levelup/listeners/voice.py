@@ -1,6 +1,5 @@
 import asyncio
 import logging
-import random
 from copy import copy
 from time import perf_counter
 
@@ -9,6 +8,7 @@ from redbot.core import commands
 
 from ..abc import MixinMeta
 from ..common.models import GuildSettings, VoiceTracking
+from ..common.policy import get_channel_scope
 
 log = logging.getLogger("red.vrt.levelup.listeners.voice")
 
@@ -178,19 +178,10 @@ class VoiceListener(MixinMeta):
         if weekly:
             weekly.voice += total_time_in_voice
 
-        # Calculate the exp to add
-        xp_to_add = conf.voicexp * (effective_time / 60)
-        cat_id = getattr(before.channel.category, "id", 0)
-        if before.channel.id in conf.channelbonus.voice:
-            xp_to_add += random.randint(*conf.channelbonus.voice[before.channel.id]) * (effective_time / 60)
-        elif cat_id in conf.channelbonus.voice:
-            xp_to_add += random.randint(*conf.channelbonus.voice[cat_id]) * (effective_time / 60)
-
-        # Stack all role bonuses
-        role_ids = [role.id for role in member.roles]
-        for role_id, (bonus_min, bonus_max) in conf.rolebonus.voice.items():
-            if role_id in role_ids:
-                xp_to_add += random.randint(bonus_min, bonus_max) * (effective_time / 60)
+        # Calculate the exp to add, channel and role bonuses are per minute
+        role_ids = {role.id for role in member.roles}
+        bonus = conf.get_policy().bonus(get_channel_scope(before.channel), role_ids, voice=True)
+        xp_to_add = (conf.voicexp + bonus) * (effective_time / 60)
 
         # Add the exp to the user
         if xp_to_add:
@@ -223,7 +214,7 @@ class VoiceListener(MixinMeta):
                     user_data.stopped_gaining_xp_at = perf
 
         # Save the changes
-        self.save()
+        self.save(member.guild)
         # Check for levelups
         await self.check_levelups(member.guild, member, profile, conf, channel=channel)
 
@@ -252,13 +243,11 @@ class VoiceListener(MixinMeta):
             addxp = False
         elif conf.ignore_invisible and member.status.name == "offline":
             addxp = False
-        elif any(role.id in conf.ignoredroles for role in member.roles):
-            addxp = False
-        elif member.id in conf.ignoredusers:
-            addxp = False
-        elif voice_state.channel.id in conf.ignoredchannels:
-            addxp = False
-        elif voice_state.channel.category_id and voice_state.channel.category_id in conf.ignoredchannels:
+        elif not conf.get_policy().eligible(
+            get_channel_scope(voice_state.channel),
+            {role.id for role in member.roles},
+            member.id,
+        ):
             addxp = False
         elif (
             conf.ignore_solo and len([i for i in voice_state.channel.members if (not i.bot and i.id != member.id)]) < 1
@@ -266,12 +255,5 @@ class VoiceListener(MixinMeta):
             addxp = False
         elif self.db.ignore_bots and member.bot:
             addxp = False
-        elif conf.allowedchannels:
-            if voice_state.channel.id not in conf.allowedchannels:
-                if voice_state.channel.category_id:
-                    if voice_state.channel.category_id not in conf.allowedchannels:
-                        addxp = False
-                else:
-                    addxp = False
 
         return addxp
@@ -23,13 +23,17 @@ SOFTWARE."""
 import asyncio
 import logging
 import multiprocessing as mp
+import os
 import sys
+import tempfile
 import typing as t
 from collections import defaultdict
 from contextlib import suppress
 from datetime import datetime
+from pathlib import Path
 from time import perf_counter
 
+import aiohttp
 import discord
 import orjson
 import psutil
@@ -43,9 +47,11 @@ from redbot.core.utils.chat_formatting import box, humanize_list
 from .abc import CompositeMetaClass
 from .commands import Commands
 from .commands.user import view_profile_context
-from .common.models import DB, VoiceTracking, run_migrations
+from .common.models import DB, QueuedXP, VoiceTracking, run_migrations
 from .dashboard.integration import DashboardIntegration
-from .generator import api
+from .generator import api, imgtools
+from .generator.rendercache import RenderCache
+from .generator.renderpool import RenderPool
 from .generator.tenor.converter import TenorAPI
 from .listeners import Listeners
 from .shared import SharedFunctions
@@ -90,8 +96,11 @@ class LevelUp(
         # Cache
         self.db: DB = DB()
         self.lastmsg: t.Dict[int, t.Dict[int, float]] = {}  # GuildID: {UserID: LastMessageTime}
-        self.profile_cache: t.Dict[int, t.Dict[int, t.Tuple[str, bytes]]] = {}  # GuildID: {UserID: (last_used, bytes)}
+        self.profile_cache: t.Dict[int, t.Dict[int, t.Tuple[float, str]]] = {}  # GuildID: {UserID: (last_used, key)}
+        self.render_cache: RenderCache = RenderCache()  # Rendered images keyed on a hash of their inputs
+        self.render_pool: RenderPool = RenderPool()  # Worker processes for local rendering, if enabled
         self.stars: t.Dict[int, t.Dict[int, datetime]] = {}  # Guild_ID: {User_ID: {User_ID: datetime}}
+        self.xp_queue: t.List[QueuedXP] = []  # Message XP waiting to be applied when batching is enabled
 
         # {guild_id: {member_id: tracking_data}}
         self.voice_tracking: t.Dict[int, t.Dict[int, VoiceTracking]] = defaultdict(dict)
@@ -101,6 +110,7 @@ class LevelUp(
         self.bundled_path = bundled_data_path(self)
         # Settings Files
         self.settings_file = self.cog_path / "LevelUp.json"
+        self.guilds_dir = self.cog_path / "guilds"  # One config file per guild
         self.old_settings_file = self.cog_path / "settings.json"
         # Custom Paths
         self.custom_fonts = self.cog_path / "fonts"
@@ -114,12 +124,20 @@ class LevelUp(
         self.io_lock = asyncio.Lock()
         self.last_save: float = perf_counter()
         self.initialized: bool = False
+        self.dirty_guilds: t.Set[int] = set()  # Guilds modified since the last save
+        self.settings_dirty: bool = False  # Global settings modified since the last save
+        self.full_save_pending: bool = False  # Data of many guilds replaced at once, write everything
 
         # Tenor API
         self.tenor: TenorAPI = None
 
         # Internal Profile Generator API
         self.api_proc: t.Union[asyncio.subprocess.Process, mp.Process, None] = None
+        # Keyed on the bot's PID so the socket stays the same across reloads, like the API process
+        self.api_socket: Path = Path(tempfile.gettempdir()) / f"levelup-api-{os.getpid()}.sock"
+        # Pooled sessions for the render API, created on load
+        self.api_session: aiohttp.ClientSession = None
+        self.api_socket_session: t.Optional[aiohttp.ClientSession] = None
 
     async def cog_load(self) -> None:
         if hasattr(self.bot, "_levelup_internal_api"):
@@ -127,11 +145,37 @@ class LevelUp(
         else:
             self.bot._levelup_internal_api = None
         self.bot.tree.add_command(view_profile_context)
+        self.api_session = aiohttp.ClientSession()
         asyncio.create_task(self.initialize())
 
     async def cog_unload(self) -> None:
         self.bot.tree.remove_command(view_profile_context)
         self.stop_levelup_tasks()
+        self.render_pool.stop()
+        if self.xp_queue:
+            queue, self.xp_queue = self.xp_queue, []
+            await self.apply_queued_xp(queue)
+        await self.flush()
+        await self.api_session.close()
+        if self.api_socket_session:
+            await self.api_socket_session.close()
+
+    async def cog_after_invoke(self, ctx: commands.Context) -> None:
+        # Commands may have changed the channel/role/user settings, recompile the XP policy on next use
+        if ctx.guild and ctx.guild.id in self.db.configs:
+            self.db.configs[ctx.guild.id].invalidate_policy()
+
+    @commands.Cog.listener()
+    async def on_command_completion(self, ctx: commands.Context) -> None:
+        # Other cogs' commands can change the prefixes or disable this cog, core ones for every guild at once
+        if ctx.cog is self:
+            return
+        if ctx.guild and (ctx.cog is None or ctx.cog.qualified_name != "Core"):
+            if ctx.guild.id in self.db.configs:
+                self.db.configs[ctx.guild.id].invalidate_policy()
+            return
+        for conf in self.db.configs.values():
+            conf.invalidate_policy()
 
     async def start_api(self) -> bool:
         if not self.db.internal_api_port:
@@ -141,7 +185,11 @@ class LevelUp(
         try:
             log_dir = self.cog_path / "APILogs"
             log_dir.mkdir(exist_ok=True, parents=True)
-            proc = await api.run(port=self.db.internal_api_port, log_dir=log_dir)
+            proc = await api.run(
+                port=self.db.internal_api_port,
+                log_dir=log_dir,
+                uds=self.api_socket if self.db.internal_api_socket else None,
+            )
             self.api_proc = proc
             self.bot._levelup_internal_api = proc
             log.debug(f"API Process started: {proc.pid}")
@@ -172,30 +220,74 @@ class LevelUp(
         log.info(f"Terminated process: {proc.pid}, API is now stopped")
         return True
 
-    def save(self) -> None:
+    def get_api_socket_session(self) -> aiohttp.ClientSession:
+        """Get the pooled session for talking to the internal API over its unix socket"""
+        if self.api_socket_session is None or self.api_socket_session.closed:
+            connector = aiohttp.UnixConnector(path=str(self.api_socket))
+            self.api_socket_session = aiohttp.ClientSession(connector=connector)
+        return self.api_socket_session
+
+    def save(self, guild: t.Union[discord.Guild, int, None] = None, full: bool = False) -> None:
+        """Schedule a save of the cog's data
+
+        Args:
+            guild: The guild whose config was modified, if None then only the global settings are written
+            full: Rewrite every guild config, for changes that replace the data of many guilds at once
+        """
+        if full:
+            self.full_save_pending = True
+        elif guild is None:
+            self.settings_dirty = True
+        else:
+            self.dirty_guilds.add(guild if isinstance(guild, int) else guild.id)
+
         async def _save():
             if self.io_lock.locked():
-                # Already saving, skip this
+                # Already saving, pending changes will be picked up on the next save
                 return
-            if perf_counter() - self.last_save < 2:
+            if (elapsed := perf_counter() - self.last_save) < 2:
                 # Do not save more than once every 2 seconds
-                return
-            if not self.initialized:
-                # Do not save if not initialized, we don't want to overwrite the config with default data
-                return
-            try:
-                log.debug("Saving config")
-                async with self.io_lock:
-                    self.db.to_file(self.settings_file)
-                    await asyncio.to_thread(self.db.to_file, self.settings_file)
-                log.debug("Config saved")
-            except Exception as e:
-                log.error("Failed to save config", exc_info=e)
-            finally:
-                self.last_save = perf_counter()
+                await asyncio.sleep(2 - elapsed)
+                if self.io_lock.locked():
+                    return
+            await self.flush()
 
         asyncio.create_task(_save())
 
+    async def flush(self) -> None:
+        """Write all dirty guild configs to disk"""
+        if not self.initialized:
+            # Do not save if not initialized, we don't want to overwrite the config with default data
+            return
+        if not self.full_save_pending and not self.settings_dirty and not self.dirty_guilds:
+            return
+        full = self.full_save_pending
+        settings = self.settings_dirty
+        guild_ids = list(self.db.configs) if full else list(self.dirty_guilds)
+        self.full_save_pending = False
+        self.settings_dirty = False
+        self.dirty_guilds.clear()
+        try:
+            log.debug(f"Saving config (full: {full}, settings: {settings})")
+            async with self.io_lock:
+                written = await asyncio.to_thread(
+                    self.db.save_shards,
+                    self.settings_file,
+                    self.guilds_dir,
+                    guild_ids,
+                    full,
+                    settings,
+                )
+            log.debug(f"Config saved, {written} guild configs written")
+        except Exception as e:
+            log.error("Failed to save config", exc_info=e)
+            # Retry these on the next save
+            self.dirty_guilds.update(guild_ids)
+            self.full_save_pending = self.full_save_pending or full
+            self.settings_dirty = self.settings_dirty or settings
+        finally:
+            self.last_save = perf_counter()
+
     async def initialize(self) -> None:
         await self.bot.wait_until_red_ready()
         if not hasattr(self, "__author__"):
@@ -205,6 +297,10 @@ class LevelUp(
             log.info("Loading config")
             try:
                 self.db = await asyncio.to_thread(DB.from_file, self.settings_file)
+                # Guild configs stored in the root file are from before each guild had its own file
+                migrated = bool(self.db.configs)
+                loaded = await asyncio.to_thread(self.db.load_shards, self.guilds_dir)
+                log.info(f"Loaded {loaded} guild configs")
             except Exception as e:
                 log.error("Failed to load config!", exc_info=e)
                 return
@@ -236,11 +332,14 @@ class LevelUp(
                     log.error("Failed to migrate old settings.json", exc_info=e)
                     return
 
+        if self.db.compact_profiles:
+            await asyncio.to_thread(self.db.set_compact, True)
+
         log.info("Config initialized")
         self.initialized = True
 
         if migrated:
-            self.save()
+            self.save(full=True)
 
         if voice_initialized := await self.initialize_voice_states():
             log.info(f"Initialized {voice_initialized} voice states")
@@ -248,11 +347,22 @@ class LevelUp(
         self.start_levelup_tasks()
         self.custom_fonts.mkdir(exist_ok=True)
         self.custom_backgrounds.mkdir(exist_ok=True)
+        await asyncio.to_thread(self.configure_render_cache)
+        await asyncio.to_thread(imgtools.preload_assets)
+        self.render_pool.start(self.db.render_pool_workers, self.db.render_pool_queue)
         logging.getLogger("PIL").setLevel(logging.WARNING)
         await self.load_tenor()
         if self.db.internal_api_port and not self.db.external_api_url:
             await self.start_api()
 
+    def configure_render_cache(self) -> None:
+        mb = 1024 * 1024
+        self.render_cache.configure(
+            max_bytes=self.db.render_cache_mb * mb,
+            spill_dir=self.cog_path / "RenderCache",
+            max_spill_bytes=self.db.render_cache_disk_mb * mb,
+        )
+
     async def load_tenor(self) -> None:
         tokens = await self.bot.get_shared_api_tokens("tenor")
         if "api_key" in tokens:
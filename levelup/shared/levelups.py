@@ -1,5 +1,4 @@
 import asyncio
-import base64
 import logging
 import random
 import typing as t
@@ -13,7 +12,7 @@ from redbot.core.i18n import Translator
 from ..abc import MixinMeta
 from ..common import utils
 from ..common.models import GuildSettings, Profile
-from ..generator import levelalert
+from ..generator import rendercache
 
 log = logging.getLogger("red.vrt.levelup.shared.levelups")
 _ = Translator("LevelUp", __file__)
@@ -97,7 +96,7 @@ class LevelUps(MixinMeta):
             else:
                 msg_txt = _("{} just reached level {}!").format(mention, profile.level)
 
-        if conf.use_embeds or self.db.force_embeds:
+        async def send_embeds() -> None:
             if conf.notifydm:
                 embed = discord.Embed(
                     description=dm_txt,
@@ -128,6 +127,8 @@ class LevelUps(MixinMeta):
                     else:
                         await log_channel.send(embed=embed)
 
+        if conf.use_embeds or self.db.force_embeds:
+            await send_embeds()
         else:
             fonts = list(self.fonts.glob("*.ttf")) + list(self.custom_fonts.iterdir())
             font = str(random.choice(fonts))
@@ -141,80 +142,74 @@ class LevelUps(MixinMeta):
             if color == (0, 0, 0):
                 color = utils.string_to_rgb(profile.namecolor) if profile.namecolor else None
 
-            payload = aiohttp.FormData()
-            if self.db.external_api_url or (self.db.internal_api_port and self.api_proc):
-                banner = await self.get_profile_background(member.id, profile, try_return_url=True)
-                avatar = member.display_avatar.url
-                payload.add_field(
-                    "background_bytes", BytesIO(banner) if isinstance(banner, bytes) else banner, filename="data"
-                )
-                payload.add_field("avatar_bytes", avatar)
-                payload.add_field("level", str(profile.level))
-                payload.add_field("color", str(color))
-                payload.add_field("font_path", font)
-                payload.add_field("render_gif", str(self.db.render_gifs))
-
-            else:
-                avatar = await member.display_avatar.read()
-                banner = await self.get_profile_background(member.id, profile)
-
+            # Keyed on where the images come from so a cached level up is found before anything is downloaded
+            key = rendercache.make_key(
+                "levelup",
+                background=profile.background,
+                avatar=member.display_avatar.url,
+                level=profile.level,
+                color=color,
+                font_path=font,
+                render_gif=self.db.render_gifs,
+            )
             img_bytes, animated = None, None
-            if external_url := self.db.external_api_url:
-                try:
-                    url = f"{external_url}/levelup"
-                    async with aiohttp.ClientSession() as session:
-                        async with session.post(url, data=payload) as response:
-                            if response.status == 200:
-                                data = await response.json()
-                                img_b64, animated = data["b64"], data["animated"]
-                                img_bytes = base64.b64decode(img_b64)
-                except Exception as e:
-                    log.error("Failed to fetch levelup image from external API", exc_info=e)
-            elif self.db.internal_api_port and self.api_proc:
-                try:
-                    url = f"http://127.0.0.1:{self.db.internal_api_port}/levelup"
-                    async with aiohttp.ClientSession() as session:
-                        async with session.post(url, data=payload) as response:
-                            if response.status == 200:
-                                data = await response.json()
-                                img_b64, animated = data["b64"], data["animated"]
-                                img_bytes = base64.b64decode(img_b64)
-                except Exception as e:
-                    log.error("Failed to fetch levelup image from internal API", exc_info=e)
-
-            def _run() -> t.Tuple[bytes, bool]:
-                img_bytes, animated = levelalert.generate_level_img(
-                    background_bytes=banner,
-                    avatar_bytes=avatar,
-                    level=profile.level,
-                    color=color,
-                    font_path=font,
-                    render_gif=self.db.render_gifs,
-                )
-                return img_bytes, animated
-
-            if not img_bytes:
-                img_bytes, animated = await asyncio.to_thread(_run)
-
-            ext = "gif" if animated else "webp"
-            if conf.notifydm:
-                file = discord.File(BytesIO(img_bytes), filename=f"levelup.{ext}")
-                with suppress(discord.HTTPException):
-                    await member.send(dm_txt, file=file)
-
-            if current_channel and conf.notify:
-                file = discord.File(BytesIO(img_bytes), filename=f"levelup.{ext}")
-                with suppress(discord.HTTPException):
-                    if conf.notifymention and message is not None:
-                        await message.reply(msg_txt, file=file, mention_author=True)
-                    else:
-                        await current_channel.send(msg_txt, file=file)
-
-            current_channel_id = current_channel.id if current_channel else 0
-            if log_channel and log_channel.id != current_channel_id:
-                file = discord.File(BytesIO(img_bytes), filename=f"levelup.{ext}")
-                with suppress(discord.HTTPException):
-                    await log_channel.send(msg_txt, file=file)
+            if cached := await asyncio.to_thread(self.render_cache.get, key):
+                img_bytes, animated = cached
+            elif self.render_pool_busy():
+                # Only renders that aren't cached have to wait on the pool, those fall back to embeds
+                await send_embeds()
+            else:
+                payload = aiohttp.FormData()
+                if self.db.external_api_url or (self.db.internal_api_port and self.api_proc):
+                    banner = await self.get_profile_background(member.id, profile, try_return_url=True)
+                    avatar = member.display_avatar.url
+                    payload.add_field(
+                        "background_bytes", BytesIO(banner) if isinstance(banner, bytes) else banner, filename="data"
+                    )
+                    payload.add_field("avatar_bytes", avatar)
+                    payload.add_field("level", str(profile.level))
+                    payload.add_field("color", str(color))
+                    payload.add_field("font_path", font)
+                    payload.add_field("render_gif", str(self.db.render_gifs))
+
+                else:
+                    avatar = await member.display_avatar.read()
+                    banner = await self.get_profile_background(member.id, profile)
+
+                if result := await self.request_render("levelup", payload):
+                    img_bytes, animated = result
+                else:
+                    img_bytes, animated = await self.render_image(
+                        "levelup",
+                        background_bytes=banner,
+                        avatar_bytes=avatar,
+                        level=profile.level,
+                        color=color,
+                        font_path=font,
+                        render_gif=self.db.render_gifs,
+                    )
+                await asyncio.to_thread(self.render_cache.put, key, img_bytes, animated)
+
+            if img_bytes:
+                ext = "gif" if animated else "webp"
+                if conf.notifydm:
+                    file = discord.File(BytesIO(img_bytes), filename=f"levelup.{ext}")
+                    with suppress(discord.HTTPException):
+                        await member.send(dm_txt, file=file)
+
+                if current_channel and conf.notify:
+                    file = discord.File(BytesIO(img_bytes), filename=f"levelup.{ext}")
+                    with suppress(discord.HTTPException):
+                        if conf.notifymention and message is not None:
+                            await message.reply(msg_txt, file=file, mention_author=True)
+                        else:
+                            await current_channel.send(msg_txt, file=file)
+
+                current_channel_id = current_channel.id if current_channel else 0
+                if log_channel and log_channel.id != current_channel_id:
+                    file = discord.File(BytesIO(img_bytes), filename=f"levelup.{ext}")
+                    with suppress(discord.HTTPException):
+                        await log_channel.send(msg_txt, file=file)
 
         payload = {
             "guild": guild,  # discord.Guild
@@ -327,7 +322,7 @@ class LevelUps(MixinMeta):
 
         if bad_roles:
             conf.levelroles = {k: v for k, v in conf.levelroles.items() if v not in bad_roles}
-            self.save()
+            self.save(member.guild)
 
         try:
             if add_roles:
@@ -3,6 +3,7 @@ import base64
 import logging
 import random
 import typing as t
+from concurrent.futures.process import BrokenProcessPool
 from io import BytesIO
 from time import perf_counter
 
@@ -15,11 +16,16 @@ from redbot.core.utils.chat_formatting import box, humanize_number
 from ..abc import MixinMeta
 from ..common import formatter, utils
 from ..common.models import Profile
+from ..generator import api, levelalert, rendercache
 from ..generator.styles import default, runescape
 
 log = logging.getLogger("red.vrt.levelup.shared.profile")
 _ = Translator("LevelUp", __file__)
 
+# Level progress is keyed in 2% steps, the stats below change with every message and are left out of render keys
+PROGRESS_BUCKETS = 50
+UNKEYED = {"messages", "voicetime", "stars", "current_xp", "position", "reraise"}
+
 
 class ProfileFormatting(MixinMeta):
     async def add_xp(self, member: discord.Member, xp: int) -> int:
@@ -29,7 +35,7 @@ class ProfileFormatting(MixinMeta):
         conf = self.db.get_conf(member.guild)
         profile = conf.get_profile(member)
         profile.xp += xp
-        self.save()
+        self.save(member.guild)
         return int(profile.xp)
 
     async def set_xp(self, member: discord.Member, xp: int) -> int:
@@ -39,7 +45,7 @@ class ProfileFormatting(MixinMeta):
         conf = self.db.get_conf(member.guild)
         profile = conf.get_profile(member)
         profile.xp = xp
-        self.save()
+        self.save(member.guild)
         return int(profile.xp)
 
     async def remove_xp(self, member: discord.Member, xp: int) -> int:
@@ -49,7 +55,7 @@ class ProfileFormatting(MixinMeta):
         conf = self.db.get_conf(member.guild)
         profile = conf.get_profile(member)
         profile.xp -= xp
-        self.save()
+        self.save(member.guild)
         return int(profile.xp)
 
     async def get_profile_background(
@@ -122,6 +128,20 @@ class ProfileFormatting(MixinMeta):
         Returns:
             t.Union[discord.Embed, discord.File]: An embed or file containing the user's profile
         """
+        result = await self.render_user_profile(member, reraise)
+        if isinstance(result, discord.Embed):
+            return result
+        _key, img_bytes, animated = result
+        ext = "gif" if animated else "webp"
+        return discord.File(BytesIO(img_bytes), filename=f"profile.{ext}")
+
+    async def render_user_profile(
+        self, member: discord.Member, reraise: bool = False
+    ) -> t.Union[discord.Embed, t.Tuple[str, bytes, bool]]:
+        """
+        Same as get_user_profile but returns the raw render as (render_cache_key, image_bytes, animated)
+        when embed profiles are disabled
+        """
         if not isinstance(member, discord.Member):
             raise TypeError("member must be a discord.Member")
         guild = member.guild
@@ -136,7 +156,7 @@ class ProfileFormatting(MixinMeta):
             # Rare but possible
             log.warning(f"User {member} has more XP than needed for next level")
             await self.check_levelups(guild, member, profile, conf)
-            return await self.get_user_profile(member)
+            return await self.render_user_profile(member, reraise)
 
         current_diff = next_level_xp - last_level_xp
         progress = current_diff - (next_level_xp - current_xp)
@@ -164,7 +184,7 @@ class ProfileFormatting(MixinMeta):
         if profile.prestige and profile.prestige in conf.prestigedata:
             pdata = conf.prestigedata[profile.prestige]
 
-        if conf.use_embeds or self.db.force_embeds:
+        async def embed_profile() -> discord.Embed:
             txt = f"{level}｜" + _("Level {}\n").format(humanize_number(profile.level))
             if pdata:
                 txt += f"{trophy}｜" + _("Prestige {}\n").format(
@@ -200,6 +220,9 @@ class ProfileFormatting(MixinMeta):
             embed.add_field(name=_("Progress"), value=box(bar, lang="python"), inline=False)
             return embed
 
+        if conf.use_embeds or self.db.force_embeds:
+            return await embed_profile()
+
         kwargs = {
             "username": member.display_name if profile.show_displayname else member.name,
             "status": str(member.status).strip(),
@@ -222,6 +245,35 @@ class ProfileFormatting(MixinMeta):
         }
 
         profile_style = conf.style_override or profile.style
+        if profile.font:
+            if (self.fonts / profile.font).exists():
+                kwargs["font_path"] = str(self.fonts / profile.font)
+            elif (self.custom_fonts / profile.font).exists():
+                kwargs["font_path"] = str(self.custom_fonts / profile.font)
+
+        if conf.showbal:
+            kwargs["balance"] = await bank.get_balance(member)
+            kwargs["currency_name"] = await bank.get_currency_name(guild)
+
+        # Keyed on where the images come from and on level progress rather than on the exact stats, so the cache
+        # is checked before anything is downloaded and a profile isn't re-rendered after every message sent
+        images = {"avatar": member.display_avatar.url}
+        if profile_style != "runescape":
+            images["background"] = profile.background
+            images["prestige_emoji"] = pdata.emoji_url if pdata else None
+            images["role_icon"] = member.top_role.icon.url if member.top_role.icon else None
+        key = rendercache.make_key(
+            profile_style,
+            progress=progress * PROGRESS_BUCKETS // current_diff if current_diff else 0,
+            **images,
+            **{k: v for k, v in kwargs.items() if k not in UNKEYED},
+        )
+        if cached := await asyncio.to_thread(self.render_cache.get, key):
+            return key, *cached
+        if self.render_pool_busy():
+            # Only renders that aren't cached have to wait on the pool, those fall back to an embed
+            return await embed_profile()
+
         if self.db.external_api_url or (self.db.internal_api_port and self.api_proc):
             # We'll use the external/internal API, try to get URLs instead for faster http requests
             kwargs["avatar_bytes"] = member.display_avatar.url
@@ -241,22 +293,12 @@ class ProfileFormatting(MixinMeta):
                 if member.top_role.icon:
                     kwargs["role_icon"] = await member.top_role.icon.read()
 
-        if profile.font:
-            if (self.fonts / profile.font).exists():
-                kwargs["font_path"] = str(self.fonts / profile.font)
-            elif (self.custom_fonts / profile.font).exists():
-                kwargs["font_path"] = str(self.custom_fonts / profile.font)
-
-        if conf.showbal:
-            kwargs["balance"] = await bank.get_balance(member)
-            kwargs["currency_name"] = await bank.get_currency_name(guild)
-
         if background_bytes := kwargs.get("background_bytes"):
             # Sometimes discord's CDN returns b'This content is no longer available.'
             # If this occurs we'll reset the background to default
             if "This content is no longer available." in str(background_bytes):
                 profile.background = "default"
-                self.save()
+                self.save(guild)
                 log.warning(
                     f"User {member.name} ({member.id}) has a background that no longer exists! Resetting to default"
                 )
@@ -268,78 +310,119 @@ class ProfileFormatting(MixinMeta):
         }
         payload = aiohttp.FormData()
         if self.db.external_api_url or (self.db.internal_api_port and self.api_proc):
-            for key, value in kwargs.items():
+            for key_name, value in kwargs.items():
                 if value is None:
                     continue
                 if isinstance(value, bytes):
-                    payload.add_field(key, value, filename="data")
+                    payload.add_field(key_name, value, filename="data")
                 else:
-                    payload.add_field(key, str(value))
+                    payload.add_field(key_name, str(value))
+
+        if result := await self.request_render(endpoints[profile_style], payload):
+            img_bytes, animated = result
+        else:
+            # By default we'll use the bundled generator
+            img_bytes, animated = await self.render_image(profile_style, **kwargs)
+
+        await asyncio.to_thread(self.render_cache.put, key, img_bytes, animated)
+        return key, img_bytes, animated
 
+    async def request_render(self, endpoint: str, payload: aiohttp.FormData) -> t.Optional[t.Tuple[bytes, bool]]:
+        """Render an image with the external or internal API
+
+        Args:
+            endpoint (str): "fullprofile", "runescape" or "levelup"
+            payload (aiohttp.FormData): The generator kwargs as form data
+
+        Returns:
+            t.Optional[t.Tuple[bytes, bool]]: The image bytes and whether it is animated,
+            or None if no API is in use or the request failed
+        """
         if external_url := self.db.external_api_url:
-            try:
-                url = f"{external_url}/{endpoints[profile_style]}"
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(url, data=payload) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            img_b64, animated = data["b64"], data["animated"]
-                            img_bytes = base64.b64decode(img_b64)
-                            ext = "gif" if animated else "webp"
-                            return discord.File(BytesIO(img_bytes), filename=f"profile.{ext}")
-                        log.error(f"Failed to fetch profile from external API: {response.status}")
-            except Exception as e:
-                log.error("Failed to fetch profile from external API", exc_info=e)
+            name = "external"
+            session = self.api_session
+            url = f"{external_url}/{endpoint}"
         elif self.db.internal_api_port and self.api_proc:
+            name = "internal"
+            if self.db.internal_api_socket and not api.IS_WINDOWS:
+                session = self.get_api_socket_session()
+                url = f"http://localhost/{endpoint}"
+            else:
+                session = self.api_session
+                url = f"http://127.0.0.1:{self.db.internal_api_port}/{endpoint}"
+        else:
+            return None
+
+        # Ask for the raw image rather than base64 encoded json
+        headers = {"Accept": "image/webp, image/gif, application/json"}
+        try:
+            async with session.post(url, data=payload, headers=headers) as response:
+                if response.status != 200:
+                    log.error(f"Failed to fetch {endpoint} image from {name} API: {response.status}")
+                    return None
+                if response.content_type == "application/json":
+                    # API versions without binary responses
+                    data = await response.json()
+                    return base64.b64decode(data["b64"]), data["animated"]
+                return await response.read(), response.headers.get("X-Animated") == "1"
+        except Exception as e:
+            log.error(f"Failed to fetch {endpoint} image from {name} API", exc_info=e)
+            return None
+
+    def render_pool_busy(self) -> bool:
+        """Whether images should fall back to embeds because the render pool's queue is full
+
+        Counts a rejected render if so
+        """
+        if self.db.external_api_url or (self.db.internal_api_port and self.api_proc):
+            return False
+        if busy := self.render_pool.busy:
+            self.render_pool.reject()
+        return busy
+
+    async def render_image(self, kind: str, **kwargs) -> t.Tuple[bytes, bool]:
+        """Render an image with the bundled generator, using the render pool if it's running
+
+        Args:
+            kind (str): "default", "runescape" or "levelup"
+            **kwargs: The kwargs for the generator
+
+        Returns:
+            t.Tuple[bytes, bool]: The image bytes and whether it is animated
+        """
+        if self.render_pool.running:
             try:
-                url = f"http://127.0.0.1:{self.db.internal_api_port}/{endpoints[profile_style]}"
-                async with aiohttp.ClientSession(trust_env=True) as session:
-                    async with session.post(url, data=payload, ssl=False) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            img_b64, animated = data["b64"], data["animated"]
-                            img_bytes = base64.b64decode(img_b64)
-                            ext = "gif" if animated else "webp"
-                            return discord.File(BytesIO(img_bytes), filename=f"profile.{ext}")
-                        log.error(f"Failed to fetch profile from internal API: {response.status}")
-            except Exception as e:
-                log.error("Failed to fetch profile from internal API", exc_info=e)
-
-        # By default we'll use the bundled generator
+                return await self.render_pool.render(kind, kwargs)
+            except BrokenProcessPool as e:
+                log.error(f"Render pool failed to render {kind} image, rendering in a thread instead", exc_info=e)
         funcs = {
             "default": default.generate_default_profile,
             "runescape": runescape.generate_runescape_profile,
+            "levelup": levelalert.generate_level_img,
         }
-
-        def _run() -> discord.File:
-            img_bytes, animated = funcs[profile_style](**kwargs)
-            ext = "gif" if animated else "webp"
-            return discord.File(BytesIO(img_bytes), filename=f"profile.{ext}")
-
-        file = await asyncio.to_thread(_run)
-        return file
+        return await asyncio.to_thread(funcs[kind], **kwargs)
 
     async def get_user_profile_cached(self, member: discord.Member) -> t.Union[discord.File, discord.Embed]:
-        """Cached version of get_user_profile"""
+        """Cached version of get_user_profile
+
+        Reuses the member's last render for up to the configured cache time without re-checking their stats
+        """
         if not self.db.cache_seconds:
             return await self.get_user_profile(member)
         now = perf_counter()
         cachedata = self.profile_cache.setdefault(member.guild.id, {}).get(member.id)
-        if cachedata is None:
-            file = await self.get_user_profile(member)
-            if not isinstance(file, discord.File):
-                return file
-            filebytes = file.fp.read()
-            self.profile_cache[member.guild.id][member.id] = (now, filebytes)
-            return discord.File(BytesIO(filebytes), filename="profile.webp")
-
-        last_used, imgbytes = cachedata
-        if last_used and now - last_used < self.db.cache_seconds:
-            return discord.File(BytesIO(imgbytes), filename="profile.webp")
-
-        file = await self.get_user_profile(member)
-        if not isinstance(file, discord.File):
-            return file
-        filebytes = file.fp.read()
-        self.profile_cache[member.guild.id][member.id] = (now, filebytes)
-        return discord.File(BytesIO(filebytes), filename="profile.webp")
+        if cachedata is not None:
+            last_used, key = cachedata
+            if now - last_used < self.db.cache_seconds:
+                if cached := await asyncio.to_thread(self.render_cache.get, key):
+                    img_bytes, animated = cached
+                    ext = "gif" if animated else "webp"
+                    return discord.File(BytesIO(img_bytes), filename=f"profile.{ext}")
+
+        result = await self.render_user_profile(member)
+        if isinstance(result, discord.Embed):
+            return result
+        key, img_bytes, animated = result
+        self.profile_cache[member.guild.id][member.id] = (now, key)
+        ext = "gif" if animated else "webp"
+        return discord.File(BytesIO(img_bytes), filename=f"profile.{ext}")
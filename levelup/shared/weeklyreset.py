@@ -35,7 +35,7 @@ class WeeklyReset(MixinMeta):
             if ctx:
                 await ctx.send(_("There are no users in the weekly data yet"))
             conf.weeklysettings.refresh()
-            self.save()
+            self.save(guild)
             return False
 
         valid_users: t.Dict[discord.Member, ProfileWeekly] = {}
@@ -49,7 +49,7 @@ class WeeklyReset(MixinMeta):
             if ctx:
                 await ctx.send(_("There are no users with XP in the weekly data yet"))
             conf.weeklysettings.refresh()
-            self.save()
+            self.save(guild)
             return False
 
         channel = guild.get_channel(conf.weeklysettings.channel) if conf.weeklysettings.channel else None
@@ -174,8 +174,9 @@ class WeeklyReset(MixinMeta):
 
         conf.weeklysettings.refresh()
         conf.users_weekly.clear()
+        conf.invalidate_ranks(weekly=True)
         conf.weeklysettings.last_embed = embed.to_dict()
-        self.save()
+        self.save(guild)
         if ctx:
             await ctx.send(_("Weekly stats have been reset."))
         log.info(f"Reset weekly stats for {guild.name}")
@@ -1,8 +1,9 @@
 from ..abc import CompositeMetaClass
 from .weekly import WeeklyTask
+from .xpbatch import XPBatchTask
 
 
-class Tasks(WeeklyTask, metaclass=CompositeMetaClass):
+class Tasks(WeeklyTask, XPBatchTask, metaclass=CompositeMetaClass):
     """
     Subclass all shared metaclassed parts of the cog
 
@@ -11,6 +12,8 @@ class Tasks(WeeklyTask, metaclass=CompositeMetaClass):
 
     def start_levelup_tasks(self):
         self.weekly_reset_check.start()
+        self.set_xp_batch_interval(self.db.xp_batch_interval)
 
     def stop_levelup_tasks(self):
         self.weekly_reset_check.cancel()
+        self.xp_batch_loop.stop()
@@ -0,0 +1,47 @@
+import asyncio
+import logging
+
+import discord
+from discord.ext import tasks
+
+from ..abc import MixinMeta
+
+log = logging.getLogger("red.vrt.levelup.tasks.xpbatch")
+
+loop_kwargs = {"seconds": 1}
+if discord.version_info >= (2, 4, 0):
+    loop_kwargs["name"] = "LevelUp.xp_batch_loop"
+
+
+class XPBatchTask(MixinMeta):
+    def set_xp_batch_interval(self, milliseconds: int) -> None:
+        """Start, restart or stop the XP batching loop depending on the interval"""
+        if not milliseconds:
+            # Cancel rather than stop, stop() only takes effect after the current interval and the loop
+            # still counts as running until then, so re-enabling right after would never start it again
+            self.xp_batch_loop.cancel()
+            return
+        self.xp_batch_loop.change_interval(seconds=milliseconds / 1000)
+        if self.xp_batch_loop.is_being_cancelled():
+            # Already winding down after being disabled, start it again once it's done
+            self.xp_batch_loop.get_task().add_done_callback(
+                lambda _: self.set_xp_batch_interval(self.db.xp_batch_interval)
+            )
+        elif self.xp_batch_loop.is_running():
+            # Applies the new interval right away, and starts a loop that was only just cancelled again
+            self.xp_batch_loop.restart()
+        else:
+            self.xp_batch_loop.start()
+
+    @tasks.loop(**loop_kwargs)
+    async def xp_batch_loop(self):
+        if not self.xp_queue:
+            return
+        queue, self.xp_queue = self.xp_queue, []
+        # Shielded so cancelling the loop can't drop a batch that was already taken off the queue
+        applied = await asyncio.shield(self.apply_queued_xp(queue))
+        log.debug(f"Applied {len(queue)} queued XP records to {applied} users")
+
+    @xp_batch_loop.error
+    async def xp_batch_loop_error(self, error: Exception):
+        log.error("Error in XP batch loop", exc_info=error)
@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import orjson
+import pytest
+
+try:
+    from .common.models import DB, CompactProfile, GuildSettings
+except ImportError:
+    from levelup.common.models import DB, CompactProfile, GuildSettings
+
+
+@pytest.fixture
+def db():
+    db = DB(configs={1: GuildSettings(), 2: GuildSettings()})
+    for gid, conf in db.configs.items():
+        for uid in range(100):
+            profile = conf.get_profile(uid)
+            profile.xp = uid * 10 * gid
+            profile.messages = uid
+            if uid % 7 == 0:
+                profile.namecolor = "#ff0000"
+                profile.blur = False
+    return db
+
+
+def test_compact_dump_matches(db):
+    # Saved data must not depend on the storage mode
+    expected = db.dump()["configs"]
+    db.set_compact(True)
+    assert isinstance(db.configs[1].users[0], CompactProfile)
+    assert db.dump()["configs"] == expected
+    assert orjson.loads(db.dumpjson())["configs"] == expected
+    assert db.configs[1].model_dump(mode="json", exclude_defaults=True) == expected["1"]
+
+
+def test_compact_shards_round_trip(db, tmp_path: Path):
+    expected = db.dump()["configs"]
+    db.set_compact(True)
+    root_file = tmp_path / "LevelUp.json"
+    db.save_shards(root_file, tmp_path / "guilds", list(db.configs), full=True)
+    loaded = DB.from_file(root_file)
+    loaded.load_shards(tmp_path / "guilds")
+    assert loaded.compact_profiles
+    assert loaded.dump()["configs"] == expected
+    loaded.set_compact(True)
+    assert loaded.configs[2].users[7].namecolor == "#ff0000"
+    assert loaded.dump()["configs"] == expected
+
+
+def test_switching_back_to_full_profiles(db):
+    expected = db.dump()["configs"]
+    db.set_compact(True)
+    db.configs[1].get_profile(3).xp += 5
+    expected["1"]["users"]["3"]["xp"] += 5
+    db.set_compact(False)
+    assert not isinstance(db.configs[1].users[3], CompactProfile)
+    assert db.dump()["configs"] == expected
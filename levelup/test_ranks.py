@@ -0,0 +1,101 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+try:
+    from .common.models import GuildSettings
+    from .common.ranks import STATS
+except ImportError:
+    from levelup.common.models import GuildSettings
+    from levelup.common.ranks import STATS
+
+
+class FakeGuild:
+    def __init__(self, member_ids):
+        self.member_map = {uid: SimpleNamespace(id=uid) for uid in member_ids}
+
+    @property
+    def members(self):
+        return list(self.member_map.values())
+
+    def get_member(self, user_id):
+        return self.member_map.get(user_id)
+
+
+def brute_force(conf: GuildSettings, guild: FakeGuild, stat: str):
+    ranked = [(uid, float(getattr(p, stat))) for uid, p in conf.users.items() if guild.get_member(uid)]
+    ranked.sort(key=lambda x: (-x[1], x[0]))
+    return ranked
+
+
+def assert_matches(conf: GuildSettings, guild: FakeGuild):
+    ranks = conf.get_ranks(guild)
+    for stat in STATS:
+        expected = brute_force(conf, guild, stat)
+        assert ranks.ranked(stat) == [i for i in expected if i[1] > 0]
+        for position, (uid, _) in enumerate(expected, start=1):
+            assert ranks.position(stat, uid) == position
+
+
+@pytest.fixture
+def setup():
+    random.seed(42)
+    conf = GuildSettings()
+    for uid in range(1, 501):
+        profile = conf.get_profile(uid)
+        profile.xp = random.randint(0, 100)
+        profile.messages = random.randint(0, 10)
+    guild = FakeGuild([uid for uid in range(1, 501) if uid % 9])
+    conf.get_ranks(guild)
+    return conf, guild
+
+
+def test_initial_ranks(setup):
+    conf, guild = setup
+    assert_matches(conf, guild)
+
+
+def test_incremental_updates(setup):
+    conf, guild = setup
+    for _ in range(20):
+        for uid in random.sample(range(1, 520), 10):
+            conf.get_profile(uid).xp += random.randint(-20, 40)
+        assert_matches(conf, guild)
+
+
+def test_member_swap_with_same_size(setup):
+    conf, guild = setup
+    ranks = conf.get_ranks(guild)
+    size = len(conf.users)
+    # One profile removed and another added between syncs leaves the users dict the same size
+    del conf.users[2]
+    conf.touch_ranks(2)
+    conf.get_profile(1000).xp = 500
+    guild.member_map[1000] = SimpleNamespace(id=1000)
+    assert len(conf.users) == size
+    assert conf.get_ranks(guild) is ranks
+    assert ranks.position("xp", 2) == -1
+    assert ranks.position("xp", 1000) == 1
+    assert_matches(conf, guild)
+
+
+def test_members_leaving_and_joining(setup):
+    conf, guild = setup
+    for uid in (1, 2, 3):
+        del guild.member_map[uid]
+        conf.touch_ranks(uid)
+    for uid in (9, 18):
+        guild.member_map[uid] = SimpleNamespace(id=uid)
+        conf.touch_ranks(uid)
+    assert_matches(conf, guild)
+
+
+def test_cleared_weekly_users(setup):
+    conf, guild = setup
+    for uid in range(1, 50):
+        conf.get_weekly_profile(uid).xp = uid
+    assert conf.get_ranks(guild, weekly=True).position("xp", 49) == 1
+    conf.users_weekly.clear()
+    conf.invalidate_ranks(weekly=True)
+    assert conf.get_ranks(guild, weekly=True).ranked("xp") == []
@@ -4,7 +4,12 @@ from abc import ABCMeta, abstractmethod
 from discord.ext.commands.cog import CogMeta
 from redbot.core.bot import Red
 
-from .common.models import DB, Method
+from .common.allocations import AllocationTracker
+from .common.histogram import WindowStore
+from .common.models import DB, Method, StatsProfile
+from .common.sampler import Sampler
+from .common.segments import SegmentStore
+from .common.watchdog import LoopWatchdog
 
 
 class CompositeMetaClass(CogMeta, ABCMeta):
@@ -16,6 +21,11 @@ class MixinMeta(metaclass=ABCMeta):
 
     bot: Red
     db: DB
+    windows: WindowStore
+    segments: SegmentStore
+    sampler: t.Optional[Sampler]
+    watchdog: t.Optional[LoopWatchdog]
+    allocations: t.Optional[AllocationTracker]
 
     # {cog_name: {method_name: original_method}}
     original_methods: t.Dict[str, t.Dict[str, t.Callable]] = {}
@@ -40,6 +50,26 @@ class MixinMeta(metaclass=ABCMeta):
     async def rebuild(self) -> None:
         raise NotImplementedError
 
+    @abstractmethod
+    def merge_stats(self, stats: t.Dict[str, t.Dict[str, t.List[StatsProfile]]]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_profiles(self, method_key: str) -> t.List[StatsProfile]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def start_sampler(self) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def start_watchdog(self) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def start_allocation_tracking(self) -> None:
+        raise NotImplementedError
+
     # -------------- profiler.common.profiling --------------
     @abstractmethod
     def attach_method(self, method_key: str) -> bool:
@@ -73,3 +103,7 @@ class MixinMeta(metaclass=ABCMeta):
     @abstractmethod
     def profile_wrapper(self, func: t.Callable, cog_name: str, func_type: str):
         raise NotImplementedError
+
+    @abstractmethod
+    def allocation_wrapper(self, func: t.Callable, key: str, cog_name: str, func_type: str):
+        raise NotImplementedError
@@ -8,10 +8,14 @@ import discord
 from discord import app_commands
 from rapidfuzz import fuzz
 from redbot.core import commands
-from redbot.core.utils.chat_formatting import box, humanize_number, pagify
+from redbot.core.utils.chat_formatting import box, humanize_number, pagify, text_to_file
 
 from ..abc import MixinMeta
-from ..common.formatting import humanize_size
+from ..common.formatting import (
+    format_allocation_report,
+    format_sampler_report,
+    humanize_size,
+)
 from ..common.mem_profiler import profile_memory
 from ..views.profile_menu import ProfileMenu
 
@@ -81,6 +85,10 @@ class Owner(MixinMeta):
         mem_size_raw = await asyncio.to_thread(deep_getsizeof, self.db)
         mem_usage = humanize_size(mem_size_raw)
         txt += f"- Cog RAM Usage: `{mem_usage}`\n"
+        if self.db.save_stats:
+            segments = await asyncio.to_thread(self.segments.buckets)
+            disk_usage = humanize_size(await asyncio.to_thread(self.segments.disk_usage))
+            txt += f"- Disk Usage: `{disk_usage}` (`{humanize_number(len(segments))}` hourly segments)\n"
 
         # TRACKING COUNTS
         records = 0
@@ -90,6 +98,12 @@ class Owner(MixinMeta):
             for statprofiles in methods.values():
                 records += len(statprofiles)
         txt += f"- Monitoring: `{humanize_number(monitoring)}` methods (`{humanize_number(records)}` Records)\n"
+        txt += f"- Aggregation is **{'Enabled' if self.db.aggregate else 'Disabled'}**"
+        txt += f" (`{humanize_number(self.windows.window_count)}` Windows)\n"
+        sampling = self.sampler is not None and self.sampler.running
+        txt += f"- Sampling profiler is **{'Running' if sampling else 'Stopped'}** (`{self.db.sample_rate}Hz`)\n"
+        watching = self.watchdog is not None and self.watchdog.running
+        txt += f"- Loop watchdog is **{'Running' if watching else 'Stopped'}** (`{self.db.lag_threshold}ms` threshold)\n"
 
         # TRACKED COGS
         y = "**Included**"
@@ -118,6 +132,7 @@ class Owner(MixinMeta):
     async def run_cleanup(self, ctx: commands.Context):
         """Run a cleanup of the stats"""
         cleaned = await asyncio.to_thread(self.db.cleanup)
+        cleaned += self.windows.cleanup(self.db)
         await ctx.send(f"Cleanup complete, {cleaned} records were removed")
         if cleaned:
             await self.save()
@@ -128,6 +143,8 @@ class Owner(MixinMeta):
         Clear all saved metrics
         """
         self.db.stats.clear()
+        self.windows.methods.clear()
+        await asyncio.to_thread(self.segments.clear)
         await self.save()
         await ctx.send("All metrics have been cleared")
 
@@ -136,9 +153,14 @@ class Owner(MixinMeta):
         """
         Toggle saving stats persistently
 
-        **Warning**: The config size can grow very large if this is enabled for a long time
+        Stats are written to hourly segment files in the cog's data folder, and deleted once past the data retention.
         """
         self.db.save_stats = not self.db.save_stats
+        if not self.db.save_stats:
+            # Bring saved stats back into memory, they'll expire from there as usual
+            loaded = await asyncio.to_thread(self.segments.load, self.segments.sealed(self.db.delta), self.db)
+            self.merge_stats(loaded)
+            await asyncio.to_thread(self.segments.clear)
         await self.save()
         await ctx.send(f"Saving of metrics is now **{self.db.save_stats}**")
 
@@ -165,6 +187,23 @@ class Owner(MixinMeta):
                 "Verbose stats are now **Disabled**. Detailed stat breakdowns will no longer be recorded for tracked methods"
             )
 
+    @profiler.command(name="aggregate")
+    async def aggregate_toggle(self, ctx: commands.Context):
+        """
+        Toggle aggregating stats into per minute histograms
+
+        Instead of keeping a record of every call, calls are counted into a latency histogram per method for each minute.
+        This keeps memory flat for busy methods like `on_message` listeners, at the cost of individual runtime records.
+
+        Methods on the watchlist, and everything while verbose stats are enabled, are still recorded individually.
+        """
+        self.db.aggregate = not self.db.aggregate
+        await self.save()
+        if self.db.aggregate:
+            await ctx.send("Calls will now be aggregated into per minute histograms")
+        else:
+            await ctx.send("Calls will now be recorded individually")
+
     @profiler.command(name="delta")
     async def set_delta(self, ctx: commands.Context, delta: int):
         """
@@ -174,6 +213,7 @@ class Owner(MixinMeta):
             return await ctx.send("Delta must be at least 1 hour")
         self.db.delta = delta
         cleaned = await asyncio.to_thread(self.db.cleanup)
+        cleaned += self.windows.cleanup(self.db)
         if cleaned:
             await self.save()
         await ctx.send(f"Data retention is now set to **{delta} {'hour' if delta == 1 else 'hours'}**")
@@ -206,6 +246,7 @@ class Owner(MixinMeta):
             self.db.track_tasks = state
 
         cleaned = await asyncio.to_thread(self.db.cleanup)
+        cleaned += self.windows.cleanup(self.db)
         if cleaned:
             await self.save()
         await ctx.send(f"Tracking of {method} is now set to **{state}**")
@@ -227,6 +268,10 @@ class Owner(MixinMeta):
         """
         if method_name in self.db.ignored_methods:
             self.db.discard_method(method_name)
+            self.windows.discard_method(method_name)
+            await asyncio.to_thread(self.segments.discard_method, method_name)
+            if self.allocations:
+                self.allocations.discard_method(method_name)
             self.db.ignored_methods.remove(method_name)
             await ctx.send(f"**{method_name}** is no longer being ignored")
             await self.save()
@@ -420,6 +465,9 @@ class Owner(MixinMeta):
     async def profile_summary(self, ctx: commands.Context, limit: int = 15):
         """
         Profile memory usage of objects in the current environment
+
+        This walks every object on the heap and can freeze a large bot for a few seconds.
+        Use `[p]profiler allocations` to attribute memory to cogs without a full heap walk.
         """
         async with ctx.typing():
             msg = await ctx.send("Profiling memory usage, standby...")
@@ -429,6 +477,177 @@ class Owner(MixinMeta):
             for p in pagify(res, page_length=1980):
                 await ctx.send(box(p, "py"))
 
+    @profiler.group(name="sampler")
+    async def sampler_group(self, ctx: commands.Context):
+        """
+        Sampling profiler for the event loop
+
+        Periodically captures what the bot's event loop is executing and attributes it to the cogs and methods running.
+        Unlike verbose profiling, nothing needs to be attached and overhead stays low enough to leave it running.
+        """
+
+    @sampler_group.command(name="start")
+    async def sampler_start(self, ctx: commands.Context, rate: int = None):
+        """
+        Start the sampling profiler
+
+        **Arguments**:
+        - `rate`: Samples per second to take (1-1000), defaults to the last rate used
+        """
+        if rate is not None:
+            if not 1 <= rate <= 1000:
+                return await ctx.send("Rate must be between 1 and 1000 samples per second")
+            self.db.sample_rate = rate
+        self.db.sampling = True
+        self.start_sampler()
+        await ctx.send(f"Sampling profiler started at **{self.db.sample_rate}** samples per second")
+        await self.save()
+
+    @sampler_group.command(name="stop")
+    async def sampler_stop(self, ctx: commands.Context):
+        """Stop the sampling profiler, collected samples are kept until reset or the cog is reloaded"""
+        self.db.sampling = False
+        if self.sampler:
+            await asyncio.to_thread(self.sampler.stop)
+        await ctx.send("Sampling profiler stopped")
+        await self.save()
+
+    @sampler_group.command(name="reset")
+    async def sampler_reset(self, ctx: commands.Context):
+        """Clear the collected samples"""
+        if self.sampler:
+            self.sampler.reset()
+        await ctx.send("Samples have been cleared")
+
+    @sampler_group.command(name="top")
+    async def sampler_top(self, ctx: commands.Context, limit: int = 15):
+        """
+        View the cogs, methods and functions the event loop spent the most time in
+
+        **Columns**:
+        - Busy: Share of the samples where the loop was running code rather than waiting
+        - Self: Samples where the function itself was executing
+        - Total: Samples where the function was anywhere on the stack
+        """
+        if not self.sampler or not self.sampler.samples:
+            return await ctx.send(f"No samples yet, start the sampler with `{ctx.clean_prefix}profiler sampler start`")
+        res = await asyncio.to_thread(format_sampler_report, self.sampler, self.methods.copy(), limit)
+        for p in pagify(res, page_length=1980):
+            await ctx.send(box(p, "py"))
+
+    @sampler_group.command(name="flamegraph", aliases=["stacks"])
+    async def sampler_flamegraph(self, ctx: commands.Context):
+        """
+        Get the sampled stacks in the collapsed format
+
+        The file can be opened in https://www.speedscope.app or rendered with `flamegraph.pl`
+        """
+        if not self.sampler or not self.sampler.samples:
+            return await ctx.send(f"No samples yet, start the sampler with `{ctx.clean_prefix}profiler sampler start`")
+        res = await asyncio.to_thread(self.sampler.collapsed)
+        await ctx.send(file=text_to_file(res, filename="stacks.txt"))
+
+    @profiler.group(name="watchdog")
+    async def watchdog_group(self, ctx: commands.Context):
+        """
+        Event loop lag watchdog
+
+        Continuously measures how late the event loop is to run callbacks. When a single callback blocks the loop for
+        longer than the threshold, the code it was running is captured and attributed to the cog it belongs to.
+
+        Incidents can be viewed with the `Loop Lag` button of the `[p]profiler view` menu.
+        """
+
+    @watchdog_group.command(name="start")
+    async def watchdog_start(self, ctx: commands.Context, threshold: int = None):
+        """
+        Start the watchdog
+
+        **Arguments**:
+        - `threshold`: Milliseconds the loop has to be blocked for to record an incident, defaults to the last one used
+        """
+        if threshold is not None:
+            if threshold < 20:
+                return await ctx.send("Threshold must be at least 20ms")
+            self.db.lag_threshold = threshold
+        self.db.watchdog = True
+        self.start_watchdog()
+        await ctx.send(f"Loop watchdog started with a threshold of **{self.db.lag_threshold}ms**")
+        await self.save()
+
+    @watchdog_group.command(name="stop")
+    async def watchdog_stop(self, ctx: commands.Context):
+        """Stop the watchdog, recorded incidents are kept until the cog is reloaded"""
+        self.db.watchdog = False
+        if self.watchdog:
+            self.watchdog.stop()
+        await ctx.send("Loop watchdog stopped")
+        await self.save()
+
+    @profiler.group(name="allocations", aliases=["allocs"])
+    async def allocations_group(self, ctx: commands.Context):
+        """
+        Memory allocation tracking with tracemalloc
+
+        Measures the memory allocated by a sample of the calls to profiled methods, and periodically snapshots the memory
+        held by each line of cog code to find the lines that keep growing.
+
+        **Note**: While tracing, every allocation in the bot is recorded, which adds some overhead to the whole bot.
+        """
+
+    @allocations_group.command(name="start")
+    async def allocations_start(self, ctx: commands.Context, sample_every: int = None):
+        """
+        Start tracking allocations
+
+        **Arguments**:
+        - `sample_every`: Measure 1 in every N calls of profiled methods, defaults to the last value used
+        """
+        if sample_every is not None:
+            if sample_every < 1:
+                return await ctx.send("Sample rate must be at least 1")
+            self.db.allocation_sample = sample_every
+        self.db.track_allocations = True
+        self.start_allocation_tracking()
+        await ctx.send(f"Tracking allocations of 1 in every **{self.db.allocation_sample}** calls")
+        await self.rebuild()
+        await self.save()
+
+    @allocations_group.command(name="stop")
+    async def allocations_stop(self, ctx: commands.Context):
+        """Stop tracking allocations, collected stats are kept until the cog is reloaded"""
+        self.db.track_allocations = False
+        if self.allocations:
+            self.allocations.stop()
+        await ctx.send("Stopped tracking allocations")
+        await self.rebuild()
+        await self.save()
+
+    @allocations_group.command(name="snapshot")
+    async def allocations_snapshot(self, ctx: commands.Context):
+        """Take a snapshot now instead of waiting for the next scheduled one"""
+        if not self.allocations or not self.allocations.tracing:
+            return await ctx.send(f"Allocations aren't being tracked, use `{ctx.clean_prefix}profiler allocations start`")
+        async with ctx.typing():
+            leaks = await asyncio.to_thread(self.allocations.take_snapshot, self.methods.copy())
+        await ctx.send(f"Snapshot taken, **{leaks}** lines have been growing consistently")
+
+    @allocations_group.command(name="view")
+    async def allocations_view(self, ctx: commands.Context, limit: int = 15):
+        """
+        View the allocation stats
+
+        **Tables**:
+        - Methods: Net memory allocated per sampled call, highest average first
+        - Cogs: Memory held by allocations made in each cog's code, and how much it changed since the previous snapshot
+        - Lines: The source lines holding the most memory, possible leaks first
+        """
+        if not self.allocations:
+            return await ctx.send(f"Allocations aren't being tracked, use `{ctx.clean_prefix}profiler allocations start`")
+        res = await asyncio.to_thread(format_allocation_report, self.allocations, limit)
+        for p in pagify(res, page_length=1980):
+            await ctx.send(box(p, "py"))
+
     @profiler.command(name="view", aliases=["v"])
     async def profile_menu(self, ctx: commands.Context):
         """
@@ -0,0 +1,161 @@
+import logging
+import tracemalloc
+import typing as t
+from collections import defaultdict
+from time import time
+
+from .models import Method
+from .sampler import Attributor
+
+log = logging.getLogger("red.vrt.profiler.allocations")
+
+
+class AllocationStats:
+    """Net memory allocated by the sampled calls of a method"""
+
+    __slots__ = ("func_type", "calls", "total", "largest")
+
+    def __init__(self, func_type: str):
+        self.func_type = func_type
+        self.calls = 0
+        self.total = 0  # Net bytes across all sampled calls
+        self.largest = 0
+
+    @property
+    def average(self) -> float:
+        return self.total / self.calls if self.calls else 0.0
+
+
+class LineGrowth:
+    """Memory held by allocations made on one source line, as of the latest snapshot"""
+
+    __slots__ = ("cog_name", "filename", "lineno", "size", "count", "growth", "streak")
+
+    def __init__(self, cog_name: str, filename: str, lineno: int):
+        self.cog_name = cog_name
+        self.filename = filename
+        self.lineno = lineno
+        self.size = 0  # Bytes still allocated
+        self.count = 0  # Blocks still allocated
+        self.growth = 0  # Bytes gained since the previous snapshot
+        self.streak = 0  # Consecutive snapshots the line has grown in
+
+
+class AllocationTracker:
+    """Memory allocation tracking with tracemalloc
+
+    Two views are kept:
+    - Per method: the change in traced memory across one in every `sample_every` calls. For coroutines this includes
+      anything else that allocated while the call was suspended, so it is a hint rather than an exact number.
+    - Per source line: periodic snapshots of memory still held, filtered down to files belonging to cogs, compared
+      to the previous snapshot. Lines that keep growing snapshot after snapshot are flagged as possible leaks.
+
+    Unlike the pympler summary this never walks the whole heap, tracemalloc records allocations as they happen.
+    """
+
+    def __init__(self, sample_every: int = 10, snapshot_interval: int = 300, leak_streak: int = 3):
+        self.sample_every = sample_every
+        self.snapshot_interval = snapshot_interval  # Seconds between snapshots
+        self.leak_streak = leak_streak  # Consecutive snapshots of growth to flag a line
+
+        self.calls = 0
+        # {cog_name: {method_key: AllocationStats}}
+        self.methods: t.Dict[str, t.Dict[str, AllocationStats]] = {}
+        # {(filename, lineno): LineGrowth}
+        self.lines: t.Dict[t.Tuple[str, int], LineGrowth] = {}
+        # {cog_name: (bytes held, bytes gained since the previous snapshot)}
+        self.cogs: t.Dict[str, t.Tuple[int, int]] = {}
+        self.snapshots = 0
+        self.last_snapshot = 0.0
+        self.started_tracing = False
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            # Only the allocating line is needed, deeper tracebacks multiply the overhead
+            tracemalloc.start(1)
+            self.started_tracing = True
+            log.info("Started tracing memory allocations")
+
+    def stop(self) -> None:
+        # Leave tracing alone if something else started it
+        if self.started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+            log.info("Stopped tracing memory allocations")
+        self.started_tracing = False
+
+    def sample(self) -> bool:
+        self.calls += 1
+        return self.calls % self.sample_every == 0
+
+    def record(self, cog_name: str, method_key: str, func_type: str, allocated: int) -> None:
+        methods = self.methods.get(cog_name)
+        if methods is None:
+            methods = self.methods[cog_name] = {}
+        stats = methods.get(method_key)
+        if stats is None:
+            stats = methods[method_key] = AllocationStats(func_type)
+        stats.calls += 1
+        stats.total += allocated
+        if allocated > stats.largest:
+            stats.largest = allocated
+
+    def discard_method(self, method_key: str) -> None:
+        for methods in self.methods.values():
+            methods.pop(method_key, None)
+
+    @property
+    def due(self) -> bool:
+        return self.tracing and time() - self.last_snapshot >= self.snapshot_interval
+
+    def take_snapshot(self, methods: t.Dict[str, Method]) -> int:
+        """Snapshot the memory held by cog code and compare it to the previous snapshot
+
+        Returns:
+            int: The number of lines flagged as possible leaks
+        """
+        if not self.tracing:
+            return 0
+        self.last_snapshot = time()
+        attributor = Attributor(methods)
+        snapshot = tracemalloc.take_snapshot()
+
+        previous_lines = self.lines
+        lines: t.Dict[t.Tuple[str, int], LineGrowth] = {}
+        cogs: t.Dict[str, t.List[int]] = defaultdict(lambda: [0, 0])
+        # Traces are stored with a single frame, so each one is attributed to the line that allocated it
+        for stat in snapshot.statistics("lineno"):
+            frame = stat.traceback[0]
+            cog_name = attributor.cog_of_file(frame.filename)
+            if cog_name is None:
+                continue
+            key = (frame.filename, frame.lineno)
+            line = LineGrowth(cog_name, frame.filename, frame.lineno)
+            line.size = stat.size
+            line.count = stat.count
+            if (previous := previous_lines.get(key)) is not None:
+                line.growth = stat.size - previous.size
+                line.streak = previous.streak + 1 if line.growth > 0 else 0
+            elif self.snapshots:
+                # New since the last snapshot
+                line.growth = stat.size
+                line.streak = 1
+            lines[key] = line
+            cogs[line.cog_name][0] += line.size
+            cogs[line.cog_name][1] += line.growth
+
+        # Lines with nothing left allocated count as shrinking their cog
+        for key, previous in previous_lines.items():
+            if key not in lines:
+                cogs[previous.cog_name][1] -= previous.size
+
+        self.lines = lines
+        self.cogs = {cog_name: (size, growth) for cog_name, (size, growth) in cogs.items()}
+        self.snapshots += 1
+        return len(self.leaks())
+
+    def leaks(self) -> t.List[LineGrowth]:
+        return [i for i in self.lines.values() if i.streak >= self.leak_streak]
@@ -2,11 +2,17 @@ import math
 import statistics
 import typing as t
 from datetime import datetime, timedelta
+from pathlib import Path
 
 from redbot.core.utils.chat_formatting import box
 from tabulate import tabulate
 
-from .models import DB, StatsProfile
+from .allocations import AllocationTracker
+from .histogram import LatencyHistogram, MethodWindows, WindowStore
+from .models import DB, Method, StatsProfile
+from .sampler import Attributor, Sampler
+from .segments import SegmentStore
+from .watchdog import LoopWatchdog
 
 
 def format_method_pages(
@@ -82,6 +88,73 @@ def format_method_pages(
     return pages
 
 
+def format_window_pages(
+    method_key: str,
+    method: MethodWindows,
+    delta: int,
+    threshold: float = 0.0,
+) -> t.List[str]:
+    oldest_time = (datetime.now() - timedelta(hours=delta)).timestamp()
+    windows = method.since(oldest_time)
+    if threshold:
+        windows = [i for i in windows if (i.max * 1000) >= threshold]
+
+    if not windows:
+        if threshold:
+            return ["No data to display. Come back later or try a lower threshold."]
+        else:
+            return ["No data to display. Come back later."]
+
+    def _format(value: float):
+        if value > 1:
+            return f"{value:.4f}s"
+        return f"{value * 1000:.2f}ms"
+
+    def _percentiles(histogram: LatencyHistogram):
+        return " / ".join(_format(histogram.percentile(i)) for i in (50, 95, 99))
+
+    summary = method.summary(oldest_time)
+    timeframe_minutes = (datetime.now() - summary.timestamp).total_seconds() / 60
+    calls_per_minute = summary.count / timeframe_minutes if timeframe_minutes else 0
+
+    base_page = (
+        f"# {method_key}\n"
+        "## Overview\n"
+        f"- Max Runtime: {_format(summary.max)}\n"
+        f"- Min Runtime: {_format(summary.min)}\n"
+        f"- Avg Runtime: {_format(summary.mean)}\n"
+        f"- P50/P95/P99: {_percentiles(summary)}\n"
+        f"- Calls/Min: {calls_per_minute:.1f}\n"
+        f"- Total Calls: {summary.count}\n"
+        f"- Errors: {summary.errors}\n"
+    )
+
+    warning_sign = "⚠️"
+    pages = []
+    # Newest first
+    for idx, window in enumerate(reversed(windows)):
+        ts = window.start
+        page = (
+            f"{base_page}"
+            "### Aggregated Window\n"
+            f"- Time Recorded: <t:{ts}:F> (<t:{ts}:R>)\n"
+            f"- Type: {method.func_type.capitalize()}\n"
+            f"- Is Coroutine: {method.is_coro}\n"
+            f"- Calls: {window.count}\n"
+            f"- Avg: {_format(window.mean)} (Min {_format(window.min)}, Max {_format(window.max)})\n"
+            f"- P50/P95/P99: {_percentiles(window)}\n"
+        )
+        if window.errors:
+            page += f"- {warning_sign} **Errors**: `{window.errors}`\n"
+        page += "\n"
+        if threshold:
+            page += f"Filtering by threshold: `{threshold:.2f}ms`\n"
+        page += f"Page `{idx + 1}/{len(windows)}`"
+        pages.append(page)
+
+    return pages
+
+
 def format_method_tables(data: t.List[StatsProfile]) -> t.List[str]:
     data = [i for i in data if i.func_profiles]
     tables = []
@@ -95,9 +168,15 @@ def format_runtime_pages(
     db: DB,
     sort_by: str,
     query: str = None,
+    windows: t.Optional[WindowStore] = None,
+    segments: t.Optional[SegmentStore] = None,
 ) -> t.List[str]:
     now = datetime.now()
-    stats: t.Dict[str, list] = {}
+    oldest_time = now - timedelta(hours=db.delta)
+    # Runtimes of each method over the last specified delta, from saved segments, profiles and aggregated windows
+    summaries: t.Dict[str, t.Tuple[str, LatencyHistogram]] = {}
+    if segments is not None and db.save_stats:
+        summaries.update(segments.summaries(db, query))
     keys = list(db.stats.keys())
     for k in keys:
         methodlist = db.stats[k]
@@ -107,49 +186,71 @@ def format_runtime_pages(
             if query and query not in method_key:
                 continue
 
-            # Calculate the calls per minute and total calls in the last specified delta
-            valid_profiles = [i for i in profiles if i.timestamp > (now - timedelta(hours=db.delta))]
+            valid_profiles = [i for i in profiles if i.timestamp > oldest_time]
             if not valid_profiles:
                 # Don't show any results beyond the set delta
                 continue
 
-            runtimes = [profile.total_tt for profile in valid_profiles]
-
-            max_runtime = max(runtimes)
-            min_runtime = min(runtimes)
-            avg_runtime = statistics.mean(runtimes)
-
-            # Now calculate the calls per minute
-            oldest_profile = min(valid_profiles, key=lambda i: i.timestamp)
-            timeframe_minutes = (now - oldest_profile.timestamp).total_seconds() / 60
-            calls_per_minute = len(valid_profiles) / timeframe_minutes if timeframe_minutes else 0
-
-            total_calls = len(valid_profiles)
-            error_count = len([i for i in valid_profiles if i.exception_thrown])
-
-            # Calculate impact score
-            std_dev = statistics.stdev(runtimes) if len(runtimes) > 1 else 0
-            variability_score = std_dev / avg_runtime if avg_runtime > 0 else 0
-            impact_score = (avg_runtime * calls_per_minute) * (1 + variability_score)
-
-            name = method_key
-            if profiles[0].func_type != "method":
-                name = f"{method_key} ({profiles[0].func_type[0].upper()})"
-
-            if method_key in db.tracked_methods:
-                name = f"+ {name}"
-            elif error_count > 0:
-                name = f"- {name}"
-
-            stats[name] = [
-                max_runtime,
-                min_runtime,
-                avg_runtime,
-                calls_per_minute,
-                total_calls,
-                error_count,
-                impact_score,
-            ]
+            summary = LatencyHistogram(int(min(i.timestamp for i in valid_profiles).timestamp()))
+            for profile in valid_profiles:
+                summary.add(profile.total_tt, bool(profile.exception_thrown))
+            if method_key in summaries:
+                # Earlier profiles were already sealed in segments
+                existing = summaries[method_key][1]
+                summary.start = min(summary.start, existing.start)
+                summary.merge(existing)
+            summaries[method_key] = (profiles[0].func_type, summary)
+
+    if windows is not None:
+        for methodlist in list(windows.methods.values()):
+            for method_key, method in list(methodlist.items()):
+                if query and query not in method_key:
+                    continue
+                summary = method.summary(oldest_time.timestamp())
+                if not summary.count:
+                    continue
+                if method_key in summaries:
+                    # Profiled both ways since aggregation was toggled
+                    func_type, existing = summaries[method_key]
+                    summary.start = min(summary.start, existing.start)
+                    summary.merge(existing)
+                summaries[method_key] = (method.func_type, summary)
+
+    stats: t.Dict[str, list] = {}
+    for method_key, (func_type, summary) in summaries.items():
+        max_runtime = summary.max
+        min_runtime = summary.min
+        avg_runtime = summary.mean
+
+        # Now calculate the calls per minute
+        timeframe_minutes = (now - summary.timestamp).total_seconds() / 60
+        calls_per_minute = summary.count / timeframe_minutes if timeframe_minutes else 0
+
+        total_calls = summary.count
+        error_count = summary.errors
+
+        # Calculate impact score
+        variability_score = summary.stdev / avg_runtime if avg_runtime > 0 else 0
+        impact_score = (avg_runtime * calls_per_minute) * (1 + variability_score)
+
+        name = method_key
+        if func_type != "method":
+            name = f"{method_key} ({func_type[0].upper()})"
+
+        if method_key in db.tracked_methods:
+            name = f"+ {name}"
+        elif error_count > 0:
+            name = f"- {name}"
+
+        stats[name] = [
+            max_runtime,
+            min_runtime,
+            avg_runtime,
+            calls_per_minute,
+            total_calls,
+            error_count,
+            impact_score,
+        ]
 
     per_page = 10
     start = 0
@@ -242,6 +343,136 @@ def format_runtime_pages(
     return pages
 
 
+def format_sampler_report(sampler: Sampler, methods: t.Dict[str, Method], limit: int = 15) -> str:
+    busy = sampler.samples - sampler.idle
+    txt = (
+        f"Samples: {sampler.samples} over {timedelta_format(seconds=sampler.elapsed) or '0s'}"
+        f" at {round(1 / sampler.interval)}Hz\n"
+        f"Loop busy: {busy / sampler.samples * 100 if sampler.samples else 0:.1f}%\n"
+        f"Sampling overhead: {sampler.overhead:.2f}%\n"
+    )
+    if sampler.dropped:
+        txt += f"Dropped: {sampler.dropped} samples of new stacks after reaching {sampler.max_stacks} unique stacks\n"
+    if not busy:
+        return txt + "\nNo busy samples yet. Come back later."
+
+    def _percent(count: int) -> str:
+        return f"{count / busy * 100:.1f}%"
+
+    cogs, method_samples = sampler.attribute(methods)
+    rows = [[cog_name, count, _percent(count)] for cog_name, count in cogs.most_common(limit)]
+    txt += f"\n{tabulate(rows, headers=['Cog', 'Samples', 'Busy'])}\n"
+    rows = [[method_key, count, _percent(count)] for method_key, count in method_samples.most_common(limit)]
+    txt += f"\n{tabulate(rows, headers=['Method', 'Samples', 'Busy'])}\n"
+    rows = [
+        [name, line, _percent(own), _percent(total)] for name, line, own, total in sampler.hot_frames(limit)
+    ]
+    txt += f"\n{tabulate(rows, headers=['Function', 'Hottest Line', 'Self', 'Total'])}"
+    return txt
+
+
+def format_lag_pages(
+    watchdog: LoopWatchdog,
+    methods: t.Dict[str, Method],
+    delta: int,
+    threshold: float = 0.0,
+) -> t.List[str]:
+    def _format(value: float):
+        if value > 1:
+            return f"{value:.3f}s"
+        return f"{value * 1000:.1f}ms"
+
+    summary = watchdog.lag.summary((datetime.now() - timedelta(hours=delta)).timestamp())
+    incidents = [i for i in list(watchdog.incidents) if i.duration is not None]
+    if threshold:
+        incidents = [i for i in incidents if (i.duration * 1000) >= threshold]
+
+    base_page = (
+        "# Event Loop Lag\n"
+        f"- Status: {'Watching' if watchdog.running else 'Stopped'} (Threshold `{watchdog.threshold * 1000:.0f}ms`)\n"
+        f"- Current Lag: {_format(watchdog.last_lag)}\n"
+        f"- P50/P95/P99: {' / '.join(_format(summary.percentile(i)) for i in (50, 95, 99))}\n"
+        f"- Max Lag: {_format(summary.max)}\n"
+        f"- Incidents: {len(incidents)}\n"
+    )
+    if not incidents:
+        if threshold:
+            return [base_page + "\nNo incidents to display. Try a lower threshold."]
+        return [base_page + "\nNo incidents to display. Come back later."]
+
+    attributor = Attributor(methods)
+    warning_sign = "⚠️"
+    pages = []
+    # Newest first
+    for idx, incident in enumerate(reversed(incidents)):
+        ts = int(incident.timestamp)
+        cog_name, method_key = attributor.owner(incident.codes)
+        page = (
+            f"{base_page}"
+            "### Incident\n"
+            f"- Time Recorded: <t:{ts}:F> (<t:{ts}:R>)\n"
+            f"- {warning_sign} Blocked For: {_format(incident.duration)}\n"
+            f"- Cog: {cog_name or 'Unknown'}\n"
+        )
+        if method_key:
+            page += f"- Method: `{method_key}`\n"
+        if incident.stack:
+            page += box("\n".join(i[:100] for i in incident.format_stack(12)), lang="py")
+        else:
+            page += "Stack was not captured, the loop recovered before the watchdog checked it.\n"
+        page += "\n"
+        if threshold:
+            page += f"Filtering by threshold: `{threshold:.2f}ms`\n"
+        page += f"Page `{idx + 1}/{len(incidents)}`"
+        pages.append(page)
+
+    return pages
+
+
+def format_allocation_report(tracker: AllocationTracker, limit: int = 15) -> str:
+    def _growth(value: int) -> str:
+        return f"+{humanize_size(value)}" if value >= 0 else f"-{humanize_size(-value)}"
+
+    txt = (
+        f"Tracing: {'Yes' if tracker.tracing else 'No'}\n"
+        f"Sampling: 1 in {tracker.sample_every} calls\n"
+        f"Snapshots: {tracker.snapshots} (Every {timedelta_format(seconds=tracker.snapshot_interval)})\n"
+    )
+
+    rows = []
+    for methods in list(tracker.methods.values()):
+        for method_key, stats in list(methods.items()):
+            rows.append([method_key, stats.calls, stats.average, stats.largest])
+    rows.sort(key=lambda i: i[2], reverse=True)
+    rows = [[key, calls, _growth(int(avg)), _growth(largest)] for key, calls, avg, largest in rows[:limit]]
+    if rows:
+        txt += f"\n{tabulate(rows, headers=['Method', 'Sampled', 'Avg Net', 'Largest'])}\n"
+    else:
+        txt += "\nNo method calls sampled yet.\n"
+
+    if not tracker.snapshots:
+        return txt + "\nNo snapshots taken yet, the first one will show what each cog is holding."
+
+    cogs = sorted(tracker.cogs.items(), key=lambda i: i[1][0], reverse=True)[:limit]
+    rows = [[cog_name, humanize_size(size), _growth(growth)] for cog_name, (size, growth) in cogs]
+    txt += f"\n{tabulate(rows, headers=['Cog', 'Held', 'Last Growth'])}\n"
+
+    lines = sorted(tracker.lines.values(), key=lambda i: (i.streak >= tracker.leak_streak, i.size), reverse=True)
+    rows = [
+        [
+            f"{'! ' if line.streak >= tracker.leak_streak else ''}{Path(line.filename).name}:{line.lineno}",
+            line.cog_name,
+            humanize_size(line.size),
+            _growth(line.growth),
+            line.streak,
+        ]
+        for line in lines[:limit]
+    ]
+    txt += f"\n{tabulate(rows, headers=['Line', 'Cog', 'Held', 'Last Growth', 'Streak'])}\n"
+    txt += f"\n! = Grown in {tracker.leak_streak} or more snapshots in a row, possible leak"
+    return txt
+
+
 def format_func_profiles(stats: StatsProfile):
     cols = [
         "Function",
@@ -5,22 +5,34 @@ import plotly.graph_objects as go
 import plotly.io as pio
 from redbot.core.utils.chat_formatting import humanize_timedelta
 
+from .histogram import LatencyHistogram
 from .models import StatsProfile
 
 
-def generate_line_graph(profile_data: t.List[StatsProfile]) -> bytes:
-    sorted_data = sorted(profile_data, key=lambda x: x.timestamp)
-    # Extracting the total_tt and timestamp from each profile
-    execution_times: t.List[float] = [profile.total_tt * 1000 for profile in sorted_data]
-    timestamps: t.List[datetime] = [profile.timestamp for profile in sorted_data]
+def generate_line_graph(profile_data: t.Union[t.List[StatsProfile], t.List[LatencyHistogram]]) -> bytes:
+    fig = go.Figure()
+    if isinstance(profile_data[0], LatencyHistogram):
+        # Aggregated windows, plot the average and percentiles of each window
+        sorted_windows = sorted(profile_data, key=lambda x: x.start)
+        timestamps: t.List[datetime] = [window.timestamp for window in sorted_windows]
+        lines = {
+            "Average": [window.mean * 1000 for window in sorted_windows],
+            "P50": [window.percentile(50) * 1000 for window in sorted_windows],
+            "P95": [window.percentile(95) * 1000 for window in sorted_windows],
+            "P99": [window.percentile(99) * 1000 for window in sorted_windows],
+        }
+        for name, values in lines.items():
+            fig.add_trace(go.Scatter(x=timestamps, y=values, mode="lines+markers", name=name))
+    else:
+        sorted_data = sorted(profile_data, key=lambda x: x.timestamp)
+        # Extracting the total_tt and timestamp from each profile
+        execution_times: t.List[float] = [profile.total_tt * 1000 for profile in sorted_data]
+        timestamps: t.List[datetime] = [profile.timestamp for profile in sorted_data]
+        fig.add_trace(go.Scatter(x=timestamps, y=execution_times, mode="lines+markers", name="Total Execution Time"))
 
     delta = timestamps[-1] - timestamps[0]
     humanized_delta = humanize_timedelta(timedelta=delta)
 
-    # Creating the plot
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=timestamps, y=execution_times, mode="lines+markers", name="Total Execution Time"))
-
     # Customizing the plot
     fig.update_layout(
         title=f"Execution Times Over {humanized_delta}",
@@ -0,0 +1,249 @@
+import math
+import typing as t
+from array import array
+from collections import deque
+from datetime import datetime
+from time import time
+
+from .models import DB
+
+BUCKETS_PER_DOUBLING = 4  # Each bucket is ~19% wide, percentiles are within ~10% of the true value
+BUCKET_COUNT = 140  # 1µs up to ~9.5 hours, anything slower lands in the last bucket
+WINDOW_SECONDS = 60
+
+
+def bucket_index(seconds: float) -> int:
+    micros = seconds * 1_000_000
+    if micros <= 1:
+        return 0
+    return min(int(math.log2(micros) * BUCKETS_PER_DOUBLING), BUCKET_COUNT - 1)
+
+
+def bucket_value(index: int) -> float:
+    """Geometric midpoint of a bucket in seconds"""
+    return 2 ** ((index + 0.5) / BUCKETS_PER_DOUBLING) / 1_000_000
+
+
+class LatencyHistogram:
+    """Runtimes of a method's calls within one time window, in log scaled buckets"""
+
+    __slots__ = ("start", "count", "total", "squares", "min", "max", "errors", "buckets")
+
+    def __init__(self, start: int = 0):
+        self.start = start  # Unix timestamp the window begins at
+        self.count = 0
+        self.total = 0.0
+        self.squares = 0.0  # Sum of squared runtimes, for the standard deviation
+        self.min = math.inf
+        self.max = 0.0
+        self.errors = 0
+        self.buckets = array("I", [0]) * BUCKET_COUNT
+
+    @property
+    def timestamp(self) -> datetime:
+        return datetime.fromtimestamp(self.start)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def stdev(self) -> float:
+        if self.count < 2:
+            return 0.0
+        variance = (self.squares - self.total * self.total / self.count) / (self.count - 1)
+        return math.sqrt(max(variance, 0.0))
+
+    def add(self, delta: float, error: bool = False) -> None:
+        self.count += 1
+        self.total += delta
+        self.squares += delta * delta
+        if delta < self.min:
+            self.min = delta
+        if delta > self.max:
+            self.max = delta
+        if error:
+            self.errors += 1
+        self.buckets[bucket_index(delta)] += 1
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        self.count += other.count
+        self.total += other.total
+        self.squares += other.squares
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.errors += other.errors
+        for idx, count in enumerate(other.buckets):
+            if count:
+                self.buckets[idx] += count
+
+    def percentile(self, percent: float) -> float:
+        """Approximate runtime in seconds that the given percent of calls finished within"""
+        if not self.count:
+            return 0.0
+        rank = percent / 100 * self.count
+        seen = 0
+        for idx, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(max(bucket_value(idx), self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "start": self.start,
+            "count": self.count,
+            "total": self.total,
+            "squares": self.squares,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            "errors": self.errors,
+            # Most buckets are empty, only keep the ones that were hit
+            "buckets": {str(idx): count for idx, count in enumerate(self.buckets) if count},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LatencyHistogram":
+        obj = cls(data["start"])
+        obj.count = data["count"]
+        obj.total = data["total"]
+        obj.squares = data["squares"]
+        obj.min = data["min"] if obj.count else math.inf
+        obj.max = data["max"]
+        obj.errors = data["errors"]
+        for idx, count in data["buckets"].items():
+            obj.buckets[int(idx)] = count
+        return obj
+
+
+class MethodWindows:
+    """Per minute histograms of a single method, oldest first"""
+
+    __slots__ = ("func_type", "is_coro", "windows")
+
+    def __init__(self, func_type: str, is_coro: bool):
+        self.func_type = func_type
+        self.is_coro = is_coro
+        self.windows: t.Deque[LatencyHistogram] = deque()
+
+    def record(self, delta: float, error: bool, now: float) -> None:
+        start = int(now) - int(now) % WINDOW_SECONDS
+        # If the clock ever goes backwards the call is added to the latest window
+        if not self.windows or self.windows[-1].start < start:
+            self.windows.append(LatencyHistogram(start))
+        self.windows[-1].add(delta, error)
+
+    def since(self, oldest: float) -> t.List[LatencyHistogram]:
+        return [i for i in list(self.windows) if i.start + WINDOW_SECONDS > oldest]
+
+    def summary(self, oldest: float) -> LatencyHistogram:
+        """All windows within the retention period merged into one"""
+        windows = self.since(oldest)
+        merged = LatencyHistogram(windows[0].start if windows else 0)
+        for window in windows:
+            merged.merge(window)
+        return merged
+
+    def expire(self, oldest: float) -> int:
+        expired = 0
+        while self.windows and self.windows[0].start + WINDOW_SECONDS <= oldest:
+            self.windows.popleft()
+            expired += 1
+        return expired
+
+
+class WindowStore:
+    """Aggregated runtimes of methods profiled in aggregate mode
+
+    Recording a call is a handful of arithmetic operations on the current window, so it is done inline by the
+    wrapper instead of building a StatsProfile in a thread for every call.
+    """
+
+    def __init__(self):
+        # {cog_name: {method_key: MethodWindows}}
+        self.methods: t.Dict[str, t.Dict[str, MethodWindows]] = {}
+
+    def record(self, cog_name: str, method_key: str, func_type: str, is_coro: bool, delta: float, error: bool):
+        methods = self.methods.get(cog_name)
+        if methods is None:
+            methods = self.methods[cog_name] = {}
+        method = methods.get(method_key)
+        if method is None:
+            method = methods[method_key] = MethodWindows(func_type, is_coro)
+        method.record(delta, error, time())
+
+    def get(self, method_key: str) -> t.Optional[MethodWindows]:
+        for methods in self.methods.values():
+            if method := methods.get(method_key):
+                return method
+        return None
+
+    def get_methods(self) -> t.Set[str]:
+        keys = set()
+        for methods in self.methods.values():
+            keys.update(methods)
+        return keys
+
+    def discard_method(self, method_key: str) -> None:
+        for methods in self.methods.values():
+            methods.pop(method_key, None)
+
+    @property
+    def window_count(self) -> int:
+        return sum(len(method.windows) for methods in self.methods.values() for method in methods.values())
+
+    def cleanup(self, db: DB) -> int:
+        """Drop expired windows and methods that are no longer tracked, the same way as `DB.cleanup`"""
+        oldest = time() - db.delta * 3600
+        cleaned = 0
+        for cog_name in list(self.methods.keys()):
+            methods = self.methods[cog_name]
+            for method_key, method in list(methods.items()):
+                if not db.is_tracked(cog_name, method_key, method.func_type):
+                    methods.pop(method_key)
+                    cleaned += 1
+                    continue
+
+                if method.expire(oldest):
+                    cleaned += 1
+                if not method.windows:
+                    methods.pop(method_key)
+                    cleaned += 1
+
+            if not methods:
+                self.methods.pop(cog_name)
+                cleaned += 1
+
+        return cleaned
+
+    def snapshot(self) -> t.List[t.Tuple[str, str, MethodWindows, t.List[LatencyHistogram]]]:
+        """Copy of the window lists so they can be serialized outside of the event loop"""
+        return [
+            (cog_name, method_key, method, list(method.windows))
+            for cog_name, methods in list(self.methods.items())
+            for method_key, method in list(methods.items())
+        ]
+
+    @staticmethod
+    def dump(snapshot: t.List[t.Tuple[str, str, MethodWindows, t.List[LatencyHistogram]]]) -> dict:
+        data = {}
+        for cog_name, method_key, method, windows in snapshot:
+            data.setdefault(cog_name, {})[method_key] = {
+                "func_type": method.func_type,
+                "is_coro": method.is_coro,
+                "windows": [i.to_dict() for i in windows],
+            }
+        return data
+
+    def load(self, data: dict) -> None:
+        for cog_name, methods in data.items():
+            for method_key, info in methods.items():
+                if not info["windows"]:
+                    continue
+                method = MethodWindows(info["func_type"], info["is_coro"])
+                method.windows.extend(LatencyHistogram.from_dict(i) for i in info["windows"])
+                existing = self.methods.setdefault(cog_name, {}).get(method_key)
+                if existing:
+                    # Calls recorded before the saved data finished loading
+                    method.windows.extend(i for i in existing.windows if i.start > method.windows[-1].start)
+                self.methods[cog_name][method_key] = method
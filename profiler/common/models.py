@@ -51,6 +51,21 @@ class DB(Base):
     verbose: bool = False  # If true, tracked_methods will be profiled verbosely
     tracked_threshold: float = 0.0  # Minimum execution delta to record a profile of tracked methods
 
+    # Record non-verbose calls into per minute latency histograms instead of a StatsProfile per call
+    aggregate: bool = False
+
+    # Sampling profiler for the event loop thread
+    sampling: bool = False  # Resume sampling when the cog loads
+    sample_rate: int = 100  # Samples per second
+
+    # Event loop lag watchdog
+    watchdog: bool = False  # Resume watching when the cog loads
+    lag_threshold: int = 250  # Block duration in ms that gets recorded as an incident
+
+    # Memory allocation tracking with tracemalloc
+    track_allocations: bool = False
+    allocation_sample: int = 10  # Measure the allocations of 1 in every N calls
+
     # {cog_name: {method_key: [StatsProfile]}}
     stats: t.Dict[str, t.Dict[str, t.List[StatsProfile]]] = {}
 
@@ -61,6 +76,17 @@ class DB(Base):
                 keys.add(method)
         return keys
 
+    def is_tracked(self, cog_name: str, method_key: str, func_type: str) -> bool:
+        """Whether profiles of a method should still be kept under the current settings"""
+        invalid = [
+            func_type in ["command", "hybrid", "slash"] and not self.track_commands,
+            func_type == "listener" and not self.track_listeners,
+            func_type == "task" and not self.track_tasks,
+            func_type == "method" and not self.track_methods,
+            cog_name not in self.tracked_cogs and method_key not in self.tracked_methods,
+        ]
+        return not any(invalid)
+
     def discard_method(self, method: str) -> None:
         for methods in self.stats.values():
             methods.pop(method, None)
@@ -0,0 +1,269 @@
+import inspect
+import logging
+import sys
+import threading
+import typing as t
+from collections import Counter
+from pathlib import Path
+from time import perf_counter
+from types import CodeType
+
+from .models import Method
+
+log = logging.getLogger("red.vrt.profiler.sampler")
+
+COROUTINE_FLAGS = inspect.CO_COROUTINE | inspect.CO_ITERABLE_COROUTINE | inspect.CO_ASYNC_GENERATOR
+
+
+def frame_label(code: CodeType) -> str:
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class Sampler:
+    """Statistical profiler for the event loop thread
+
+    A background thread grabs the loop thread's current stack at a fixed rate. Stacks are only stored as tuples
+    of code objects while sampling, everything else (labels, attribution to cogs) is worked out when a report is
+    requested, so each sample is a frame walk and a counter increment.
+    """
+
+    def __init__(self, thread_id: int, rate: int = 100, max_depth: int = 128, max_stacks: int = 50000):
+        self.thread_id = thread_id
+        self.interval = 1 / rate
+        self.max_depth = max_depth
+        self.max_stacks = max_stacks
+
+        # Stack of code objects, outermost first: samples
+        self.stacks: t.Counter[t.Tuple[CodeType, ...]] = Counter()
+        # (code, line number) of the frame that was executing: samples
+        self.lines: t.Counter[t.Tuple[CodeType, int]] = Counter()
+        self.samples = 0
+        self.idle = 0  # Samples where the loop was waiting for events
+        self.dropped = 0  # Samples of new stacks once max_stacks was reached
+        self.busy = 0.0  # Seconds spent taking samples
+        self.elapsed = 0.0  # Seconds the sampler has been running
+
+        # Frames that run the event loop, a sample with nothing else on the stack is the loop waiting for events
+        self.baseline: t.Tuple[CodeType, ...] = ()
+
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread: t.Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    @property
+    def overhead(self) -> float:
+        """Percentage of time spent sampling"""
+        return self.busy / self.elapsed * 100 if self.elapsed else 0.0
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self.baseline = self.loop_frames()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="profiler-sampler", daemon=True)
+        self.thread.start()
+        log.info(f"Sampling profiler started at {round(1 / self.interval)}Hz")
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+        log.info("Sampling profiler stopped")
+
+    def reset(self) -> None:
+        with self.lock:
+            self.stacks.clear()
+            self.lines.clear()
+            self.samples = 0
+            self.idle = 0
+            self.dropped = 0
+            self.busy = 0.0
+            self.elapsed = 0.0
+
+    def loop_frames(self) -> t.Tuple[CodeType, ...]:
+        """The loop thread's frames outside of any coroutine, outermost first
+
+        asyncio's own loop waits for events in selectors.py, but uvloop waits in C under whichever frame started it
+        (run_until_complete or similar), so the idle stack has to be recorded rather than recognized by name.
+        """
+        frame = sys._current_frames().get(self.thread_id)
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        del frame
+        codes.reverse()
+        for idx, code in enumerate(codes):
+            if code.co_flags & COROUTINE_FLAGS:
+                return tuple(codes[:idx])
+        return tuple(codes)
+
+    def run(self) -> None:
+        last = perf_counter()
+        while not self.stop_event.wait(self.interval):
+            start = perf_counter()
+            try:
+                self.sample()
+            except Exception as e:
+                log.exception("Failed to take a sample, stopping", exc_info=e)
+                return
+            now = perf_counter()
+            self.busy += now - start
+            self.elapsed += now - last
+            last = now
+
+    def sample(self) -> None:
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        top = (frame.f_code, frame.f_lineno)
+        codes = []
+        while frame is not None and len(codes) < self.max_depth:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        del frame
+
+        stack = tuple(reversed(codes))
+        with self.lock:
+            self.samples += 1
+            if top[0].co_name == "select" and top[0].co_filename.endswith("selectors.py"):
+                self.idle += 1
+                return
+            if stack == self.baseline[: len(stack)]:
+                self.idle += 1
+                return
+            if stack not in self.stacks and len(self.stacks) >= self.max_stacks:
+                self.dropped += 1
+                return
+            self.stacks[stack] += 1
+            self.lines[top] += 1
+
+    def snapshot(self) -> t.Tuple[t.Dict[t.Tuple[CodeType, ...], int], t.Dict[t.Tuple[CodeType, int], int]]:
+        with self.lock:
+            return dict(self.stacks), dict(self.lines)
+
+    def collapsed(self) -> str:
+        """Stacks in the collapsed format read by flamegraph.pl, speedscope and similar tools"""
+        stacks, _ = self.snapshot()
+        labels: t.Dict[CodeType, str] = {}
+        lines = []
+        for stack, count in sorted(stacks.items(), key=lambda i: i[1], reverse=True):
+            for code in stack:
+                if code not in labels:
+                    labels[code] = frame_label(code).replace(";", ",")
+            lines.append(f"{';'.join(labels[code] for code in stack)} {count}")
+        return "\n".join(lines)
+
+    def hot_frames(self, limit: int = 15) -> t.List[t.Tuple[str, str, int, int]]:
+        """The functions with the most samples
+
+        Returns:
+            t.List[t.Tuple[str, str, int, int]]: (function, hottest line, self samples, total samples)
+        """
+        stacks, lines = self.snapshot()
+        own: t.Counter[CodeType] = Counter()
+        hottest: t.Dict[CodeType, t.Tuple[int, int]] = {}
+        for (code, lineno), count in lines.items():
+            own[code] += count
+            if count > hottest.get(code, (0, 0))[1]:
+                hottest[code] = (lineno, count)
+        total: t.Counter[CodeType] = Counter()
+        for stack, count in stacks.items():
+            # Recursive functions only count once per sample
+            for code in set(stack):
+                total[code] += count
+
+        ranked = sorted(total, key=lambda code: (own[code], total[code]), reverse=True)[:limit]
+        return [
+            (
+                getattr(code, "co_qualname", code.co_name),
+                f"{Path(code.co_filename).name}:{hottest.get(code, (code.co_firstlineno, 0))[0]}",
+                own[code],
+                total[code],
+            )
+            for code in ranked
+        ]
+
+    def attribute(self, methods: t.Dict[str, Method]) -> t.Tuple[t.Counter[str], t.Counter[str]]:
+        """Attribute each busy sample to the cog and method it was taken in
+
+        Returns:
+            t.Tuple[t.Counter[str], t.Counter[str]]: Samples per cog, samples per method key
+        """
+        stacks, _ = self.snapshot()
+        attributor = Attributor(methods)
+        cogs: t.Counter[str] = Counter()
+        method_samples: t.Counter[str] = Counter()
+        for stack, count in stacks.items():
+            cog_name, method_key = attributor.owner(stack)
+            if cog_name:
+                cogs[cog_name] += count
+            if method_key:
+                method_samples[method_key] += count
+        return cogs, method_samples
+
+
+class Attributor:
+    """Finds which cog and method a stack was executing"""
+
+    def __init__(self, methods: t.Dict[str, Method]):
+        self.methods = methods
+        self.modules: t.Dict[str, str] = {}
+        # Top level packages, so helper modules without any methods of the cog still belong to it
+        self.packages: t.Dict[str, str] = {}
+        for method_key, method in list(methods.items()):
+            module = method_key.rsplit(".", 1)[0]
+            self.modules.setdefault(module, method.cog_name)
+            self.packages.setdefault(module.split(".")[0], method.cog_name)
+        self.resolved: t.Dict[CodeType, t.Tuple[t.Optional[str], t.Optional[str]]] = {}
+        self.files: t.Dict[str, t.Optional[str]] = {}
+
+    def module_owner(self, module: str) -> t.Optional[str]:
+        return self.modules.get(module) or self.packages.get(module.split(".")[0])
+
+    def cog_of_file(self, filename: str) -> t.Optional[str]:
+        """The cog a source file belongs to, if any"""
+        if filename not in self.files:
+            self.files[filename] = self.module_owner(module_name(filename))
+        return self.files[filename]
+
+    def resolve(self, code: CodeType) -> t.Tuple[t.Optional[str], t.Optional[str]]:
+        if code not in self.resolved:
+            module = module_name(code.co_filename)
+            key = f"{module}.{code.co_name}"
+            if method := self.methods.get(key):
+                self.resolved[code] = (method.cog_name, key)
+            else:
+                self.resolved[code] = (self.module_owner(module), None)
+        return self.resolved[code]
+
+    def owner(self, stack: t.Sequence[CodeType]) -> t.Tuple[t.Optional[str], t.Optional[str]]:
+        """The innermost known cog method on a stack (outermost frame first)
+
+        Stacks that aren't inside a known method but pass through one of a cog's modules belong to the cog alone.
+        """
+        cog_name = None
+        for code in reversed(stack):
+            owner, method_key = self.resolve(code)
+            if method_key:
+                return owner, method_key
+            if owner and cog_name is None:
+                cog_name = owner
+        return cog_name, None
+
+
+def module_name(filename: str) -> str:
+    """Best effort dotted module name of a source file from its path"""
+    path = Path(filename)
+    parts = [path.stem] if path.stem != "__init__" else []
+    parent = path.parent
+    while (parent / "__init__.py").exists():
+        parts.insert(0, parent.name)
+        parent = parent.parent
+    return ".".join(parts)
@@ -0,0 +1,306 @@
+"""Binary storage of profiling stats in time bucketed segments
+
+Stats used to be dumped to Config as one big JSON tree of every StatsProfile. Instead, each hour of stats is a
+segment file holding the profiles of every method in columns:
+
+    MAGIC | header length (u32) | header (JSON) | per method: timestamps (f64[]) durations (f64[]) [profiles]
+
+The header has each method's metadata, the byte offset of its columns, its error messages and a latency histogram
+summarizing the hour, so the runtime overview can be built from headers alone and only the columns of a method
+being inspected are read. The segment of the current hour is rewritten on each save, older ones are sealed and
+their profiles dropped from memory. Retention is enforced by deleting whole segments.
+"""
+
+import logging
+import os
+import struct
+import sys
+import threading
+import typing as t
+import zlib
+from array import array
+from datetime import datetime
+from pathlib import Path
+from time import time
+
+import orjson
+
+from .histogram import LatencyHistogram
+from .models import DB, StatsProfile
+
+log = logging.getLogger("red.vrt.profiler.segments")
+
+MAGIC = b"PRFSEG1\n"
+HEADER_LENGTH = struct.Struct("<I")
+
+
+def bucket_start(timestamp: float, bucket_seconds: int) -> int:
+    return int(timestamp) - int(timestamp) % bucket_seconds
+
+
+class SegmentStore:
+    def __init__(self, root: Path, bucket_seconds: int = 3600):
+        self.root = root
+        self.bucket_seconds = bucket_seconds
+        # Start of the oldest bucket whose profiles are still in memory, segments from here on are only read
+        # back at startup so they aren't counted twice
+        self.memory_from = bucket_start(time(), bucket_seconds)
+        self.headers: t.Dict[int, dict] = {}
+        self.lock = threading.Lock()  # Guards the header cache
+        self.writing = threading.Lock()  # Saves and rewrites run in separate threads
+
+    def path(self, start: int) -> Path:
+        return self.root / f"{start}.seg"
+
+    def buckets(self) -> t.List[int]:
+        if not self.root.is_dir():
+            return []
+        return sorted(int(path.stem) for path in self.root.glob("*.seg") if path.stem.isdigit())
+
+    def disk_usage(self) -> int:
+        return sum(self.path(start).stat().st_size for start in self.buckets())
+
+    # -------------- Writing --------------
+
+    def write(self, stats: t.Dict[str, t.Dict[str, t.List[StatsProfile]]]) -> int:
+        """Write the profiles of each bucket they span to its segment
+
+        Every profile of a bucket must be included, the segment is replaced rather than appended to.
+
+        Returns:
+            int: The start of the current bucket, profiles before it can be dropped from memory
+        """
+        current = bucket_start(time(), self.bucket_seconds)
+        grouped: t.Dict[int, t.Dict[t.Tuple[str, str], t.List[StatsProfile]]] = {}
+        for cog_name, methods in stats.items():
+            for method_key, profiles in methods.items():
+                for profile in profiles:
+                    start = bucket_start(profile.timestamp.timestamp(), self.bucket_seconds)
+                    grouped.setdefault(start, {}).setdefault((cog_name, method_key), []).append(profile)
+
+        with self.writing:
+            for start, methods in grouped.items():
+                self.write_segment(start, methods)
+            self.memory_from = current
+        return current
+
+    def write_segment(self, start: int, methods: t.Dict[t.Tuple[str, str], t.List[StatsProfile]]) -> None:
+        header = {"start": start, "byteorder": sys.byteorder, "methods": {}}
+        body: t.List[bytes] = []
+        offset = 0
+        for (cog_name, method_key), profiles in methods.items():
+            profiles = sorted(profiles, key=lambda i: i.timestamp)
+            summary = LatencyHistogram(start)
+            timestamps = array("d")
+            durations = array("d")
+            errors = {}
+            func_profiles = {}
+            for idx, profile in enumerate(profiles):
+                timestamps.append(profile.timestamp.timestamp())
+                durations.append(profile.total_tt)
+                summary.add(profile.total_tt, bool(profile.exception_thrown))
+                if profile.exception_thrown:
+                    errors[str(idx)] = profile.exception_thrown[:300]
+                if profile.func_profiles:
+                    func_profiles[str(idx)] = {k: v.model_dump() for k, v in profile.func_profiles.items()}
+
+            entry = {
+                "cog_name": cog_name,
+                "func_type": profiles[0].func_type,
+                "is_coro": profiles[0].is_coro,
+                "rows": len(profiles),
+                "offset": offset,
+                "summary": summary.to_dict(),
+                "errors": errors,
+                "profiles": None,
+            }
+            columns = timestamps.tobytes() + durations.tobytes()
+            body.append(columns)
+            offset += len(columns)
+            if func_profiles:
+                # Verbose breakdowns are only read when the method is inspected, so they're compressed
+                blob = zlib.compress(orjson.dumps(func_profiles))
+                entry["profiles"] = [offset, len(blob)]
+                body.append(blob)
+                offset += len(blob)
+            header["methods"][method_key] = entry
+
+        raw_header = orjson.dumps(header)
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.path(start)
+        tmp_path = path.with_suffix(".tmp")
+        with tmp_path.open("wb") as fs:
+            fs.write(MAGIC)
+            fs.write(HEADER_LENGTH.pack(len(raw_header)))
+            fs.write(raw_header)
+            for chunk in body:
+                fs.write(chunk)
+            fs.flush()
+            os.fsync(fs.fileno())
+        tmp_path.replace(path)
+        header["body"] = len(MAGIC) + HEADER_LENGTH.size + len(raw_header)
+        with self.lock:
+            self.headers[start] = header
+
+    def expire(self, delta_hours: int) -> int:
+        """Delete segments entirely older than the retention period"""
+        oldest = time() - delta_hours * 3600
+        removed = 0
+        for start in self.buckets():
+            if start + self.bucket_seconds > oldest:
+                break
+            self.path(start).unlink(missing_ok=True)
+            with self.lock:
+                self.headers.pop(start, None)
+            removed += 1
+        return removed
+
+    def discard_method(self, method_key: str) -> int:
+        """Rewrite the sealed segments holding a method without it
+
+        Segments of buckets still in memory are left alone, they're rewritten from memory on the next save.
+        """
+        rewritten = 0
+        with self.writing:
+            for start in self.buckets():
+                if start >= self.memory_from:
+                    continue
+                header = self.read_header(start)
+                if not header or method_key not in header["methods"]:
+                    continue
+                methods = {
+                    (cog_name, key): profiles
+                    for cog_name, methodlist in self.load([start]).items()
+                    for key, profiles in methodlist.items()
+                    if key != method_key
+                }
+                if methods:
+                    self.write_segment(start, methods)
+                else:
+                    self.path(start).unlink(missing_ok=True)
+                    with self.lock:
+                        self.headers.pop(start, None)
+                rewritten += 1
+        return rewritten
+
+    def clear(self) -> None:
+        with self.writing:
+            for start in self.buckets():
+                self.path(start).unlink(missing_ok=True)
+            with self.lock:
+                self.headers.clear()
+
+    # -------------- Reading --------------
+
+    def read_header(self, start: int) -> t.Optional[dict]:
+        with self.lock:
+            if start in self.headers:
+                return self.headers[start]
+        try:
+            with self.path(start).open("rb") as fs:
+                if fs.read(len(MAGIC)) != MAGIC:
+                    log.warning(f"Skipping segment {start}, unrecognized format")
+                    return None
+                (length,) = HEADER_LENGTH.unpack(fs.read(HEADER_LENGTH.size))
+                header = orjson.loads(fs.read(length))
+                header["body"] = len(MAGIC) + HEADER_LENGTH.size + length
+        except (OSError, struct.error, orjson.JSONDecodeError) as e:
+            log.error(f"Failed to read segment {start}", exc_info=e)
+            return None
+        with self.lock:
+            self.headers[start] = header
+        return header
+
+    def sealed(self, delta_hours: int) -> t.List[int]:
+        """Buckets within the retention period, without those whose profiles are in memory"""
+        oldest = time() - delta_hours * 3600
+        return [start for start in self.buckets() if start + self.bucket_seconds > oldest and start < self.memory_from]
+
+    def unsealed(self) -> t.List[int]:
+        """Buckets whose profiles belong in memory, read back at startup"""
+        return [start for start in self.buckets() if start >= self.memory_from]
+
+    def summaries(self, db: DB, query: t.Optional[str] = None) -> t.Dict[str, t.Tuple[str, LatencyHistogram]]:
+        """Runtime summary of each method across the sealed segments, read from the headers alone"""
+        summaries: t.Dict[str, t.Tuple[str, LatencyHistogram]] = {}
+        for start in self.sealed(db.delta):
+            header = self.read_header(start)
+            if not header:
+                continue
+            for method_key, entry in header["methods"].items():
+                if query and query not in method_key:
+                    continue
+                if not db.is_tracked(entry["cog_name"], method_key, entry["func_type"]):
+                    continue
+                summary = LatencyHistogram.from_dict(entry["summary"])
+                if method_key in summaries:
+                    summaries[method_key][1].merge(summary)
+                else:
+                    summaries[method_key] = (entry["func_type"], summary)
+        return summaries
+
+    def load_method(self, db: DB, method_key: str) -> t.List[StatsProfile]:
+        """Profiles of a single method from the sealed segments within the retention period, oldest first"""
+        loaded = self.load(self.sealed(db.delta), db, method_key)
+        return [profile for methods in loaded.values() for profile in methods.get(method_key, [])]
+
+    def load(
+        self,
+        buckets: t.List[int],
+        db: t.Optional[DB] = None,
+        method_key: t.Optional[str] = None,
+    ) -> t.Dict[str, t.Dict[str, t.List[StatsProfile]]]:
+        """Read the profiles of the given buckets, or only those of one method
+
+        Methods that are no longer tracked under the settings of `db` are skipped if it's given.
+        """
+        stats: t.Dict[str, t.Dict[str, t.List[StatsProfile]]] = {}
+        for start in buckets:
+            header = self.read_header(start)
+            if not header:
+                continue
+            if method_key is not None:
+                entries = {method_key: header["methods"][method_key]} if method_key in header["methods"] else {}
+            else:
+                entries = header["methods"]
+            if not entries:
+                continue
+            with self.path(start).open("rb") as fs:
+                for key, entry in entries.items():
+                    if db is not None and not db.is_tracked(entry["cog_name"], key, entry["func_type"]):
+                        continue
+                    profiles = self.read_entry(fs, header, entry)
+                    stats.setdefault(entry["cog_name"], {}).setdefault(key, []).extend(profiles)
+        return stats
+
+    def read_entry(self, fs: t.BinaryIO, header: dict, entry: dict) -> t.List[StatsProfile]:
+        rows = entry["rows"]
+        fs.seek(header["body"] + entry["offset"])
+        timestamps = array("d")
+        timestamps.frombytes(fs.read(rows * timestamps.itemsize))
+        durations = array("d")
+        durations.frombytes(fs.read(rows * durations.itemsize))
+        if header["byteorder"] != sys.byteorder:
+            timestamps.byteswap()
+            durations.byteswap()
+
+        func_profiles = {}
+        if entry["profiles"]:
+            offset, length = entry["profiles"]
+            fs.seek(header["body"] + offset)
+            func_profiles = orjson.loads(zlib.decompress(fs.read(length)))
+
+        profiles = []
+        for idx in range(rows):
+            profile = StatsProfile.model_validate(
+                {
+                    "total_tt": durations[idx],
+                    "func_type": entry["func_type"],
+                    "is_coro": entry["is_coro"],
+                    "func_profiles": func_profiles.get(str(idx), {}),
+                    "exception_thrown": entry["errors"].get(str(idx)),
+                    "timestamp": datetime.fromtimestamp(timestamps[idx]),
+                }
+            )
+            profiles.append(profile)
+        return profiles
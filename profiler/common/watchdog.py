@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import sys
+import threading
+import typing as t
+from collections import deque
+from datetime import datetime
+from time import perf_counter, time
+from types import CodeType
+
+from .histogram import MethodWindows
+from .sampler import frame_label
+
+log = logging.getLogger("red.vrt.profiler.watchdog")
+
+
+class LagIncident:
+    """A single stretch of time the event loop was blocked for longer than the threshold"""
+
+    __slots__ = ("timestamp", "duration", "stack")
+
+    def __init__(self, timestamp: float, stack: t.Tuple[t.Tuple[CodeType, int], ...]):
+        self.timestamp = timestamp  # Unix time the block started
+        self.duration: t.Optional[float] = None  # Seconds, None while still blocked
+        self.stack = stack  # (code, line number) of each frame, outermost first
+
+    @property
+    def started(self) -> datetime:
+        return datetime.fromtimestamp(self.timestamp)
+
+    @property
+    def codes(self) -> t.Tuple[CodeType, ...]:
+        return tuple(code for code, _ in self.stack)
+
+    def format_stack(self, limit: int = 15) -> t.List[str]:
+        return [f"{frame_label(code)} line {lineno}" for code, lineno in self.stack[-limit:]]
+
+
+class LoopWatchdog:
+    """Measures event loop lag and catches callbacks that block it
+
+    A heartbeat task on the loop wakes up every interval and records how late it was. A thread watches the
+    heartbeat, and when the loop hasn't got back to it within the threshold, it grabs the loop thread's stack
+    while the blocking callback is still running, so the incident can be attributed to whoever owns the code.
+    """
+
+    def __init__(self, threshold: float = 0.25, interval: float = 0.1, max_incidents: int = 100):
+        self.threshold = threshold
+        self.interval = interval
+        self.lag = MethodWindows("loop", False)  # Per minute lag histograms
+        self.incidents: t.Deque[LagIncident] = deque(maxlen=max_incidents)
+        self.last_lag = 0.0
+
+        self.thread_id: t.Optional[int] = None
+        self.last_beat = 0.0  # perf_counter() of the last heartbeat
+        self.pending: t.Optional[LagIncident] = None  # Incident caught by the thread that the heartbeat will finish
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.task: t.Optional[asyncio.Task] = None
+        self.thread: t.Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self) -> None:
+        """Start watching, must be called from the event loop"""
+        if self.running:
+            return
+        self.thread_id = threading.get_ident()
+        self.last_beat = perf_counter()
+        self.stop_event.clear()
+        self.task = asyncio.create_task(self.heartbeat())
+        self.thread = threading.Thread(target=self.watch, name="profiler-watchdog", daemon=True)
+        self.thread.start()
+        log.info(f"Loop watchdog started with a {self.threshold * 1000:.0f}ms threshold")
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+        log.info("Loop watchdog stopped")
+
+    async def heartbeat(self) -> None:
+        while True:
+            start = perf_counter()
+            await asyncio.sleep(self.interval)
+            now = perf_counter()
+            lag = max(now - start - self.interval, 0.0)
+            self.last_lag = lag
+            self.lag.record(lag, False, time())
+            with self.lock:
+                self.last_beat = now
+                incident, self.pending = self.pending, None
+            if incident is not None:
+                incident.duration = lag
+                self.incidents.append(incident)
+                log.debug(f"Event loop blocked for {lag * 1000:.0f}ms")
+            elif lag >= self.threshold:
+                # Blocked for long enough but the thread didn't catch it in the act
+                self.incidents.append(LagIncident(time() - lag, ()))
+                self.incidents[-1].duration = lag
+
+    def watch(self) -> None:
+        # Check often enough to catch blocks that only just go over the threshold
+        while not self.stop_event.wait(max(self.threshold / 4, 0.01)):
+            with self.lock:
+                if self.pending is not None:
+                    continue
+                blocked = perf_counter() - self.last_beat - self.interval
+                if blocked < self.threshold:
+                    continue
+                try:
+                    stack = self.capture()
+                except Exception as e:
+                    log.exception("Failed to capture the event loop stack", exc_info=e)
+                    stack = ()
+                self.pending = LagIncident(time() - blocked, stack)
+
+    def capture(self) -> t.Tuple[t.Tuple[CodeType, int], ...]:
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None and len(stack) < 128:
+            stack.append((frame.f_code, frame.f_lineno))
+            frame = frame.f_back
+        return tuple(reversed(stack))
@@ -3,6 +3,7 @@ import cProfile
 import functools
 import logging
 import pstats
+import tracemalloc
 import typing as t
 from dataclasses import asdict
 from time import perf_counter
@@ -40,6 +41,18 @@ class Wrapper(MixinMeta):
                         profile.disable()
                         await asyncio.to_thread(self.add_stats, func, profile, cog_name, func_type, exception)
 
+                elif self.db.aggregate:
+                    start = perf_counter()
+                    try:
+                        retval = await func(*args, **kwargs)
+                        return retval
+                    except Exception as exc:
+                        exception = str(exc)
+                        raise exc
+                    finally:
+                        delta = perf_counter() - start
+                        self.windows.record(cog_name, key, func_type, True, delta, exception is not None)
+
                 else:
                     start = perf_counter()
                     try:
@@ -54,6 +67,8 @@ class Wrapper(MixinMeta):
 
             # Preserve the signature of the original function
             functools.update_wrapper(async_wrapper, func)
+            if self.db.track_allocations:
+                return self.allocation_wrapper(async_wrapper, key, cog_name, func_type)
             return async_wrapper
 
         else:
@@ -74,6 +89,18 @@ class Wrapper(MixinMeta):
                         profile.disable()
                         self.add_stats(func, profile, cog_name, func_type, exception)
 
+                elif self.db.aggregate:
+                    start = perf_counter()
+                    try:
+                        retval = func(*args, **kwargs)
+                        return retval
+                    except Exception as exc:
+                        exception = str(exc)
+                        raise exc
+                    finally:
+                        delta = perf_counter() - start
+                        self.windows.record(cog_name, key, func_type, False, delta, exception is not None)
+
                 else:
                     start = perf_counter()
                     try:
@@ -87,6 +114,40 @@ class Wrapper(MixinMeta):
                         self.add_stats(func, delta, cog_name, func_type, exception)
 
             # Preserve the signature of the original function
+            functools.update_wrapper(sync_wrapper, func)
+            if self.db.track_allocations:
+                return self.allocation_wrapper(sync_wrapper, key, cog_name, func_type)
+            return sync_wrapper
+
+    def allocation_wrapper(self, func: t.Callable, key: str, cog_name: str, func_type: str):
+        """Measure the net memory allocated by a sample of the calls to an already wrapped method"""
+        if asyncio.iscoroutinefunction(func):
+
+            async def async_wrapper(*args, **kwargs):
+                tracker = self.allocations
+                if tracker is None or not tracker.sample():
+                    return await func(*args, **kwargs)
+                before = tracemalloc.get_traced_memory()[0]
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    tracker.record(cog_name, key, func_type, tracemalloc.get_traced_memory()[0] - before)
+
+            functools.update_wrapper(async_wrapper, func)
+            return async_wrapper
+
+        else:
+
+            def sync_wrapper(*args, **kwargs):
+                tracker = self.allocations
+                if tracker is None or not tracker.sample():
+                    return func(*args, **kwargs)
+                before = tracemalloc.get_traced_memory()[0]
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    tracker.record(cog_name, key, func_type, tracemalloc.get_traced_memory()[0] - before)
+
             functools.update_wrapper(sync_wrapper, func)
             return sync_wrapper
 
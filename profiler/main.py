@@ -1,15 +1,23 @@
 import asyncio
 import logging
+import threading
 import typing as t
+from time import time
 
 from discord.ext import tasks
 from redbot.core import Config, commands
 from redbot.core.bot import Red
+from redbot.core.data_manager import cog_data_path
 
 from .abc import CompositeMetaClass
 from .commands.owner import Owner
-from .common.models import DB, Method
+from .common.allocations import AllocationTracker
+from .common.histogram import WindowStore
+from .common.models import DB, Method, StatsProfile
 from .common.profiling import Profiling
+from .common.sampler import Sampler
+from .common.segments import SegmentStore
+from .common.watchdog import LoopWatchdog
 from .common.wrapper import Wrapper
 
 log = logging.getLogger("red.vrt.profiler")
@@ -32,8 +40,13 @@ class Profiler(Owner, Profiling, Wrapper, commands.Cog, metaclass=CompositeMetaC
         self.bot: Red = bot
 
         self.config = Config.get_conf(self, 117, force_registration=True)
-        self.config.register_global(db={})
+        self.config.register_global(db={}, windows={})
         self.db: DB = DB()
+        self.windows: WindowStore = WindowStore()
+        self.segments: SegmentStore = SegmentStore(cog_data_path(self) / "segments")
+        self.sampler: t.Optional[Sampler] = None
+        self.watchdog: t.Optional[LoopWatchdog] = None
+        self.allocations: t.Optional[AllocationTracker] = None
         self.saving = False
 
         # {cog_name: {method_name: original_method}}
@@ -66,14 +79,32 @@ class Profiler(Owner, Profiling, Wrapper, commands.Cog, metaclass=CompositeMetaC
     async def cog_unload(self) -> None:
         self.detach_profilers()
         self.save_loop.cancel()
+        if self.sampler:
+            self.sampler.stop()
+        if self.watchdog:
+            self.watchdog.stop()
+        if self.allocations:
+            self.allocations.stop()
 
     async def _initialize(self) -> None:
         await self.bot.wait_until_red_ready()
         data = await self.config.db()
         self.db = await asyncio.to_thread(DB.model_validate, data)
+        if self.db.save_stats:
+            self.windows.load(await self.config.windows())
+            # Stats saved to config by older versions stay in memory until they're written to segments
+            loaded = await asyncio.to_thread(self.segments.load, self.segments.unsealed())
+            self.merge_stats(loaded)
         log.info("Config loaded")
+        if self.db.track_allocations:
+            self.start_allocation_tracking()
         self.build()
         await asyncio.to_thread(self.db.cleanup)
+        self.windows.cleanup(self.db)
+        if self.db.sampling:
+            self.start_sampler()
+        if self.db.watchdog:
+            self.start_watchdog()
         await asyncio.sleep(10)
         self.save_loop.start()
 
@@ -82,22 +113,30 @@ class Profiler(Owner, Profiling, Wrapper, commands.Cog, metaclass=CompositeMetaC
             return
 
         def _dump():
-            db = DB.model_validate(self.db.model_dump(exclude={"stats"}))
+            # Stats are stored in segments rather than config
+            return self.db.model_dump(mode="json", exclude={"stats"})
+
+        def _write_segments():
             # Break stats down to avoid RuntimeErrors
-            if self.db.save_stats:
-                keys = list(self.db.stats.keys())
-                for cog_name in keys:
-                    db.stats[cog_name] = {}
-                    method_keys = list(self.db.stats[cog_name].keys())
-                    for method_key in method_keys:
-                        db.stats[cog_name][method_key] = self.db.stats[cog_name][method_key].copy()
-            return db.model_dump(mode="json")
+            stats = {}
+            keys = list(self.db.stats.keys())
+            for cog_name in keys:
+                stats[cog_name] = {}
+                method_keys = list(self.db.stats[cog_name].keys())
+                for method_key in method_keys:
+                    stats[cog_name][method_key] = self.db.stats[cog_name][method_key].copy()
+            return stats, self.segments.write(stats)
 
         try:
             self.saving = True
             log.debug("Saving config")
             dump = await asyncio.to_thread(_dump)
             await self.config.db.set(dump)
+            if self.db.save_stats:
+                written, current = await asyncio.to_thread(_write_segments)
+                self.drop_sealed(written, current)
+            windows = await asyncio.to_thread(WindowStore.dump, self.windows.snapshot() if self.db.save_stats else [])
+            await self.config.windows.set(windows)
         except Exception as e:
             log.exception("Failed to save config", exc_info=e)
         finally:
@@ -106,10 +145,75 @@ class Profiler(Owner, Profiling, Wrapper, commands.Cog, metaclass=CompositeMetaC
     @tasks.loop(seconds=60)
     async def save_loop(self) -> None:
         await asyncio.to_thread(self.db.cleanup)
+        # Windows are appended to by the wrappers on the loop, so they are expired on the loop too
+        self.windows.cleanup(self.db)
+        if self.watchdog:
+            self.watchdog.lag.expire(time() - self.db.delta * 3600)
+        if self.db.save_stats:
+            await asyncio.to_thread(self.segments.expire, self.db.delta)
+        if self.allocations and self.allocations.due:
+            await asyncio.to_thread(self.allocations.take_snapshot, self.methods.copy())
         if not self.db.save_stats:
             return
         await self.save()
 
+    def merge_stats(self, stats: t.Dict[str, t.Dict[str, t.List[StatsProfile]]]) -> None:
+        for cog_name, methods in stats.items():
+            for method_key, profiles in methods.items():
+                existing = self.db.stats.setdefault(cog_name, {}).setdefault(method_key, [])
+                existing.extend(profiles)
+                existing.sort(key=lambda i: i.timestamp)
+
+    def drop_sealed(self, written: t.Dict[str, t.Dict[str, t.List[StatsProfile]]], current: int) -> None:
+        """Drop profiles from memory that were written to segments of past buckets"""
+        for cog_name, methods in written.items():
+            for method_key, profiles in methods.items():
+                sealed = {id(i) for i in profiles if i.timestamp.timestamp() < current}
+                if not sealed:
+                    continue
+                methodlist = self.db.stats.get(cog_name, {})
+                if method_key not in methodlist:
+                    continue
+                # Profiles recorded while the segments were being written are kept
+                remaining = [i for i in methodlist[method_key] if id(i) not in sealed]
+                if remaining:
+                    methodlist[method_key] = remaining
+                else:
+                    methodlist.pop(method_key)
+            if cog_name in self.db.stats and not self.db.stats[cog_name]:
+                self.db.stats.pop(cog_name)
+
+    def get_profiles(self, method_key: str) -> t.List[StatsProfile]:
+        """Profiles of a method within the retention period, from segments on disk and memory
+
+        Blocking, should be run in a thread.
+        """
+        profiles = self.segments.load_method(self.db, method_key) if self.db.save_stats else []
+        for methods in list(self.db.stats.values()):
+            if method_key in methods:
+                profiles.extend(methods[method_key].copy())
+        return profiles
+
+    def start_sampler(self) -> None:
+        if self.sampler and self.sampler.running:
+            self.sampler.stop()
+        # Called from the event loop, so this is the thread that gets sampled
+        self.sampler = Sampler(threading.get_ident(), rate=self.db.sample_rate)
+        self.sampler.start()
+
+    def start_watchdog(self) -> None:
+        if self.watchdog is None:
+            self.watchdog = LoopWatchdog()
+        # Lag history and incidents are kept if the watchdog was running before
+        self.watchdog.threshold = self.db.lag_threshold / 1000
+        self.watchdog.start()
+
+    def start_allocation_tracking(self) -> None:
+        if self.allocations is None:
+            self.allocations = AllocationTracker()
+        self.allocations.sample_every = self.db.allocation_sample
+        self.allocations.start()
+
     async def rebuild(self) -> None:
         def _run():
             self.detach_profilers()
@@ -119,6 +223,7 @@ class Profiler(Owner, Profiling, Wrapper, commands.Cog, metaclass=CompositeMetaC
             return cleaned
 
         cleaned = await asyncio.to_thread(_run)
+        cleaned += self.windows.cleanup(self.db)
         if cleaned:
             await self.save()
 
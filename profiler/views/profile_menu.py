@@ -10,9 +10,11 @@ from redbot.core.utils.chat_formatting import text_to_file
 
 from ..abc import MixinMeta
 from ..common.formatting import (
+    format_lag_pages,
     format_method_pages,
     format_method_tables,
     format_runtime_pages,
+    format_window_pages,
 )
 from ..common.generator import generate_line_graph
 
@@ -54,6 +56,7 @@ class ProfileMenu(discord.ui.View):
         self.query: t.Union[str, None] = None
 
         self.inspecting: t.Union[str, None] = None
+        self.viewing_lag: bool = False
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
         if interaction.user.id != self.ctx.author.id:
@@ -75,6 +78,7 @@ class ProfileMenu(discord.ui.View):
             self.refresh.disabled = True
             self.add_profiler.disabled = True
             self.remove_profiler.disabled = True
+            self.loop_lag.disabled = True
             with suppress(discord.NotFound):
                 await self.message.edit(view=self)
 
@@ -83,7 +87,9 @@ class ProfileMenu(discord.ui.View):
     async def start(self):
         self.remove_item(self.back)
 
-        self.pages = await asyncio.to_thread(format_runtime_pages, self.db, self.sorting_by)
+        self.pages = await asyncio.to_thread(
+            format_runtime_pages, self.db, self.sorting_by, None, self.cog.windows, self.cog.segments
+        )
         if len(self.pages) < 15:
             self.remove_item(self.right10)
             self.remove_item(self.left10)
@@ -92,7 +98,7 @@ class ProfileMenu(discord.ui.View):
 
     async def update(self):
         self.clear_items()
-        if self.inspecting:
+        if self.inspecting or self.viewing_lag:
             self.add_item(self.left)
             self.add_item(self.close)
             self.add_item(self.right)
@@ -111,6 +117,7 @@ class ProfileMenu(discord.ui.View):
             self.add_item(self.add_profiler)
             self.add_item(self.remove_profiler)
             self.add_item(self.refresh)
+            self.add_item(self.loop_lag)
             if len(self.pages) >= 15:
                 self.add_item(self.left10)
                 self.add_item(self.right10)
@@ -175,7 +182,24 @@ class ProfileMenu(discord.ui.View):
 
     @discord.ui.button(label="Filter", style=discord.ButtonStyle.success, row=1)
     async def filter_results(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if self.inspecting:
+        if self.viewing_lag:
+            modal = SearchModal(None, "Filter Incidents", "Enter Minimum Block Duration (ms)")
+            await interaction.response.send_modal(modal)
+            await modal.wait()
+            if modal.query is None:
+                return
+            threshold = 0.0
+            if modal.query.strip():
+                try:
+                    threshold = float(modal.query)
+                except ValueError:
+                    return await interaction.followup.send("Invalid threshold, must be a decimal", ephemeral=True)
+            self.pages = await asyncio.to_thread(
+                format_lag_pages, self.cog.watchdog, self.cog.methods.copy(), self.db.delta, threshold
+            )
+            await self.update()
+
+        elif self.inspecting:
             modal = SearchModal(self.query, "Filter Results", "Enter Minimum Execution Threshold (ms)")
             await interaction.response.send_modal(modal)
             await modal.wait()
@@ -192,16 +216,21 @@ class ProfileMenu(discord.ui.View):
                 except ValueError:
                     return await interaction.followup.send("Invalid threshold, must be a decimal", ephemeral=True)
 
-            for methodlist in self.db.stats.values():
-                if method_stats := methodlist.get(self.inspecting):
-                    break
-            else:
-                return await interaction.followup.send("No method found with that key", ephemeral=True)
+            method_stats = await asyncio.to_thread(self.cog.get_profiles, self.inspecting)
+            if not method_stats:
+                method_windows = self.cog.windows.get(self.inspecting)
+                if not method_windows:
+                    return await interaction.followup.send("No method found with that key", ephemeral=True)
 
             await interaction.followup.send(
                 f"Filtering results with a threshold of `{threshold:.2f}ms`", ephemeral=True
             )
-            self.pages = await asyncio.to_thread(format_method_pages, self.inspecting, method_stats, threshold)
+            if method_stats:
+                self.pages = await asyncio.to_thread(format_method_pages, self.inspecting, method_stats, threshold)
+            else:
+                self.pages = await asyncio.to_thread(
+                    format_window_pages, self.inspecting, method_windows, self.db.delta, threshold
+                )
             await self.update()
 
         else:
@@ -213,7 +242,9 @@ class ProfileMenu(discord.ui.View):
 
             self.query = modal.query
             await interaction.followup.send(f"Filtering results with query: `{self.query}`", ephemeral=True)
-            self.pages = await asyncio.to_thread(format_runtime_pages, self.db, self.sorting_by, self.query)
+            self.pages = await asyncio.to_thread(
+                format_runtime_pages, self.db, self.sorting_by, self.query, self.cog.windows, self.cog.segments
+            )
             await self.update()
 
     @discord.ui.button(label="Inspect", style=discord.ButtonStyle.success, row=1)
@@ -224,10 +255,16 @@ class ProfileMenu(discord.ui.View):
         if modal.query is None:
             return
 
-        for methodlist in self.db.stats.values():
-            if method_stats := methodlist.get(modal.query):
-                break
-        else:
+        method_stats = await asyncio.to_thread(self.cog.get_profiles, modal.query)
+        if not method_stats:
+            if method_windows := self.cog.windows.get(modal.query):
+                self.inspecting = modal.query
+                self.pages = await asyncio.to_thread(format_window_pages, modal.query, method_windows, self.db.delta)
+                self.tables = []
+                if len(method_windows.windows) > 10:
+                    self.plot = await asyncio.to_thread(generate_line_graph, list(method_windows.windows))
+                await self.update()
+                return
             return await interaction.followup.send("No method found with that key", ephemeral=True)
 
         self.inspecting = modal.query
@@ -267,7 +304,9 @@ class ProfileMenu(discord.ui.View):
             self.sorting_by = "Name"
             button.label = "Sort: Name"
 
-        self.pages = await asyncio.to_thread(format_runtime_pages, self.db, self.sorting_by, self.query)
+        self.pages = await asyncio.to_thread(
+            format_runtime_pages, self.db, self.sorting_by, self.query, self.cog.windows, self.cog.segments
+        )
         await self.update()
 
     def _match(self, data: t.List[str], name: str):
@@ -292,16 +331,20 @@ class ProfileMenu(discord.ui.View):
             self.db.tracked_cogs.append(query)
             await asyncio.to_thread(self.cog.attach_cog, query)
             await interaction.followup.send(f"Cog `{query}` is now being tracked", ephemeral=True)
-            self.pages = await asyncio.to_thread(format_runtime_pages, self.db, self.sorting_by, self.query)
+            self.pages = await asyncio.to_thread(
+                format_runtime_pages, self.db, self.sorting_by, self.query, self.cog.windows, self.cog.segments
+            )
             await self.update()
             await self.cog.save()
             return
 
-        if query in self.cog.methods or query in self.db.get_methods():
+        if query in self.cog.methods or query in self.db.get_methods() or query in self.cog.windows.get_methods():
             self.db.tracked_methods.append(query)
             await interaction.followup.send(f"Method `{query}` is now being tracked", ephemeral=True)
             await asyncio.to_thread(self.cog.attach_method, query)
-            self.pages = await asyncio.to_thread(format_runtime_pages, self.db, self.sorting_by, self.query)
+            self.pages = await asyncio.to_thread(
+                format_runtime_pages, self.db, self.sorting_by, self.query, self.cog.windows, self.cog.segments
+            )
             await self.update()
             await self.cog.save()
             return
@@ -328,6 +371,7 @@ class ProfileMenu(discord.ui.View):
                 )
 
             self.db.stats.pop(query, None)
+            self.cog.windows.methods.pop(query, None)
             cleaned = await asyncio.to_thread(self.db.cleanup)
             if cleaned:
                 await interaction.followup.send(
@@ -336,7 +380,9 @@ class ProfileMenu(discord.ui.View):
             else:
                 await interaction.followup.send(f"Cog `{query}` is no longer being tracked", ephemeral=True)
 
-            self.pages = await asyncio.to_thread(format_runtime_pages, self.db, self.sorting_by, self.query)
+            self.pages = await asyncio.to_thread(
+                format_runtime_pages, self.db, self.sorting_by, self.query, self.cog.windows, self.cog.segments
+            )
             await self.update()
             await self.cog.save()
             return
@@ -349,6 +395,10 @@ class ProfileMenu(discord.ui.View):
                     f"Failed to detach `{query}`, is the cog it belongs to still loaded?", ephemeral=True
                 )
             self.db.discard_method(query)
+            self.cog.windows.discard_method(query)
+            await asyncio.to_thread(self.cog.segments.discard_method, query)
+            if self.cog.allocations:
+                self.cog.allocations.discard_method(query)
             cleaned = await asyncio.to_thread(self.db.cleanup)
             if cleaned:
                 await interaction.followup.send(
@@ -357,7 +407,9 @@ class ProfileMenu(discord.ui.View):
             else:
                 await interaction.followup.send(f"Method `{query}` is no longer being tracked", ephemeral=True)
 
-            self.pages = await asyncio.to_thread(format_runtime_pages, self.db, self.sorting_by, self.query)
+            self.pages = await asyncio.to_thread(
+                format_runtime_pages, self.db, self.sorting_by, self.query, self.cog.windows, self.cog.segments
+            )
             await self.update()
             await self.cog.save()
             return
@@ -372,7 +424,9 @@ class ProfileMenu(discord.ui.View):
         with suppress(discord.NotFound):
             await interaction.response.defer()
 
-        self.pages = await asyncio.to_thread(format_runtime_pages, self.db, self.sorting_by, self.query)
+        self.pages = await asyncio.to_thread(
+            format_runtime_pages, self.db, self.sorting_by, self.query, self.cog.windows, self.cog.segments
+        )
         await self.update()
 
     @discord.ui.button(label="Back", style=discord.ButtonStyle.secondary, row=1)
@@ -380,9 +434,29 @@ class ProfileMenu(discord.ui.View):
         with suppress(discord.NotFound):
             await interaction.response.defer()
 
-        if not self.inspecting:
+        if not self.inspecting and not self.viewing_lag:
             return
         self.inspecting = None
+        self.viewing_lag = False
         self.tables.clear()
-        self.pages = await asyncio.to_thread(format_runtime_pages, self.db, self.sorting_by, self.query)
+        self.pages = await asyncio.to_thread(
+            format_runtime_pages, self.db, self.sorting_by, self.query, self.cog.windows, self.cog.segments
+        )
+        await self.update()
+
+    @discord.ui.button(label="Loop Lag", style=discord.ButtonStyle.secondary, row=2)
+    async def loop_lag(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if not self.cog.watchdog:
+            return await interaction.response.send_message(
+                f"The loop watchdog isn't running, start it with `{self.ctx.clean_prefix}profiler watchdog start`",
+                ephemeral=True,
+            )
+        with suppress(discord.NotFound):
+            await interaction.response.defer()
+
+        self.viewing_lag = True
+        self.page = 0
+        self.pages = await asyncio.to_thread(
+            format_lag_pages, self.cog.watchdog, self.cog.methods.copy(), self.db.delta
+        )
         await self.update()
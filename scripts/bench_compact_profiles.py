@@ -0,0 +1,37 @@
+"""Measure the memory used by full and compact LevelUp profiles
+
+Run from the repository root with: python -m scripts.bench_compact_profiles
+"""
+
+import random
+import tracemalloc
+import typing as t
+
+from levelup.common.models import CompactProfile, Profile
+
+
+def measure(factory: t.Callable[[int], t.Any], count: int = 1_000_000) -> int:
+    tracemalloc.start()
+    users = {uid: factory(uid) for uid in range(count)}
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del users
+    return size
+
+
+def make_profile(uid: int) -> Profile:
+    profile = Profile(xp=random.randint(0, 100_000), messages=random.randint(0, 5000), level=uid % 50)
+    if uid % 20 == 0:
+        profile.namecolor = "#ff0000"
+    return profile
+
+
+def main():
+    full = measure(make_profile)
+    compact = measure(lambda uid: CompactProfile.from_profile(make_profile(uid)))
+    print(f"Profile:        {full / 1024 / 1024:.1f} MB")
+    print(f"CompactProfile: {compact / 1024 / 1024:.1f} MB ({compact / full:.0%})")
+
+
+if __name__ == "__main__":
+    main()
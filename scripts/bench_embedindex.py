@@ -0,0 +1,81 @@
+"""Benchmark the Assistant embedding index against the old per-entry loop, and the recall of its approximate search
+
+Run from the repository root with: python -m scripts.bench_embedindex
+"""
+
+import random
+import typing as t
+from time import perf_counter
+
+import numpy as np
+from pydantic import BaseModel
+
+from assistant.common.embedindex import EmbeddingIndex
+
+
+class FakeEmbedding(BaseModel):
+    text: str
+    embedding: t.List[float]
+
+
+def loop_search(embeddings: dict, query: t.List[float], top_n: int, min_relatedness: float):
+    def cosine_similarity(a, b):
+        return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
+
+    results = []
+    for name, em in embeddings.items():
+        if len(query) != len(em.embedding):
+            continue
+        score = cosine_similarity(query, em.embedding)
+        if score >= min_relatedness:
+            results.append((name, score))
+    results.sort(key=lambda x: x[1], reverse=True)
+    return results[:top_n]
+
+
+def main():
+    count, dims = 20000, 1536
+    data = np.random.rand(count, dims).astype(np.float32)
+    embeddings = {f"entry-{i}": FakeEmbedding(text=str(i), embedding=data[i].tolist()) for i in range(count)}
+    query = embeddings[f"entry-{random.randrange(count)}"].embedding
+
+    index = EmbeddingIndex()
+    start = perf_counter()
+    index.sync(embeddings)
+    print(f"Initial build: {perf_counter() - start:.3f}s")
+
+    start = perf_counter()
+    expected = loop_search(embeddings, query, 3, 0.7)
+    print(f"Loop search:   {perf_counter() - start:.4f}s")
+
+    start = perf_counter()
+    index.sync(embeddings)
+    found = index.search(query, 3, 0.7)
+    print(f"Index search:  {perf_counter() - start:.4f}s (including sync)")
+    print("Same results:", [i[0] for i in expected] == [i[0] for i in found])
+
+    # Recall@k of the approximate index against exact search
+    k, queries = 10, 100
+    count, dims = 100000, 256
+    centers = np.random.rand(200, dims).astype(np.float32)
+    data = centers[np.random.randint(200, size=count)] + np.random.rand(count, dims).astype(np.float32) * 0.5
+    embeddings = {f"entry-{i}": FakeEmbedding(text=str(i), embedding=data[i].tolist()) for i in range(count)}
+    index = EmbeddingIndex()
+    index.sync(embeddings)
+    tests = [embeddings[f"entry-{random.randrange(count)}"].embedding for _ in range(queries)]
+    start = perf_counter()
+    index.search(tests[0], k, 0, probes=1)
+    print(f"\nIVF training over {count} entries: {perf_counter() - start:.2f}s")
+    start = perf_counter()
+    exact = [{i[0] for i in index.search(q, k, -1)} for q in tests]
+    print(f"Exact:     {(perf_counter() - start) / queries * 1000:.2f}ms per query")
+    for probes in (1, 4, 8, 16, 32):
+        start = perf_counter()
+        found = [{i[0] for i in index.search(q, k, -1, probes=probes)} for q in tests]
+        elapsed = (perf_counter() - start) / queries * 1000
+        recall = sum(len(a & b) for a, b in zip(exact, found)) / (k * queries)
+        print(f"{probes:>2} probes: {elapsed:.2f}ms per query, recall@{k} {recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark the LevelUp rank index against sorting every profile on each lookup
+
+Run from the repository root with: python -m scripts.bench_ranks
+"""
+
+import random
+from time import perf_counter
+from types import SimpleNamespace
+
+from levelup.common.models import GuildSettings, Prestige
+
+
+def sorted_position(guild, conf: GuildSettings, target_user: int, key: str) -> dict:
+    # The previous get_user_position for the main leaderboard, with ties broken by user ID like the index
+    if not conf.prestigedata:
+        lb = conf.users
+    else:
+        lb = {}
+        for user_id in list(conf.users.keys()):
+            profile = conf.users[user_id].model_copy()
+            if profile.prestige and conf.prestigelevel:
+                profile.xp += profile.prestige * conf.algorithm.get_xp(conf.prestigelevel)
+                profile.level += profile.prestige * conf.prestigelevel
+            lb[user_id] = profile
+
+    valid_users = {k: v for k, v in lb.items() if guild.get_member(k)}
+    sorted_users = sorted(valid_users.items(), key=lambda x: (-getattr(x[1], key), x[0]))
+    for idx, (uid, _) in enumerate(sorted_users):
+        if uid == target_user:
+            position = idx + 1
+            break
+    else:
+        position = -1
+    total = sum([getattr(x[1], key) for x in sorted_users])
+    percent = getattr(lb[target_user], key) / total * 100 if total else 0
+    return {"position": position, "total": total, "percent": percent}
+
+
+def main():
+    lookups = 50
+    for count, prestige in ((10_000, False), (100_000, False), (100_000, True)):
+        members = {uid: SimpleNamespace(id=uid) for uid in range(count) if uid % 10}  # 10% have left
+        guild = SimpleNamespace(members=list(members.values()), get_member=members.get)
+        conf = GuildSettings()
+        if prestige:
+            conf.prestigelevel = 50
+            conf.prestigedata = {1: Prestige(role=0, emoji_string="", emoji_url="")}
+        for uid in range(count):
+            profile = conf.get_profile(uid)
+            profile.xp = random.randint(0, 1_000_000)
+            profile.prestige = random.randint(0, 2) if prestige else 0
+
+        start = perf_counter()
+        conf.get_ranks(guild)
+        build = perf_counter() - start
+
+        # Each lookup follows an XP gain, like a profile command after chatting
+        targets = random.sample(list(members), lookups)
+        gains = [random.randint(1, 50_000) for _ in targets]
+        start = perf_counter()
+        found = []
+        for uid, gain in zip(targets, gains):
+            conf.get_profile(uid).xp += gain
+            found.append(conf.get_ranks(guild).stat_summary("xp", uid))
+        new = (perf_counter() - start) / lookups
+
+        # The old path only ever sees the final XP, so compare it against fresh lookups
+        start = perf_counter()
+        expected = [sorted_position(guild, conf, uid, "xp") for uid in targets]
+        old = (perf_counter() - start) / lookups
+
+        start = perf_counter()
+        final = [conf.get_ranks(guild).stat_summary("xp", uid) for uid in targets]
+        unchanged = (perf_counter() - start) / lookups
+
+        same = [i["position"] for i in expected] == [i["position"] for i in final]
+        label = f"{count} users{' with prestige' if prestige else ''}"
+        print(f"{label}: sorted {old * 1000:.2f}ms, index {new * 1000:.3f}ms per lookup after an XP gain")
+        print(f"  Without changes: {unchanged * 1000:.3f}ms per lookup")
+        print(f"  Initial build: {build * 1000:.1f}ms, same positions: {same}")
+
+
+if __name__ == "__main__":
+    main()